@@ -0,0 +1,59 @@
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append("..")
+
+from src.benchmark import PipelineBenchmark, compare_results
+
+
+def benchmark(args):
+
+    with tempfile.TemporaryDirectory() as data_folder:
+        benchmarker = PipelineBenchmark(
+            Path(data_folder),
+            grid_size=(args.lat, args.lon),
+            start_year=args.start_year,
+            end_year=args.end_year,
+            experiment=args.experiment,
+            pred_months=args.pred_months,
+            backend=args.backend,
+            num_epochs=args.num_epochs,
+            num_workers=args.num_workers,
+            trace_memory=not args.no_memory,
+        )
+        results = benchmarker.run()
+        benchmarker.save(Path(args.output))
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        for stage, ratios in compare_results(baseline, results).items():
+            print(f"{stage}: {ratios}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline on synthetic data"
+    )
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument(
+        "--compare", default=None, help="Results from a previous run, to compare to"
+    )
+    parser.add_argument("--lat", type=int, default=36)
+    parser.add_argument("--lon", type=int, default=45)
+    parser.add_argument("--start-year", type=int, default=2000)
+    parser.add_argument("--end-year", type=int, default=2010)
+    parser.add_argument("--experiment", default="one_month_forecast")
+    parser.add_argument("--pred-months", type=int, default=3)
+    parser.add_argument("--backend", default="netcdf")
+    parser.add_argument("--num-epochs", type=int, default=1)
+    parser.add_argument("--num-workers", type=int, default=0)
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Don't trace the peak memory, which slows down every stage",
+    )
+    benchmark(parser.parse_args())
@@ -1,4 +1,5 @@
 from .event_detector import EventDetector
+from .event_catalogue import EventCatalogue
 from .evaluation import (
     plot_predictions,
     spatial_rmse,
@@ -9,6 +10,8 @@ from .evaluation import (
     read_true_data,
     read_train_data,
     read_test_data,
+    load_predictions,
+    skill_scores,
 )
 from .plot_explanations import plot_explanations, all_explanations_for_file
 from .indices import (
@@ -28,6 +31,7 @@ from .region_analysis import LandcoverRegionAnalysis, AdministrativeRegionAnalys
 __all__ = [
     "plot_explanations",
     "EventDetector",
+    "EventCatalogue",
     "SPI",
     "ZScoreIndex",
     "PercentNormalIndex",
@@ -51,4 +55,6 @@ __all__ = [
     "read_true_data",
     "read_train_data",
     "read_test_data",
+    "load_predictions",
+    "skill_scores",
 ]
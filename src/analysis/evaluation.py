@@ -7,7 +7,7 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 import pandas as pd
 
-from sklearn.metrics import r2_score, mean_squared_error
+from sklearn.metrics import mean_squared_error
 from typing import Dict, List, Optional, Union, Tuple
 from src.utils import get_ds_mask, _sort_lat_lons
 
@@ -70,6 +70,206 @@ def rmse(y_true: np.ndarray, y_pred: np.ndarray) -> float:
     return np.sqrt(mean_squared_error(y_true, y_pred))
 
 
+def load_predictions(
+    models: List[str],
+    pred_years: List[int],
+    months: List[int] = list(range(1, 13)),
+    experiment: str = "one_month_forecast",
+    true_data_experiment: Optional[str] = None,
+    data_path: Path = Path("data"),
+    target_var: str = "VCI",
+) -> Tuple[xr.DataArray, xr.DataArray]:
+    """Read the predictions of all the models, and the true data, for every
+    (pred_year, month), reading each file once.
+
+    Returns:
+    ----------
+    true_da: The (time, lat, lon) true data
+    pred_da: The (model, time, lat, lon) predictions, on the grid of the true data
+    """
+    if true_data_experiment is None:
+        true_data_experiment = experiment
+
+    true_list: List[xr.DataArray] = []
+    pred_lists: Dict[str, List[xr.DataArray]] = {model: [] for model in models}
+    for pred_year in pred_years:
+        for month in months:
+            true_path = (
+                data_path / f"features/{true_data_experiment}/test"
+                f"/{pred_year}_{month}/y.nc"
+            )
+            with xr.open_dataset(true_path) as true_ds:
+                true_list.append(true_ds[target_var].isel(time=[0]).load())
+
+            for model in models:
+                pred_path = (
+                    data_path / f"models/{experiment}/{model}"
+                    f"/preds_{pred_year}_{month}.nc"
+                )
+                with xr.open_dataset(pred_path) as pred_ds:
+                    pred_lists[model].append(pred_ds.preds.isel(time=0).load())
+
+    true_da = xr.concat(true_list, dim="time").transpose("time", "lat", "lon")
+    # the predictions are put on the grid of the true data, and are given its
+    # timesteps (as `monthly_score` only compares the first timestep of each file)
+    pred_da = xr.concat(
+        [
+            xr.concat(pred_lists[model], dim="time")
+            .drop("time")
+            .assign_coords(time=true_da.time)
+            .transpose("time", "lat", "lon")
+            .reindex(lat=true_da.lat, lon=true_da.lon)
+            for model in models
+        ],
+        dim=pd.Index(models, name="model"),
+    )
+    return true_da, pred_da
+
+
+def skill_scores(
+    true_da: xr.DataArray,
+    pred_da: xr.DataArray,
+    groupby: Optional[str] = "time",
+    metrics: Optional[List[str]] = None,
+    reference: Optional[str] = None,
+    regions: Optional[xr.DataArray] = None,
+) -> xr.Dataset:
+    """Calculate the scores of all the models over every group at once, from
+    sums over the (model, group) of every (model, time, pixel) value.
+
+    Arguments
+    ----------
+    true_da: The (time, lat, lon) true data
+    pred_da: The (model, time, lat, lon) predictions, e.g. from `load_predictions`
+    groupby: The groups to score over, one of {'time', 'month', 'year', 'pixel',
+        'region'}. If None, all the values are scored together
+    metrics: The metrics to calculate, from {'rmse', 'r2', 'mae', 'bias', 'skill'}.
+        If None, all are calculated ('skill' only if there is a `reference`)
+    reference: The name of the model which the mean squared error skill score
+        (`1 - mse / mse_reference`) is relative to, e.g. a persistence model
+    regions: A (lat, lon) DataArray of integer region ids, required if
+        groupby='region'. Pixels with a NaN (or negative) id are not scored
+
+    Returns:
+    ----------
+    A Dataset with a (model, group) variable for each metric. The group dimension
+    is named after `groupby`, and is (lat, lon) if groupby='pixel'
+    """
+    if metrics is None:
+        metrics = ["rmse", "r2", "mae", "bias"] + (
+            ["skill"] if reference is not None else []
+        )
+    unknown = set(metrics) - {"rmse", "r2", "mae", "bias", "skill"}
+    assert len(unknown) == 0, f"Unknown metrics: {unknown}"
+    if "skill" in metrics:
+        assert reference is not None, "A reference model is required for `skill`"
+        assert reference in pred_da.model.values, f"{reference} is not in pred_da"
+
+    true_da = true_da.transpose("time", "lat", "lon")
+    pred_da = pred_da.transpose("model", "time", "lat", "lon")
+    true_da, pred_da = xr.align(true_da, pred_da, join="inner")
+
+    group_idx, group_coords = _group_index(true_da, groupby, regions)
+    num_groups = int(np.prod([len(labels) for labels in group_coords.values()]))
+
+    num_models = pred_da.shape[0]
+    true = true_da.values.reshape(-1)
+    preds = pred_da.values.reshape(num_models, -1)
+    valid = ~np.isnan(preds) & ~np.isnan(true) & (group_idx >= 0)
+
+    # every (model, group) is a bin of one bincount
+    bins = (np.arange(num_models)[:, np.newaxis] * num_groups + group_idx)[valid]
+    true = np.broadcast_to(true, preds.shape)[valid]
+    error = (preds - true_da.values.reshape(-1))[valid]
+
+    def group_sum(values: np.ndarray) -> np.ndarray:
+        return np.bincount(
+            bins, weights=values, minlength=num_models * num_groups
+        ).reshape(num_models, num_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        count = group_sum(np.ones_like(error))
+        mse = group_sum(error ** 2) / count
+
+        scores: Dict[str, np.ndarray] = {}
+        if "rmse" in metrics:
+            scores["rmse"] = np.sqrt(mse)
+        if "mae" in metrics:
+            scores["mae"] = group_sum(np.abs(error)) / count
+        if "bias" in metrics:
+            scores["bias"] = group_sum(error) / count
+        if "r2" in metrics:
+            true_mean = (group_sum(true) / count).reshape(-1)[bins]
+            total = group_sum((true - true_mean) ** 2) / count
+            scores["r2"] = 1 - mse / total
+        if "skill" in metrics:
+            reference_idx = list(pred_da.model.values).index(reference)
+            scores["skill"] = 1 - mse / mse[reference_idx]
+
+    dims = ["model"] + list(group_coords.keys())
+    shape = (num_models,) + tuple(len(c) for c in group_coords.values())
+    coords = {"model": pred_da.model.values, **group_coords}
+    return xr.Dataset(
+        {
+            metric: (dims, scores[metric].reshape(shape))
+            for metric in metrics
+            if metric in scores
+        },
+        coords=coords,
+    )
+
+
+def _group_index(
+    true_da: xr.DataArray, groupby: Optional[str], regions: Optional[xr.DataArray]
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """The group of every (time, pixel) value of a (time, lat, lon) DataArray,
+    flattened, and the coordinates of the groups. -1 for values not in any group
+    """
+    num_times, num_lats, num_lons = true_da.shape
+    time_idx = np.repeat(np.arange(num_times), num_lats * num_lons)
+    pixel_idx = np.tile(np.arange(num_lats * num_lons), num_times)
+
+    if groupby is None:
+        return np.zeros(time_idx.shape, dtype=np.int64), {}
+    elif groupby == "time":
+        return time_idx, {"time": true_da.time.values}
+    elif groupby in ["month", "year"]:
+        values = true_da[f"time.{groupby}"].values
+        labels, time_groups = np.unique(values, return_inverse=True)
+        return time_groups[time_idx], {groupby: labels}
+    elif groupby == "pixel":
+        return pixel_idx, {"lat": true_da.lat.values, "lon": true_da.lon.values}
+    elif groupby == "region":
+        assert regions is not None, "`regions` are required to group by region"
+        region_ids = regions.reindex(lat=true_da.lat, lon=true_da.lon).values.ravel()
+        in_region = ~np.isnan(region_ids) & (np.nan_to_num(region_ids) >= 0)
+        labels, pixel_groups = np.unique(
+            region_ids[in_region].astype(np.int64), return_inverse=True
+        )
+        groups = np.full(region_ids.shape, -1, dtype=np.int64)
+        groups[in_region] = pixel_groups
+        return groups[pixel_idx], {"region": labels}
+    else:
+        assert False, (
+            f"groupby must be one of {{'time', 'month', 'year', 'pixel', 'region'}}"
+            f" or None. Got: {groupby}"
+        )
+
+
+def _scores_to_dict(
+    scores: xr.Dataset, metrics: List[str]
+) -> Dict[str, Dict[str, List[float]]]:
+    """{metric: {'month': [...], 'year': [...], model: [...]}} of time grouped scores
+    """
+    times = pd.to_datetime(scores.time.values)
+    scores_dict: Dict[str, Dict[str, List[float]]] = {}
+    for metric in metrics:
+        scores_dict[metric] = {"month": list(times.month), "year": list(times.year)}
+        for model in scores.model.values:
+            scores_dict[metric][model] = list(scores[metric].sel(model=model).values)
+    return scores_dict
+
+
 def annual_scores(
     models: List[str],
     metrics: Optional[List[str]] = None,
@@ -82,39 +282,39 @@ def annual_scores(
     to_dataframe: bool = False,
 ) -> Union[Dict[str, Dict[str, List[float]]], pd.DataFrame]:
     """
-    Aggregates monthly R2 scores over a `pred_year` of data
+    Aggregates monthly R2 scores over a `pred_year` of data.
+
+    The predictions of all the models for all the `pred_years` are read once, and
+    scored together with `skill_scores`
     """
     if metrics is None:
         # if None, use all
         metrics = ["rmse", "r2"]
-    monthly_scores: Dict[str, Dict[str, List[float]]] = {}
-    for metric in metrics:
-        monthly_scores[metric] = {"month": [], "year": []}
-        for model in models:
-            monthly_scores[metric][model] = []
+
+    true_da, pred_da = load_predictions(
+        models=models,
+        pred_years=pred_years,
+        experiment=experiment,
+        true_data_experiment=true_data_experiment,
+        data_path=data_path,
+        target_var=target_var,
+    )
+    scores = skill_scores(true_da, pred_da, groupby="time", metrics=metrics)
 
     out_dict = dict()
     for pred_year in pred_years:
-        for month in range(1, 13):
-            scores = monthly_score(
-                month=month,
-                metrics=metrics,
-                models=models,
-                data_path=data_path,
-                pred_year=pred_year,
-                experiment=experiment,
-                true_data_experiment=true_data_experiment,
-                target_var=target_var,
-                verbose=verbose,
-            )
-
-            for model, metric_scores in scores.items():
-                for metric, score in metric_scores.items():
-                    monthly_scores[metric][model].append(score)
-            for metric in metrics:
-                monthly_scores[metric]["month"].append(month)
-                monthly_scores[metric]["year"].append(pred_year)
-
+        year_scores = scores.isel(time=(scores["time.year"] == pred_year).values)
+        if verbose:
+            for time in pd.to_datetime(year_scores.time.values):
+                for model in models:
+                    for metric in metrics:
+                        score = year_scores[metric].sel(model=model, time=time).values
+                        print(
+                            f"For month {time.month}, model {model} has "
+                            f"{metric} score {score}"
+                        )
+
+        monthly_scores = _scores_to_dict(year_scores, metrics)
         if to_dataframe:
             out_dict[pred_year] = annual_scores_to_dataframe(monthly_scores)
         else:
@@ -235,41 +435,22 @@ def monthly_score(
     ----------
     output_score: A dict {model_name: {metric: score}} for that month's data
     """
-    metric2function = {"r2": r2_score, "rmse": rmse}
-
-    model_files: Dict[str, xr.Dataset] = {}
-    for model in models:
-        pred_path = (
-            data_path / f"models/{experiment}/{model}/preds_{pred_year}_{month}.nc"
-        )
-        model_files[model] = xr.open_dataset(pred_path).isel(time=0)
-
-    if true_data_experiment is None:
-        true_data_path = (
-            data_path / f"features/{experiment}/test" f"/{pred_year}_{month}/y.nc"
-        )
-    else:
-        true_data_path = (
-            data_path / f"features/{true_data_experiment}/test"
-            f"/{pred_year}_{month}/y.nc"
-        )
-    true_data = xr.open_dataset(true_data_path).isel(time=0)
+    true_da, pred_da = load_predictions(
+        models=models,
+        pred_years=[pred_year],
+        months=[month],
+        experiment=experiment,
+        true_data_experiment=true_data_experiment,
+        data_path=data_path,
+        target_var=target_var,
+    )
+    scores = skill_scores(true_da, pred_da, groupby=None, metrics=metrics)
 
     output_score: Dict[str, Dict[str, float]] = {}
-
-    for model, preds in model_files.items():
-        diff = true_data[target_var] - preds.preds
-        notnan = ~np.isnan(diff.values)
-        joined = true_data.merge(preds, join="inner")
-        true_np = joined[target_var].values[notnan].flatten()
-        preds_np = joined.preds.values[notnan].flatten()
-
+    for model in models:
+        output_score[model] = {}
         for metric in metrics:
-            score = metric2function[metric](true_np, preds_np)
-
-            if model not in output_score:
-                output_score[model] = {}
-
+            score = float(scores[metric].sel(model=model).values)
             output_score[model][metric] = score
 
             if verbose:
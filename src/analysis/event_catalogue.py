@@ -0,0 +1,252 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy import ndimage, sparse
+from scipy.sparse import csgraph
+
+from typing import Optional, Tuple
+
+
+class EventCatalogue:
+    r"""Discrete (e.g. drought) events: clusters of threshold exceedences which are
+    connected in space and across consecutive timesteps, found by labelling the
+    connected components of the (time, lat, lon) exceedences.
+
+    >>> e = EventDetector(path_to_data)
+    >>> e.detect(variable='precip', method='q10', time_period='month', hilo='low')
+    >>> catalogue = e.label_events(connectivity=1)
+    >>> catalogue.events  # one row per event
+    >>> catalogue.update(new_exceedences)  # when new months are appended
+
+    :param connectivity: Which neighbouring pixels (in space and time) are connected,
+        as in `scipy.ndimage.generate_binary_structure`. 1 only connects pixels which
+        share a face (so a pixel in the next timestep must be the same pixel), 2 also
+        connects pixels which share an edge and 3 also those which share a corner
+
+    Attributes:
+    ----------
+    labels: xr.DataArray
+        The (time, lat, lon) label of the event each pixel is part of. 0 where there
+        are no exceedences
+    tracks: pd.DataFrame
+        One row per event and timestep, with the event's area (in pixels), centroid
+        (lat, lon) and peak intensity at that timestep
+    events: pd.DataFrame
+        One row per event (indexed by label), with its start and end times, duration
+        (in timesteps), its maximum and total area (in pixels, and pixel-timesteps)
+        and its peak intensity
+    """
+
+    track_columns = ["label", "time", "area", "lat", "lon", "peak_intensity"]
+
+    def __init__(self, connectivity: int = 1) -> None:
+        assert connectivity in {1, 2, 3}, "connectivity must be one of {1, 2, 3}"
+        self.connectivity = connectivity
+        self.structure = ndimage.generate_binary_structure(3, connectivity)
+
+        self.labels: Optional[xr.DataArray] = None
+        self.tracks = pd.DataFrame(columns=self.track_columns)
+        self.num_labels = 0
+
+    @property
+    def events(self) -> pd.DataFrame:
+        grouped = self.tracks.groupby("label")
+        events = grouped.agg(
+            {
+                "time": ["min", "max", "count"],
+                "area": ["max", "sum"],
+                "peak_intensity": "max",
+            }
+        )
+        events.columns = [
+            "start_time",
+            "end_time",
+            "duration",
+            "max_area",
+            "total_area",
+            "peak_intensity",
+        ]
+        return events
+
+    def label(
+        self, exceedences: xr.DataArray, intensity: Optional[xr.DataArray] = None
+    ) -> None:
+        """Label the events in `exceedences`, replacing any previous events
+
+        :param exceedences: The (time, lat, lon) boolean exceedences
+        :param intensity: The (time, lat, lon) intensity of each exceedence (e.g. its
+            distance beyond the threshold), used for each event's peak intensity
+        """
+        self.labels = None
+        self.tracks = pd.DataFrame(columns=self.track_columns)
+        self.num_labels = 0
+        self.update(exceedences, intensity)
+
+    def update(
+        self, exceedences: xr.DataArray, intensity: Optional[xr.DataArray] = None
+    ) -> None:
+        """Add the events of new timesteps, which must all be after the timesteps
+        already labelled. Only the new timesteps (and the last labelled one, to
+        connect them to the existing events) are labelled. Existing events which
+        are joined by the new timesteps are merged into the event with the
+        smallest label
+        """
+        exceedences = exceedences.transpose("time", "lat", "lon")
+        exceed = exceedences.values.astype(bool)
+
+        if self.labels is None:
+            previous = np.zeros((1,) + exceed.shape[1:], dtype=np.int32)
+        else:
+            assert (
+                exceedences.time.values.min() > self.labels.time.values.max()
+            ), "The new timesteps must be after the labelled timesteps"
+            for coord in ["lat", "lon"]:
+                assert (
+                    exceedences[coord].values == self.labels[coord].values
+                ).all(), f"The {coord} of the new timesteps must be the same"
+            previous = self.labels.isel(time=slice(-1, None)).values
+
+        # label the new timesteps together with the last labelled timestep, so that
+        # the new components are connected to the existing events
+        components, num_components = ndimage.label(
+            np.concatenate([previous > 0, exceed]), structure=self.structure
+        )
+        previous_map, component_map = self._merge_labels(
+            previous[0], components[0], num_components
+        )
+
+        new_labels = component_map[components[1:]]
+        if self.labels is None:
+            self.labels = self._to_dataarray(new_labels, exceedences)
+        else:
+            if (previous_map != np.arange(len(previous_map))).any():
+                # some existing events are joined by the new timesteps
+                self.labels.values = previous_map[self.labels.values]
+                self.tracks["label"] = previous_map[self.tracks["label"].values]
+                self.tracks = self._combine_tracks(self.tracks)
+            self.labels = xr.concat(
+                [self.labels, self._to_dataarray(new_labels, exceedences)], dim="time"
+            )
+
+        new_tracks = self._tracks(new_labels, exceedences, intensity)
+        if len(self.tracks) == 0:
+            self.tracks = new_tracks
+        else:
+            # the new tracks of existing events are added as their own rows
+            self.tracks = pd.concat([self.tracks, new_tracks], ignore_index=True)
+
+    def _merge_labels(
+        self, previous: np.ndarray, first_components: np.ndarray, num_components: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Map the existing labels, and the new components, onto the merged labels.
+
+        The existing labels and new components are the nodes of a graph, with an
+        edge between the existing label and the new component of every pixel in
+        the last labelled timestep. Every connected part of the graph is an event.
+
+        :returns: Lookup arrays from existing labels, and from new components, to
+            the merged labels
+        """
+        num_labels = self.num_labels
+        # node i is existing label i, and node (num_labels + j) is new component j
+        num_nodes = num_labels + 1 + num_components
+        in_event = previous > 0
+        graph = sparse.coo_matrix(
+            (
+                np.ones(in_event.sum()),
+                (previous[in_event], num_labels + first_components[in_event]),
+            ),
+            shape=(num_nodes, num_nodes),
+        )
+        _, parts = csgraph.connected_components(graph, directed=False)
+        label_parts = parts[: num_labels + 1]
+        component_parts = parts[num_labels + 1 :]
+
+        # each part takes the smallest existing label in it, or (if it only has
+        # new components) a new label
+        no_label = np.iinfo(np.int64).max
+        part_labels = np.full(parts.max() + 1, no_label)
+        np.minimum.at(part_labels, label_parts, np.arange(num_labels + 1))
+
+        is_new = part_labels[component_parts] == no_label
+        new_parts = np.unique(component_parts[is_new])
+        part_labels[new_parts] = num_labels + 1 + np.arange(len(new_parts))
+        self.num_labels = num_labels + len(new_parts)
+
+        previous_map = part_labels[label_parts]
+        component_map = np.concatenate([[0], part_labels[component_parts]])
+        return previous_map.astype(np.int32), component_map.astype(np.int32)
+
+    @staticmethod
+    def _to_dataarray(labels: np.ndarray, like: xr.DataArray) -> xr.DataArray:
+        return xr.DataArray(
+            labels,
+            dims=["time", "lat", "lon"],
+            coords={"time": like.time, "lat": like.lat, "lon": like.lon},
+            name="label",
+        )
+
+    @staticmethod
+    def _tracks(
+        labels: np.ndarray,
+        exceedences: xr.DataArray,
+        intensity: Optional[xr.DataArray] = None,
+    ) -> pd.DataFrame:
+        time_idx, lat_idx, lon_idx = np.nonzero(labels)
+        pixels = pd.DataFrame(
+            {
+                "label": labels[time_idx, lat_idx, lon_idx],
+                "time": exceedences.time.values[time_idx],
+                "area": 1,
+                "lat": exceedences.lat.values[lat_idx],
+                "lon": exceedences.lon.values[lon_idx],
+                "peak_intensity": np.nan,
+            }
+        )
+        if intensity is not None:
+            values = intensity.transpose("time", "lat", "lon").values
+            pixels["peak_intensity"] = values[time_idx, lat_idx, lon_idx]
+        return EventCatalogue._combine_tracks(pixels)
+
+    @staticmethod
+    def _combine_tracks(tracks: pd.DataFrame) -> pd.DataFrame:
+        """Combine the rows with the same label and time, with the centroid
+        weighted by area
+        """
+        tracks = tracks.assign(
+            lat=tracks["lat"] * tracks["area"], lon=tracks["lon"] * tracks["area"]
+        )
+        combined = tracks.groupby(["label", "time"]).agg(
+            {"area": "sum", "lat": "sum", "lon": "sum", "peak_intensity": "max"}
+        )
+        combined["lat"] /= combined["area"]
+        combined["lon"] /= combined["area"]
+        return combined.reset_index()[EventCatalogue.track_columns]
+
+    def save(self, folder: Path) -> None:
+        """Save the label cube (as labels.nc) and the tracks and events tables
+        (as tracks.csv and events.csv) to `folder`
+        """
+        assert self.labels is not None, "No events have been labelled"
+        folder.mkdir(parents=True, exist_ok=True)
+
+        labels = self.labels.to_dataset()
+        labels.attrs["connectivity"] = self.connectivity
+        labels.attrs["num_labels"] = self.num_labels
+        labels.to_netcdf(folder / "labels.nc")
+        self.tracks.to_csv(folder / "tracks.csv", index=False)
+        self.events.to_csv(folder / "events.csv")
+        print(f"Saved {len(self.events)} events to {folder}")
+
+    @classmethod
+    def load(cls, folder: Path) -> "EventCatalogue":
+        """Load a catalogue saved by `save`, e.g. to `update` it"""
+        with xr.open_dataset(folder / "labels.nc") as labels:
+            labels = labels.load()
+
+        catalogue = cls(connectivity=int(labels.attrs["connectivity"]))
+        catalogue.num_labels = int(labels.attrs["num_labels"])
+        catalogue.labels = labels.label.astype(np.int32)
+        catalogue.tracks = pd.read_csv(folder / "tracks.csv", parse_dates=["time"])
+        return catalogue
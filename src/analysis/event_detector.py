@@ -1,12 +1,12 @@
 import xarray as xr
 import numpy as np
+import pandas as pd
 from pathlib import Path
-from typing import Tuple, Optional, Any
+from typing import Callable, Tuple, Optional, Any, List, Union
 import warnings
-from ..utils import get_ds_mask, create_shape_aligned_climatology
-
-rle = None
-longest_run = None
+from ..utils import get_ds_mask, create_shape_aligned_climatology, grouped_nanquantile
+from . import run_length
+from .event_catalogue import EventCatalogue
 
 
 class EventDetector:
@@ -24,14 +24,6 @@ class EventDetector:
     """
 
     def __init__(self, path_to_data: Path) -> None:
-
-        global rle
-        global longest_run
-        if rle is None:
-            from xclim.run_length import rle
-        if longest_run is None:
-            from xclim.run_length import longest_run
-
         assert (
             path_to_data.exists()
         ), f"{path_to_data} does not point to an existing file!"
@@ -99,21 +91,10 @@ class EventDetector:
             be used as the threshold value.
         """
         if method == "q90":
-            warnings.warn(f"this method ({method}) is currently super slow")
-            thresh = (
-                ds.groupby(f"time.{time_period}")
-                # .quantile(q=0.9)  # updated v0.12.2
-                .reduce(np.nanpercentile, dim="time", q=90)
-            )
+            thresh = EventDetector.calculate_quantiles(ds, 0.9, time_period)
 
         elif method == "q10":
-            warnings.warn(f"this method ({method}) is currently super slow")
-            thresh = (
-                ds.groupby(f"time.{time_period}").reduce(
-                    np.nanpercentile, dim="time", q=10
-                )
-                # .quantile(q=0.1)
-            )
+            thresh = EventDetector.calculate_quantiles(ds, 0.1, time_period)
 
         elif method == "std":
             assert (
@@ -139,6 +120,58 @@ class EventDetector:
 
         return thresh
 
+    @staticmethod
+    def calculate_quantiles(
+        ds: xr.Dataset,
+        q: Union[float, List[float]],
+        time_period: str,
+        lat_chunk_size: Optional[int] = None,
+    ) -> xr.Dataset:
+        """Calculate the quantile(s) of each variable in `ds` for each `time_period`
+        (as `ds.groupby(f"time.{time_period}").quantile(q)`, ignoring NaNs).
+
+        The timesteps in each period are sorted once for all pixels, and all the
+        quantiles in `q` are read from the sorted values.
+
+        Arguments:
+        ----------
+        ds: xr.Dataset
+            dataset with (time, lat, lon) variables
+
+        q: Union[float, List[float]]
+            the quantile(s), between 0 and 1. If a list, the output has a
+            `quantile` dimension
+
+        time_period: str
+            the time period to groupby
+            {'dayofyear', 'month', 'season'}
+
+        lat_chunk_size: Optional[int] = None
+            the number of latitudes sorted at once, to limit the memory used
+            on large (e.g. daily) datasets
+        """
+        periods, groups = np.unique(
+            ds[f"time.{time_period}"].values, return_inverse=True
+        )
+
+        thresh = {}
+        for variable in ds.data_vars:
+            if "time" not in ds[variable].dims:
+                continue
+            da = ds[variable].transpose("time", "lat", "lon")
+            quantiles = grouped_nanquantile(
+                da.values.astype(np.float64), groups, q, chunk_size=lat_chunk_size
+            )
+            if isinstance(q, list):
+                thresh[variable] = (["quantile", time_period, "lat", "lon"], quantiles)
+            else:
+                thresh[variable] = ([time_period, "lat", "lon"], quantiles[0])
+
+        coords = {time_period: periods, "lat": ds.lat, "lon": ds.lon}
+        if isinstance(q, list):
+            coords["quantile"] = q
+        return xr.Dataset(thresh, coords=coords)
+
     def get_thresh_clim_dataarrays(
         self,
         ds: xr.Dataset,
@@ -239,6 +272,8 @@ class EventDetector:
          {method}. The threshold is unique for each {time_period}"
         )
         self.variable = variable
+        self.time_period = time_period
+        self.hilo = hilo
         _, _, exceed = self.calculate_threshold_exceedences(
             variable, time_period, hilo, method=method, value=value
         )
@@ -283,16 +318,15 @@ class EventDetector:
 
         return da
 
-    def calculate_runs(self) -> xr.Dataset:
-        """use xclim to calculate the number of consecutive exceedences.
-        For each pixel-time calculate the `run` of exceedences at the
-        current timestep.
-
-        e.g.
-            [True, True, False, True, False, True, True, True] =>
-            [1, 2, 0, 1, 0, 1, 2, 3]
-
-            TODO: want to make this general enough to work with subset data too
+    def _apply_over_lat_blocks(
+        self,
+        func: Callable[[np.ndarray], np.ndarray],
+        lat_chunk_size: Optional[int] = None,
+        reduce_time: bool = False,
+    ) -> xr.DataArray:
+        """Apply a run length kernel to `self.exceedences`, one block of
+        `lat_chunk_size` latitudes at a time, so that only one block of the
+        exceedences is loaded at once
         """
         assert self.exceedences.dtype == np.dtype(
             "bool"
@@ -300,7 +334,37 @@ class EventDetector:
             Expected exceedences to be an array of boolean type.\
              Got {self.exceedences.dtype}"
 
-        runs = rle(self.exceedences).load()  # type: ignore
+        exceed = self.exceedences.transpose("time", "lat", "lon")
+        if lat_chunk_size is None:
+            lat_chunk_size = exceed.lat.size
+
+        blocks = [
+            func(exceed.isel(lat=slice(start, start + lat_chunk_size)).values)
+            for start in range(0, exceed.lat.size, lat_chunk_size)
+        ]
+        dims = ["lat", "lon"] if reduce_time else ["time", "lat", "lon"]
+        return xr.DataArray(
+            np.concatenate(blocks, axis=dims.index("lat")),
+            dims=dims,
+            coords={d: exceed[d] for d in dims},
+        )
+
+    def calculate_runs(self, lat_chunk_size: Optional[int] = None) -> xr.DataArray:
+        """Calculate the number of consecutive exceedences. For each run of
+        exceedences, its length is given at its first timestep, and all the
+        other timesteps are 0.
+
+        e.g.
+            [True, True, False, True, False, True, True, True] =>
+            [2, 0, 0, 1, 0, 3, 0, 0]
+
+        Arguments:
+        ---------
+        lat_chunk_size: Optional[int] = None
+            the number of latitudes to calculate the runs of at once. By default
+            the whole grid is calculated at once
+        """
+        runs = self._apply_over_lat_blocks(run_length.run_lengths, lat_chunk_size)
 
         # apply the same mask as TIME=0 (e.g. for the sea-land mask)
         mask = get_ds_mask(self.ds[self.variable])
@@ -308,7 +372,99 @@ class EventDetector:
 
         return runs
 
-    def calculate_longest_run(self, resample_str: Optional[str] = None) -> xr.Dataset:
+    def calculate_longest_run(
+        self, resample_str: Optional[str] = None, lat_chunk_size: Optional[int] = None
+    ) -> xr.DataArray:
         """ Calculate the longest run in the dataset
         TODO: fix this argument to work with other resample_str """
-        return longest_run(self.exceedences, dim="time").load()  # type: ignore
+        return self._apply_over_lat_blocks(
+            run_length.longest_run, lat_chunk_size, reduce_time=True
+        )
+
+    def calculate_run_count(self, lat_chunk_size: Optional[int] = None) -> xr.DataArray:
+        """Calculate the number of runs (of any length) of each pixel"""
+        return self._apply_over_lat_blocks(
+            run_length.run_count, lat_chunk_size, reduce_time=True
+        )
+
+    def calculate_current_run_length(
+        self, lat_chunk_size: Optional[int] = None
+    ) -> xr.DataArray:
+        """Calculate the length of the run each timestep is in, so far
+
+        e.g.
+            [True, True, False, True, False, True, True, True] =>
+            [1, 2, 0, 1, 0, 1, 2, 3]
+        """
+        return self._apply_over_lat_blocks(
+            run_length.current_run_length, lat_chunk_size
+        )
+
+    def calculate_events(self, lat_chunk_size: Optional[int] = None) -> pd.DataFrame:
+        """Find every run of exceedences (an event), and calculate its severity:
+        the total distance beyond the threshold over the event (e.g. for `hilo='low'`
+        the sum of `thresh - value`)
+
+        Returns:
+        -------
+        pd.DataFrame with one row per event, and columns
+            [lat, lon, start_time, end_time, duration, severity]
+        """
+        exceed = self.exceedences.transpose("time", "lat", "lon")
+        da = self.ds[self.variable].transpose("time", "lat", "lon")
+        thresh = self.thresh[self.variable].transpose(self.time_period, "lat", "lon")
+        # the index of each timestep's period in the threshold
+        periods = pd.Index(thresh[self.time_period].values).get_indexer(
+            da[f"time.{self.time_period}"].values
+        )
+        sign = -1.0 if self.hilo == "low" else 1.0
+
+        if lat_chunk_size is None:
+            lat_chunk_size = exceed.lat.size
+        num_lon = exceed.lon.size
+
+        events = []
+        for start in range(0, exceed.lat.size, lat_chunk_size):
+            block = slice(start, start + lat_chunk_size)
+            distance = sign * (
+                da.isel(lat=block).values - thresh.isel(lat=block).values[periods]
+            )
+            runs = run_length.find_runs(exceed.isel(lat=block).values, distance)
+            lat_idx, lon_idx = np.divmod(runs.pixel, num_lon)
+            events.append(
+                pd.DataFrame(
+                    {
+                        "lat": exceed.lat.values[lat_idx + start],
+                        "lon": exceed.lon.values[lon_idx],
+                        "start_time": exceed.time.values[runs.start],
+                        "end_time": exceed.time.values[runs.end],
+                        "duration": runs.end - runs.start + 1,
+                        "severity": runs.severity,
+                    }
+                )
+            )
+        return pd.concat(events, ignore_index=True)
+
+    def label_events(self, connectivity: int = 1) -> EventCatalogue:
+        """Label discrete events: clusters of exceedences which are connected in
+        space and across consecutive timesteps. The intensity of each exceedence
+        is its distance beyond the threshold.
+
+        Arguments:
+        ---------
+        connectivity: int = 1
+            which neighbouring pixels are connected (see `EventCatalogue`)
+
+        Returns:
+        -------
+        EventCatalogue, which can be updated with the exceedences of new timesteps
+        """
+        thresh_ext = create_shape_aligned_climatology(
+            self.ds, self.thresh, self.variable, self.time_period
+        )[self.variable]
+        sign = -1.0 if self.hilo == "low" else 1.0
+        intensity = sign * (self.ds[self.variable] - thresh_ext)
+
+        catalogue = EventCatalogue(connectivity)
+        catalogue.label(self.exceedences, intensity)
+        return catalogue
@@ -1,8 +1,12 @@
 import xarray as xr
 import numpy as np
 
-from .base import BaseIndices
-from .utils import rolling_cumsum, apply_over_period
+import warnings
+
+from typing import Optional
+
+from .base import BaseIndices, fit_in_blocks
+from .climatology import Climatology
 
 
 class AnomalyIndex(BaseIndices):
@@ -42,89 +46,41 @@ class AnomalyIndex(BaseIndices):
 
     name = "rainfall_anomaly_index"
 
-    @staticmethod
-    def assign_magnitudes(
-        y: xr.Dataset,
-        anom: xr.DataArray,
-        rai_plus: xr.DataArray,
-        rai_minus: xr.DataArray,
-        variable: str,
-    ) -> xr.Dataset:
-        """ assign magnitudes to positive and negative anomalies """
-        # REVERSE boolean indexing
-        # if anom values are NOT less than/equal than fill with PLUS values
-        y_plus = y.where(~(anom >= 0), other=rai_plus)
-        y_plus_mask = y.where(~(anom >= 0)).isnull()
-        y_plus = y_plus.where(y_plus_mask)
-
-        y_minus = y.where(~(anom < 0), other=rai_minus)
-        y_minus_mask = y.where(~(anom < 0)).isnull()
-        y_minus = y_minus.where(y_minus_mask)
-
-        # convert to numpy masked array
-        y_plus_m_np = y_plus_mask[variable].values
-        y_plus_np = y_plus[variable].values
-        y_plus_np = np.ma.array(y_plus_np, mask=(~y_plus_m_np))
-
-        y_minus_m_np = y_minus_mask[variable].values
-        y_minus_np = y_minus[variable].values
-        y_minus_np = np.ma.array(y_minus_np, mask=(~y_minus_m_np))
-
-        # recombine masked arrays
-        rai_array = np.ma.array(
-            y_plus_np.filled(1) * y_minus_np.filled(1),
-            mask=(y_plus_np.mask * y_minus_np.mask),
-        )
-
-        rai = xr.ones_like(y)
-        rai[variable] = (["time", "lat", "lon"], rai_array)
-        return rai
-
-    def RAI(self, da: xr.DataArray, variable: str, dim: str = "time") -> xr.DataArray:
-        """ Rainfall Anomaly Index """
-        # calculations
-        y = da.copy()
-        x1 = da.copy().sortby(dim, ascending=False)  # high -> low over TIME
-
-        # sample average, max average, min average
-        x_avg = x1.mean(dim=dim)  # monthly average over all time
-        mx_avg = x1.isel(time=slice(0, 10)).mean(dim=dim)  # max mean (top 10)
-        mn_avg = x1.isel(time=slice(-11, -1)).mean(dim=dim)  # min mean (bottom 10) NB
-
-        # anomaly = value - mean
-        anom = da - x_avg
-
-        # where anomaly is >=0, get the ratio to difference of max_avg - x_avg
-        rai_plus = 3.0 * anom.where(anom >= 0) / (mx_avg - x_avg)
-        rai_minus = -3.0 * anom.where(anom < 0) / (mn_avg - x_avg)
-
-        # assign the magnitudes for positive and negative anomalies
-        # convert to numpy masked arrays and then back out to xarray
-        rai = self.assign_magnitudes(y, anom, rai_plus, rai_minus, variable)
-
-        return rai
-
+    @fit_in_blocks
     def fit(
-        self, variable: str, time_period: str = "month", rolling_window: int = 3
+        self,
+        variable: str,
+        time_period: str = "month",
+        rolling_window: int = 3,
+        climatology: Optional[Climatology] = None,
     ) -> None:
 
         print("Fitting Rainfall Anomaly Index")
 
         # 1. calculate a cumsum over `rolling_window` timesteps
-        ds_window = rolling_cumsum(self.ds, rolling_window)
-
-        out_variable = "RAI"
-
-        rai = apply_over_period(  # type: ignore
-            ds_window,
-            func=self.RAI,
-            in_variable=variable,
-            out_variable=out_variable,
-            time_str=time_period,
-            **{"variable": variable},
+        clim = self.get_climatology(variable, rolling_window, time_period, climatology)
+        ds_window = clim.ds_window
+
+        # 2. sample average, max average, min average (of each period)
+        x_avg = clim.mean()
+        mx_avg, mn_avg = [], []
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            for group in clim.groups:
+                # high -> low over TIME
+                descending = clim.values[group[::-1]]
+                # max mean (top 10), min mean (bottom 10) NB
+                mx_avg.append(np.nanmean(descending[0:10], axis=0))
+                mn_avg.append(np.nanmean(descending[-11:-1], axis=0))
+
+        # 3. where the anomaly (value - mean) is >= 0, get its ratio to the
+        # difference of max_avg - x_avg, otherwise to min_avg - x_avg
+        anom = ds_window[variable] - x_avg
+        rai = xr.where(
+            anom >= 0,
+            3.0 * anom / (clim.align(np.stack(mx_avg), "mx_avg") - x_avg),
+            -3.0 * anom / (clim.align(np.stack(mn_avg), "mn_avg") - x_avg),
         )
-        rai = rai.drop("month")
-        ds_window = ds_window.merge(rai).rename({variable: f"{variable}_cumsum"})
 
-        self.index = ds_window
+        self.index = ds_window.assign(RAI=rai).rename({variable: f"{variable}_cumsum"})
         print(f"Fitted Rainfall Anomaly Index and stored at `obj.index`")
@@ -1,6 +1,35 @@
+import copy
+import functools
+import shutil
+import numpy as np
+import pandas as pd
 import xarray as xr
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .climatology import Climatology
+
+netCDF4 = None
+
+
+def fit_in_blocks(fit: Callable) -> Callable:
+    """Decorate the `fit` method of an index, so that if the index is chunked the
+    fit is only recorded when it is called, and is calculated for one spatial block
+    of the data at a time when the index is saved.
+    """
+
+    @functools.wraps(fit)
+    def wrapper(self, *args, **kwargs):
+        if self.chunks is None:
+            return fit(self, *args, **kwargs)
+
+        assert (
+            kwargs.get("climatology") is None
+        ), "A shared climatology can't be used by a chunked index"
+        self._fit_args = (fit, args, kwargs)
+        print(f"{self.name} will be fitted one block at a time when it is saved")
+
+    return wrapper
 
 
 class BaseIndices:
@@ -9,12 +38,15 @@ class BaseIndices:
     index: xr.Dataset
     ds: xr.Dataset
     resample: bool = False
+    chunks: Optional[Dict[str, int]] = None
+    _fit_args: Tuple[Callable, tuple, dict]
 
     def __init__(
         self,
         file_path: Optional[Path] = None,
         ds: Optional[xr.Dataset] = None,
         resample_str: Optional[str] = None,
+        chunks: Optional[Dict[str, int]] = None,
     ) -> None:
         """
         Arguments:
@@ -25,6 +57,13 @@ class BaseIndices:
 
         resample_str: Optional[str]
             One of {'daysofyear', 'month', 'year', 'season', None}
+
+        chunks: Optional[Dict[str, int]]
+            The size of the spatial blocks, e.g. {'lat': 100, 'lon': 100}. If passed,
+             the data is not loaded when the index is fitted. Instead, the index is
+             fitted (and written) one block at a time when it is saved, so that
+             only one block is in memory at once. The indices are calculated
+             independently for each pixel, so the results are the same
         """
         assert (file_path is not None) or (
             ds is not None
@@ -43,11 +82,19 @@ class BaseIndices:
         else:
             assert False, "Must provide ds or file_path argument"
 
+        if chunks is not None:
+            assert set(chunks) <= {
+                "lat",
+                "lon",
+            }, f"Only lat and lon can be chunked, got {list(chunks)}"
+        self.chunks = chunks
+
         if resample_str is not None:
             self.resample = True
             self.resample_str = resample_str
-            self.ds = self.ds.sortby("time")
-            self.ds = self.resample_ds_mean()
+            if self.chunks is None:
+                self.ds = self.ds.sortby("time")
+                self.ds = self.resample_ds_mean()
 
     def resample_ds_mean(self) -> xr.Dataset:
         lookup = {
@@ -68,6 +115,120 @@ class BaseIndices:
         ], f"resample_str must be one of: {[k for k in lookup.keys()]}"
         return self.ds.resample(time=f"{lookup[self.resample_str]}").mean()
 
+    def get_climatology(
+        self,
+        variable: str,
+        rolling_window: int = 3,
+        time_period: str = "month",
+        climatology: Optional[Climatology] = None,
+    ) -> Climatology:
+        """Return the climatology of `variable` in self.ds. If a `climatology` is
+        passed (e.g. one shared between indices) it is used instead of being
+        recalculated, so it must have been calculated with the same arguments
+        """
+        if climatology is not None:
+            assert climatology.matches(variable, rolling_window, time_period), (
+                f"The climatology was calculated for {climatology.variable} with a "
+                f"rolling_window of {climatology.rolling_window} and time_period "
+                f"{climatology.time_period}"
+            )
+            return climatology
+        return Climatology(self.ds, variable, rolling_window, time_period)
+
+    def _blocks(self) -> Iterator[Dict[str, slice]]:
+        assert self.chunks is not None
+        lat_size = self.chunks.get("lat", self.ds.lat.size)
+        lon_size = self.chunks.get("lon", self.ds.lon.size)
+        for lat_start in range(0, self.ds.lat.size, lat_size):
+            for lon_start in range(0, self.ds.lon.size, lon_size):
+                yield {
+                    "lat": slice(lat_start, lat_start + lat_size),
+                    "lon": slice(lon_start, lon_start + lon_size),
+                }
+
+    def _fit_block(self, block: Dict[str, slice]) -> xr.Dataset:
+        """Fit the index to one spatial block of the data, in memory"""
+        fit, args, kwargs = self._fit_args
+
+        block_index = copy.copy(self)
+        block_index.chunks = None
+        block_index.ds = self.ds.isel(block).load()
+        if self.resample:
+            block_index.ds = block_index.ds.sortby("time")
+            block_index.ds = block_index.resample_ds_mean()
+        fit(block_index, *args, **kwargs)
+        return block_index.index
+
+    def _save_blocks(self, file_path: Path) -> None:
+        """Fit the index to each block of the data, and write them all to `file_path`.
+
+        The index of each block is written to its own (temporary) file, since the
+        indices of the blocks may have different timesteps (e.g. if a block is all
+        NaN for the first timesteps). They are then copied into one netcdf file
+        with the timesteps of all the blocks, as floats so that the timesteps
+        missing from a block can be NaN. Integer variables (e.g. classes) keep
+        their type, with the missing timesteps filled with 0
+        """
+        global netCDF4
+        if netCDF4 is None:
+            import netCDF4
+
+        assert hasattr(self, "_fit_args"), "The index must be fitted before saving"
+        block_dir = file_path.parent / f".{file_path.stem}_blocks"
+        block_dir.mkdir(parents=True, exist_ok=True)
+
+        blocks: List[Tuple[Dict[str, slice], Path]] = []
+        times = pd.DatetimeIndex([])
+        for i, block in enumerate(self._blocks()):
+            block_path = block_dir / f"block_{i}.nc"
+            block_index = self._fit_block(block)
+            block_index.to_netcdf(block_path)
+            times = times.union(pd.DatetimeIndex(block_index.time.values))
+            blocks.append((block, block_path))
+            print(f"Fitted block {i}")
+
+        lat, lon = self.ds.lat.values, self.ds.lon.values
+        with netCDF4.Dataset(file_path, "w") as nc:  # type: ignore
+            for name, values in [("time", times), ("lat", lat), ("lon", lon)]:
+                nc.createDimension(name, len(values))
+            time_values, units, calendar = xr.coding.times.encode_cf_datetime(times)
+            nc.createVariable("time", "f8", ("time",))
+            nc["time"].setncatts({"units": units, "calendar": calendar})
+            nc["time"][:] = time_values
+            for name, values in [("lat", lat), ("lon", lon)]:
+                nc.createVariable(name, values.dtype, (name,))
+                nc[name][:] = values
+
+            for block, block_path in blocks:
+                with xr.open_dataset(block_path) as block_index:
+                    for var in block_index.data_vars:
+                        assert set(block_index[var].dims) == {"time", "lat", "lon"}
+                        da = block_index[var].transpose("time", "lat", "lon")
+                        is_integer = np.issubdtype(da.dtype, np.integer)
+                        dtype, fill_value = (
+                            (da.dtype, 0) if is_integer else (np.float64, np.nan)
+                        )
+                        da = da.reindex(
+                            time=times,
+                            lat=lat[block["lat"]],
+                            lon=lon[block["lon"]],
+                            fill_value=fill_value,
+                        )
+                        if var not in nc.variables:
+                            # 0 is a valid class, so it isn't masked when read
+                            nc.createVariable(
+                                var,
+                                dtype,
+                                da.dims,
+                                fill_value=False if is_integer else fill_value,
+                            )
+                        values = da.values.astype(dtype)
+                        nc[var][:, block["lat"], block["lon"]] = values
+
+        shutil.rmtree(block_dir)
+        # the index can be read from the file (lazily) once it is saved
+        self.index = xr.open_dataset(file_path)
+
     def save(self, data_dir: Path = Path("data")):
         """save the self.index to netcdf"""
         analysis_dir = data_dir / "analysis" / "indices"
@@ -75,5 +236,8 @@ class BaseIndices:
             analysis_dir.mkdir(parents=True, exist_ok=True)
 
         file_path = analysis_dir / (self.name + ".nc")
-        self.index.to_netcdf(file_path)
+        if self.chunks is None:
+            self.index.to_netcdf(file_path)
+        else:
+            self._save_blocks(file_path)
         print(f"Saved {self.name} to {file_path.as_posix()}")
@@ -1,8 +1,9 @@
-import xarray as xr
 import numpy as np
 
-from .base import BaseIndices
-from .utils import rolling_cumsum, apply_over_period
+from typing import Optional
+
+from .base import BaseIndices, fit_in_blocks
+from .climatology import Climatology
 
 
 class ChinaZIndex(BaseIndices):
@@ -39,52 +40,34 @@ class ChinaZIndex(BaseIndices):
 
     name = "china_z_index"
 
-    @staticmethod
-    def MCZI(da: xr.DataArray, dim: str = "time") -> xr.DataArray:
-        zsi = (da - da.median(dim=dim)) / da.std(dim=dim)
-        cs = np.power(zsi, 3) / da.sizes[dim]
-        mczi = (
-            6.0 / cs * np.power((cs / 2.0 * zsi + 1.0), 1.0 / 3.0) - 6.0 / cs + cs / 6.0
-        )
-        return mczi
-
-    @staticmethod
-    def CZI(da: xr.DataArray, dim: str = "time") -> xr.DataArray:
-        zsi = (da - da.mean(dim=dim)) / da.std(dim=dim)
-        cs = np.power(zsi, 3) / da.sizes[dim]
-        czi = (
-            6.0 / cs * np.power((cs / 2.0 * zsi + 1.0), 1.0 / 3.0) - 6.0 / cs + cs / 6.0
-        )
-        return czi
-
+    @fit_in_blocks
     def fit(
         self,
         variable: str,
         time_period: str = "month",
         rolling_window: int = 3,
         modified: bool = False,
+        climatology: Optional[Climatology] = None,
     ) -> None:
 
         print("Fitting China Z-Score Index")
-        ds_window = rolling_cumsum(self.ds, rolling_window)
+        clim = self.get_climatology(variable, rolling_window, time_period, climatology)
+        ds_window = clim.ds_window
 
         if modified:  # modified china z index
             out_variable = "MCZI"
-            func = self.MCZI
+            centre = clim.median()
         else:
             out_variable = "CZI"
-            func = self.CZI
-
-        czi = apply_over_period(
-            ds_window,
-            func=func,
-            in_variable=variable,
-            out_variable=out_variable,
-            time_str=time_period,
+            centre = clim.mean()
+
+        zsi = (ds_window[variable] - centre) / clim.std()
+        cs = np.power(zsi, 3) / clim.period_size()
+        czi = (
+            6.0 / cs * np.power((cs / 2.0 * zsi + 1.0), 1.0 / 3.0) - 6.0 / cs + cs / 6.0
         )
-        ds_window = ds_window.merge(czi.drop("month")).rename(
+
+        self.index = ds_window.assign(**{out_variable: czi}).rename(
             {variable: f"{variable}_cumsum"}
         )
-
-        self.index = ds_window
         print(f"Fitted China Z-Score Index and stored at `obj.index`")
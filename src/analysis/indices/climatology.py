@@ -0,0 +1,189 @@
+import numpy as np
+import xarray as xr
+import warnings
+
+from typing import Dict
+
+from .utils import sum_to_scale
+from ...utils import grouped_nanquantile
+
+
+class Climatology:
+    r"""The rolling sum of a variable, and its statistics in each period
+    (e.g. calendar month), calculated once so that they can be shared by all the
+    indices fitted to the same data.
+
+    The statistics are calculated (and cached) when they are first needed. Each is
+    returned aligned with the rolling sum, so that every timestep has the statistics
+    of its period.
+
+    :param ds: The dataset containing the variable, with (time, lat, lon) dimensions
+    :param variable: The variable to calculate the climatology of
+    :param rolling_window: The number of timesteps to sum the variable over. The
+        leading timesteps without a complete window are dropped. Unlike
+        `rolling_cumsum`, timesteps which are NaN for every pixel are kept, so that
+        the statistics of each pixel only depend on its own values (and the
+        climatology of a spatial block of the data is the same as that block of
+        the climatology of all the data)
+    :param time_period: The period over which the statistics are calculated,
+        one of `{'month', 'season', 'dayofyear'}`
+    """
+
+    def __init__(
+        self,
+        ds: xr.Dataset,
+        variable: str,
+        rolling_window: int = 3,
+        time_period: str = "month",
+    ) -> None:
+        self.variable = variable
+        self.rolling_window = rolling_window
+        self.time_period = time_period
+
+        da = ds[variable].transpose("time", "lat", "lon")
+        summed = sum_to_scale(da.values.astype(np.float64), rolling_window)
+        complete = slice(rolling_window - 1, None)
+
+        self.ds_window = xr.Dataset(
+            {variable: (["time", "lat", "lon"], summed[complete])},
+            coords={"time": da.time[complete], "lat": da.lat, "lon": da.lon},
+        )
+        self.values = self.ds_window[variable].values
+
+        periods = self.ds_window[f"time.{time_period}"].values
+        # the index of each timestep's period, and the timesteps in each period
+        self.periods, self._period_idx = np.unique(periods, return_inverse=True)
+        self.groups = [
+            np.where(self._period_idx == i)[0] for i in range(len(self.periods))
+        ]
+        # the position of each timestep within its period (e.g. its year)
+        order = np.argsort(self._period_idx, kind="stable")
+        period_start = np.cumsum([0] + [len(group) for group in self.groups])
+        self._position = np.empty(len(periods), dtype=np.int64)
+        self._position[order] = (
+            np.arange(len(periods)) - period_start[self._period_idx[order]]
+        )
+
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def matches(self, variable: str, rolling_window: int, time_period: str) -> bool:
+        return (variable, rolling_window, time_period) == (
+            self.variable,
+            self.rolling_window,
+            self.time_period,
+        )
+
+    def align(self, stat: np.ndarray, name: str) -> xr.DataArray:
+        """Align a (period, lat, lon) statistic with the (time, lat, lon) rolling sum
+        """
+        return xr.DataArray(
+            stat[self._period_idx],
+            dims=["time", "lat", "lon"],
+            coords=self.ds_window.coords,
+            name=name,
+        )
+
+    def _reduce(self, name: str, func) -> np.ndarray:
+        if name not in self._cache:
+            with warnings.catch_warnings():
+                # all NaN pixels (e.g. the sea) have NaN statistics
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                self._cache[name] = np.stack(
+                    [func(self.values[group], axis=0) for group in self.groups]
+                )
+        return self._cache[name]
+
+    def mean(self) -> xr.DataArray:
+        return self.align(self._reduce("mean", np.nanmean), "mean")
+
+    def std(self) -> xr.DataArray:
+        """The (population) standard deviation, as calculated by xarray
+        """
+        return self.align(self._reduce("std", np.nanstd), "std")
+
+    def min(self) -> xr.DataArray:
+        return self.align(self._reduce("min", np.nanmin), "min")
+
+    def max(self) -> xr.DataArray:
+        return self.align(self._reduce("max", np.nanmax), "max")
+
+    def median(self) -> xr.DataArray:
+        return self.quantile(0.5).rename("median")
+
+    def quantile(self, q: float) -> xr.DataArray:
+        """The `q`th quantile (linearly interpolated between the values,
+        as by `np.nanquantile`)
+        """
+        name = f"quantile_{q}"
+        if name not in self._cache:
+            quantile = grouped_nanquantile(self.values, self._period_idx, q)
+            self._cache[name] = quantile[0]
+        return self.align(self._cache[name], name)
+
+    def period_size(self) -> xr.DataArray:
+        """The number of timesteps in each period (including missing values)
+        """
+        sizes = np.array([len(group) for group in self.groups], dtype=np.float64)
+        sizes = np.broadcast_to(
+            sizes[:, None, None], (len(self.periods),) + self.values.shape[1:]
+        )
+        return self.align(sizes, "period_size")
+
+    def rank(self) -> xr.DataArray:
+        """The rank of each value within its period (starting at 1, with ties given
+        their average rank), as by `xr.DataArray.rank`. Missing values are NaN.
+
+        The values are arranged in a (position in period, period, lat, lon) array,
+        padded with NaNs, so that every period is ranked with one argsort
+        """
+        if "rank" not in self._cache:
+            by_period = np.full(
+                (self._position.max() + 1, len(self.periods)) + self.values.shape[1:],
+                np.nan,
+            )
+            by_period[self._position, self._period_idx] = self.values
+            # NaNs (including the padding) are ranked last, and then set to NaN
+            ranks = _average_rank(by_period)
+            self._cache["rank"] = ranks[self._position, self._period_idx]
+        return xr.DataArray(
+            self._cache["rank"],
+            dims=["time", "lat", "lon"],
+            coords=self.ds_window.coords,
+            name="rank",
+        )
+
+    def normalised_rank(self) -> xr.DataArray:
+        """The rank of each value within its period, scaled to [0, 100]"""
+        return ((self.rank() - 1) / (self.period_size() - 1) * 100).rename(
+            "normalised_rank"
+        )
+
+
+def _average_rank(values: np.ndarray) -> np.ndarray:
+    """Rank the values along the first axis, giving tied values their average rank
+    """
+    order = np.argsort(values, axis=0, kind="stable")  # NaNs last
+    sorted_values = np.take_along_axis(values, order, axis=0)
+
+    # the first and last position of each value's group of ties
+    positions = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+    positions = np.broadcast_to(positions, values.shape)
+    new_value = np.ones(values.shape, dtype=bool)
+    new_value[1:] = sorted_values[1:] != sorted_values[:-1]
+    first = np.maximum.accumulate(np.where(new_value, positions, 0), axis=0)
+
+    last_value = np.ones(values.shape, dtype=bool)
+    last_value[:-1] = new_value[1:]
+    last = np.flip(
+        np.minimum.accumulate(
+            np.flip(np.where(last_value, positions, len(values)), axis=0), axis=0
+        ),
+        axis=0,
+    )
+
+    sorted_ranks = (first + last) / 2 + 1
+    sorted_ranks[np.isnan(sorted_values)] = np.nan
+
+    ranks = np.empty(values.shape)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=0)
+    return ranks
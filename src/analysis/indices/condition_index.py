@@ -1,6 +1,6 @@
 import xarray as xr
 
-from .base import BaseIndices
+from .base import BaseIndices, fit_in_blocks
 from .utils import rolling_mean
 
 
@@ -46,6 +46,7 @@ class ConditionIndex(BaseIndices):
 
         return condition_index
 
+    @fit_in_blocks
     def fit(self, variable: str, rolling_window: int = 1) -> None:
 
         var_name = f"{variable}_{self.name}_{rolling_window}"
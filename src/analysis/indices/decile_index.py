@@ -1,8 +1,10 @@
 import xarray as xr
 import numpy as np
 
-from .base import BaseIndices
-from .utils import rolling_cumsum, apply_over_period
+from typing import Optional
+
+from .base import BaseIndices, fit_in_blocks
+from .climatology import Climatology
 
 
 class DecileIndex(BaseIndices):
@@ -45,64 +47,62 @@ class DecileIndex(BaseIndices):
     name = "decile_index"
 
     @staticmethod
-    def bin_to_quintiles(
-        da: xr.DataArray, new_variable_name: str = "quintile"
-    ) -> xr.Dataset:
-        """use the numpy `np.digitize` function to bin the
-        variables to quintile labels
-        https://stackoverflow.com/a/56514582/9940782
-
-        Arguments:
-        ---------
-        da : xr.DataArray
-            variable that you want to bin into quintiles
-
-        new_variable_name: str
-            the `variable_name` in the output `xr.Dataset`
-             which corresponds to the quintile labels
+    def bin_to_classes(
+        rank_norm: xr.DataArray, num_classes: int, new_variable_name: str
+    ) -> xr.DataArray:
+        """bin the normalised ranks (from 0 to 100) into `num_classes` equally
+        sized classes, labelled from 1 to `num_classes`. Missing values are
+        labelled 0, so that the classes can be stored as int8
+
+        e.g. for num_classes = 5 the labels = [1, 2, 3, 4, 5] correspond to
+             [(0, 20) (20,40) (40,60) (60,80) (80,100)]
+        """
+        bins = np.linspace(0, 100, num_classes + 1)[:-1]
+        values = rank_norm.values
+        classes = np.where(np.isnan(values), 0, np.digitize(values, bins))
+        return xr.DataArray(
+            classes.astype(np.int8),
+            dims=rank_norm.dims,
+            coords=rank_norm.coords,
+            name=new_variable_name,
+        )
 
-        Returns:
-        ------
-        xr.Dataset
+    @staticmethod
+    def bin_to_quintiles(
+        rank_norm: xr.DataArray, new_variable_name: str = "quintile"
+    ) -> xr.DataArray:
+        """bin the normalised ranks to quintile labels, which correspond to the
+        Decile Index categories (deciles 1-2 are much below normal,
+        3-4 below normal, 5-6 near normal, 7-8 above normal and 9-10 much
+        above normal)
 
         Note:
             labels = [1, 2, 3, 4, 5] correspond to
              [(0, 20) (20,40) (40,60) (60,80) (80,100)]
         """
-        # calculate the quintiles using `np.digitize`
-        bins = [0.0, 20.0, 40.0, 60.0, 80.0]
-        result = xr.apply_ufunc(np.digitize, da, bins)
-        result = result.rename(new_variable_name)
-        return result
-
-    @staticmethod
-    def rank_norm(ds, dim="time"):
-        return (ds.rank(dim=dim) - 1) / (ds.sizes[dim] - 1) * 100
+        return DecileIndex.bin_to_classes(rank_norm, 5, new_variable_name)
 
+    @fit_in_blocks
     def fit(
-        self, variable: str, time_period: str = "month", rolling_window: int = 3
+        self,
+        variable: str,
+        time_period: str = "month",
+        rolling_window: int = 3,
+        climatology: Optional[Climatology] = None,
     ) -> None:
         print("Fitting Decile Index")
         # 1. calculate a cumsum over `rolling_window` timesteps
-        ds_window = rolling_cumsum(self.ds, rolling_window)
+        clim = self.get_climatology(variable, rolling_window, time_period, climatology)
+        ds_window = clim.ds_window
 
         # 2. calculate the normalised rank (of each month) for the variable
-        out_variable = "rank_norm"
-        normalised_rank = apply_over_period(
-            ds_window,
-            self.rank_norm,
-            variable,
-            out_variable=out_variable,
-            time_str=time_period,
-        )
-        ds_window = ds_window.merge(normalised_rank.drop("month"))
+        rank_norm = clim.normalised_rank()
 
-        # bin the normalised_rank into quintiles
-        new_variable_name = "DecileIndex"
-        quintile = self.bin_to_quintiles(ds_window[variable], new_variable_name)
-        ds_window = ds_window.merge(quintile.to_dataset(name="quintile")).rename(
-            {variable: f"{variable}_cumsum"}
-        )
+        # 3. bin the normalised_rank into deciles and quintiles
+        decile = self.bin_to_classes(rank_norm, 10, "decile")
+        quintile = self.bin_to_quintiles(rank_norm, "quintile")
 
-        self.index = ds_window
+        self.index = ds_window.assign(
+            rank_norm=rank_norm, decile=decile, quintile=quintile
+        ).rename({variable: f"{variable}_cumsum"})
         print("Fitted DI and stored at `obj.index`")
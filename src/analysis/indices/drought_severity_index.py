@@ -1,7 +1,7 @@
-import xarray as xr
+from typing import Optional
 
-from .base import BaseIndices
-from .utils import rolling_cumsum, apply_over_period
+from .base import BaseIndices, fit_in_blocks
+from .climatology import Climatology
 
 
 class DroughtSeverityIndex(BaseIndices):
@@ -35,30 +35,22 @@ class DroughtSeverityIndex(BaseIndices):
 
     name = "drought_severity_index"
 
-    @staticmethod
-    def DSI(da: xr.DataArray, dim: str = "time") -> xr.DataArray:
-        y = (da.rank(dim=dim) - 1.0) / (da.sizes[dim] - 1.0)
-        z = 8.0 * (y - 0.5)
-        return z
-
+    @fit_in_blocks
     def fit(
-        self, variable: str, time_period: str = "month", rolling_window: int = 3
+        self,
+        variable: str,
+        time_period: str = "month",
+        rolling_window: int = 3,
+        climatology: Optional[Climatology] = None,
     ) -> None:
 
         print("Fitting Hutchinson Drought Severity Index")
-        ds_window = rolling_cumsum(self.ds, rolling_window)
+        clim = self.get_climatology(variable, rolling_window, time_period, climatology)
+        ds_window = clim.ds_window
 
-        out_variable = "DSI"
-        dsi = apply_over_period(
-            ds_window,
-            func=self.DSI,
-            in_variable=variable,
-            out_variable=out_variable,
-            time_str=time_period,
-        )
-        ds_window = ds_window.merge(dsi.drop("month")).rename(
-            {variable: f"{variable}_cumsum"}
-        )
+        # the rank of each value within its period, scaled to [-4, 4]
+        y = (clim.rank() - 1.0) / (clim.period_size() - 1.0)
+        dsi = 8.0 * (y - 0.5)
 
-        self.index = ds_window
+        self.index = ds_window.assign(DSI=dsi).rename({variable: f"{variable}_cumsum"})
         print("Fitted Drought Severity Index and stored at `obj.index`")
@@ -1,7 +1,7 @@
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
-from .base import BaseIndices
+from .base import BaseIndices, fit_in_blocks
 from .utils import rolling_mean
 
 
@@ -11,12 +11,14 @@ class MovingAverage(BaseIndices):
         file_path: Path,
         rolling_window: int = 3,
         resample_str: Optional[str] = "month",
+        chunks: Optional[Dict[str, int]] = None,
     ) -> None:
 
         self.name = f"{rolling_window}{resample_str}_moving_average"
         self.rolling_window = rolling_window
-        super().__init__(file_path=file_path, resample_str=resample_str)
+        super().__init__(file_path=file_path, resample_str=resample_str, chunks=chunks)
 
+    @fit_in_blocks
     def fit(self, variable: str, time_str: str = "month") -> None:
         vars = [v for v in self.ds.data_vars]
         assert (
@@ -1,8 +1,8 @@
 import xarray as xr
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from .base import BaseIndices
-from .utils import rolling_cumsum, create_shape_aligned_climatology
+from .base import BaseIndices, fit_in_blocks
+from .climatology import Climatology
 
 
 class PercentNormalIndex(BaseIndices):
@@ -63,7 +63,8 @@ class PercentNormalIndex(BaseIndices):
         time_period: str,
         rolling_window: int = 3,
         clim_period: Optional[List[str]] = None,
-    ) -> xr.DataArray:
+        climatology: Optional[Climatology] = None,
+    ) -> Tuple[xr.Dataset, xr.Dataset]:
         """calculate Percent of Normal Index (PNI)
 
             Arguments:
@@ -81,33 +82,37 @@ class PercentNormalIndex(BaseIndices):
             rolling_window: int Default = 3
                 the size of the cumsum window (in timesteps)
 
+            climatology: Optional[Climatology] Default = None
+                the climatology of `ds[variable]`, if it has already been calculated
+
         """
-        # calculate the rolling window (cumsum over time)
-        ds_window = rolling_cumsum(ds, rolling_window)
+        # calculate the rolling window (cumsum over time), dropping the initial
+        # nans caused by the windowed cumsum (e.g. window=3 the first 2 months)
+        if climatology is None:
+            climatology = Climatology(ds, variable, rolling_window, time_period)
+        ds_window = climatology.ds_window
 
         # calculate climatology based on time_period
-        mthly_climatology = ds_window.groupby(f"time.{time_period}").mean(dim="time")
-        clim = create_shape_aligned_climatology(
-            ds_window, mthly_climatology, variable, time_period
-        )
+        clim = climatology.mean().to_dataset(name=variable)
 
         # calculate the PNI
         PNI = (ds_window / clim) * 100
-        # drop the initial nans caused by the widnowed cumsum
-        #  (e.g. window=3 the first 2 months)
         PNI = (
-            PNI.dropna(dim="time", how="all")
-            .rename({variable: "PNI"})
+            PNI.rename({variable: "PNI"})
             .merge(ds_window)
             .rename({variable: f"{variable}_cumsum"})
         )
 
         return PNI, clim
 
+    @fit_in_blocks
     def fit(
-        self, variable: str, rolling_window: int = 3, time_str: str = "month"
+        self,
+        variable: str,
+        rolling_window: int = 3,
+        time_str: str = "month",
+        climatology: Optional[Climatology] = None,
     ) -> None:
-
         coords = [c for c in self.ds.coords]
         vars = [v for v in self.ds.variables if v not in coords]
         assert (
@@ -122,6 +127,9 @@ class PercentNormalIndex(BaseIndices):
             time_period=time_str,
             rolling_window=rolling_window,
             clim_period=None,
+            climatology=self.get_climatology(
+                variable, rolling_window, time_str, climatology
+            ),
         )
 
         self.index = PNI
@@ -1,13 +1,203 @@
+import numpy as np
 import xarray as xr
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from scipy import special
 
-from typing import Optional, Tuple
-from enum import Enum
+from typing import Dict, Optional, Tuple
 
-from .base import BaseIndices
+from .base import BaseIndices, fit_in_blocks
+from .utils import sum_to_scale
 
-climate_indices = None
-indices = None
+# the SPI values are clipped to this range (as in the climate_indices package),
+# beyond which the fitted distributions are unreliable
+_SPI_BOUNDS = (-3.09, 3.09)
+
+
+def probability_of_zero(values: np.ndarray) -> np.ndarray:
+    """The fraction of the (non NaN) values along the first axis which are 0"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (values == 0).sum(axis=0) / (~np.isnan(values)).sum(axis=0)
+
+
+def gamma_parameters(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Fit a gamma distribution to the non-zero values along the first axis,
+    using Thom's (1958) maximum likelihood approximation
+
+    :returns: The shape (alpha) and scale (beta) parameters
+    """
+    values = np.where(values > 0, values, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.nanmean(values, axis=0)
+        a = np.log(means) - np.nanmean(np.log(values), axis=0)
+        alphas = (1 + np.sqrt(1 + 4 * a / 3)) / (4 * a)
+        betas = means / alphas
+    return alphas, betas
+
+
+def pearson_parameters(
+    values: np.ndarray, min_values: int = 4
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fit a Pearson Type III distribution to the non-zero values along the first
+    axis, using L-moments (Hosking, 1990)
+
+    :param min_values: The minimum number of non-zero values needed for the fit.
+        The parameters of slices with fewer values are NaN
+    :returns: The location, scale and skew parameters
+    """
+    values = np.sort(np.where(values > 0, values, np.nan), axis=0)  # NaNs last
+    n = (~np.isnan(values)).sum(axis=0).astype(np.float64)
+    n = np.where(n >= min_values, n, np.nan)
+
+    # the probability weighted moments of each (sorted) sample
+    rank = np.arange(values.shape[0]).reshape((-1,) + (1,) * (values.ndim - 1))
+    values = np.where(np.isnan(values), 0, values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        b0 = values.sum(axis=0) / n
+        b1 = (rank * values).sum(axis=0) / (n * (n - 1))
+        b2 = (rank * (rank - 1) * values).sum(axis=0) / (n * (n - 1) * (n - 2))
+
+        l1 = b0
+        l2 = 2 * b1 - b0
+        t3 = (6 * b2 - 6 * b1 + b0) / l2
+
+        # rational approximations of alpha from t3
+        abs_t3 = np.abs(t3)
+        z_small = 3 * np.pi * t3**2
+        alpha_small = (1 + 0.2906 * z_small) / (
+            z_small + 0.1882 * z_small**2 + 0.0442 * z_small**3
+        )
+        z_large = 1 - abs_t3
+        alpha_large = (
+            0.36067 * z_large - 0.59567 * z_large**2 + 0.25361 * z_large**3
+        ) / (1 - 2.78861 * z_large + 2.56096 * z_large**2 - 0.77045 * z_large**3)
+        alpha = np.where(abs_t3 < 1 / 3, alpha_small, alpha_large)
+
+        skew = 2 / np.sqrt(alpha) * np.sign(t3)
+        scale = (
+            l2
+            * np.sqrt(np.pi)
+            * np.sqrt(alpha)
+            * np.exp(special.gammaln(alpha) - special.gammaln(alpha + 0.5))
+        )
+
+    # a symmetrical distribution is a normal distribution
+    is_normal = abs_t3 <= 1e-6
+    skew = np.where(is_normal, 0, skew)
+    scale = np.where(is_normal, l2 * np.sqrt(np.pi), scale)
+    return l1, scale, skew
+
+
+def gamma_cdf(values: np.ndarray, alphas: np.ndarray, betas: np.ndarray) -> np.ndarray:
+    return special.gammainc(alphas, np.clip(values, 0, None) / betas)
+
+
+def pearson_cdf(
+    values: np.ndarray, loc: np.ndarray, scale: np.ndarray, skew: np.ndarray
+) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        alpha = 4 / skew**2
+        beta = 0.5 * scale * np.abs(skew)
+        xi = loc - 2 * scale / skew
+
+        positive = special.gammainc(alpha, np.clip((values - xi) / beta, 0, None))
+        negative = special.gammaincc(alpha, np.clip((xi - values) / beta, 0, None))
+        normal = special.ndtr((values - loc) / scale)
+    cdf = np.where(skew > 0, positive, negative)
+    return np.where(skew == 0, normal, cdf)
+
+
+def _spi_chunk(
+    values: np.ndarray,
+    periods: np.ndarray,
+    is_calibration: np.ndarray,
+    distribution: str,
+) -> np.ndarray:
+    """Calculate the SPI of a (time, pixel) chunk of (scaled) precipitation"""
+    spi = np.full(values.shape, np.nan)
+    for period in np.unique(periods):
+        in_period = periods == period
+        calibration_values = values[in_period & is_calibration]
+        period_values = values[in_period]
+
+        prob_zero = probability_of_zero(calibration_values)
+        if distribution == "gamma":
+            cdf = gamma_cdf(period_values, *gamma_parameters(calibration_values))
+        else:
+            cdf = pearson_cdf(period_values, *pearson_parameters(calibration_values))
+
+        probabilities = prob_zero + (1 - prob_zero) * np.where(
+            period_values > 0, cdf, 0
+        )
+        with np.errstate(invalid="ignore"):
+            spi[in_period] = np.clip(special.ndtri(probabilities), *_SPI_BOUNDS)
+    # missing values stay missing
+    spi[np.isnan(values)] = np.nan
+    return spi
+
+
+def compute_spi(
+    values: np.ndarray,
+    periods: np.ndarray,
+    years: np.ndarray,
+    scale: int = 3,
+    distribution: str = "gamma",
+    calibration_year_initial: Optional[int] = None,
+    calibration_year_final: Optional[int] = None,
+    pixel_chunk_size: int = 10000,
+    n_workers: int = 1,
+) -> np.ndarray:
+    """Calculate the SPI of a (time, pixel) array of precipitation, for every pixel
+    at once.
+
+    The precipitation is summed over `scale` timesteps, and a distribution is fitted
+    to the sums in each period (e.g. calendar month) of the calibration years, for
+    each pixel. The probability of zero precipitation is accounted for separately.
+    The cumulative probabilities of the sums are then converted to the standard
+    normal distribution.
+
+    :param values: A (time, pixel) array of precipitation
+    :param periods: The period (e.g. calendar month) of each timestep
+    :param years: The year of each timestep
+    :param scale: The number of timesteps to sum the precipitation over
+    :param distribution: One of `{'gamma', 'pearson'}`
+    :param calibration_year_initial: The first year used to fit the distributions.
+        Defaults to the first year of data
+    :param calibration_year_final: The last year used to fit the distributions.
+        Defaults to the last year of data
+    :param pixel_chunk_size: The number of pixels calculated at a time
+    :param n_workers: The number of threads over which the pixel chunks are split
+    """
+    assert distribution in {
+        "gamma",
+        "pearson",
+    }, f"{distribution} is not a valid distribution fit for SPI"
+    assert values.ndim == 2, f"Expected a (time, pixel) array, got {values.shape}"
+    assert len(periods) == len(years) == values.shape[0]
+
+    if calibration_year_initial is None:
+        calibration_year_initial = int(years.min())
+    if calibration_year_final is None:
+        calibration_year_final = int(years.max())
+    is_calibration = (years >= calibration_year_initial) & (
+        years <= calibration_year_final
+    )
+
+    # negative precipitation values are errors
+    scaled = sum_to_scale(np.clip(values.astype(np.float64), 0, None), scale)
+
+    chunks = [
+        scaled[:, start : start + pixel_chunk_size]
+        for start in range(0, scaled.shape[1], pixel_chunk_size)
+    ]
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        spi_chunks = list(
+            executor.map(
+                lambda chunk: _spi_chunk(chunk, periods, is_calibration, distribution),
+                chunks,
+            )
+        )
+    return np.concatenate(spi_chunks, axis=1)
 
 
 class SPI(BaseIndices):
@@ -59,33 +249,24 @@ class SPI(BaseIndices):
     resample_str = "month"
 
     def __init__(
-        self, file_path: Optional[Path] = None, ds: Optional[xr.Dataset] = None
+        self,
+        file_path: Optional[Path] = None,
+        ds: Optional[xr.Dataset] = None,
+        chunks: Optional[Dict[str, int]] = None,
     ) -> None:
-        super().__init__(file_path, ds=ds, resample_str=self.resample_str)
-
-        global indices
-        global climate_indices
-
-        if climate_indices is None:
-            import climate_indices
-        if indices is None:
-            from climate_indices import indices
+        super().__init__(
+            file_path, ds=ds, resample_str=self.resample_str, chunks=chunks
+        )
 
-    @staticmethod
-    def stack_pixels(da: xr.DataArray) -> xr.DataArray:
-        return da.stack(point=("lat", "lon")).groupby("point")
-
-    def init_distribution(self, distribution: str) -> Enum:
-        if distribution == "gamma":
-            dist = climate_indices.indices.Distribution.gamma  # type: ignore
-        elif distribution == "pearson":
-            dist = climate_indices.indices.Distribution.pearson  # type: ignore
-        else:
-            assert False, f"{distribution} is not a valid distribution fit for SPI"
+    def init_distribution(self, distribution: str) -> str:
+        assert distribution in {
+            "gamma",
+            "pearson",
+        }, f"{distribution} is not a valid distribution fit for SPI"
 
         self.distribution = distribution
 
-        return dist
+        return distribution
 
     def init_start_year(self, data_start_year: Optional[int] = None) -> int:
         if data_start_year is None:
@@ -129,20 +310,18 @@ class SPI(BaseIndices):
 
         return initial_yr, final_yr
 
-    def init_periodicity(self, periodicity: Optional[str]) -> Enum:
+    def init_periodicity(self, periodicity: Optional[str]) -> str:
         if periodicity is None:
-            periodicity = "gamma"
+            periodicity = "monthly"
 
-        if periodicity == "monthly":
-            period = climate_indices.compute.Periodicity.monthly  # type: ignore
-        elif periodicity == "daily":
-            period = climate_indices.compute.Periodicity.daily  # type: ignore
-        else:
-            assert False, f"{periodicity} is not a valid periodicity for SPI"
+        assert periodicity in {
+            "monthly",
+            "daily",
+        }, f"{periodicity} is not a valid periodicity for SPI"
 
         self.periodicity = periodicity
 
-        return period
+        return periodicity
 
     def initialise_params(
         self,
@@ -152,28 +331,26 @@ class SPI(BaseIndices):
         calibration_year_initial: Optional[int],
         calibration_year_final: Optional[int],
         periodicity: Optional[str],
-    ) -> Tuple[int, Enum, int, int, int, int, Enum]:
+    ) -> Tuple[int, str, int, int, int, str]:
         self.scale = scale
-        # distribution must be a climate_indices enum type
         dist = self.init_distribution(distribution)
         self.data_start_year = self.init_start_year(data_start_year)
         (
             self.calibration_year_initial,
             self.calibration_year_final,
         ) = self.init_calib_year(calibration_year_initial, calibration_year_final)
-        # period must be a climate_indices enum type
         period = self.init_periodicity(periodicity)
 
-        return (  # type: ignore
+        return (
             self.scale,
             dist,
             self.data_start_year,
             self.calibration_year_initial,
             self.calibration_year_final,
-            self.init_calib_year,
             period,
         )
 
+    @fit_in_blocks
     def fit(
         self,
         variable: str,
@@ -183,6 +360,7 @@ class SPI(BaseIndices):
         calibration_year_initial: Optional[int] = None,
         calibration_year_final: Optional[int] = None,
         periodicity: Optional[str] = "monthly",
+        n_workers: int = 1,
     ) -> None:
         """fit the index to self.ds writing to new self.index `xr.Dataset`
 
@@ -202,8 +380,8 @@ class SPI(BaseIndices):
 
         data_start_year: Optional[int] = None
             the starting year of the data series. Defaults to using the MINIMUM in the
-            time series.
-            **(we recommend leaving this parameter alone).
+            time series. The periods (calendar months or days) are read from the
+            time coordinate, so this is only used for logging.
 
         calibration_year_initial: Optional[int] = None
             the first year of the calibration period (). Defaults to using the MINIMUM
@@ -218,16 +396,15 @@ class SPI(BaseIndices):
             the periodicity of your data.
             {'monthly', 'daily'}
 
+        n_workers: int = 1
+            the number of threads over which the pixels are split
+
         """
         coords = [c for c in self.ds.coords]
         vars = [v for v in self.ds.variables if v not in coords]
         assert variable in vars, f"Must choose a variable from: {vars}"
 
-        # stack the lat-lon pairs into pixels
-        da = self.stack_pixels(self.ds[variable])
-
-        # initialise the parameters (including enums from climate_indices)
-        _, dist, _, _, _, _, period = self.initialise_params(
+        self.initialise_params(
             scale,
             distribution,
             data_start_year,
@@ -247,36 +424,23 @@ class SPI(BaseIndices):
             "---------------\n",
         )
 
-        try:
-            index = xr.apply_ufunc(  # type: ignore
-                indices.spi,  # type: ignore
-                da,
-                self.scale,
-                dist,
-                self.data_start_year,
-                self.calibration_year_initial,
-                self.calibration_year_final,
-                period,
-            )
-        except ValueError as E:
-            print("** ValueError: ")
-            print(E)
-            print("\the current fix is rather nasty edit of xarray")
-            print(
-                "the indices.spi computation sometimes collapses the dimensionality"
-                " of the groupby object. "
-                "Therefore added some code to L578 "
-                "~/miniconda3/envs/crop/lib/python3.7/site-packages/xarray/core/computation.py)"
-                "\n> # TODO: TOMMY ADDED\n"
-                "\nif (data.ndim == 1) and (len(dims) == 2):"
-                "\n\tdata = np.expand_dims(data, -1)"
-                "\n"
-            )
-            print(
-                "I am pretty sure that this is probably something"
-                " that we need to fix from the indices code"
-            )
+        # all the pixels are fitted at once, as a (time, pixel) array
+        da = self.ds[variable].transpose("time", "lat", "lon")
+        time_str = "month" if self.periodicity == "monthly" else "dayofyear"
+        spi = compute_spi(
+            da.values.reshape(da.shape[0], -1),
+            periods=self.ds[f"time.{time_str}"].values,
+            years=self.ds["time.year"].values,
+            scale=self.scale,
+            distribution=self.distribution,
+            calibration_year_initial=self.calibration_year_initial,
+            calibration_year_final=self.calibration_year_final,
+            n_workers=n_workers,
+        )
 
-        self.index = index.unstack("point").to_dataset(name=f"SPI{scale}")
+        self.index = xr.Dataset(
+            {f"SPI{scale}": (["time", "lat", "lon"], spi.reshape(da.shape))},
+            coords={"time": da.time, "lat": da.lat, "lon": da.lon},
+        )
 
         print("Fitted SPI and stored at `obj.index`")
@@ -3,6 +3,8 @@ from typing import Any
 import numpy as np
 from pathlib import Path
 
+from ...utils import create_shape_aligned_climatology  # noqa: F401
+
 
 def rolling_cumsum(ds: xr.Dataset, rolling_window: int = 3) -> xr.Dataset:
 
@@ -15,6 +17,28 @@ def rolling_cumsum(ds: xr.Dataset, rolling_window: int = 3) -> xr.Dataset:
     return ds_window
 
 
+def sum_to_scale(values: np.ndarray, scale: int) -> np.ndarray:
+    """The rolling sum of the previous `scale` timesteps (along the first axis).
+    The first `scale - 1` timesteps, and any window containing a NaN, are NaN
+    """
+    summed = np.full(values.shape, np.nan)
+    if values.shape[0] < scale:
+        return summed
+
+    is_nan = np.isnan(values)
+    cumsum = np.cumsum(np.where(is_nan, 0, values), axis=0)
+    nan_count = np.cumsum(is_nan, axis=0)
+
+    summed[scale - 1] = cumsum[scale - 1]
+    summed[scale:] = cumsum[scale:] - cumsum[:-scale]
+
+    window_nans = nan_count.copy()
+    window_nans[scale:] = nan_count[scale:] - nan_count[:-scale]
+    summed[window_nans > 0] = np.nan
+    summed[: scale - 1] = np.nan
+    return summed
+
+
 def rolling_mean(ds: xr.Dataset, rolling_window: int = 3) -> xr.Dataset:
     ds_window = (
         ds.rolling(time=rolling_window, center=False)
@@ -41,51 +65,6 @@ def apply_over_period(
     )
 
 
-def create_shape_aligned_climatology(
-    ds: xr.Dataset, clim: xr.Dataset, variable: str, time_period: str = "month"
-) -> xr.Dataset:
-    """match the time dimension of `clim` to the shape of `ds` so that can
-    perform simple calculations / arithmetic on the values of clim
-
-    Arguments:
-    ---------
-    ds : xr.Dataset
-        the dataset with the raw values that you are comparing to climatology
-    clim: xr.Dataset
-        the climatology values for a given `time_period`
-    variable: str
-        name of the variable that you are comparing to the climatology
-    time_period: str
-        the period string used to calculate the climatology
-         time_period = {'dayofyear', 'season', 'month'}
-    Notes:
-        1. assumes that `lat` and `lon` are the
-        coord names in ds
-    """
-    ds[time_period] = ds[f"time.{time_period}"]
-    values = clim[variable].values
-    keys = clim[time_period].values
-    # map the `time_period` to the `values` of the climatology (threshold or mean)
-    lookup_dict = dict(zip(keys, values))
-    # extract an array of the `time_period` values from the `ds`
-    timevals = ds[time_period].values
-    # use the lat lon arrays (climatology values) in `lookup_dict` corresponding
-    #  to time_period values defined in `timevals` and stack into new array
-    new_clim_vals = np.stack([lookup_dict[timevals[i]] for i in range(len(timevals))])
-    assert (
-        new_clim_vals.shape == ds[variable].shape
-    ), f"\
-        Shapes for new_clim_vals and ds must match! \
-         new_clim_vals.shape: {new_clim_vals.shape} \
-         ds.shape: {ds[variable].shape}"
-    # copy that forward in time
-    new_clim = xr.Dataset(
-        {variable: (["time", "lat", "lon"], new_clim_vals)},
-        coords={"lat": clim.lat, "lon": clim.lon, "time": ds.time},
-    )
-    return new_clim
-
-
 def fit_all_indices(data_path: Path, variable: str = "precip") -> xr.Dataset:
     """ fit all indices and return one `xr.Dataset`
 
@@ -110,6 +89,7 @@ def fit_all_indices(data_path: Path, variable: str = "precip") -> xr.Dataset:
         AnomalyIndex,
         SPI,
     )
+    from .climatology import Climatology
 
     indices = (
         ZScoreIndex,
@@ -121,19 +101,29 @@ def fit_all_indices(data_path: Path, variable: str = "precip") -> xr.Dataset:
         SPI,
     )
 
+    # the climatology is calculated once, and shared by all the indices
+    # (except the SPI, which fits its own distribution)
+    ds = xr.open_dataset(data_path)
+    climatology = Climatology(ds, variable, rolling_window=3, time_period="month")
+
     # fit each index
     out = {}
     for index in indices:
-        i = index(data_path)
-        if i.name == "china_z_index":
+        i = index(ds=ds)
+        if i.name == "spi":
             i.fit(variable=variable)
             out[index.name] = i  # type: ignore
+        elif i.name == "china_z_index":
+            i.fit(variable=variable, climatology=climatology)  # type: ignore
+            out[index.name] = i  # type: ignore
             # fit modifiedCZI
-            i = index(data_path)
-            i.fit(variable=variable, modified=True)
+            i = index(ds=ds)
+            i.fit(  # type: ignore
+                variable=variable, modified=True, climatology=climatology
+            )
             out[index.name + "_modified"] = i  # type: ignore
         else:
-            i.fit(variable=variable)
+            i.fit(variable=variable, climatology=climatology)  # type: ignore
             out[index.name] = i  # type: ignore
     print([k for k in out.keys()])
 
@@ -141,6 +131,8 @@ def fit_all_indices(data_path: Path, variable: str = "precip") -> xr.Dataset:
     print("Joining all variables into one `xr.dataset`")
     ds_objs = [index.index for index in out.values()]
     ds = xr.merge(ds_objs)
-    ds = ds.drop(["month", "precip_cumsum"]).isel(time=slice(2, -1))
+    ds = ds.drop(
+        [v for v in ["month", f"{variable}_cumsum"] if v in ds.variables]
+    ).isel(time=slice(2, -1))
 
     return ds
@@ -1,9 +1,9 @@
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 import xarray as xr
 import numpy as np
 
-from .base import BaseIndices
+from .base import BaseIndices, fit_in_blocks
 from .utils import rolling_mean
 
 
@@ -41,6 +41,7 @@ class VegetationDeficitIndex(BaseIndices):
         file_path: Path,
         rolling_window: int = 3,
         resample_str: Optional[str] = "month",
+        chunks: Optional[Dict[str, int]] = None,
     ) -> None:
 
         if rolling_window != 3:
@@ -52,7 +53,7 @@ class VegetationDeficitIndex(BaseIndices):
         self.name: str = "vegetation_deficit_index"
         self.ma_name: str = f"{rolling_window}{resample_str}_moving_average"
         self.rolling_window: int = rolling_window
-        super().__init__(file_path=file_path, resample_str=resample_str)
+        super().__init__(file_path=file_path, resample_str=resample_str, chunks=chunks)
 
         if "vci" not in [v.lower() for v in self.ds.data_vars]:
             print(
@@ -91,6 +92,7 @@ class VegetationDeficitIndex(BaseIndices):
         result = result.rename(new_variable_name)
         return result
 
+    @fit_in_blocks
     def fit(self, variable: str, time_str: str = "month") -> None:
 
         out_variable = f"VCI{self.rolling_window}M_index"
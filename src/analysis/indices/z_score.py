@@ -1,7 +1,7 @@
-import xarray as xr
+from typing import Optional
 
-from .base import BaseIndices
-from .utils import rolling_cumsum, apply_over_period
+from .base import BaseIndices, fit_in_blocks
+from .climatology import Climatology
 
 
 class ZScoreIndex(BaseIndices):
@@ -46,13 +46,13 @@ class ZScoreIndex(BaseIndices):
 
     name = "z_score_index"
 
-    @staticmethod
-    def ZSI(da: xr.DataArray, dim: str = "time", **kwargs) -> xr.DataArray:
-        zsi = (da - da.median(dim=dim)) / da.std(dim=dim)
-        return zsi
-
+    @fit_in_blocks
     def fit(
-        self, variable: str, rolling_window: int = 3, time_str: str = "month"
+        self,
+        variable: str,
+        rolling_window: int = 3,
+        time_str: str = "month",
+        climatology: Optional[Climatology] = None,
     ) -> None:
         coords = [c for c in self.ds.coords]
         vars = [v for v in self.ds.variables if v not in coords]
@@ -63,20 +63,11 @@ class ZScoreIndex(BaseIndices):
 
         print(f"Fitting ZSI for variable: {variable}")
         # 1. calculate a cumsum over `rolling_window` timesteps
-        ds_window = rolling_cumsum(self.ds, rolling_window)
+        clim = self.get_climatology(variable, rolling_window, time_str, climatology)
+        ds_window = clim.ds_window
 
         # 2. calculate the ZSI for the variable
-        out_variable = "ZSI"
-        zsi = apply_over_period(
-            ds_window,
-            func=self.ZSI,
-            in_variable=variable,
-            out_variable=out_variable,
-            time_str=time_str,
-        )
-        ds_window = ds_window.merge(zsi.drop("month")).rename(
-            {variable: f"{variable}_cumsum"}
-        )
-
-        self.index = ds_window
+        zsi = (ds_window[variable] - clim.median()) / clim.std()
+
+        self.index = ds_window.assign(ZSI=zsi).rename({variable: f"{variable}_cumsum"})
         print("Fitted ZSI and stored at `obj.index`")
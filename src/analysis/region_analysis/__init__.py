@@ -1,12 +1,14 @@
 from .administrative_region_analysis import AdministrativeRegionAnalysis
 from .landcover_region_analysis import LandcoverRegionAnalysis
 from .region_geo_plotter import RegionGeoPlotter
+from .region_index import RegionIndex
 from .groupby_region import GroupbyRegion, KenyaGroupbyRegion
 
 __all__ = [
     "AdministrativeRegionAnalysis",
     "LandcoverRegionAnalysis",
     "RegionGeoPlotter",
+    "RegionIndex",
     "GroupbyRegion",
     "KenyaGroupbyRegion",
 ]
@@ -5,6 +5,7 @@ from datetime import datetime
 from typing import Tuple, Dict, Optional, List
 
 from .base import RegionAnalysis
+from .region_index import RegionIndex
 
 # from .region_geo_plotter import RegionGeoPlotter
 
@@ -61,6 +62,15 @@ class AdministrativeRegionAnalysis(RegionAnalysis):
 
         return region_da, region_lookup, region_group_name
 
+    def build_region_index(
+        self,
+        region_da: Optional[xr.DataArray] = None,
+        region_lookup: Optional[Dict] = None,
+        landcover_das: Optional[List[xr.DataArray]] = None,
+    ) -> RegionIndex:
+        assert (region_da is not None) and (region_lookup is not None)
+        return RegionIndex.from_region_da(region_da, region_lookup)
+
     def compute_mean_statistics(
         self,
         region_da: xr.DataArray,
@@ -81,13 +91,6 @@ class AdministrativeRegionAnalysis(RegionAnalysis):
         true_mean_value: List
             the mean true value for ROI
         """
-        # For each region calculate mean `target_variable` in true / pred
-        valid_region_ids: List = [k for k in region_lookup.keys()]
-        region_names: List = []
-        predicted_mean_value: List = []
-        true_mean_value: List = []
-        datetimes: List = []
-
         # check the shapes match
         pred_latlon_shape = (pred_da.lat.shape[0], pred_da.lon.shape[0])
         true_latlon_shape = (true_da.lat.shape[0], true_da.lon.shape[0])
@@ -98,16 +101,12 @@ class AdministrativeRegionAnalysis(RegionAnalysis):
             " and the same reference_nc_file to regrid onto same reference_grid"
         )
 
-        for valid_region_id in valid_region_ids:
-            region_names.append(region_lookup[valid_region_id])
-            predicted_mean_value.append(
-                pred_da.where(region_da == valid_region_id).mean().values
-            )
-            true_mean_value.append(
-                true_da.where(region_da == valid_region_id).mean().values
-            )
-            # assert true_da.time == pred_da.time, 'time must be matching!'
-            datetimes.append(datetime)
+        # For each region calculate mean `target_variable` in true / pred
+        region_index = self.build_region_index(region_da, region_lookup)
+        region_names: List = list(region_index.region_names)
+        predicted_mean_value: List = list(region_index.total_mean(pred_da))
+        true_mean_value: List = list(region_index.total_mean(true_da))
+        datetimes: List = [datetime for _ in region_names]
 
         assert len(region_names) == len(predicted_mean_value) == len(datetimes)
         return datetimes, region_names, predicted_mean_value, true_mean_value
@@ -9,6 +9,7 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import itertools
 
 from .region_geo_plotter import RegionGeoPlotter
+from .region_index import RegionIndex
 
 
 class RegionAnalysis:
@@ -316,6 +317,14 @@ class RegionAnalysis:
         )
         return geoplotter
 
+    def build_region_index(
+        self,
+        region_da: Optional[xr.DataArray] = None,
+        region_lookup: Optional[Dict] = None,
+        landcover_das: Optional[List[xr.DataArray]] = None,
+    ) -> RegionIndex:
+        raise NotImplementedError
+
     def _base_analyze_single(
         self,
         admin_level_name: str,
@@ -324,6 +333,13 @@ class RegionAnalysis:
         region_group_name: Optional[str] = None,
         landcover_das: Optional[List[xr.DataArray]] = None,
     ) -> Optional[pd.DataFrame]:
+        """Calculate the mean true and predicted values in every region, for
+        every timestep and model.
+
+        The region membership of every pixel is indexed once (as a `RegionIndex`),
+        the true data are read once for all the models, and the means of all the
+        regions and timesteps come from one sparse matrix multiplication per array.
+        """
         # RUN CHECKS FOR CORRECT INPUTS
         if self.admin_boundaries:
             assert region_da is not None, (
@@ -344,6 +360,23 @@ class RegionAnalysis:
             )
 
         print(f"* Analyzing for {admin_level_name} *")
+        region_index = self.build_region_index(
+            region_da=region_da,
+            region_lookup=region_lookup,
+            landcover_das=landcover_das,
+        )
+
+        # the true data, for all the timesteps, are shared by all the models
+        true_data_paths = [f for f in self.features_dir.glob("*/y.nc")]
+        true_das = [self.load_true_data(path) for path in true_data_paths]
+        if true_das == []:
+            print("No DataFrames Created")
+            return None
+        datetimes = [self.read_xr_datetime(true_da) for true_da in true_das]
+        true_means = region_index.mean(
+            xr.concat([true_da.isel(time=0) for true_da in true_das], dim="time")
+        ).values
+
         all_model_dfs = []
         for model in self.models:
             print(f"\n** Analyzing for {model}-{admin_level_name} **")
@@ -351,13 +384,9 @@ class RegionAnalysis:
             if not (self.out_dir / model).exists():
                 (self.out_dir / model).mkdir(exist_ok=True, parents=True)
 
-            dfs = []
-            true_data_paths = [f for f in self.features_dir.glob("*/y.nc")]
-            # convert this to funciton
-            for true_data_path in true_data_paths:
-                # load the required data
-                true_da = self.load_true_data(true_data_path)
-                dt = self.read_xr_datetime(true_da)
+            time_idxs: List[int] = []
+            pred_das: List[xr.DataArray] = []
+            for time_idx, dt in enumerate(datetimes):
                 preds_data_path = self.get_pred_data_on_timestep(
                     datetime=dt, model=model
                 )
@@ -367,68 +396,46 @@ class RegionAnalysis:
                         f"{preds_data_path.parents[0] / preds_data_path.name} does not exist"
                     )
                     continue
-                pred_da = self.load_prediction_data(preds_data_path)
-
-                # compute the statistics - different for landcover vs. admin regions
-                if self.admin_boundaries:
-                    (
-                        datetimes,
-                        region_name,
-                        predicted_mean_value,
-                        true_mean_value,
-                    ) = self.compute_mean_statistics(  # type: ignore
-                        region_da=region_da,
-                        true_da=true_da,
-                        pred_da=pred_da,
-                        region_lookup=region_lookup,
-                        datetime=dt,
-                    )
-                else:
-                    (
-                        datetimes,
-                        region_name,
-                        predicted_mean_value,
-                        true_mean_value,
-                    ) = self.compute_mean_statistics(  # type: ignore
-                        landcover_das, true_da=true_da, pred_da=pred_da, datetime=dt
-                    )
-
-                # store as pandas object and add to
-                dfs.append(
-                    pd.DataFrame(
-                        {
-                            "admin_level_name": [
-                                admin_level_name for _ in range(len(datetimes))
-                            ],
-                            "model": [model for _ in range(len(datetimes))],
-                            "datetime": datetimes,
-                            "region_name": region_name,
-                            "predicted_mean_value": predicted_mean_value,
-                            "true_mean_value": true_mean_value,
-                        }
-                    )
-                )
+                time_idxs.append(time_idx)
+                pred_das.append(self.load_prediction_data(preds_data_path).isel(time=0))
 
-            if dfs == []:
+            if time_idxs == []:
                 print(f"No matching time data found for {model}")
                 print(f"Contents of {model} dir:")
                 print(f"\t{[f.name for f in (self.models_dir / model).iterdir()]}")
-
-            else:
-                df = pd.concat(dfs).reset_index()
-                df = df.sort_values(by=["datetime"])
-                output_filepath = (
-                    self.out_dir / model / f"{model}_{admin_level_name}.csv"
-                )
-                df.to_csv(output_filepath)
-                print(f"** Written {model} csv to {output_filepath.as_posix()} **")
-                all_model_dfs.append(df)
+                continue
+
+            pred_means = region_index.mean(xr.concat(pred_das, dim="time")).values
+
+            # one row per (timestep, region)
+            num_regions = len(region_index.region_names)
+            df = pd.DataFrame(
+                {
+                    "admin_level_name": admin_level_name,
+                    "model": model,
+                    "datetime": np.repeat(
+                        np.array(datetimes, dtype="datetime64[ns]")[time_idxs],
+                        num_regions,
+                    ),
+                    "region_name": np.tile(region_index.region_names, len(time_idxs)),
+                    "predicted_mean_value": pred_means.T.ravel(),
+                    "true_mean_value": true_means[:, time_idxs].T.ravel(),
+                },
+                # the `index` column of the csv is the region's position in
+                # its timestep
+                index=np.tile(np.arange(num_regions), len(time_idxs)),
+            )
+            df = df.reset_index().sort_values(by=["datetime"], kind="mergesort")
+            output_filepath = self.out_dir / model / f"{model}_{admin_level_name}.csv"
+            df.to_csv(output_filepath)
+            print(f"** Written {model} csv to {output_filepath.as_posix()} **")
+            all_model_dfs.append(df)
 
         if all_model_dfs != []:
             all_model_df = pd.concat(all_model_dfs).reset_index()
-            all_model_df = all_model_df.sort_values(by=["datetime"]).drop(
-                columns=["index", "level_0"]
-            )
+            all_model_df = all_model_df.sort_values(
+                by=["datetime"], kind="mergesort"
+            ).drop(columns=["index", "level_0"])
             return all_model_df
         else:
             print("No DataFrames Created")
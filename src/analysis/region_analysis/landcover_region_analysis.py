@@ -1,10 +1,11 @@
 from pathlib import Path
 import xarray as xr
 from datetime import datetime
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 import string
 
 from .base import RegionAnalysis
+from .region_index import RegionIndex
 
 
 class LandcoverRegionAnalysis(RegionAnalysis):
@@ -44,6 +45,17 @@ class LandcoverRegionAnalysis(RegionAnalysis):
 
         return landcover_das
 
+    def build_region_index(
+        self,
+        region_da: Optional[xr.DataArray] = None,
+        region_lookup: Optional[Dict] = None,
+        landcover_das: Optional[List[xr.DataArray]] = None,
+    ) -> RegionIndex:
+        assert landcover_das is not None
+        return RegionIndex.from_landcover_das(
+            landcover_das, [self.create_lc_name(da.name) for da in landcover_das]
+        )
+
     def compute_mean_statistics(
         self,
         landcover_das: List[xr.DataArray],
@@ -64,19 +76,11 @@ class LandcoverRegionAnalysis(RegionAnalysis):
             the mean true value for ROI
         """
         # For each region calculate mean `target_variable` in true / pred
-        region_names: List = []
-        predicted_mean_value: List = []
-        true_mean_value: List = []
-        datetimes: List = []
-
-        for landcover_da in landcover_das:
-            lc_name = self.create_lc_name(landcover_da.name)
-            region_names.append(lc_name)
-            # because one-hot-encoded only select where value == 1
-            predicted_mean_value.append(pred_da.where(landcover_da == 1).mean().values)
-            true_mean_value.append(true_da.where(landcover_da == 1).mean().values)
-            # assert true_da.time == pred_da.time, 'time must be matching!'
-            datetimes.append(datetime)
+        region_index = self.build_region_index(landcover_das=landcover_das)
+        region_names: List = list(region_index.region_names)
+        predicted_mean_value: List = list(region_index.total_mean(pred_da))
+        true_mean_value: List = list(region_index.total_mean(true_da))
+        datetimes: List = [datetime for _ in region_names]
 
         assert len(region_names) == len(predicted_mean_value) == len(datetimes)
         return datetimes, region_names, predicted_mean_value, true_mean_value
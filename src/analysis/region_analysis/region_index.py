@@ -0,0 +1,125 @@
+import numpy as np
+import xarray as xr
+from scipy import sparse
+
+from typing import Dict, List, Tuple
+
+
+class RegionIndex:
+    """A sparse (region, pixel) membership matrix, built once from the region
+    rasters, so that the mean of every region (for every timestep and model)
+    comes from one sparse matrix multiplication per array, instead of masking
+    the array once per region.
+
+    >>> region_index = RegionIndex.from_region_da(region_da, region_lookup)
+    >>> region_index.mean(pred_da)  # (region, time)
+
+    Attributes:
+    ----------
+    membership: sparse.csr_matrix
+        (region, pixel) with a 1 where the (flattened) pixel is in the region
+    region_names: List[str]
+    lat, lon: np.ndarray
+        the grid of the region rasters. Arrays are put on this grid before the
+        region statistics are calculated
+    """
+
+    def __init__(
+        self,
+        membership: sparse.csr_matrix,
+        region_names: List[str],
+        lat: np.ndarray,
+        lon: np.ndarray,
+    ) -> None:
+        assert membership.shape == (len(region_names), len(lat) * len(lon)), (
+            "Expected the membership to be (region, pixel). Got "
+            f"{membership.shape} for {len(region_names)} regions and "
+            f"{len(lat)} x {len(lon)} pixels"
+        )
+        self.membership = membership
+        self.region_names = region_names
+        self.lat = lat
+        self.lon = lon
+
+    @classmethod
+    def from_region_da(
+        cls, region_da: xr.DataArray, region_lookup: Dict
+    ) -> "RegionIndex":
+        """From a categorical (lat, lon) DataArray of region ids, and the lookup from
+        the ids to the region names (as loaded from `data/analysis/boundaries_preprocessed`)
+        """
+        region_da = region_da.transpose("lat", "lon")
+        region_ids = list(region_lookup.keys())
+
+        pixel_ids = region_da.values.ravel()
+        # the row of each pixel's region, or -1 if it is not a region in the lookup
+        order = np.argsort(region_ids)
+        sorted_ids = np.array(region_ids)[order]
+        position = np.searchsorted(sorted_ids, pixel_ids).clip(max=len(region_ids) - 1)
+        in_region = sorted_ids[position] == pixel_ids
+        rows = np.where(in_region, order[position], -1)
+        membership = sparse.csr_matrix(
+            (np.ones(in_region.sum()), (rows[in_region], np.where(in_region)[0])),
+            shape=(len(region_ids), pixel_ids.size),
+        )
+        return cls(
+            membership,
+            [region_lookup[region_id] for region_id in region_ids],
+            region_da.lat.values,
+            region_da.lon.values,
+        )
+
+    @classmethod
+    def from_landcover_das(
+        cls, landcover_das: List[xr.DataArray], region_names: List[str]
+    ) -> "RegionIndex":
+        """From one (lat, lon) one hot encoded DataArray per landcover class"""
+        assert len(landcover_das) == len(region_names)
+        landcover = xr.concat(
+            [da.transpose("lat", "lon") for da in landcover_das], dim="region"
+        )
+        # because one-hot-encoded only select where value == 1
+        membership = sparse.csr_matrix(
+            (landcover.values == 1).reshape(len(landcover_das), -1).astype(np.float64)
+        )
+        return cls(membership, region_names, landcover.lat.values, landcover.lon.values)
+
+    def _sums_and_counts(
+        self, da: xr.DataArray
+    ) -> Tuple[xr.DataArray, np.ndarray, np.ndarray]:
+        """The sum and number of the non-NaN values in each region, with the
+        dimensions other than (lat, lon) flattened into the columns
+        """
+        other_dims = [d for d in da.dims if d not in ["lat", "lon"]]
+        da = da.reindex(lat=self.lat, lon=self.lon).transpose(*other_dims, "lat", "lon")
+
+        values = da.values.reshape(-1, len(self.lat) * len(self.lon)).T
+        is_valid = ~np.isnan(values)
+        sums = self.membership @ np.where(is_valid, values, 0)
+        counts = self.membership @ is_valid.astype(np.float64)
+        return da, sums, counts
+
+    def mean(self, da: xr.DataArray) -> xr.DataArray:
+        """The mean of the non-NaN values of `da` in each region, for every
+        element of the dimensions other than (lat, lon)
+
+        :returns: A (region, *other dims) DataArray
+        """
+        da, sums, counts = self._sums_and_counts(da)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = sums / counts
+
+        other_dims = da.dims[:-2]
+        return xr.DataArray(
+            means.reshape((len(self.region_names),) + da.shape[:-2]),
+            dims=("region",) + other_dims,
+            coords={"region": self.region_names, **{d: da[d] for d in other_dims}},
+        )
+
+    def total_mean(self, da: xr.DataArray) -> np.ndarray:
+        """The mean of the non-NaN values of `da` in each region, over all the
+        dimensions
+        """
+        _, sums, counts = self._sums_and_counts(da)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return sums.sum(axis=1) / counts.sum(axis=1)
@@ -0,0 +1,101 @@
+"""Run length kernels for (time, ...) boolean arrays, e.g. threshold exceedences.
+
+Each kernel makes one cumulative sum pass along the time (first) axis, for all the
+pixels at the same time, so they can be applied to blocks of pixels in turn.
+"""
+import numpy as np
+
+from typing import NamedTuple, Optional
+
+
+class Runs(NamedTuple):
+    """Every run in a (time, pixel) array, one element per run"""
+
+    pixel: np.ndarray  # the (flattened) index of the pixel
+    start: np.ndarray  # the index of the first timestep of the run
+    end: np.ndarray  # the index of the last timestep of the run (inclusive)
+    severity: Optional[np.ndarray]  # the sum of the values over the run
+
+
+def current_run_length(exceed: np.ndarray) -> np.ndarray:
+    """The length of the run each timestep is in, up to and including that timestep
+
+    e.g.
+        [True, True, False, True, False, True, True, True] =>
+        [1, 2, 0, 1, 0, 1, 2, 3]
+    """
+    exceed = exceed.astype(bool)
+    count = np.cumsum(exceed, axis=0, dtype=np.int32)
+    # the count at the most recent timestep which was not part of a run
+    count_at_reset = np.maximum.accumulate(np.where(exceed, 0, count), axis=0)
+    return count - count_at_reset
+
+
+def _run_ends(exceed: np.ndarray) -> np.ndarray:
+    is_end = exceed.copy()
+    is_end[:-1] &= ~exceed[1:]
+    return is_end
+
+
+def run_lengths(exceed: np.ndarray) -> np.ndarray:
+    """The length of each run, at the first timestep of the run. All other
+    timesteps are 0
+
+    e.g.
+        [True, True, False, True, False, True, True, True] =>
+        [2, 0, 0, 1, 0, 3, 0, 0]
+    """
+    exceed = exceed.astype(bool)
+    current = current_run_length(exceed)
+
+    end_time, *end_pixel = np.nonzero(_run_ends(exceed))
+    lengths = current[(end_time, *end_pixel)]
+
+    output = np.zeros(exceed.shape, dtype=np.int32)
+    output[(end_time - lengths + 1, *end_pixel)] = lengths
+    return output
+
+
+def longest_run(exceed: np.ndarray) -> np.ndarray:
+    """The length of the longest run of each pixel"""
+    if exceed.shape[0] == 0:
+        return np.zeros(exceed.shape[1:], dtype=np.int32)
+    return current_run_length(exceed).max(axis=0)
+
+
+def run_count(exceed: np.ndarray) -> np.ndarray:
+    """The number of runs of each pixel"""
+    return _run_ends(exceed.astype(bool)).sum(axis=0, dtype=np.int32)
+
+
+def find_runs(exceed: np.ndarray, values: Optional[np.ndarray] = None) -> Runs:
+    """Find the start and end of every run, and (if `values` are passed) their
+    severity: the sum of the values over the run.
+
+    :param exceed: A (time, ...) boolean array. The pixels are flattened, so that
+        `Runs.pixel` indexes `exceed[0].ravel()`
+    :param values: The (time, ...) values to sum over each run, e.g. the deficit
+        below the threshold. NaNs are treated as 0
+    """
+    exceed = exceed.astype(bool).reshape(exceed.shape[0], -1)
+    current = current_run_length(exceed)
+
+    end, pixel = np.nonzero(_run_ends(exceed))
+    start = end - current[end, pixel] + 1
+
+    severity = None
+    if values is not None:
+        values = values.reshape(exceed.shape)
+        summed = np.cumsum(np.where(exceed, np.nan_to_num(values), 0), axis=0)
+        severity = summed[end, pixel]
+        after_start = start > 0
+        severity[after_start] -= summed[start[after_start] - 1, pixel[after_start]]
+
+    # in order of the pixels, and then time
+    order = np.lexsort((start, pixel))
+    return Runs(
+        pixel=pixel[order],
+        start=start[order],
+        end=end[order],
+        severity=None if severity is None else severity[order],
+    )
@@ -0,0 +1,9 @@
+from .pipeline import PipelineBenchmark, compare_results
+from .synthetic import make_synthetic_boundaries, make_synthetic_data
+
+__all__ = [
+    "PipelineBenchmark",
+    "compare_results",
+    "make_synthetic_boundaries",
+    "make_synthetic_data",
+]
@@ -0,0 +1,364 @@
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import xarray as xr
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .synthetic import (
+    SYNTHETIC_DATASETS,
+    make_synthetic_boundaries,
+    make_synthetic_data,
+)
+
+resource = None
+
+
+def _max_rss_mb() -> Optional[float]:
+    """The peak resident memory of this process so far, if it can be measured"""
+    global resource
+    if resource is None:
+        try:
+            import resource
+        except ImportError:
+            # not available on Windows
+            return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # type: ignore
+    # kilobytes on linux, bytes on OSX
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=Path(__file__).parent,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            .stdout.decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> Dict[str, Any]:
+    versions: Dict[str, Optional[str]] = {"python": platform.python_version()}
+    for package in ["numpy", "xarray", "pandas", "torch"]:
+        try:
+            versions[package] = __import__(package).__version__
+        except ImportError:
+            versions[package] = None
+    return {
+        "commit": _git_commit(),
+        "platform": platform.platform(),
+        "versions": versions,
+    }
+
+
+class PipelineBenchmark:
+    r"""Time (and record the peak memory of) each stage of the pipeline, run on
+    synthetic VHI, CHIRPS and ERA5-like data so that no downloads are needed.
+
+    The stages are run in order, each using the outputs of the previous one:
+        merge_files: `BasePreProcessor.merge_files` for each dataset
+        engineer: `_EngineerBase.engineer`
+        dataloader_epoch: one epoch of (training) `DataLoader` iteration
+        train: `NNBase.train`, for a `LinearNetwork`
+        evaluate: `ModelBase.evaluate`, saving the predictions
+        region_analysis: `RegionAnalysis.analyze`, for synthetic admin regions. This
+            reads the test features' netcdf files, so it fails with the `virtual` backend
+
+    If a stage fails, its error is recorded and the following stages are still run
+    (although they will fail too if they need its outputs).
+
+    :param data_folder: The (empty) folder in which to create the data
+    :param grid_size: The (lat, lon) size of the synthetic grid
+    :param start_year: The first year of synthetic data
+    :param end_year: The last year of synthetic data, which is used as the test year
+    :param experiment: One of `{'one_month_forecast', 'nowcast'}`
+    :param pred_months: The number of months used as input for each prediction
+    :param backend: The features backend, one of `{'netcdf', 'store', 'virtual'}`
+    :param num_epochs: The number of epochs to train the model for
+    :param batch_file_size: The number of files loaded per batch by the DataLoader
+    :param num_workers: The number of DataLoader prefetching workers
+    :param trace_memory: Whether to record the peak (Python and numpy) memory
+        allocated in each stage with `tracemalloc`. This slows down every stage
+    :param seed: The random seed, for the data and the model
+    """
+
+    stages: List[str] = [
+        "merge_files",
+        "engineer",
+        "dataloader_epoch",
+        "train",
+        "evaluate",
+        "region_analysis",
+    ]
+
+    def __init__(
+        self,
+        data_folder: Path,
+        grid_size: Tuple[int, int] = (36, 45),
+        start_year: int = 2000,
+        end_year: int = 2010,
+        experiment: str = "one_month_forecast",
+        pred_months: int = 3,
+        backend: str = "netcdf",
+        num_epochs: int = 1,
+        batch_file_size: int = 1,
+        num_workers: int = 0,
+        trace_memory: bool = True,
+        seed: int = 42,
+    ) -> None:
+        assert backend in {
+            "netcdf",
+            "store",
+            "virtual",
+        }, f"Backend must be one of {{netcdf, store, virtual}}, got {backend}"
+
+        self.data_folder = data_folder
+        self.grid_size = grid_size
+        self.start_year = start_year
+        self.end_year = end_year
+        self.experiment = experiment
+        self.pred_months = pred_months
+        self.backend = backend
+        self.num_epochs = num_epochs
+        self.batch_file_size = batch_file_size
+        self.num_workers = num_workers
+        self.trace_memory = trace_memory
+        self.seed = seed
+
+        self.model: Any = None
+        self.results: Dict[str, Any] = {}
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return {
+            "grid_size": list(self.grid_size),
+            "start_year": self.start_year,
+            "end_year": self.end_year,
+            "experiment": self.experiment,
+            "pred_months": self.pred_months,
+            "backend": self.backend,
+            "num_epochs": self.num_epochs,
+            "batch_file_size": self.batch_file_size,
+            "num_workers": self.num_workers,
+            "trace_memory": self.trace_memory,
+            "seed": self.seed,
+        }
+
+    def run(self, stages: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Create the synthetic data and run the benchmark
+
+        :param stages: The stages to run. Defaults to all of them. Since every stage
+            uses the outputs of the previous ones, this is mostly useful to stop early
+        :returns: The results, as they would be saved by `save`
+        """
+        if stages is None:
+            stages = self.stages
+        for stage in stages:
+            assert stage in self.stages, f"{stage} is not one of {self.stages}"
+
+        np.random.seed(self.seed)
+        make_synthetic_data(
+            self.data_folder,
+            grid_size=self.grid_size,
+            start_year=self.start_year,
+            end_year=self.end_year,
+            seed=self.seed,
+        )
+        make_synthetic_boundaries(self.data_folder, grid_size=self.grid_size)
+
+        stage_results: Dict[str, Dict[str, Any]] = {}
+        for stage in stages:
+            print(f"Benchmarking {stage}")
+            stage_results[stage] = self._measure(getattr(self, f"_{stage}"))
+            print(
+                f"{stage}: {stage_results[stage]['status']} "
+                f"in {stage_results[stage]['seconds']:.2f}s"
+            )
+            if (stage == "merge_files") and (stage_results[stage]["status"] != "ok"):
+                # so that the later stages can still be measured
+                self._merge_without_preprocessors()
+
+        self.results = {
+            "timestamp": datetime.now().isoformat(),
+            "environment": _environment(),
+            "config": self.config,
+            "stages": stage_results,
+        }
+        return self.results
+
+    def save(self, path: Path) -> None:
+        assert self.results != {}, "The benchmark must be run before it is saved"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as f:
+            json.dump(self.results, f, indent=2)
+        print(f"Saved benchmark results to {path}")
+
+    def _measure(self, stage: Callable[[], Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        result: Dict[str, Any] = {"status": "ok", "error": None}
+        try:
+            # stages can return extra information about what they did
+            result["info"] = stage()
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = time.perf_counter() - start
+
+        result["peak_memory_mb"] = None
+        if self.trace_memory:
+            result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024**2
+            tracemalloc.stop()
+        result["max_rss_mb"] = _max_rss_mb()
+        return result
+
+    def _preprocessors(self) -> Dict[str, Any]:
+        from ..preprocess import (
+            CHIRPSPreprocessor,
+            ERA5MonthlyMeanPreprocessor,
+            VHIPreprocessor,
+        )
+
+        return {
+            "vhi": VHIPreprocessor,
+            "chirps": CHIRPSPreprocessor,
+            "era5": ERA5MonthlyMeanPreprocessor,
+        }
+
+    def _merge_files(self) -> Dict[str, Any]:
+        preprocessors = self._preprocessors()
+        for dataset in SYNTHETIC_DATASETS:
+            preprocessor = preprocessors[dataset](self.data_folder)
+            preprocessor.merge_files(subset_str="kenya", resample_time="M")
+        return {"datasets": list(SYNTHETIC_DATASETS.keys())}
+
+    def _merge_without_preprocessors(self) -> None:
+        """Merge the interim files as `merge_files` would, without the preprocessors
+        (and so without their dependencies, e.g. xesmf and dask)
+        """
+        from ..preprocess.base import BasePreProcessor
+
+        print("Merging the interim files without the preprocessors")
+        for folder_name, _, _ in SYNTHETIC_DATASETS.values():
+            interim = self.data_folder / "interim" / f"{folder_name}_interim"
+            out_dir = self.data_folder / "interim" / f"{folder_name}_preprocessed"
+            out_dir.mkdir(parents=True, exist_ok=True)
+
+            ds = xr.concat(
+                [xr.open_dataset(file) for file in sorted(interim.glob("*.nc"))],
+                dim="time",
+            )
+            ds = BasePreProcessor.resample_time(ds, "M")
+            ds.to_netcdf(out_dir / "data_kenya.nc")
+
+    def _engineer(self) -> Dict[str, Any]:
+        from ..engineer import Engineer
+
+        engineer = Engineer(
+            self.data_folder, process_static=False, experiment=self.experiment
+        )
+        engineer.engineer(
+            test_year=self.end_year,
+            target_variable="VHI",
+            pred_months=self.pred_months,
+            expected_length=self.pred_months,
+            feature_store=self.backend == "store",
+            virtual=self.backend == "virtual",
+        )
+        return {}
+
+    def _dataloader_epoch(self) -> Dict[str, Any]:
+        from ..models.data import DataLoader
+
+        dataloader = DataLoader(
+            data_path=self.data_folder,
+            batch_file_size=self.batch_file_size,
+            mode="train",
+            experiment=self.experiment,
+            static=None,
+            backend=self.backend,
+            num_workers=self.num_workers,
+        )
+        num_batches = num_instances = 0
+        for x, _ in dataloader:
+            num_batches += 1
+            num_instances += x[0].shape[0]
+        return {"batches": num_batches, "instances": num_instances}
+
+    def _train(self) -> Dict[str, Any]:
+        from ..models import LinearNetwork
+
+        self.model = LinearNetwork(
+            layer_sizes=[100],
+            data_folder=self.data_folder,
+            experiment=self.experiment,
+            static=None,
+            device="cpu",
+            dataloader_kwargs={
+                "backend": self.backend,
+                "num_workers": self.num_workers,
+            },
+        )
+        self.model.train(num_epochs=self.num_epochs)
+        return {}
+
+    def _evaluate(self) -> Dict[str, Any]:
+        assert self.model is not None, "The train stage must be run first"
+        self.model.evaluate(save_preds=True)
+        return {}
+
+    def _region_analysis(self) -> Dict[str, Any]:
+        from ..analysis import AdministrativeRegionAnalysis
+
+        analyzer = AdministrativeRegionAnalysis(
+            self.data_folder,
+            experiment=self.experiment,
+            true_data_experiment=self.experiment,
+        )
+        analyzer.analyze()
+        return {"rows": 0 if analyzer.df is None else len(analyzer.df)}
+
+
+def compare_results(
+    baseline: Dict[str, Any], current: Dict[str, Any]
+) -> Dict[str, Dict[str, Optional[float]]]:
+    """Compare two sets of results (e.g. from different commits) saved by
+    `PipelineBenchmark.save`.
+
+    :returns: For each stage which succeeded in both, the ratio of the current to the
+        baseline time and peak memory (so < 1 is an improvement)
+    """
+    ratios: Dict[str, Dict[str, Optional[float]]] = {}
+    for stage, current_stage in current["stages"].items():
+        baseline_stage = baseline["stages"].get(stage)
+        if (
+            (baseline_stage is None)
+            or (baseline_stage["status"] != "ok")
+            or (current_stage["status"] != "ok")
+        ):
+            continue
+        ratios[stage] = {}
+        for metric in ["seconds", "peak_memory_mb"]:
+            if (current_stage[metric] is None) or (not baseline_stage[metric]):
+                ratios[stage][metric] = None
+            else:
+                ratios[stage][metric] = current_stage[metric] / baseline_stage[metric]
+    return ratios
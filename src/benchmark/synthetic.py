@@ -0,0 +1,155 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..utils import get_kenya
+
+# the interim folder name, the timestep frequency and the variables of each of the
+# synthetic datasets. These mirror the outputs of the matching preprocessors
+SYNTHETIC_DATASETS: Dict[str, Tuple[str, str, List[str]]] = {
+    "vhi": ("vhi", "W-SUN", ["VHI"]),
+    "chirps": ("chirps", "D", ["precip"]),
+    "era5": ("reanalysis-era5-single-levels-monthly-means", "M", ["t2m", "swvl1"]),
+}
+
+
+def _seasonal_field(
+    times: pd.DatetimeIndex,
+    shape: Tuple[int, int],
+    rng: np.random.RandomState,
+    mean: float,
+    amplitude: float,
+    noise: float,
+) -> np.ndarray:
+    """A (time, lat, lon) field with an annual cycle, a north-south gradient
+    and random noise, so that the models have some signal to learn
+    """
+    day_of_year = times.dayofyear.values[:, None, None]
+    gradient = np.linspace(-1, 1, shape[0])[None, :, None]
+    cycle = np.sin(2 * np.pi * day_of_year / 365.25 + gradient)
+    field = (
+        mean + amplitude * cycle + noise * rng.standard_normal((len(times),) + shape)
+    )
+    return field.astype(np.float32)
+
+
+def _vhi(
+    times: pd.DatetimeIndex, shape: Tuple[int, int], rng: np.random.RandomState
+) -> Dict[str, np.ndarray]:
+    vhi = _seasonal_field(times, shape, rng, mean=50, amplitude=20, noise=10)
+    return {"VHI": np.clip(vhi, 0, 100)}
+
+
+def _chirps(
+    times: pd.DatetimeIndex, shape: Tuple[int, int], rng: np.random.RandomState
+) -> Dict[str, np.ndarray]:
+    intensity = _seasonal_field(times, shape, rng, mean=2, amplitude=2, noise=0.5)
+    precip = rng.gamma(shape=0.5, scale=np.clip(intensity, 0.1, None))
+    return {"precip": precip.astype(np.float32)}
+
+
+def _era5(
+    times: pd.DatetimeIndex, shape: Tuple[int, int], rng: np.random.RandomState
+) -> Dict[str, np.ndarray]:
+    t2m = _seasonal_field(times, shape, rng, mean=295, amplitude=4, noise=1)
+    swvl1 = _seasonal_field(times, shape, rng, mean=0.25, amplitude=0.1, noise=0.02)
+    return {"t2m": t2m, "swvl1": np.clip(swvl1, 0, 1)}
+
+
+_generators: Dict[str, Callable] = {"vhi": _vhi, "chirps": _chirps, "era5": _era5}
+
+
+def make_synthetic_data(
+    data_folder: Path,
+    grid_size: Tuple[int, int] = (36, 45),
+    start_year: int = 2000,
+    end_year: int = 2010,
+    datasets: Optional[List[str]] = None,
+    missing_fraction: float = 0.05,
+    seed: int = 42,
+) -> Dict[str, List[Path]]:
+    r"""Write VHI, CHIRPS and ERA5-like cubes over Kenya to
+    `data_folder/interim/{dataset}_interim`, one file per year, as the preprocessors
+    would before merging their files. A fraction of the VHI pixels are masked (NaN),
+    as the ocean and missing observations are in the real data.
+
+    :param data_folder: The data folder in which to write the cubes
+    :param grid_size: The (lat, lon) size of the grid
+    :param start_year: The first year of data
+    :param end_year: The last year of data (inclusive)
+    :param datasets: The datasets to create. Defaults to all of `{'vhi', 'chirps', 'era5'}`
+    :param missing_fraction: The fraction of VHI pixels which are always NaN
+    :param seed: The random seed, so that the same data is written every time
+
+    :returns: A dictionary of the files written, keyed by dataset
+    """
+    if datasets is None:
+        datasets = list(SYNTHETIC_DATASETS.keys())
+
+    rng = np.random.RandomState(seed)
+    kenya = get_kenya()
+    coords = {
+        "lat": np.linspace(kenya.latmin, kenya.latmax, grid_size[0]),
+        "lon": np.linspace(kenya.lonmin, kenya.lonmax, grid_size[1]),
+    }
+    missing = rng.uniform(size=grid_size) < missing_fraction
+
+    output_files: Dict[str, List[Path]] = {}
+    for dataset in datasets:
+        assert (
+            dataset in SYNTHETIC_DATASETS
+        ), f"{dataset} is not one of {list(SYNTHETIC_DATASETS.keys())}"
+        folder_name, freq, _ = SYNTHETIC_DATASETS[dataset]
+        interim_folder = data_folder / "interim" / f"{folder_name}_interim"
+        interim_folder.mkdir(parents=True, exist_ok=True)
+
+        output_files[dataset] = []
+        for year in range(start_year, end_year + 1):
+            times = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq=freq)
+            variables = _generators[dataset](times, grid_size, rng)
+            if dataset == "vhi":
+                variables["VHI"][:, missing] = np.nan
+
+            ds = xr.Dataset(
+                {
+                    var: (["time", "lat", "lon"], values)
+                    for var, values in variables.items()
+                },
+                coords={"time": times, **coords},
+            )
+            filename = interim_folder / f"{year}_{dataset}_kenya.nc"
+            ds.to_netcdf(filename)
+            output_files[dataset].append(filename)
+    return output_files
+
+
+def make_synthetic_boundaries(
+    data_folder: Path, grid_size: Tuple[int, int] = (36, 45), num_regions: int = 8
+) -> Path:
+    r"""Write a region mask (as created by the boundary preprocessor) on the same
+    grid as `make_synthetic_data`, to `data_folder/analysis/boundaries_preprocessed`.
+    The grid is split into `num_regions` vertical strips.
+
+    :returns: The path to the region mask
+    """
+    kenya = get_kenya()
+    lat = np.linspace(kenya.latmin, kenya.latmax, grid_size[0])
+    lon = np.linspace(kenya.lonmin, kenya.lonmax, grid_size[1])
+
+    region_ids = np.floor(np.linspace(0, num_regions, grid_size[1], endpoint=False))
+    regions = np.broadcast_to(region_ids, grid_size).astype(np.int64)
+
+    ds = xr.Dataset(
+        {"province_l1": (["lat", "lon"], regions)}, coords={"lat": lat, "lon": lon}
+    )
+    ds.attrs["keys"] = ", ".join(str(i) for i in range(num_regions))
+    ds.attrs["values"] = ", ".join(f"region_{i}" for i in range(num_regions))
+
+    out_folder = data_folder / "analysis" / "boundaries_preprocessed"
+    out_folder.mkdir(parents=True, exist_ok=True)
+    filename = out_folder / "province_l1_kenya.nc"
+    ds.to_netcdf(filename)
+    return filename
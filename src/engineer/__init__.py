@@ -46,6 +46,9 @@ class Engineer:
         pred_months: int = 12,
         expected_length: Optional[int] = 12,
         global_means: bool = True,
+        feature_store: bool = False,
+        virtual: bool = False,
+        incremental: bool = False,
     ) -> None:
         """
         Take all the preprocessed data generated by the preprocessing classes, and turn it
@@ -61,6 +64,18 @@ class Engineer:
             If this is not None and an x array has a different time dimension size, the array
             is ignored. This differs from pred_months if the preprocessors are run with a
             time granularity different from `'M'`
+        :param global_means: Whether to include the global means of the dynamic variables
+            in the static data
+        :param feature_store: Whether to also write a consolidated (memory-mappable) store
+            of the x, y arrays for each split to `features/{experiment}/store/{train, test}`.
+            This can be read by the `DataLoader` with `backend='store'`
+        :param virtual: Whether to save the merged data once, with an index of the input
+            window of each target month, to `features/{experiment}/virtual` instead of
+            saving the (overlapping) x, y arrays of every target month. This can be read
+            by the `DataLoader` with `backend='virtual'`
+        :param incremental: Whether to only create the target months which are new, or
+            whose data has changed, since the engineer was last run (with the same
+            arguments). The normalization values are updated with the new timesteps
         """
         self.engineer_class.engineer(
             test_year,
@@ -68,6 +83,9 @@ class Engineer:
             pred_months,
             expected_length,
             global_means=global_means,
+            feature_store=feature_store,
+            virtual=virtual,
+            incremental=incremental,
         )
 
     @staticmethod
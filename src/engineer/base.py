@@ -1,17 +1,34 @@
+import calendar
 import numpy as np
 from collections import defaultdict
 from datetime import datetime, date
 from pathlib import Path
 import pickle
+import shutil
 import xarray as xr
 import warnings
 from collections.abc import Iterable
 
 from typing import cast, DefaultDict, Dict, List, Optional, Union, Tuple
 
+from ..utils import minus_months
+from .feature_store import FeatureStoreWriter
+from .manifest import EngineerManifest
+from .running_statistics import calculate_statistics, RunningStatistics
+from .virtual_features import VirtualFeatureWriter
+
 
 class _EngineerBase:
     name: str
+    # set by `_process_dynamic` when a consolidated feature store is written
+    feature_stores: Optional[Dict[str, FeatureStoreWriter]] = None
+    # set by `_process_dynamic` when only the windows are saved (instead of x.nc, y.nc)
+    virtual_features: Optional[VirtualFeatureWriter] = None
+    # set by `_process_dynamic`; the manifest being written, and (in incremental
+    # mode) the previous manifest and the timesteps which changed since it was written
+    manifest: Optional[EngineerManifest] = None
+    previous_manifest: Optional[EngineerManifest] = None
+    stale_times: Optional[np.ndarray] = None
 
     def __init__(
         self, data_folder: Path = Path("data"), process_static: bool = False
@@ -46,9 +63,20 @@ class _EngineerBase:
         expected_length: Optional[int] = 12,
         global_means: bool = True,
         pixel_means: bool = True,
+        feature_store: bool = False,
+        virtual: bool = False,
+        incremental: bool = False,
     ) -> None:
 
-        self._process_dynamic(test_year, target_variable, pred_months, expected_length)
+        self._process_dynamic(
+            test_year,
+            target_variable,
+            pred_months,
+            expected_length,
+            feature_store,
+            virtual,
+            incremental,
+        )
         if self.process_static:
             self._process_static(
                 test_year=test_year, global_means=global_means, pixel_means=pixel_means
@@ -76,9 +104,20 @@ class _EngineerBase:
         ones = xr.ones_like(static_ds)
         ones_da = ones[[v for v in ones.data_vars][0]]
 
+        # the per pixel statistics are calculated in one pass over time, and
+        # the global statistics are calculated from them
+        pixel_stats = {}
+        if global_means_bool or pixel_means_bool:
+            pixel_stats = {
+                var: calculate_statistics(dynamic_ds[var], dims=["time"])
+                for var in dynamic_ds.data_vars
+            }
+
         if global_means_bool:
             # 1. create global means ds
-            global_means = dynamic_ds.mean(dim=["lat", "lon", "time"])
+            global_means = xr.Dataset(
+                {var: ((), stats.total().mean) for var, stats in pixel_stats.items()}
+            )
             global_means = ones_da * global_means
             # rename variables
             rename_map = {v: f"{v}_global_mean" for v in global_means.data_vars}
@@ -86,7 +125,20 @@ class _EngineerBase:
 
         if pixel_means_bool:
             # 2. create pixel means ds
-            pixel_means = dynamic_ds.mean(dim=["time"])
+            pixel_means = xr.Dataset(
+                {
+                    var: (
+                        [dim for dim in dynamic_ds[var].dims if dim != "time"],
+                        stats.mean,
+                    )
+                    for var, stats in pixel_stats.items()
+                },
+                coords={
+                    name: coord
+                    for name, coord in dynamic_ds.coords.items()
+                    if "time" not in coord.dims
+                },
+            )
             pixel_means = ones_da * pixel_means
             # rename variables
             rename_map = {v: f"{v}_pixel_mean" for v in pixel_means.data_vars}
@@ -152,10 +204,8 @@ class _EngineerBase:
                 mean = 0.0
                 std = 1.0
             else:
-                mean = float(
-                    static_ds[var].mean(dim=["lat", "lon"], skipna=True).values
-                )
-                std = float(static_ds[var].std(dim=["lat", "lon"], skipna=True).values)
+                stats = calculate_statistics(static_ds[var], dims=["lat", "lon"])
+                mean, std = float(stats.mean), float(stats.std)
 
             normalization_values[var]["mean"] = mean
             normalization_values[var]["std"] = std
@@ -171,12 +221,19 @@ class _EngineerBase:
         target_variable: str = "VHI",
         pred_months: int = 12,
         expected_length: Optional[int] = 12,
+        feature_store: bool = False,
+        virtual: bool = False,
+        incremental: bool = False,
     ) -> None:
         if expected_length is None:
             warnings.warn(
                 "** `expected_length` is None. This means that \
             missing data will not be skipped. Are you sure? **"
             )
+        assert not (incremental and (feature_store or virtual)), (
+            "The consolidated feature store and virtual features "
+            "can't be updated incrementally"
+        )
 
         # read in all the data from interim/{var}_preprocessed
         data = self._make_dataset(static=False)  # .sortby('lat')
@@ -185,6 +242,49 @@ class _EngineerBase:
         if type(test_year) is int:
             test_year = [cast(int, test_year)]
 
+        manifest_path = self.output_folder / "manifest.json"
+        config = {
+            "test_year": sorted(cast(List, test_year)),
+            "target_variable": target_variable,
+            "pred_months": pred_months,
+            "expected_length": expected_length,
+        }
+        # the timesteps of the data are only hashed if the manifest needs them
+        # (to find the stale timesteps, or when it is saved)
+        self.manifest = EngineerManifest.from_data(
+            config, self._get_preprocessed_files(static=False), data
+        )
+        if incremental:
+            previous_manifest = EngineerManifest.load(manifest_path)
+            if (previous_manifest is None) or (previous_manifest.config != config):
+                print("No manifest for this configuration! Engineering all months")
+            elif previous_manifest.interim_files == self.manifest.interim_files:
+                print("No interim files have changed since the last run")
+                self.manifest = None
+                return None
+            else:
+                self.previous_manifest = previous_manifest
+                self.stale_times = self.manifest.stale_times(previous_manifest)
+
+        if feature_store:
+            # in addition to the {year}_{month} folders, consolidate all
+            # the x, y arrays for each split into a single store
+            self.feature_stores = {
+                dataset_type: FeatureStoreWriter(
+                    self.output_folder / "store" / dataset_type
+                )
+                for dataset_type in ["train", "test"]
+            }
+
+        if virtual:
+            # save the merged data once, and only the window of each target
+            # month instead of its x, y datasets
+            if not data.indexes["time"].is_monotonic_increasing:
+                data = data.sortby("time")
+            self.virtual_features = VirtualFeatureWriter(
+                self.output_folder / "virtual", cube=data, experiment=self.name
+            )
+
         # save test data (x, y) and return the train_ds (subset of `data`)
         train_ds = self._train_test_split(
             ds=data,
@@ -194,7 +294,10 @@ class _EngineerBase:
             expected_length=expected_length,
         )
 
-        normalization_values = self._calculate_normalization_values(train_ds)
+        if self.previous_manifest is not None:
+            normalization_values = self._update_normalization_values(train_ds)
+        else:
+            normalization_values = self._calculate_normalization_values(train_ds)
 
         # split train_ds into x, y for each year-month before `test_year` & save
         self._stratify_training_data(
@@ -204,10 +307,22 @@ class _EngineerBase:
             expected_length=expected_length,
         )
 
+        if self.feature_stores is not None:
+            for store in self.feature_stores.values():
+                store.close()
+            self.feature_stores = None
+
+        if self.virtual_features is not None:
+            self.virtual_features.close()
+            self.virtual_features = None
+
         savepath = self.output_folder / "normalizing_dict.pkl"
         with savepath.open("wb") as f:
             pickle.dump(normalization_values, f)
 
+        self.manifest.save(manifest_path)
+        self.manifest = self.previous_manifest = self.stale_times = None
+
     def _get_preprocessed_files(self, static: bool) -> List[Path]:
         processed_files = []
         if static:
@@ -264,28 +379,32 @@ class _EngineerBase:
         min_date = self._get_datetime(train_ds.time.values.min())
         max_date = self._get_datetime(train_ds.time.values.max())
 
+        # every month-year from the maximum date, counting down one month at
+        # a time (02 -> 01 -> 12 ...) until the minimum date
+        target_months: List[Tuple[int, int]] = []
         cur_pred_year, cur_pred_month = max_date.year, max_date.month
-
-        # for every month-year create & save the x, y datasets for training
         cur_min_date = max_date
         while cur_min_date >= min_date:
-            # each iteration count down one month (02 -> 01 -> 12 ...)
-            arrays, cur_min_date = self._stratify_xy(
-                ds=train_ds,
-                year=cur_pred_year,
-                target_variable=target_variable,
-                target_month=cur_pred_month,
-                pred_months=pred_months,
-                expected_length=expected_length,
+            target_months.append((cur_pred_year, cur_pred_month))
+            cur_pred_year, cur_pred_month, cur_min_date = minus_months(  # type: ignore
+                cur_pred_year, cur_pred_month, diff_months=1
             )
+
+        target_months = self._select_target_months(target_months, pred_months, "train")
+
+        # create & save the x, y datasets for training
+        all_arrays = self._stratify_all(
+            ds=train_ds,
+            target_months=target_months,
+            target_variable=target_variable,
+            pred_months=pred_months,
+            expected_length=expected_length,
+        )
+        for (year, month), arrays in zip(target_months, all_arrays):
             if arrays is not None:
-                self._save(
-                    arrays,
-                    year=cur_pred_year,
-                    month=cur_pred_month,
-                    dataset_type="train",
-                )
-            cur_pred_year, cur_pred_month = cur_min_date.year, cur_min_date.month
+                self._save(arrays, year=year, month=month, dataset_type="train")
+            elif self.previous_manifest is not None:
+                self._remove(year=year, month=month, dataset_type="train")
 
     def _train_test_split(
         self,
@@ -299,41 +418,63 @@ class _EngineerBase:
 
         years.sort()
 
-        # for the first `year` Jan calculate the xy_test dictionary and min date
-        xy_test, min_test_date = self._stratify_xy(
+        # each month in test_year produce an x,y pair for testing
+        target_months = [(year, month) for year in years for month in range(1, 13)]
+        target_months = self._select_target_months(target_months, pred_months, "test")
+        all_xy_test = self._stratify_all(
             ds=ds,
-            year=years[0],
+            target_months=target_months,
             target_variable=target_variable,
-            target_month=1,
             pred_months=pred_months,
             expected_length=expected_length,
         )
 
-        # the train_ds MUST BE from before minimum test date
+        # the train_ds MUST BE from before minimum test date (the max
+        # input date for the first `year` Jan)
+        _, min_test_date, _ = self._get_target_dates(years[0], 1, pred_months)
         train_dates = ds.time.values <= np.datetime64(str(min_test_date))
         train_ds = ds.isel(time=train_dates)
 
-        # save the xy_test dictionary
-        if xy_test is not None:
-            self._save(xy_test, year=years[0], month=1, dataset_type="test")
-
-        # each month in test_year produce an x,y pair for testing
-        for year in years:
-            for month in range(1, 13):
-                if year > years[0] or month > 1:
-                    # prevents the initial test set from being recalculated
-                    xy_test, _ = self._stratify_xy(
-                        ds=ds,
-                        year=year,
-                        target_variable=target_variable,
-                        target_month=month,
-                        pred_months=pred_months,
-                        expected_length=expected_length,
-                    )
-                    if xy_test is not None:
-                        self._save(xy_test, year=year, month=month, dataset_type="test")
+        # save the xy_test dictionaries
+        for (year, month), xy_test in zip(target_months, all_xy_test):
+            if xy_test is not None:
+                self._save(xy_test, year=year, month=month, dataset_type="test")
+            elif self.previous_manifest is not None:
+                self._remove(year=year, month=month, dataset_type="test")
         return train_ds
 
+    def _select_target_months(
+        self, target_months: List[Tuple[int, int]], pred_months: int, dataset_type: str
+    ) -> List[Tuple[int, int]]:
+        """Record the target months in the manifest, and in incremental mode, only
+        return the ones which are new or whose data has changed
+        """
+        if self.manifest is not None:
+            self.manifest.target_months[dataset_type] = [
+                f"{year}_{month}" for year, month in target_months
+            ]
+        if (self.previous_manifest is None) or (self.stale_times is None):
+            return target_months
+
+        previous = set(self.previous_manifest.target_months.get(dataset_type, []))
+        selected = []
+        for year, month in target_months:
+            min_date, _, max_date = self._get_target_dates(year, month, pred_months)
+            # the number of stale timesteps in (min_date, max_date]
+            num_stale = np.searchsorted(
+                self.stale_times, np.datetime64(str(max_date), "ns"), side="right"
+            ) - np.searchsorted(
+                self.stale_times, np.datetime64(str(min_date), "ns"), side="right"
+            )
+            if (f"{year}_{month}" not in previous) or (num_stale > 0):
+                selected.append((year, month))
+
+        print(
+            f"{len(selected)} of {len(target_months)} {dataset_type} "
+            f"target months are new or stale"
+        )
+        return selected
+
     def _stratify_xy(
         self,
         ds: xr.Dataset,
@@ -345,6 +486,136 @@ class _EngineerBase:
     ) -> Tuple[Optional[Dict[str, xr.Dataset]], date]:
         raise NotImplementedError
 
+    @staticmethod
+    def _window_to_xy(
+        ds: xr.Dataset, x_start: int, target_variable: str, expected_length: int
+    ) -> Dict[str, xr.Dataset]:
+        """Create the {x, y} datasets for the `expected_length` long input window
+        starting at time index `x_start` (and the target at the following timestep)
+        """
+        raise NotImplementedError
+
+    def _stratify_all(
+        self,
+        ds: xr.Dataset,
+        target_months: List[Tuple[int, int]],
+        target_variable: str,
+        pred_months: int,
+        expected_length: Optional[int],
+    ) -> List[Optional[Dict[str, xr.Dataset]]]:
+        """Create the {x, y} datasets for every (year, month) in `target_months`
+        in one pass, rather than calling `_stratify_xy` once per target month.
+
+        The dataset is loaded into memory once, and the window bounds for all the
+        target months are found at the same time. Each {x, y} dataset is then a
+        slice (a view, not a copy) of the loaded arrays.
+        """
+        if len(target_months) == 0:
+            return []
+
+        if expected_length is None:
+            # the input windows may have different lengths, so they
+            # are selected one target month at a time
+            return [
+                self._stratify_xy(
+                    ds=ds,
+                    year=year,
+                    target_variable=target_variable,
+                    target_month=month,
+                    pred_months=pred_months,
+                    expected_length=expected_length,
+                )[0]
+                for year, month in target_months
+            ]
+
+        if not ds.indexes["time"].is_monotonic_increasing:
+            ds = ds.sortby("time")
+
+        # only the timesteps in the target months' windows need to be loaded
+        all_dates = [
+            self._get_target_dates(year, month, pred_months)
+            for year, month in target_months
+        ]
+        earliest = np.datetime64(str(min(dates[0] for dates in all_dates)), "ns")
+        latest = np.datetime64(str(max(dates[2] for dates in all_dates)), "ns")
+        times = ds.time.values
+        ds = ds.isel(time=(times > earliest) & (times <= latest)).load()
+
+        x_starts, is_valid = self._get_windows(
+            ds.time.values, target_months, pred_months, expected_length
+        )
+        print(
+            f"Generating data for {int(is_valid.sum())} of "
+            f"{len(target_months)} target months"
+        )
+
+        output: List[Optional[Dict[str, xr.Dataset]]] = []
+        for (year, month), x_start, valid in zip(target_months, x_starts, is_valid):
+            if not valid:
+                print(
+                    f"Wrong number of x or y values for year: {year}, "
+                    f"target month: {month}; skipping"
+                )
+                output.append(None)
+            else:
+                output.append(
+                    self._window_to_xy(
+                        ds, int(x_start), target_variable, expected_length
+                    )
+                )
+        return output
+
+    @classmethod
+    def _get_windows(
+        cls,
+        times: np.ndarray,
+        target_months: List[Tuple[int, int]],
+        pred_months: int,
+        expected_length: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """For every target month, find the index in (sorted) `times` at which its
+        input window starts, and whether it has exactly `expected_length` input
+        timesteps and one target timestep.
+        """
+        min_dates, max_train_dates, max_dates = [], [], []
+        for year, month in target_months:
+            min_date, max_train_date, max_date = cls._get_target_dates(
+                year, month, pred_months
+            )
+            min_dates.append(str(min_date))
+            max_train_dates.append(str(max_train_date))
+            max_dates.append(str(max_date))
+
+        times = times.astype("datetime64[ns]")
+        x_starts = np.searchsorted(
+            times, np.array(min_dates, dtype="datetime64[ns]"), side="right"
+        )
+        y_starts = np.searchsorted(
+            times, np.array(max_train_dates, dtype="datetime64[ns]"), side="right"
+        )
+        y_ends = np.searchsorted(
+            times, np.array(max_dates, dtype="datetime64[ns]"), side="right"
+        )
+
+        is_valid = ((y_ends - y_starts) == 1) & (
+            (y_starts - x_starts) == expected_length
+        )
+        return cast(np.ndarray, x_starts), is_valid
+
+    @staticmethod
+    def _get_target_dates(
+        year: int, target_month: int, pred_months: int
+    ) -> Tuple[date, date, date]:
+        """Return the (exclusive) minimum input date, the maximum input date
+        and the date to be predicted for a target month
+        """
+        max_date = date(year, target_month, calendar.monthrange(year, target_month)[-1])
+        mx_year, mx_month, max_train_date = minus_months(
+            year, target_month, diff_months=1
+        )
+        _, _, min_date = minus_months(mx_year, mx_month, diff_months=pred_months)
+        return cast(date, min_date), cast(date, max_train_date), max_date
+
     @staticmethod
     def _get_datetime(time: np.datetime64) -> date:
         return datetime.strptime(time.astype(str)[:10], "%Y-%m-%d").date()
@@ -353,15 +624,65 @@ class _EngineerBase:
         self, ds_dict: Dict[str, xr.Dataset], year: int, month: int, dataset_type: str
     ) -> None:
 
-        save_folder = self.output_folder / dataset_type
-        save_folder.mkdir(exist_ok=True)
+        if self.virtual_features is not None:
+            self.virtual_features.append(ds_dict, f"{year}_{month}", dataset_type)
+        else:
+            save_folder = self.output_folder / dataset_type
+            save_folder.mkdir(exist_ok=True)
 
-        output_location = save_folder / f"{year}_{month}"
-        output_location.mkdir(exist_ok=True)
+            output_location = save_folder / f"{year}_{month}"
+            output_location.mkdir(exist_ok=True)
 
-        for x_or_y, output_ds in ds_dict.items():
-            print(f"Saving data to {output_location.as_posix()}/{x_or_y}.nc")
-            output_ds.to_netcdf(output_location / f"{x_or_y}.nc")
+            for x_or_y, output_ds in ds_dict.items():
+                print(f"Saving data to {output_location.as_posix()}/{x_or_y}.nc")
+                output_ds.to_netcdf(output_location / f"{x_or_y}.nc")
+
+        if self.feature_stores is not None:
+            self.feature_stores[dataset_type].append(ds_dict, key=f"{year}_{month}")
+
+    def _remove(self, year: int, month: int, dataset_type: str) -> None:
+        output_location = self.output_folder / dataset_type / f"{year}_{month}"
+        if output_location.exists():
+            print(f"Removing {output_location.as_posix()}")
+            shutil.rmtree(output_location)
+
+    def _update_normalization_values(
+        self, train_ds: xr.Dataset
+    ) -> DefaultDict[str, Dict[str, float]]:
+        """Update the saved normalization values with the new timesteps of
+        `train_ds`, instead of recalculating them over all the timesteps
+        """
+        assert (self.previous_manifest is not None) and (self.stale_times is not None)
+
+        savepath = self.output_folder / "normalizing_dict.pkl"
+        previous_values = None
+        if savepath.exists():
+            with savepath.open("rb") as f:
+                previous_values = pickle.load(f)
+
+        train_times = train_ds.time.values.astype("datetime64[ns]")
+        stale_train_times = self.stale_times[self.stale_times <= train_times.max()]
+        # changed (or removed) timesteps can't be taken out of the statistics
+        previous_times = set(self.previous_manifest.time_hashes)
+        can_update = (
+            (previous_values is not None)
+            and all(str(time) not in previous_times for time in stale_train_times)
+            and set(previous_values) == set(train_ds.data_vars)
+            and all("count" in val for val in previous_values.values())
+        )
+        if not can_update:
+            return self._calculate_normalization_values(train_ds)
+
+        new_ds = train_ds.isel(time=np.isin(train_times, stale_train_times))
+        normalization_values: DefaultDict[str, Dict[str, float]] = defaultdict(dict)
+        for var in train_ds.data_vars:
+            stats = RunningStatistics.from_dict(previous_values[var])  # type: ignore
+            if new_ds.time.size > 0:
+                stats.merge(
+                    calculate_statistics(new_ds[var], dims=["lat", "lon", "time"])
+                )
+            normalization_values[var].update(stats.to_dict())
+        return normalization_values
 
     def _calculate_normalization_values(
         self, x_data: xr.Dataset
@@ -369,12 +690,10 @@ class _EngineerBase:
         normalization_values: DefaultDict[str, Dict[str, float]] = defaultdict(dict)
 
         for var in x_data.data_vars:
-            mean = float(
-                x_data[var].mean(dim=["lat", "lon", "time"], skipna=True).values
-            )
-            std = float(x_data[var].std(dim=["lat", "lon", "time"], skipna=True).values)
-            normalization_values[var]["mean"] = mean
-            normalization_values[var]["std"] = std
+            # in one (chunked) pass over time, so that the whole array
+            # doesn't need to be loaded into memory
+            stats = calculate_statistics(x_data[var], dims=["lat", "lon", "time"])
+            normalization_values[var].update(stats.to_dict())
 
         return normalization_values
 
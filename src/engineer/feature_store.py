@@ -0,0 +1,203 @@
+import json
+import numpy as np
+import xarray as xr
+from pathlib import Path
+
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+
+class FeatureStoreWriter:
+    r"""Append the engineered {x, y} datasets for every target month into
+    a single consolidated store per split (`train` / `test`).
+
+    The store is a folder containing:
+        x.dat: a contiguous float32 (instance, time, feature) block
+        y.dat: a contiguous float32 (instance, 1) block
+        index.npz: index tables mapping each target month ({year}_{month})
+            to its target time, historical times and instance offsets, plus
+            the lat, lon grid from which the instances were flattened
+        meta.json: the array shapes and variable names
+
+    Instances are the flattened (lat, lon) pixels of each target month, in the
+    same order as `DataLoader` flattens the `x.nc`, `y.nc` files.
+
+    :param store_folder: The folder in which to write the store. Any existing
+        store in this folder is overwritten
+    """
+
+    def __init__(self, store_folder: Path) -> None:
+        self.store_folder = store_folder
+        self.store_folder.mkdir(parents=True, exist_ok=True)
+
+        self._x_file: Optional[BinaryIO] = (store_folder / "x.dat").open("wb")
+        self._y_file: Optional[BinaryIO] = (store_folder / "y.dat").open("wb")
+
+        self.keys: List[str] = []
+        self.target_times: List[np.datetime64] = []
+        self.historical_times: List[np.ndarray] = []
+        self.offsets: List[int] = [0]
+
+        self.x_vars: Optional[List[str]] = None
+        self.y_var: Optional[str] = None
+        self.lat: Optional[np.ndarray] = None
+        self.lon: Optional[np.ndarray] = None
+
+    def append(self, ds_dict: Dict[str, xr.Dataset], key: str) -> None:
+        assert self._x_file is not None, "The store has already been closed!"
+
+        x = ds_dict["x"].transpose("time", "lat", "lon")
+        y = ds_dict["y"].transpose("time", "lat", "lon")
+        assert len(y.data_vars) == 1, "Expected only one target variable!"
+
+        if self.x_vars is None:
+            self.x_vars = list(x.data_vars)
+            self.y_var = list(y.data_vars)[0]
+            self.lat, self.lon = x.lat.values, x.lon.values
+        else:
+            assert list(x.data_vars) == self.x_vars, (
+                f"All x datasets in a store must have the same variables. "
+                f"Expected {self.x_vars}, got {list(x.data_vars)}"
+            )
+            assert np.array_equal(x.lat.values, self.lat) and np.array_equal(
+                x.lon.values, self.lon
+            ), "All x datasets in a store must share the same lat, lon grid"
+            if x.time.size != self.historical_times[0].size:
+                raise ValueError(
+                    f"Got {x.time.size} timesteps for {key}, but the store has "
+                    f"{self.historical_times[0].size}. A consolidated store "
+                    f"requires a fixed `expected_length`"
+                )
+
+        # (variable, time, lat, lon) -> (pixel, time, variable)
+        x_np = x.to_array().values
+        x_np = x_np.reshape(x_np.shape[0], x_np.shape[1], x_np.shape[2] * x_np.shape[3])
+        x_np = np.moveaxis(x_np, [0, 2], [2, 0])
+        y_np = y.to_array().values.reshape(-1, 1)
+
+        np.ascontiguousarray(x_np, dtype=np.float32).tofile(self._x_file)
+        np.ascontiguousarray(y_np, dtype=np.float32).tofile(self._y_file)
+
+        self.keys.append(key)
+        self.target_times.append(y.time.values[0])
+        self.historical_times.append(x.time.values)
+        self.offsets.append(self.offsets[-1] + x_np.shape[0])
+
+    def close(self) -> None:
+        if self._x_file is None:
+            return None
+        self._x_file.close()
+        self._y_file.close()  # type: ignore
+        self._x_file = self._y_file = None
+
+        n_times = self.historical_times[0].size if self.historical_times else 0
+        x_vars = self.x_vars if self.x_vars is not None else []
+
+        np.savez(
+            self.store_folder / "index.npz",
+            keys=np.array(self.keys, dtype=str),
+            target_times=np.array(self.target_times, dtype="datetime64[ns]"),
+            historical_times=np.array(
+                self.historical_times, dtype="datetime64[ns]"
+            ).reshape(len(self.keys), n_times),
+            offsets=np.array(self.offsets, dtype=np.int64),
+            lat=self.lat if self.lat is not None else np.array([]),
+            lon=self.lon if self.lon is not None else np.array([]),
+        )
+        meta = {
+            "x_shape": [self.offsets[-1], n_times, len(x_vars)],
+            "y_shape": [self.offsets[-1], 1],
+            "x_vars": x_vars,
+            "y_var": self.y_var,
+        }
+        with (self.store_folder / "meta.json").open("w") as f:
+            json.dump(meta, f)
+
+
+class FeatureStore:
+    r"""Read a consolidated store written by the `FeatureStoreWriter`.
+
+    The x and y blocks are memory-mapped, so selecting the arrays for a target
+    month returns a (zero-copy) view onto the file.
+
+    :param store_folder: The folder containing the store
+    :param mmap_mode: The mode with which to memory-map the arrays. Defaults to
+        read only
+    """
+
+    def __init__(self, store_folder: Path, mmap_mode: str = "r") -> None:
+        self._open(store_folder, mmap_mode)
+
+    def _open(self, store_folder: Path, mmap_mode: str) -> None:
+        assert (
+            store_folder / "meta.json"
+        ).exists(), f"{store_folder} does not contain a feature store. Has the engineer been run?"
+
+        self.store_folder = store_folder
+        self.mmap_mode = mmap_mode
+        with (store_folder / "meta.json").open("r") as f:
+            meta = json.load(f)
+        self.x_vars: List[str] = meta["x_vars"]
+        self.y_var: str = meta["y_var"]
+
+        index = np.load(store_folder / "index.npz")
+        self._keys: List[str] = [str(key) for key in index["keys"]]
+        self.target_times: np.ndarray = index["target_times"]
+        self.historical_times: np.ndarray = index["historical_times"]
+        self.offsets: np.ndarray = index["offsets"]
+        self.lat: np.ndarray = index["lat"]
+        self.lon: np.ndarray = index["lon"]
+
+        self.x = self._memmap(store_folder / "x.dat", meta["x_shape"], mmap_mode)
+        self.y = self._memmap(store_folder / "y.dat", meta["y_shape"], mmap_mode)
+
+        self._key_to_idx = {key: idx for idx, key in enumerate(self._keys)}
+
+    def __getstate__(self) -> Dict:
+        # the store is reopened (rather than copied) when it is sent to
+        # another process, e.g. the DataLoader's prefetching workers
+        return {"store_folder": self.store_folder, "mmap_mode": self.mmap_mode}
+
+    def __setstate__(self, state: Dict) -> None:
+        self._open(state["store_folder"], state["mmap_mode"])
+
+    @staticmethod
+    def _memmap(path: Path, shape: List[int], mmap_mode: str) -> np.ndarray:
+        # numpy can't memory-map empty files
+        if np.prod(shape) == 0:
+            return np.empty(shape, dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode=mmap_mode, shape=tuple(shape))
+
+    @staticmethod
+    def read_keys(store_folder: Path) -> List[str]:
+        """The keys ({year}_{month}) of the target months in the store,
+        without memory-mapping the arrays
+        """
+        return [str(key) for key in np.load(store_folder / "index.npz")["keys"]]
+
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_to_idx
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return views of the (pixel, time, feature) x array and the
+        (pixel, 1) y array for a target month
+        """
+        idx = self._key_to_idx[key]
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.x[start:end], self.y[start:end]
+
+    def get_times(self, key: str) -> Tuple[np.datetime64, np.ndarray]:
+        """Return the target time and the historical times for a target month
+        """
+        idx = self._key_to_idx[key]
+        return self.target_times[idx], self.historical_times[idx]
+
+    @property
+    def latlons(self) -> np.ndarray:
+        lons, lats = np.meshgrid(self.lon, self.lat)
+        return np.concatenate((lats.reshape(-1, 1), lons.reshape(-1, 1)), axis=-1)
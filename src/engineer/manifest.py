@@ -0,0 +1,117 @@
+import hashlib
+import json
+import numpy as np
+import xarray as xr
+from pathlib import Path
+
+from typing import Any, Dict, List, Optional
+
+
+class EngineerManifest:
+    r"""A record of the data the engineer created its features from, so that later
+    runs can find which target months are missing or stale.
+
+    :param config: The arguments the engineer was run with. If these change, all
+        the target months are stale
+    :param interim_files: The modification time and size of every interim file
+    :param time_hashes: A hash of the (merged) data at each timestep, keyed by the
+        timestep's ISO format string. If None, they are calculated (from the
+        dataset passed to `from_data`) the first time they are used
+    :param target_months: The {year}_{month} keys of the target months created
+        (or skipped because their windows are incomplete) for each split
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        interim_files: Dict[str, List[float]],
+        time_hashes: Optional[Dict[str, str]] = None,
+        target_months: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
+        self.config = config
+        self.interim_files = interim_files
+        self._time_hashes = time_hashes
+        self.target_months = target_months if target_months is not None else {}
+
+        self._ds: Optional[xr.Dataset] = None
+        self._time_chunk_size = 12
+
+    @classmethod
+    def from_data(
+        cls,
+        config: Dict[str, Any],
+        interim_files: List[Path],
+        ds: xr.Dataset,
+        time_chunk_size: int = 12,
+    ) -> "EngineerManifest":
+        """The manifest of the interim files (their modification time and size,
+        which are cheap to compare) and of the data. The data is only hashed
+        when the `time_hashes` are needed
+        """
+        file_states = {
+            str(file): [file.stat().st_mtime, file.stat().st_size]
+            for file in interim_files
+        }
+        manifest = cls(config, file_states)
+        manifest._ds = ds
+        manifest._time_chunk_size = time_chunk_size
+        return manifest
+
+    @property
+    def time_hashes(self) -> Dict[str, str]:
+        if self._time_hashes is None:
+            assert self._ds is not None, "No data to hash the timesteps of"
+            self._time_hashes = self._hash_times(self._ds, self._time_chunk_size)
+            self._ds = None
+        return self._time_hashes
+
+    @staticmethod
+    def _hash_times(ds: xr.Dataset, time_chunk_size: int) -> Dict[str, str]:
+        # the data is hashed a chunk of timesteps at a time, so that it
+        # doesn't need to be loaded into memory all at once
+        hashes = [hashlib.md5() for _ in range(ds.time.size)]
+        for var in sorted(ds.data_vars):
+            da = ds[var].transpose("time", *[d for d in ds[var].dims if d != "time"])
+            for start in range(0, ds.time.size, time_chunk_size):
+                chunk = da.isel(time=slice(start, start + time_chunk_size)).values
+                for idx, values in enumerate(chunk):
+                    hashes[start + idx].update(var.encode())
+                    hashes[start + idx].update(np.ascontiguousarray(values).tobytes())
+
+        return {
+            str(time): md5.hexdigest()
+            for time, md5 in zip(ds.time.values.astype("datetime64[ns]"), hashes)
+        }
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["EngineerManifest"]:
+        if not path.exists():
+            return None
+        with path.open("r") as f:
+            return cls(**json.load(f))
+
+    def save(self, path: Path) -> None:
+        with path.open("w") as f:
+            json.dump(
+                {
+                    "config": self.config,
+                    "interim_files": self.interim_files,
+                    "time_hashes": self.time_hashes,
+                    "target_months": self.target_months,
+                },
+                f,
+            )
+
+    def stale_times(self, previous: "EngineerManifest") -> np.ndarray:
+        """The (sorted) timesteps which were added, changed or removed since
+        the `previous` manifest was written
+        """
+        stale = [
+            time
+            for time, time_hash in self.time_hashes.items()
+            if previous.time_hashes.get(time) != time_hash
+        ]
+        stale.extend(
+            time for time in previous.time_hashes if time not in self.time_hashes
+        )
+        return np.sort(np.array(stale, dtype="datetime64[ns]"))
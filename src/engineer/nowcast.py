@@ -1,11 +1,9 @@
 import numpy as np
-import calendar
 from datetime import date
 import xarray as xr
 
 from typing import cast, Dict, Optional, Tuple
 
-from ..utils import minus_months
 from .base import _EngineerBase
 
 
@@ -53,11 +51,9 @@ class _NowcastEngineer(_EngineerBase):
         print(f"Generating data for year: {year}, target month: {target_month}")
 
         # get the test datetime
-        max_date = date(year, target_month, calendar.monthrange(year, target_month)[-1])
-        mx_year, mx_month, max_train_date = minus_months(
-            year, target_month, diff_months=1
+        min_date, max_train_date, max_date = self._get_target_dates(
+            year, target_month, pred_months
         )
-        _, _, min_date = minus_months(mx_year, mx_month, diff_months=pred_months)
 
         # convert to numpy datetime
         min_date_np = np.datetime64(str(min_date))
@@ -133,3 +129,29 @@ class _NowcastEngineer(_EngineerBase):
             return None, cast(date, max_train_date)
 
         return {"x": x_dataset, "y": y_dataset}, cast(date, max_train_date)
+
+    @staticmethod
+    def _window_to_xy(
+        ds: xr.Dataset, x_start: int, target_variable: str, expected_length: int
+    ) -> Dict[str, xr.Dataset]:
+        y_idx = x_start + expected_length
+
+        y_dataset = (
+            ds[target_variable]
+            .isel(time=slice(y_idx, y_idx + 1))
+            .to_dataset(name=target_variable)
+        )
+        x_dataset = ds.drop(target_variable).isel(time=slice(x_start, y_idx + 1))
+
+        # the target variable at the target time is all -9999.0. Unlike the other
+        # variables, this is a copy since the values are modified
+        x_target = (
+            ds[target_variable]
+            .isel(time=slice(x_start, y_idx + 1))
+            .load()
+            .copy(deep=True)
+        )
+        x_target[{"time": -1}] = -9999.0
+        x_dataset[target_variable] = x_target
+
+        return {"x": x_dataset, "y": y_dataset}
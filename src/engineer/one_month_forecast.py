@@ -1,12 +1,10 @@
 import numpy as np
-import calendar
 from datetime import date
 import xarray as xr
 import warnings
 
 from typing import cast, Dict, Optional, Tuple
 
-from ..utils import minus_months
 from .base import _EngineerBase
 
 
@@ -30,11 +28,10 @@ class _OneMonthForecastEngineer(_EngineerBase):
 
         print(f"Generating data for year: {year}, target month: {target_month}")
 
-        max_date = date(year, target_month, calendar.monthrange(year, target_month)[-1])
-        mx_year, mx_month, max_train_date = minus_months(
-            year, target_month, diff_months=1
+        target_dates = _OneMonthForecastEngineer._get_target_dates(
+            year, target_month, pred_months
         )
-        _, _, min_date = minus_months(mx_year, mx_month, diff_months=pred_months)
+        min_date, max_train_date, max_date = target_dates
 
         # `max_date` is the date to be predicted;
         # `max_train_date` is one timestep before;
@@ -76,3 +73,17 @@ class _OneMonthForecastEngineer(_EngineerBase):
             return None, cast(date, max_train_date)
 
         return {"x": x_dataset, "y": y_dataset}, cast(date, max_train_date)
+
+    @staticmethod
+    def _window_to_xy(
+        ds: xr.Dataset, x_start: int, target_variable: str, expected_length: int
+    ) -> Dict[str, xr.Dataset]:
+        y_idx = x_start + expected_length
+
+        x_dataset = ds.isel(time=slice(x_start, y_idx))
+        y_dataset = (
+            ds[target_variable]
+            .isel(time=slice(y_idx, y_idx + 1))
+            .to_dataset(name=target_variable)
+        )
+        return {"x": x_dataset, "y": y_dataset}
@@ -0,0 +1,147 @@
+import numpy as np
+import xarray as xr
+import warnings
+
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class RunningStatistics:
+    r"""NaN-aware mean, standard deviation, minimum, maximum and count, which are
+    updated one chunk of values at a time (using Welford's algorithm) so that the
+    values never need to be held in memory at once.
+
+    Partial statistics (e.g. of different chunks, or of data which arrives later)
+    can be merged with `merge`.
+
+    :param shape: The shape of the statistics. `()` (the default) calculates a single
+        value, e.g. `(lat, lon)` calculates a value per pixel
+    """
+
+    def __init__(self, shape: Tuple[int, ...] = ()) -> None:
+        self.count = np.zeros(shape, dtype=np.int64)
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self._min = np.full(shape, np.inf)
+        self._max = np.full(shape, -np.inf)
+
+    @property
+    def mean(self) -> np.ndarray:
+        return np.where(self.count > 0, self._mean, np.nan)
+
+    @property
+    def var(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 0, self._m2 / self.count, np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.var)
+
+    @property
+    def min(self) -> np.ndarray:
+        return np.where(self.count > 0, self._min, np.nan)
+
+    @property
+    def max(self) -> np.ndarray:
+        return np.where(self.count > 0, self._max, np.nan)
+
+    def update(
+        self, values: np.ndarray, axis: Optional[Union[int, Tuple[int, ...]]] = None
+    ) -> None:
+        """Add a chunk of values. These are reduced along `axis` (all axes if None),
+        so the remaining axes must have the same shape as the statistics
+        """
+        values = np.asarray(values, dtype=np.float64)
+
+        chunk = RunningStatistics()
+        chunk.count = (~np.isnan(values)).sum(axis=axis)
+        with warnings.catch_warnings():
+            # all NaN slices return NaN, which are handled below
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mean = np.nanmean(values, axis=axis, keepdims=True)
+            chunk._min = np.nanmin(values, axis=axis)
+            chunk._max = np.nanmax(values, axis=axis)
+        chunk._m2 = np.nansum((values - mean) ** 2, axis=axis)
+        chunk._mean = np.squeeze(mean, axis=axis)
+
+        is_empty = chunk.count == 0
+        chunk._mean = np.where(is_empty, 0.0, chunk._mean)
+        chunk._min = np.where(is_empty, np.inf, chunk._min)
+        chunk._max = np.where(is_empty, -np.inf, chunk._max)
+
+        self.merge(chunk)
+
+    def merge(self, other: "RunningStatistics") -> None:
+        """Merge another set of statistics (with the same shape) into these ones
+        """
+        count = self.count + other.count
+        delta = other._mean - self._mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            other_fraction = np.where(count > 0, other.count / count, 0.0)
+
+        self._mean = self._mean + delta * other_fraction
+        self._m2 = self._m2 + other._m2 + (delta ** 2) * self.count * other_fraction
+        self._min = np.minimum(self._min, other._min)
+        self._max = np.maximum(self._max, other._max)
+        self.count = count
+
+    def total(self) -> "RunningStatistics":
+        """Merge all the values of these statistics into a single value,
+        e.g. to go from per-pixel to global statistics
+        """
+        total = RunningStatistics()
+        total.count = self.count.sum()
+        if total.count == 0:
+            return total
+
+        total._mean = (self.count * self._mean).sum() / total.count
+        total._m2 = (self._m2 + self.count * (self._mean - total._mean) ** 2).sum()
+        total._min = self._min.min()
+        total._max = self._max.max()
+        return total
+
+    def to_dict(self) -> Dict[str, float]:
+        """The (single valued) statistics, as saved in the normalizing dicts
+        """
+        assert self.count.shape == (), "Only single valued statistics can be saved"
+        return {
+            "mean": float(self.mean),
+            "std": float(self.std),
+            "min": float(self.min),
+            "max": float(self.max),
+            "count": int(self.count),
+        }
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, float]) -> "RunningStatistics":
+        """Recreate the statistics saved by `to_dict`, so that they can be updated
+        """
+        stats = cls()
+        stats.count = np.array(int(values["count"]))
+        if stats.count > 0:
+            stats._mean = np.array(values["mean"])
+            stats._m2 = np.array(values["std"] ** 2 * stats.count)
+            stats._min = np.array(values["min"])
+            stats._max = np.array(values["max"])
+        return stats
+
+
+def calculate_statistics(
+    da: xr.DataArray, dims: List[str], time_chunk_size: int = 12
+) -> RunningStatistics:
+    """Calculate the statistics of a DataArray along `dims`, reading (at most)
+    `time_chunk_size` timesteps into memory at a time
+    """
+    keep_dims = [dim for dim in da.dims if dim not in dims]
+    # the reduced dimensions first, so that they are the leading axes of each chunk
+    da = da.transpose(*dims, *keep_dims)
+    axis = tuple(range(len(dims)))
+
+    stats = RunningStatistics(shape=tuple(da.sizes[dim] for dim in keep_dims))
+    if "time" in da.dims:
+        for start in range(0, da.sizes["time"], time_chunk_size):
+            chunk = da.isel(time=slice(start, start + time_chunk_size))
+            stats.update(chunk.values, axis=axis)
+    else:
+        stats.update(da.values, axis=axis)
+    return stats
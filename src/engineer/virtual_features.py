@@ -0,0 +1,156 @@
+import json
+import numpy as np
+import xarray as xr
+from pathlib import Path
+
+from typing import Dict, List, Optional
+
+
+class VirtualFeatureWriter:
+    r"""Save the merged (interim) dataset once, with an index of the input windows
+    of every target month, instead of an `{x, y}.nc` pair per target month.
+
+    The folder contains:
+        cube.nc: the merged dataset, sorted by time
+        index.npz: for each target month ({year}_{month}), the split (`train` /
+            `test`) it belongs to, its target time, the index of the first input
+            timestep in the cube and the number of input timesteps
+        meta.json: the experiment and the target variable
+
+    Since the target month's timestep directly follows its input window, the
+    {x, y} datasets can be recreated from the cube by `VirtualFeatures`.
+
+    :param folder: The folder in which to write the cube and the index
+    :param cube: The merged dataset from which all the windows are taken
+    :param experiment: One of `{'one_month_forecast', 'nowcast'}`, which defines
+        how the {x, y} datasets are created from a window
+    """
+
+    def __init__(self, folder: Path, cube: xr.Dataset, experiment: str) -> None:
+        self.folder = folder
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.experiment = experiment
+
+        assert cube.indexes[
+            "time"
+        ].is_monotonic_increasing, "The cube must be sorted by time"
+        self.times = cube.time.values
+        cube.to_netcdf(folder / "cube.nc")
+
+        self.keys: List[str] = []
+        self.splits: List[str] = []
+        self.target_times: List[np.datetime64] = []
+        self.starts: List[int] = []
+        self.lengths: List[int] = []
+        self.y_var: Optional[str] = None
+
+    def append(
+        self, ds_dict: Dict[str, xr.Dataset], key: str, dataset_type: str
+    ) -> None:
+        x, y = ds_dict["x"], ds_dict["y"]
+        y_var = list(y.data_vars)[0]
+        if self.y_var is None:
+            self.y_var = y_var
+        assert y_var == self.y_var, f"Expected target {self.y_var}, got {y_var}"
+
+        start = int(np.searchsorted(self.times, x.time.values[0]))
+        target_idx = int(np.searchsorted(self.times, y.time.values[0]))
+        assert (
+            self.times[target_idx] == y.time.values[0]
+        ), f"The target time for {key} is not in the cube"
+
+        self.keys.append(key)
+        self.splits.append(dataset_type)
+        self.target_times.append(y.time.values[0])
+        self.starts.append(start)
+        self.lengths.append(target_idx - start)
+
+    def close(self) -> None:
+        np.savez(
+            self.folder / "index.npz",
+            keys=np.array(self.keys, dtype=str),
+            splits=np.array(self.splits, dtype=str),
+            target_times=np.array(self.target_times, dtype="datetime64[ns]"),
+            starts=np.array(self.starts, dtype=np.int64),
+            lengths=np.array(self.lengths, dtype=np.int64),
+        )
+        with (self.folder / "meta.json").open("w") as f:
+            json.dump({"experiment": self.experiment, "y_var": self.y_var}, f)
+
+
+class VirtualFeatures:
+    r"""Read the {x, y} datasets of one split from the cube and window index
+    written by the `VirtualFeatureWriter`.
+
+    The cube is opened lazily, so the datasets returned by `get` are (lazy) slices
+    of the cube, which are only read from disk when their values are used.
+
+    :param folder: The folder containing the cube and the index
+    :param dataset_type: One of `{'train', 'test'}`
+    """
+
+    def __init__(self, folder: Path, dataset_type: str) -> None:
+        assert (
+            folder / "meta.json"
+        ).exists(), f"{folder} does not contain virtual features. Has the engineer been run?"
+        self._open(folder, dataset_type)
+
+    def _open(self, folder: Path, dataset_type: str) -> None:
+        # imported here since the engineers import the writer
+        from .nowcast import _NowcastEngineer
+        from .one_month_forecast import _OneMonthForecastEngineer
+
+        self.folder = folder
+        self.dataset_type = dataset_type
+        with (folder / "meta.json").open("r") as f:
+            meta = json.load(f)
+        self.experiment: str = meta["experiment"]
+        self.y_var: str = meta["y_var"]
+
+        if self.experiment == "nowcast":
+            self._window_to_xy = _NowcastEngineer._window_to_xy
+        else:
+            self._window_to_xy = _OneMonthForecastEngineer._window_to_xy
+
+        index = np.load(folder / "index.npz")
+        in_split = index["splits"] == dataset_type
+        self._keys: List[str] = [str(key) for key in index["keys"][in_split]]
+        self.target_times: np.ndarray = index["target_times"][in_split]
+        self.starts: np.ndarray = index["starts"][in_split]
+        self.lengths: np.ndarray = index["lengths"][in_split]
+        self._key_to_idx = {key: idx for idx, key in enumerate(self._keys)}
+
+        self.cube = xr.open_dataset(folder / "cube.nc")
+
+    def __getstate__(self) -> Dict:
+        # reopen the cube (rather than copying it) when sent to another process
+        return {"folder": self.folder, "dataset_type": self.dataset_type}
+
+    def __setstate__(self, state: Dict) -> None:
+        self._open(state["folder"], state["dataset_type"])
+
+    @staticmethod
+    def read_keys(folder: Path, dataset_type: str) -> List[str]:
+        """The keys ({year}_{month}) of the target months in a split,
+        without opening the cube
+        """
+        index = np.load(folder / "index.npz")
+        return [str(key) for key in index["keys"][index["splits"] == dataset_type]]
+
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_to_idx
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: str) -> Dict[str, xr.Dataset]:
+        """Return the {x, y} datasets for a target month, as the engineer
+        would have saved them
+        """
+        idx = self._key_to_idx[key]
+        return self._window_to_xy(
+            self.cube, int(self.starts[idx]), self.y_var, int(self.lengths[idx])
+        )
@@ -1,9 +1,17 @@
 from pathlib import Path
 
-from typing import Optional
+from typing import Dict, List, Optional
 from ..utils import Region, get_kenya, region_lookup
+from .download import DownloadManager, DownloadTask
 
-__all__ = ["BaseExporter", "Region", "get_kenya", "region_lookup"]
+__all__ = [
+    "BaseExporter",
+    "DownloadManager",
+    "DownloadTask",
+    "Region",
+    "get_kenya",
+    "region_lookup",
+]
 
 
 class BaseExporter:
@@ -28,3 +36,29 @@ class BaseExporter:
             self.output_folder = self.raw_folder / self.dataset
             if not self.output_folder.exists():
                 self.output_folder.mkdir()
+
+    @property
+    def manifest_path(self) -> Path:
+        """The record of the files downloaded by this exporter"""
+        return self.raw_folder / f"{self.dataset}_download_manifest.json"
+
+    def download_files(
+        self,
+        tasks: List[DownloadTask],
+        max_workers: int = 8,
+        max_per_host: int = 2,
+        retries: int = 3,
+    ) -> Dict[str, List[str]]:
+        """Download the files with a `DownloadManager`, recording them in the
+        exporter's manifest. Files completed by an earlier export are skipped,
+        and partially downloaded files are resumed
+
+        :returns: A dictionary of the urls which were {"completed", "failed"}
+        """
+        manager = DownloadManager(
+            self.manifest_path,
+            max_workers=max_workers,
+            max_per_host=max_per_host,
+            retries=retries,
+        )
+        return manager.download(tasks)
@@ -1,15 +1,37 @@
 from pathlib import Path
+import math
+import threading
+import time
 import warnings
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
-import multiprocessing
 from datetime import datetime
-from typing import Dict, Optional, List, cast
+import numpy as np
+import xarray as xr
+from typing import Any, Dict, Optional, List, NamedTuple, Tuple
 
 from .base import BaseExporter, Region, region_lookup
 
 cdsapi = None
 
+# netCDF4 / HDF5 isn't thread safe, so the exporters' netcdf reads and writes
+# hold this lock
+netcdf_lock = threading.Lock()
+
+
+class CDSRequest(NamedTuple):
+    """One unit of work for the Climate Data Store, and the file it is saved to.
+    If the unit is too large to retrieve at once, its area is split into `tiles`,
+    which are retrieved separately and merged into the output file
+    """
+
+    dataset: str
+    selection_request: Dict
+    output_file: Path
+    size: int
+    tiles: Tuple[str, ...] = ()
+
 
 class CDSExporter(BaseExporter):
     """Exports for the Climate Data Store
@@ -17,6 +39,27 @@ class CDSExporter(BaseExporter):
     cds.climate.copernicus.eu
     """
 
+    # used to estimate the size of a request: the grid spacing (in degrees)
+    # of the dataset, and the number of ensemble members in each field
+    grid_resolution: float = 0.25
+    ensemble_members: int = 1
+    bytes_per_value: int = 4
+
+    # the selection request keys with one field per value
+    field_keys = [
+        "variable",
+        "product_type",
+        "pressure_level",
+        "year",
+        "month",
+        "day",
+        "time",
+        "leadtime_month",
+        "leadtime_hour",
+    ]
+    # the keys requests can be broken up by, in the order they are broken up
+    split_keys = ["variable", "year", "month"]
+
     def __init__(self, data_folder: Path = Path("data")) -> None:
         super().__init__(data_folder)
 
@@ -25,6 +68,8 @@ class CDSExporter(BaseExporter):
             import cdsapi
 
         self.client = cdsapi.Client()  # type: ignore
+        # one client per worker thread, when requests are retrieved in parallel
+        self._clients = threading.local()
 
     @staticmethod
     def _correct_input(value, key):
@@ -194,14 +239,269 @@ class CDSExporter(BaseExporter):
         if not output_file.exists():
 
             if not in_parallel:
-                self.client.retrieve(dataset, selection_request, str(output_file))
+                client = self.client
 
             else:  # in parallel create a new Client each time it's called
                 client = cdsapi.Client()  # type: ignore
-                client.retrieve(dataset, selection_request, str(output_file))
+            self._retrieve_to(client, dataset, selection_request, output_file)
 
         return output_file
 
+    @staticmethod
+    def _retrieve_to(
+        client: Any, dataset: str, selection_request: Dict, output_file: Path
+    ) -> None:
+        """Retrieve to a `.part` file, which is only moved to the output
+        file once it is complete
+        """
+        part_file = output_file.with_name(f"{output_file.name}.part")
+        client.retrieve(dataset, selection_request, str(part_file))
+        part_file.replace(output_file)
+
+    @staticmethod
+    def _parse_area(area: Optional[Any]) -> List[float]:
+        """[north, west, south, east] from an area string (or list)"""
+        if area is None:
+            return [90.0, -180.0, -90.0, 180.0]
+        if isinstance(area, str):
+            area = area.split("/")
+        return [float(x) for x in area]
+
+    def _num_points(self, start: float, end: float) -> int:
+        return int(round(abs(start - end) / self.grid_resolution)) + 1
+
+    def estimate_request_size(self, selection_request: Dict) -> int:
+        """Estimate the size (in bytes) of the data a selection request returns;
+        the number of fields it requests times the number of grid points in its area
+        """
+        num_fields = self.ensemble_members
+        for key in self.field_keys:
+            value = selection_request.get(key)
+            if isinstance(value, (list, tuple)):
+                num_fields *= len(value)
+
+        north, west, south, east = self._parse_area(selection_request.get("area"))
+        num_points = self._num_points(north, south) * self._num_points(west, east)
+        return num_fields * num_points * self.bytes_per_value
+
+    def _tile_area(self, area: Optional[Any], num_tiles: int) -> Tuple[str, ...]:
+        """Split an area into (at most) `num_tiles` bands of latitude, which
+        don't overlap on the grid of the dataset
+        """
+        north, west, south, east = self._parse_area(area)
+        num_rows = self._num_points(north, south)
+
+        tiles = []
+        for rows in np.array_split(np.arange(num_rows), min(num_tiles, num_rows)):
+            tile = [
+                north - rows[0] * self.grid_resolution,
+                west,
+                north - rows[-1] * self.grid_resolution,
+                east,
+            ]
+            tiles.append("/".join(["{:.3f}".format(x) for x in tile]))
+        return tuple(tiles)
+
+    def plan_requests(
+        self,
+        dataset: str,
+        selection_request: Dict,
+        break_up: Optional[List[str]] = None,
+        max_request_size: int = 2 ** 30,
+    ) -> List[CDSRequest]:
+        """Divide a selection request into units of work which can be
+        retrieved independently (and in parallel), each of which is
+        (estimated to be) at most `max_request_size` bytes.
+
+        The request is always broken up by the keys in `break_up`. Units which
+        are still too large are broken up by variable, then year, then month,
+        and finally (for netcdf requests) their area is split into tiles.
+        Units with the same filename are only planned once.
+
+        Parameters
+        ----------
+        dataset: str
+            The dataset to be exported
+        selection_request: dict
+            The (full) selection information to be passed to the CDS API
+        break_up: Optional[List[str]], default: None
+            The keys (from {'variable', 'year', 'month'}) to always break
+            the request up by
+        max_request_size: int, default: 2 ** 30 (1GB)
+            The maximum (estimated) size of a unit, in bytes
+
+        Returns
+        ----------
+        requests: List[CDSRequest]
+            The units of work, with the files they will be saved to
+        """
+        break_up = [] if break_up is None else break_up
+        assert all(
+            key in self.split_keys for key in break_up
+        ), f"Requests can only be broken up by {self.split_keys}. Got {break_up}"
+
+        units = [selection_request]
+        for key in self.split_keys:
+            split_units: List[Dict] = []
+            for unit in units:
+                values = unit.get(key)
+                if (
+                    isinstance(values, list)
+                    and (len(values) > 1)
+                    and (
+                        (key in break_up)
+                        or (self.estimate_request_size(unit) > max_request_size)
+                    )
+                ):
+                    split_units.extend({**unit, key: [value]} for value in values)
+                else:
+                    split_units.append(unit)
+            units = split_units
+
+        requests: Dict[Path, CDSRequest] = {}
+        for unit in units:
+            output_file = self.make_filename(dataset, unit)
+            if output_file in requests:
+                continue
+
+            size = self.estimate_request_size(unit)
+            tiles: Tuple[str, ...] = ()
+            if size > max_request_size:
+                if unit.get("format") == "netcdf":
+                    tiles = self._tile_area(
+                        unit.get("area"), math.ceil(size / max_request_size)
+                    )
+                else:
+                    warnings.warn(
+                        f"{output_file} is estimated to be {size} bytes, more than "
+                        f"{max_request_size}, but only netcdf requests can be tiled"
+                    )
+            requests[output_file] = CDSRequest(dataset, unit, output_file, size, tiles)
+
+        return list(requests.values())
+
+    def retrieve_requests(
+        self,
+        requests: List[CDSRequest],
+        n_parallel_requests: int = 1,
+        show_api_request: bool = False,
+        retries: int = 3,
+        backoff: float = 30.0,
+    ) -> List[Path]:
+        """Retrieve the requests which are not already on disk, using
+        `n_parallel_requests` workers (each with its own cdsapi.Client).
+
+        A failed retrieval is tried `retries` times, waiting `backoff` seconds
+        before the first retry and doubling the wait before each one after.
+        Retrievals are only moved to their output files once they are complete,
+        so an interrupted export is restarted by running it again.
+
+        Only the retrievals run in the workers. The tiles of the requests which
+        are split into tiles are merged afterwards, in the calling thread.
+
+        Returns
+        ----------
+        output_files: List[Path]
+            The output files of the requests which have been retrieved (by this
+            export, or an earlier one)
+        """
+        to_retrieve = [r for r in requests if not r.output_file.exists()]
+        print(f"Retrieving {len(to_retrieve)} of {len(requests)} requests")
+
+        def retrieve(request: CDSRequest) -> bool:
+            if show_api_request:
+                self._print_api_request(
+                    request.dataset, request.selection_request, request.output_file
+                )
+            return self._retrieve_with_retries(request, retries, backoff)
+
+        if n_parallel_requests > 1:
+            with ThreadPoolExecutor(max_workers=n_parallel_requests) as executor:
+                retrieved = list(executor.map(retrieve, to_retrieve))
+        else:
+            retrieved = [retrieve(request) for request in to_retrieve]
+
+        for idx, request in enumerate(to_retrieve):
+            if retrieved[idx] and (len(request.tiles) > 0):
+                try:
+                    self._merge_tiles(request)
+                except Exception as e:
+                    print(f"Failed to merge the tiles of {request.output_file}: {e}")
+                    retrieved[idx] = False
+
+        failed = [r.output_file for r, ok in zip(to_retrieve, retrieved) if not ok]
+        if len(failed) > 0:
+            warnings.warn(
+                f"{len(failed)} requests failed, and will be retried by the "
+                f"next export: {failed}"
+            )
+        return [r.output_file for r in requests if r.output_file.exists()]
+
+    def _get_client(self) -> Any:
+        """The exporter's client in the main thread, and one client per
+        worker thread otherwise
+        """
+        if threading.current_thread() is threading.main_thread():
+            return self.client
+        if getattr(self._clients, "client", None) is None:
+            self._clients.client = cdsapi.Client()  # type: ignore
+        return self._clients.client
+
+    def _retrieve_with_retries(
+        self, request: CDSRequest, retries: int, backoff: float
+    ) -> bool:
+        retries = max(1, retries)
+        for attempt in range(retries):
+            if attempt > 0:
+                time.sleep(backoff * 2 ** (attempt - 1))
+            try:
+                self._retrieve(request)
+                return True
+            except Exception as e:
+                print(
+                    f"Failed to retrieve {request.output_file} "
+                    f"(attempt {attempt + 1} of {retries}): {e}"
+                )
+        return False
+
+    def _retrieve(self, request: CDSRequest) -> None:
+        client = self._get_client()
+        if len(request.tiles) == 0:
+            self._retrieve_to(
+                client, request.dataset, request.selection_request, request.output_file
+            )
+            return
+
+        # the tiles are kept until they are merged (by `retrieve_requests`), so
+        # they aren't retrieved again if the export is restarted
+        for area, tile_file in zip(request.tiles, self._tile_files(request)):
+            if not tile_file.exists():
+                tile_request = {**request.selection_request, "area": area}
+                self._retrieve_to(client, request.dataset, tile_request, tile_file)
+
+    @staticmethod
+    def _tile_files(request: CDSRequest) -> List[Path]:
+        return [
+            request.output_file.with_name(f"{request.output_file.name}.tile{i}")
+            for i in range(len(request.tiles))
+        ]
+
+    @classmethod
+    def _merge_tiles(cls, request: CDSRequest) -> None:
+        """Merge the (retrieved) tiles of a request into its output file"""
+        tile_files = cls._tile_files(request)
+        part_file = request.output_file.with_name(f"{request.output_file.name}.part")
+        with netcdf_lock:
+            tiles = [xr.open_dataset(tile_file) for tile_file in tile_files]
+            try:
+                xr.combine_by_coords(tiles).to_netcdf(part_file)
+            finally:
+                for tile in tiles:
+                    tile.close()
+        part_file.replace(request.output_file)
+        for tile_file in tile_files:
+            tile_file.unlink()
+
 
 class ERA5Exporter(CDSExporter):
     """Exports ERA5 data from the Climate Data Store
@@ -316,6 +616,7 @@ class ERA5Exporter(CDSExporter):
         break_up: bool = False,
         n_parallel_requests: int = 1,
         region_str: str = "kenya",
+        max_request_size: int = 2 ** 30,
     ) -> List[Path]:
         """ Export functionality to prepare the API request and to send it to
         the cdsapi.client() object.
@@ -335,13 +636,16 @@ class ERA5Exporter(CDSExporter):
             Selection request arguments to be merged with the defaults. If both a key is
             defined in both the selection_request and the defaults, the value in the
             selection_request takes precedence.
-        break_up: bool, default = True
+        break_up: bool, default = False
             The best way to download the data is by making many small calls to the CDS
-            API. If true, the calls will be broken up into months
-        parallel: bool, default = True
-            Whether to download data in parallel
+            API. If true, the calls will be broken up into years
         n_parallel_requests:
             How many parallel requests to the CDSAPI to make
+        region_str: str, default = 'kenya'
+            The region to download data for
+        max_request_size: int, default = 2 ** 30 (1GB)
+            Calls estimated to be larger than this (in bytes) are broken up further
+            (by month, and then into area tiles)
 
         Returns:
         -------
@@ -357,34 +661,11 @@ class ERA5Exporter(CDSExporter):
         if dataset is None:
             dataset = self.get_dataset(variable, granularity)
 
-        if n_parallel_requests < 1:
-            n_parallel_requests = 1
-
-        # break up by year
-        if break_up:
-            if n_parallel_requests > 1:  # Run in parallel
-                p = multiprocessing.Pool(int(n_parallel_requests))
-
-            output_paths = []
-            for year in processed_selection_request["year"]:
-                updated_request = processed_selection_request.copy()
-                updated_request["year"] = [year]
-
-                if n_parallel_requests > 1:  # Run in parallel
-                    # multiprocessing of the paths
-                    output_paths.append(
-                        p.apply_async(
-                            self._export,
-                            args=(dataset, updated_request, show_api_request, True),
-                        )
-                    )
-                else:  # run sequentially
-                    output_paths.append(  # type: ignore
-                        self._export(dataset, updated_request, show_api_request)
-                    )
-            if n_parallel_requests > 1:
-                p.close()
-                p.join()
-            return cast(List[Path], output_paths)
-
-        return [self._export(dataset, processed_selection_request, show_api_request)]
+        # break up by year, and then as required by the size of the requests
+        requests = self.plan_requests(
+            dataset,
+            processed_selection_request,
+            break_up=["variable", "year"] if break_up else None,
+            max_request_size=max_request_size,
+        )
+        return self.retrieve_requests(requests, n_parallel_requests, show_api_request)
@@ -1,9 +1,7 @@
 import urllib.request
-import os
 import warnings
-import multiprocessing
 from pathlib import Path
-from .base import BaseExporter
+from .base import BaseExporter, DownloadTask
 
 from typing import List, Optional
 
@@ -72,20 +70,15 @@ class CHIRPSExporter(BaseExporter):
         return chirpsfiles
 
     def wget_file(self, filepath: str) -> None:
-        """
-        https://explainshell.com/explain?cmd=wget+-np+-nH+--cut
-        -dirs+7+www.google.come+-P+folder
-        """
+        """Download a single file (by its url) to the region folder"""
         assert (
             self.region_folder is not None
         ), f"A region folder must be defined and made"
-        if (self.region_folder / filepath).exists():
+        filename = filepath.split("/")[-1]
+        if (self.region_folder / filename).exists():
             print(f"{filepath} already exists! Skipping")
         else:
-            os.system(
-                f"wget -np -nH --cut-dirs 7 {filepath} \
-                -P {self.region_folder.as_posix()}"
-            )
+            self.download_files([DownloadTask(filepath, self.region_folder / filename)])
 
     def download_chirps_files(
         self,
@@ -94,20 +87,26 @@ class CHIRPSExporter(BaseExporter):
         period: str = "monthly",
         n_parallel_processes: int = 1,
     ) -> None:
-        """ download the chirps files using wget """
-        n_parallel_processes = min(1, n_parallel_processes)
+        """download the chirps files (concurrently, if n_parallel_processes > 1),
+        resuming any partially downloaded files
+        """
+        assert (
+            self.region_folder is not None
+        ), "A region folder must be defined and made"
+        n_parallel_processes = max(1, n_parallel_processes)
 
         # build the base url
         url = self.get_url(region, period)
-
-        filepaths = [url + f for f in chirps_files]
-
-        if n_parallel_processes > 1:
-            pool = multiprocessing.Pool(processes=n_parallel_processes)
-            pool.map(self.wget_file, filepaths)
-        else:
-            for file in filepaths:
-                self.wget_file(file)
+        tasks = [DownloadTask(url + f, self.region_folder / f) for f in chirps_files]
+
+        outputs = self.download_files(
+            tasks, max_workers=n_parallel_processes, max_per_host=n_parallel_processes
+        )
+        if len(outputs["failed"]) > 0:
+            warnings.warn(
+                f"{len(outputs['failed'])} files failed to download. They are "
+                f"listed in {self.manifest_path}, and will be retried by the next export"
+            )
 
     def export(
         self,
@@ -127,7 +126,7 @@ class CHIRPSExporter(BaseExporter):
         period: str {'monthly', 'weekly', 'pentad'...}
             The period of the data being downloaded
         n_parallel_processes: int, default = 1
-            Whether to n_parallel_processesize the downloading of data
+            The number of files to download at the same time
         """
 
         if years is not None:
@@ -0,0 +1,394 @@
+import ftplib
+import hashlib
+import http.client
+import json
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class DownloadTask(NamedTuple):
+    """A file to download. If the `size` (in bytes) or the `md5` checksum are
+    known, the downloaded file is verified against them
+    """
+
+    url: str
+    path: Path
+    size: Optional[int] = None
+    md5: Optional[str] = None
+
+
+class DownloadManifest:
+    """A persistent record of the status of every download, so that an export
+    which stopped can restart where it stopped.
+
+    The manifest is a json file of {path: {"status": str, "url": str, ...}}, where
+    the status is one of {"pending", "completed", "failed"}. Status changes are
+    appended to a json lines log next to it (`{name}.log`), so that each change
+    is one small write instead of a rewrite of the whole manifest. The log is
+    compacted into the json file (atomically) when the manifest is loaded, and
+    by `compact`.
+    """
+
+    statuses = ["pending", "completed", "failed"]
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.log_path = path.with_name(f"{path.name}.log")
+        self._lock = threading.Lock()
+
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with self.path.open("r") as f:
+                self.entries = json.load(f)
+        if self.log_path.exists():
+            with self.log_path.open("r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # the last line of an interrupted write
+                        continue
+                    self._apply(**record)
+            self.compact()
+
+    def status(self, path: Path) -> Optional[str]:
+        entry = self.entries.get(str(path))
+        return None if entry is None else entry["status"]
+
+    def update(self, path: Path, status: str, **info: Any) -> None:
+        self.update_many(status, {path: info})
+
+    def update_many(self, status: str, infos: Dict[Path, Dict[str, Any]]) -> None:
+        """Set the status (and info) of many paths, with one write"""
+        assert status in self.statuses, f"status must be one of {self.statuses}"
+        if len(infos) == 0:
+            return
+        records = [
+            {"path": str(path), "status": status, **info}
+            for path, info in infos.items()
+        ]
+        with self._lock:
+            for record in records:
+                self._apply(**record)
+            self._append(records)
+
+    def _apply(self, path: str, status: str, **info: Any) -> None:
+        entry = self.entries.setdefault(path, {})
+        entry.update(status=status, **info)
+        if status != "failed":
+            entry.pop("error", None)
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.log_path.open("a") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def compact(self) -> None:
+        """Rewrite the manifest with the logged changes, and remove the log"""
+        with self._lock:
+            self._save()
+            if self.log_path.exists():
+                self.log_path.unlink()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with tmp_path.open("w") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        tmp_path.replace(self.path)
+
+    def paths(self, status: str) -> List[str]:
+        return [
+            path for path, entry in self.entries.items() if entry["status"] == status
+        ]
+
+    @property
+    def completed(self) -> List[str]:
+        return self.paths("completed")
+
+    @property
+    def failed(self) -> List[str]:
+        return self.paths("failed")
+
+    @property
+    def pending(self) -> List[str]:
+        return self.paths("pending")
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadManager:
+    """Download files over FTP or HTTP(S) concurrently, with a bounded number
+    of downloads from each host.
+
+    Each download is written to a `.part` file next to its final path, and is
+    resumed from the end of that file (with a byte range, or an FTP `REST`)
+    if it was interrupted. Completed downloads are verified against their
+    expected size (from the task, or as reported by the server) and checksum,
+    and recorded in the manifest, so they are skipped without contacting the
+    server when the export is run again.
+
+    Connections to each host are pooled, and reused by the downloads from that
+    host.
+
+    :param manifest_path: The json file to record the status of every download in
+    :param max_workers: The number of downloads to run at the same time
+    :param max_per_host: The number of downloads to run at the same time from
+        any one host
+    :param retries: The number of times to try each download
+    :param timeout: The socket timeout (in seconds) of every connection
+    :param block_size: The number of bytes to read at a time
+    """
+
+    def __init__(
+        self,
+        manifest_path: Path,
+        max_workers: int = 8,
+        max_per_host: int = 2,
+        retries: int = 3,
+        timeout: float = 60,
+        block_size: int = 2 ** 16,
+    ) -> None:
+        self.manifest = DownloadManifest(manifest_path)
+        self.max_workers = max(1, max_workers)
+        self.max_per_host = max(1, max_per_host)
+        self.retries = max(1, retries)
+        self.timeout = timeout
+        self.block_size = block_size
+
+        self._lock = threading.Lock()
+        self._host_limits: Dict[Tuple[str, str], threading.BoundedSemaphore] = {}
+        self._idle: Dict[Tuple[str, str], List[Any]] = defaultdict(list)
+
+    def download(self, tasks: List[DownloadTask]) -> Dict[str, List[str]]:
+        """Download every task which is not already completed.
+
+        :returns: A dictionary of the urls of the tasks which were
+            {"completed", "failed"}
+        """
+        to_download, downloaded_before = [], {}
+        for task in tasks:
+            status = self.manifest.status(task.path)
+            if task.path.exists() and (status in [None, "completed"]):
+                # downloaded before, possibly before there was a manifest
+                if status is None:
+                    downloaded_before[task.path] = {"url": task.url}
+                continue
+            to_download.append(task)
+        self.manifest.update_many("completed", downloaded_before)
+        self.manifest.update_many(
+            "pending", {task.path: {"url": task.url} for task in to_download}
+        )
+
+        print(f"Downloading {len(to_download)} of {len(tasks)} files")
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(self._download_with_retries, to_download))
+        finally:
+            self.close()
+            self.manifest.compact()
+
+        return {
+            status: [
+                task.url for task in tasks if self.manifest.status(task.path) == status
+            ]
+            for status in ["completed", "failed"]
+        }
+
+    def close(self) -> None:
+        """Close all the pooled connections"""
+        with self._lock:
+            idle, self._idle = self._idle, defaultdict(list)
+        for (scheme, _), connections in idle.items():
+            for connection in connections:
+                self._close_connection(scheme, connection)
+
+    def _download_with_retries(self, task: DownloadTask) -> None:
+        url = urlparse(task.url)
+        error: Optional[Exception] = None
+        with self._host_limit(url.scheme, url.netloc):
+            for _ in range(self.retries):
+                try:
+                    size = self._download(task)
+                    self.manifest.update(
+                        task.path, "completed", url=task.url, size=size
+                    )
+                    print(f"Downloaded {task.path.name}")
+                    return
+                except Exception as e:
+                    error = e
+        print(f"Failed to download {task.url}: {error}")
+        self.manifest.update(task.path, "failed", url=task.url, error=repr(error))
+
+    def _download(self, task: DownloadTask) -> int:
+        """Download (or resume downloading) the task to its `.part` file, verify it
+        and move it to the task's path
+
+        :returns: The size of the downloaded file
+        """
+        task.path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = task.path.with_name(f"{task.path.name}.part")
+
+        url = urlparse(task.url)
+        if url.scheme == "ftp":
+            expected_size = self._download_ftp(url.netloc, url.path, part_path)
+        elif url.scheme in ["http", "https"]:
+            path = url.path if url.query == "" else f"{url.path}?{url.query}"
+            expected_size = self._download_http(url.scheme, url.netloc, path, part_path)
+        else:
+            assert False, f"Only ftp and http(s) urls can be downloaded. Got {task.url}"
+
+        if task.size is not None:
+            expected_size = task.size
+        size = part_path.stat().st_size
+        if (expected_size is not None) and (size != expected_size):
+            if size > expected_size:
+                # the partial file can't be resumed
+                part_path.unlink()
+            raise DownloadError(f"Expected {expected_size} bytes, got {size}")
+
+        if (task.md5 is not None) and (_md5(part_path) != task.md5):
+            part_path.unlink()
+            raise DownloadError(f"The md5 checksum of {task.url} does not match")
+
+        part_path.replace(task.path)
+        return size
+
+    def _download_ftp(self, host: str, path: str, part_path: Path) -> Optional[int]:
+        with self._connection("ftp", host) as ftp:
+            ftp.voidcmd("TYPE I")
+            try:
+                size: Optional[int] = ftp.size(path)
+            except ftplib.error_perm:
+                # the server doesn't support SIZE
+                size = None
+
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            if (size is not None) and (offset >= size):
+                return size
+
+            with part_path.open("ab" if offset > 0 else "wb") as f:
+                ftp.retrbinary(
+                    f"RETR {path}",
+                    f.write,
+                    blocksize=self.block_size,
+                    rest=offset if offset > 0 else None,
+                )
+        return size
+
+    def _download_http(
+        self, scheme: str, host: str, path: str, part_path: Path
+    ) -> Optional[int]:
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset > 0 else {}
+
+        with self._connection(scheme, host) as connection:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+
+            if response.status == 416:
+                # the range starts at the end of the file, which is complete
+                response.read()
+                return offset
+            if response.status not in [200, 206]:
+                response.read()
+                raise DownloadError(
+                    f"{scheme}://{host}{path} returned {response.status} "
+                    f"{response.reason}"
+                )
+
+            size: Optional[int] = None
+            if response.status == 206:
+                # Content-Range: bytes {start}-{end}/{size}
+                content_range = response.getheader("Content-Range", "")
+                start, _, total = content_range.replace("bytes ", "").partition("/")
+                assert int(start.split("-")[0]) == offset, "Unexpected byte range"
+                size = None if total in ["", "*"] else int(total)
+                mode = "ab"
+            else:
+                # the server sent the whole file
+                length = response.getheader("Content-Length")
+                size = None if length is None else int(length)
+                mode = "wb"
+
+            with part_path.open(mode) as f:
+                while True:
+                    block = response.read(self.block_size)
+                    if not block:
+                        break
+                    f.write(block)
+
+            if response.will_close:
+                connection.close()
+        return size
+
+    @contextmanager
+    def _host_limit(self, scheme: str, host: str) -> Iterator[None]:
+        with self._lock:
+            if (scheme, host) not in self._host_limits:
+                self._host_limits[(scheme, host)] = threading.BoundedSemaphore(
+                    self.max_per_host
+                )
+            limit = self._host_limits[(scheme, host)]
+        with limit:
+            yield
+
+    @contextmanager
+    def _connection(self, scheme: str, host: str) -> Iterator[Any]:
+        """Use a pooled connection to the host, or open a new one. The connection
+        is returned to the pool if it was used successfully
+        """
+        with self._lock:
+            idle = self._idle[(scheme, host)]
+            connection = idle.pop() if len(idle) > 0 else None
+        if connection is None:
+            connection = self._connect(scheme, host)
+
+        try:
+            yield connection
+        except BaseException:
+            self._close_connection(scheme, connection)
+            raise
+        with self._lock:
+            self._idle[(scheme, host)].append(connection)
+
+    def _connect(self, scheme: str, host: str) -> Any:
+        if scheme == "ftp":
+            ftp = ftplib.FTP(timeout=self.timeout)
+            hostname, _, port = host.partition(":")
+            ftp.connect(hostname, int(port) if port != "" else 21)
+            ftp.login()
+            return ftp
+        connection_class: Callable = (
+            http.client.HTTPSConnection
+            if scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return connection_class(host, timeout=self.timeout)
+
+    @staticmethod
+    def _close_connection(scheme: str, connection: Any) -> None:
+        try:
+            if scheme == "ftp":
+                connection.quit()
+            else:
+                connection.close()
+        except Exception:
+            if scheme == "ftp":
+                connection.close()
+
+
+def _md5(path: Path, block_size: int = 2 ** 20) -> str:
+    md5 = hashlib.md5()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            md5.update(block)
+    return md5.hexdigest()
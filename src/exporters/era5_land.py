@@ -1,8 +1,6 @@
 from pathlib import Path
-from typing import Optional, Dict, List, cast, Any
+from typing import Optional, Dict, List
 import warnings
-import multiprocessing
-import itertools
 
 from .cds import CDSExporter
 from .base import region_lookup
@@ -67,6 +65,13 @@ VALID_ERA5_LAND_VARS = [
 class ERA5LandExporter(CDSExporter):
     dataset = "reanalysis-era5-land-monthly-means"
     granularity = "monthly"
+    grid_resolution = 0.1
+
+    # the keys each value of `break_up` always breaks requests up by
+    break_up_keys = {
+        "yearly": ["variable", "year"],
+        "monthly": ["variable", "year", "month"],
+    }
 
     @staticmethod
     def print_valid_vars():
@@ -115,34 +120,6 @@ class ERA5LandExporter(CDSExporter):
                 ]
         return processed_selection_request
 
-    def _broken_export(
-        self,
-        updated_request: Dict,
-        dataset: str,
-        output_paths: List,
-        show_api_request: bool = True,
-        n_parallel_requests: int = 1,
-        pool: Optional[Any] = None,  #  multiprocessing
-    ) -> List:
-        if n_parallel_requests > 1:  # Run in parallel
-            assert pool is not None, (
-                "`p` argument (multiprocessing.Pool)"
-                " must be provided for n_parallel_requests > 1"
-            )
-            # multiprocessing of the paths
-            output_paths.append(
-                pool.apply_async(
-                    self._export,
-                    args=(dataset, updated_request, show_api_request, True),
-                )
-            )
-        else:  # run sequentially
-            output_paths.append(  # type: ignore
-                self._export(dataset, updated_request, show_api_request)
-            )
-
-        return output_paths
-
     def export(
         self,
         variable: str,
@@ -153,6 +130,7 @@ class ERA5LandExporter(CDSExporter):
         region_str: str = "kenya",
         dataset: Optional[str] = None,
         granularity: str = "monthly",
+        max_request_size: int = 2 ** 30,
     ) -> List[Path]:
         """ Export functionality to prepare the API request and to send it to
         the cdsapi.client() object.
@@ -170,10 +148,11 @@ class ERA5LandExporter(CDSExporter):
         break_up: str: {'yearly', 'monthly'}, default = 'yearly'
             The best way to download the data is by relatively large calls to the CDS
             API. If specified, the calls will be broken up by {'yearly', 'monthly'}
-        parallel: bool, default = True
-            Whether to download data in parallel
         n_parallel_requests:
             How many parallel requests to the CDSAPI to make
+        max_request_size: int, default = 2 ** 30 (1GB)
+            Calls estimated to be larger than this (in bytes) are broken up further
+            (by month, and then into area tiles)
 
         Returns:
         -------
@@ -197,67 +176,10 @@ class ERA5LandExporter(CDSExporter):
             variable, selection_request, granularity, region_str
         )
 
-        if n_parallel_requests < 1:
-            n_parallel_requests = 1
-
-        p: Optional[Any]  #  multiprocessing.Pool
-        if n_parallel_requests > 1:  # Run in parallel
-            p = multiprocessing.Pool(int(n_parallel_requests))
-        else:
-            p = None
-
-        # break up by month
-        if break_up == "monthly":
-            output_paths: List[Path] = []
-            for year, month in itertools.product(
-                processed_selection_request["year"],
-                processed_selection_request["month"],
-            ):
-                updated_request = processed_selection_request.copy()
-                updated_request["year"] = [year]
-                updated_request["month"] = [month]
-                output_paths = self._broken_export(
-                    updated_request=updated_request,
-                    dataset=dataset,
-                    output_paths=output_paths,
-                    show_api_request=show_api_request,
-                    n_parallel_requests=n_parallel_requests,
-                    pool=p,
-                )
-
-            if n_parallel_requests > 1:
-                assert p is not None
-                p.close()
-                p.join()
-            return cast(List[Path], output_paths)
-
-        if break_up == "yearly":
-            output_paths = []
-            for year in processed_selection_request["year"]:
-                updated_request = processed_selection_request.copy()
-                updated_request["year"] = [year]
-                try:
-                    output_paths = self._broken_export(
-                        updated_request=updated_request,
-                        dataset=dataset,
-                        output_paths=output_paths,
-                        show_api_request=show_api_request,
-                        n_parallel_requests=n_parallel_requests,
-                        pool=p,
-                    )
-                except KeyboardInterrupt:
-                    raise
-                except Exception as E:
-                    print(f"\n\n**{year} Failed **")
-                    print(E)
-                    print("\nRequest:")
-                    print(updated_request)
-                    print("\n\n")
-
-            if n_parallel_requests > 1:
-                assert p is not None
-                p.close()
-                p.join()
-            return cast(List[Path], output_paths)
-
-        return [self._export(dataset, processed_selection_request, show_api_request)]
+        requests = self.plan_requests(
+            dataset,
+            processed_selection_request,
+            break_up=None if break_up is None else self.break_up_keys[break_up],
+            max_request_size=max_request_size,
+        )
+        return self.retrieve_requests(requests, n_parallel_requests, show_api_request)
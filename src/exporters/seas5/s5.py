@@ -6,10 +6,12 @@ from .all_valid_s5 import datasets as dataset_reference
 from ..base import region_lookup
 from ..cds import CDSExporter
 
-pool = None
-
 
 class S5Exporter(CDSExporter):
+    grid_resolution = 1.0
+    # the forecasts have 51 members (25 for the hindcasts)
+    ensemble_members = 51
+
     def __init__(
         self,
         pressure_level: bool,
@@ -58,10 +60,6 @@ class S5Exporter(CDSExporter):
         """
         super().__init__(data_folder)
 
-        global pool
-        if pool is None:
-            from pathos.pools import _ThreadPool as pool
-
         # initialise attributes for this export
         self.pressure_level = pressure_level
         self.granularity = granularity
@@ -105,6 +103,7 @@ class S5Exporter(CDSExporter):
         show_api_request: bool = True,
         break_up: bool = True,
         region_str: str = "kenya",
+        max_request_size: int = 2 ** 30,
     ) -> List[Path]:
         """
         Arguments
@@ -140,18 +139,19 @@ class S5Exporter(CDSExporter):
             do you want to print the api request to view it?
 
         break_up: bool - default: True
-            whether to break up requests into parallel
+            whether to break up requests by initialisation month. Otherwise, requests
+            are broken up by year
+
+        max_request_size: int, default = 2 ** 30 (1GB)
+            requests estimated to be larger than this (in bytes) are broken up further
 
         Note:
         ----
         - All parameters that are assigned to class attributes are fixed for one download
         - these are required to initialise the object [granularity, pressure_level]
-        - Only time will be chunked (by months) to send separate calls to the cdsapi
+        - Only time will be chunked (by years or months) to send separate calls
+         to the cdsapi
         """
-        # n_parallel_requests can only be a MINIMUM of 1
-        if n_parallel_requests < 1:
-            n_parallel_requests = 1
-
         # max_leadtime defaults
         if max_leadtime is None:
             # set the max_leadtime to 3 months as default
@@ -177,59 +177,15 @@ class S5Exporter(CDSExporter):
             if pressure_levels_dict is not None:
                 processed_selection_request.update(cast(Dict, pressure_levels_dict))
 
-        if n_parallel_requests > 1:  # Run in parallel
-            # p = multiprocessing.Pool(int(n_parallel_requests))
-            p = pool(int(n_parallel_requests))  # type: ignore
-
-        output_paths = []
-        if break_up:
-            # SPLIT THE API CALLS INTO YEARS (speed up downloads)
-            for year in processed_selection_request["year"]:
-                updated_request = processed_selection_request.copy()
-                updated_request["year"] = [year]
-
-                if n_parallel_requests > 1:  # Run in parallel
-                    # multiprocessing of the paths
-                    in_parallel = True
-                    output_paths.append(
-                        p.apply_async(
-                            self._export,
-                            args=(
-                                self.dataset,
-                                updated_request,
-                                show_api_request,
-                                in_parallel,
-                            ),
-                        )
-                    )
-
-                else:  # run sequentially
-                    in_parallel = False
-                    output_paths.append(
-                        self._export(
-                            self.dataset, updated_request, show_api_request, in_parallel
-                        )
-                    )
-
-            # close the multiprocessing pool
-            if n_parallel_requests > 1:
-                p.close()
-                p.join()
-
-        else:  # don't split by month
-            for year in processed_selection_request["year"]:
-                updated_request = processed_selection_request.copy()
-                updated_request["year"] = [year]
-                output_paths.append(
-                    self._export(
-                        self.dataset,
-                        updated_request,
-                        show_api_request,
-                        in_parallel=False,
-                    )
-                )
-
-        return output_paths
+        # one request per initialisation month (or per year)
+        break_up_keys = ["variable", "year"] + (["month"] if break_up else [])
+        requests = self.plan_requests(
+            self.dataset,
+            processed_selection_request,
+            break_up=break_up_keys,
+            max_request_size=max_request_size,
+        )
+        return self.retrieve_requests(requests, n_parallel_requests, show_api_request)
 
     @staticmethod
     def get_s5_initialisation_times(
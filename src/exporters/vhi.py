@@ -1,16 +1,13 @@
 from pathlib import Path
-from typing import List, Tuple, Generator, Dict, Optional
+from typing import List, Tuple, Generator, Optional
 import ftplib
 from pprint import pprint
-from functools import partial
 import re
 import pickle
 import numpy as np
 import warnings
 
-from .base import BaseExporter
-
-Pool = None  # this requires the pathos libary
+from .base import BaseExporter, DownloadTask
 
 
 class VHIExporter(BaseExporter):
@@ -20,20 +17,15 @@ class VHIExporter(BaseExporter):
     """
 
     dataset = "vhi"
-
-    def __init___(self, data_folder: Path = Path("data")) -> None:
-        super().__init__(data_folder)
-
-        global Pool
-        if Pool is None:
-            from pathos.multiprocessing import ProcessingPool as Pool
+    host = "ftp.star.nesdis.noaa.gov"
+    ftp_folder = "/pub/corp/scsb/wguo/data/Blended_VH_4km/VH/"
 
     @staticmethod
     def get_ftp_filenames(years: Optional[List]) -> List:
         """  get the filenames containing VHI """
-        with ftplib.FTP("ftp.star.nesdis.noaa.gov") as ftp:
+        with ftplib.FTP(VHIExporter.host) as ftp:
             ftp.login()
-            ftp.cwd("/pub/corp/scsb/wguo/data/Blended_VH_4km/VH/")
+            ftp.cwd(VHIExporter.ftp_folder)
 
             # append the filenames to a list
             listing: List = []
@@ -60,50 +52,47 @@ class VHIExporter(BaseExporter):
             # Create an index range for l of n items:
             yield l[i : i + n]
 
-    def save_errors(self, outputs: List) -> None:
-        print("\nError: ", [errors for errors in outputs if errors is not None])
+    def save_errors(self, failed_files: List[str]) -> None:
+        print("\nError: ", failed_files)
 
         # save the filenames that failed to a pickle object
         with open(self.raw_folder / "vhi_export_errors.pkl", "wb") as f:
-            pickle.dump([error[-1] for error in outputs if error is not None], f)
+            pickle.dump(failed_files, f)
 
     def _run_export(self, vhi_files: List, n_parallel_processes: int = 100) -> List:
-
-        if n_parallel_processes > 1:
-            pool = Pool(processes=n_parallel_processes)  # type: ignore
-
-            # split the filenames into batches of 100
-            batches = [batch for batch in self.chunks(vhi_files, 100)]
-
-            # run in parallel for multiple file downloads
-            args = dict(raw_folder=self.raw_folder)
-            outputs = pool.map(partial(batch_ftp_request, args), batches)
-        else:
-            outputs = []
-            batches = []
-            for vhi_file in vhi_files:
-                try:
-                    batch_ftp_request(
-                        args={"raw_folder": self.raw_folder}, filenames=[vhi_file]
-                    )
-                    batches.append([vhi_file])
-                except Exception as e:
-                    outputs.append(e)
+        """Download the files from the ftp server, with up to `n_parallel_processes`
+        connections to the server at the same time. Each connection is reused for
+        many files, and partially downloaded files are resumed
+        """
+        n_parallel_processes = max(1, n_parallel_processes)
+        tasks = [
+            DownloadTask(
+                f"ftp://{self.host}{self.ftp_folder}{vhi_file}",
+                make_filename(self.raw_folder, vhi_file, dataset="vhi"),
+            )
+            for vhi_file in vhi_files
+        ]
+        outputs = self.download_files(
+            tasks, max_workers=n_parallel_processes, max_per_host=n_parallel_processes
+        )
+        failed_files = [url.split("/")[-1] for url in outputs["failed"]]
+        completed_files = [url.split("/")[-1] for url in outputs["completed"]]
 
         # write the output (TODO: turn into logging behaviour)
         print("\n\n*************************")
         print("VHI Data Downloaded")
         print("*************************")
         print("Errors:")
-        pprint([error for error in outputs if error is not None])
+        pprint(failed_files)
         print(
             "Errors saved in data/raw/vhi_export_errors.pkl. Extract using \
             VHIExporter.check_failures()"
         )
         # save errors
-        self.save_errors(outputs)
+        self.save_errors(failed_files)
 
-        return batches
+        # split the filenames into batches of 100
+        return [batch for batch in self.chunks(completed_files, 100)]
 
     def check_failures(self) -> List:
         """ Read the outputted list of errors to the user """
@@ -113,7 +102,7 @@ class VHIExporter(BaseExporter):
             f"Required to check the files that failed"
         )
 
-        with open(pickled_error_fname, "rb") as f:
+        with open(self.raw_folder / pickled_error_fname, "rb") as f:
             errors = pickle.load(f)
 
         return errors
@@ -172,8 +161,9 @@ class VHIExporter(BaseExporter):
             be downloaded
         repeats: int = 5
             The number of times to retry downloads which failed
-        n_parallel_processes: int = 100
-            The number of processes to run. If 1, the download happens serially
+        n_parallel_processes: int = 1
+            The number of files to download from the ftp server at the same time.
+            If 1, the download happens serially
         check_exists: bool = True
             Check whether the file has already been downloaded, if so skip it.
 
@@ -217,16 +207,19 @@ class VHIExporter(BaseExporter):
         # run the download steps in parallel
         batches = self._run_export(vhi_files, n_parallel_processes)
 
-        for _ in range(repeats):
-            missing_filepaths = self.get_missing_filepaths(vhi_files)
-            batches = self._run_export(missing_filepaths, n_parallel_processes)
-            print(f"**{_} of {repeats} VHI Downloads completed **")
+        for repeat in range(repeats):
+            # retry the files which failed
+            failed_files = self.check_failures()
+            if len(failed_files) == 0:
+                break
+            batches.extend(self._run_export(failed_files, n_parallel_processes))
+            print(f"**{repeat} of {repeats} VHI Downloads completed **")
 
         return batches
 
 
 # ------------------------------------------------------------------------------
-# Parallel functions
+# Helper functions
 # ------------------------------------------------------------------------------
 
 
@@ -268,36 +261,3 @@ def make_filename(raw_folder: Path, raw_filename: str, dataset: str = "vhi") ->
     filename = year_folder / raw_filename
 
     return filename
-
-
-def download_file_from_ftp(
-    ftp_instance: ftplib.FTP, filename: str, output_filename: Path
-) -> None:
-    # check if already exists
-    if output_filename.exists():
-        print(f"File already exists! {output_filename}")
-        return
-
-    # download to output_filename
-    with output_filename.open("wb") as out_f:
-        ftp_instance.retrbinary("RETR " + filename, out_f.write)
-
-    if output_filename.exists():
-        print(f"Successful Download! {output_filename}")
-    else:
-        print(f"Error Downloading file: {output_filename}")
-
-
-def batch_ftp_request(args: Dict, filenames: List) -> None:
-    # unpack multiple arguments
-    raw_folder = args["raw_folder"]
-
-    # create one FTP connection for each batch
-    with ftplib.FTP("ftp.star.nesdis.noaa.gov") as ftp:
-        ftp.login()
-        ftp.cwd("/pub/corp/scsb/wguo/data/Blended_VH_4km/VH/")
-
-        # download each filename using this FTP object
-        for raw_filename in filenames:
-            output_filename = make_filename(raw_folder, raw_filename, dataset="vhi")
-            download_file_from_ftp(ftp, raw_filename, output_filename)
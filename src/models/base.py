@@ -40,6 +40,9 @@ class ModelBase:
     predict_delta: bool = False
         Whether to model the CHANGE in target variable rather than the
         raw values
+    dataloader_kwargs: Optional[Dict[str, Any]] = None
+        Additional arguments passed to every DataLoader the model creates (e.g.
+        {'backend': 'store'} to read from the consolidated feature store)
     """
 
     model_name: str  # to be added by the model classes
@@ -62,6 +65,7 @@ class ModelBase:
         include_prev_y: bool = True,
         normalize_y: bool = False,
         clear_nans: bool = True,
+        dataloader_kwargs: Optional[Dict[str, Any]] = None,
     ) -> None:
 
         self.batch_size = batch_size
@@ -80,6 +84,9 @@ class ModelBase:
         self.include_prev_y = include_prev_y
         self.normalize_y = normalize_y
         self.clear_nans = clear_nans
+        self.dataloader_kwargs = (
+            dataloader_kwargs if dataloader_kwargs is not None else {}
+        )
         if normalize_y:
             with (data_folder / f"features/{experiment}/normalizing_dict.pkl").open(
                 "rb"
@@ -367,7 +374,7 @@ class ModelBase:
             "normalize_y": self.normalize_y,
         }
 
-        for key, val in kwargs.items():
+        for key, val in {**self.dataloader_kwargs, **kwargs}.items():
             # override the default args
             default_args[key] = val
 
@@ -1,19 +1,29 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from copy import copy
+from dataclasses import dataclass, replace
 from datetime import datetime
+import hashlib
 import numpy as np
 import pandas as pd
 from pandas import Timestamp
 from random import shuffle
 from pathlib import Path
 import pickle
+import shutil
+import tempfile
 import torch
 import xarray as xr
 import warnings
+import weakref
 
 from typing import cast, Dict, Optional, Union, List, Tuple
 
+from ..engineer.feature_store import FeatureStore
+from ..engineer.virtual_features import VirtualFeatures
+
 
 @dataclass
 class TrainData:
@@ -85,6 +95,18 @@ class ModelArrays:
         if self.latlons is not None:
             self.latlons = np.concatenate((self.latlons, x.latlons), axis=0)
 
+    def shallow_copy(self) -> ModelArrays:
+        """A copy which can be concatenated, filtered or tensorized without
+        changing the arrays of the original
+        """
+        return replace(self, x=replace(self.x))
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.y, self.latlons, self.historical_target, self.notnan_indices]
+        arrays.extend([self.nan_mask, *self.x.__dict__.values()])
+        return sum(val.nbytes for val in arrays if isinstance(val, np.ndarray))
+
     def to_xarray(self) -> Tuple[xr.Dataset, xr.Dataset, Optional[xr.Dataset]]:
         assert (
             self.latlons.shape[0] == self.x.historical.shape[0]  # type: ignore
@@ -214,6 +236,292 @@ def train_val_mask(
     return train_mask.tolist(), val_mask.tolist()
 
 
+_array_fields = ["y", "latlons", "historical_target", "notnan_indices", "nan_mask"]
+_train_data_fields = [
+    "historical",
+    "current",
+    "pred_months",
+    "latlons",
+    "yearly_aggs",
+    "static",
+    "prev_y_var",
+]
+_metadata_fields = [
+    "x_vars",
+    "y_var",
+    "target_time",
+    "historical_times",
+    "predict_delta",
+]
+
+
+def save_model_arrays(folder: Path, arrays: ModelArrays) -> None:
+    """Save a ModelArrays object to a folder, as one .npy file per array
+    (and a pickle file for everything else)
+    """
+    tmp_folder = folder.parent / f"{folder.name}.tmp"
+    tmp_folder.mkdir(parents=True, exist_ok=True)
+
+    metadata = {}
+    for prefix, obj, fields in [
+        ("", arrays, _array_fields),
+        ("x_", arrays.x, _train_data_fields),
+    ]:
+        for field in fields:
+            val = getattr(obj, field)
+            if isinstance(val, np.ndarray):
+                np.save(tmp_folder / f"{prefix}{field}.npy", val)
+            else:
+                metadata[f"{prefix}{field}"] = val
+    for field in _metadata_fields:
+        metadata[field] = getattr(arrays, field)
+
+    with (tmp_folder / "metadata.pkl").open("wb") as f:
+        pickle.dump(metadata, f)
+    # so that partially written folders are never read
+    tmp_folder.rename(folder)
+
+
+def load_model_arrays(folder: Path) -> ModelArrays:
+    """Load a ModelArrays object saved by `save_model_arrays`
+    """
+    with (folder / "metadata.pkl").open("rb") as f:
+        values = pickle.load(f)
+    for npy_file in folder.glob("*.npy"):
+        values[npy_file.stem] = np.load(npy_file)
+
+    train_data = TrainData(
+        **{field: values.pop(f"x_{field}") for field in _train_data_fields}
+    )
+    return ModelArrays(x=train_data, **values)
+
+
+class ModelArraysCache:
+    """A least-recently-used cache of the (processed) ModelArrays of each
+    {year}_{month} folder, so that the data only needs to be loaded and
+    processed in the first epoch.
+
+    Attributes:
+    ----------
+    max_bytes: int
+        The number of bytes of arrays to keep in memory. When this is exceeded,
+        the least recently used arrays are evicted
+    cache_dir: Optional[Path] = None
+        If not None, evicted arrays are saved here (as .npy files) instead of being
+        discarded, and reloaded from there when they are next requested
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: Optional[Path] = None) -> None:
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        if (cache_dir is not None) and (not cache_dir.exists()):
+            cache_dir.mkdir(parents=True)
+
+        self._arrays: OrderedDict = OrderedDict()
+        self._current_bytes = 0
+
+    @staticmethod
+    def config_hash(config: Dict) -> str:
+        """A hash of the loader configuration, so that arrays processed
+        with different configurations are not mixed up
+        """
+        return hashlib.md5(repr(sorted(config.items())).encode()).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        return (key in self._arrays) or (
+            (self.cache_dir is not None) and (self.cache_dir / key).exists()
+        )
+
+    def get(self, key: str) -> Optional[ModelArrays]:
+        if key in self._arrays:
+            self._arrays.move_to_end(key)
+            return self._arrays[key]
+        elif (self.cache_dir is not None) and (self.cache_dir / key).exists():
+            arrays = load_model_arrays(self.cache_dir / key)
+            self.put(key, arrays)
+            return arrays
+        return None
+
+    def put(self, key: str, arrays: ModelArrays) -> None:
+        if key in self._arrays:
+            self._current_bytes -= self._arrays.pop(key).nbytes
+        self._arrays[key] = arrays
+        self._current_bytes += arrays.nbytes
+
+        # never evict the arrays which were just added
+        while (self._current_bytes > self.max_bytes) and (len(self._arrays) > 1):
+            evicted_key, evicted_arrays = self._arrays.popitem(last=False)
+            self._current_bytes -= evicted_arrays.nbytes
+            if (self.cache_dir is not None) and (
+                not (self.cache_dir / evicted_key).exists()
+            ):
+                # the arrays are deterministic, so they don't need to be rewritten
+                save_model_arrays(self.cache_dir / evicted_key, evicted_arrays)
+
+    def clear(self) -> None:
+        self._arrays = OrderedDict()
+        self._current_bytes = 0
+        if self.cache_dir is not None:
+            for subfolder in self.cache_dir.iterdir():
+                shutil.rmtree(subfolder)
+
+
+class _Prefetcher:
+    """Convert the upcoming folders of an epoch to ModelArrays in a pool of
+    worker processes, ahead of the iterator which consumes them.
+
+    The workers hand the arrays back through files in a shared memory (tmpfs)
+    folder, which avoids pickling the arrays through the pool's pipes.
+
+    Attributes:
+    ----------
+    loader: DataLoader
+        The dataloader whose files are being prefetched
+    num_workers: int
+        The number of worker processes
+    prefetch_factor: int = 2
+        The number of folders each worker processes ahead of the iterator
+    """
+
+    def __init__(
+        self, loader: DataLoader, num_workers: int, prefetch_factor: int = 2
+    ) -> None:
+        assert num_workers > 0, f"num_workers must be positive, got {num_workers}"
+        assert (
+            prefetch_factor > 0
+        ), f"prefetch_factor must be positive, got {prefetch_factor}"
+
+        self.num_workers = num_workers
+        self.max_pending = num_workers * prefetch_factor
+        self.cache = loader.cache
+
+        # the workers don't need to cache, prefetch or shuffle anything themselves
+        worker_loader = copy(loader)
+        worker_loader.data_files = []
+        worker_loader.shuffle = False
+        worker_loader.cache = None
+        worker_loader.prefetcher = None
+        self._worker_loader = worker_loader
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tmp_dir: Optional[Path] = None
+        self._finalizer: Optional[weakref.finalize] = None
+
+        self._futures: Dict[str, Future] = {}
+        self._queue: List[Path] = []
+        self._num_submitted = 0
+
+    def _start_executor(self) -> None:
+        shm = Path("/dev/shm")
+        self._tmp_dir = Path(
+            tempfile.mkdtemp(prefix="prefetch_", dir=str(shm) if shm.is_dir() else None)
+        )
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            initializer=_init_prefetch_worker,
+            initargs=(self._worker_loader,),
+        )
+        # so the workers and the shared memory are cleaned up with the loader
+        self._finalizer = weakref.finalize(
+            self, _close_prefetcher, self._executor, self._tmp_dir
+        )
+
+    def start(self, data_files: List[Path]) -> None:
+        """Start prefetching the files of an epoch, in the order in which
+        they will be requested
+        """
+        if self._executor is None:
+            self._start_executor()
+        # the futures left over from an epoch which wasn't finished (e.g. after
+        # a `break` out of the iterator) would hold up this epoch's prefetching
+        self._discard_futures()
+        # a snapshot, since the iterator removes empty folders from its list
+        self._queue = list(data_files)
+        self._fill()
+
+    def _discard_futures(self) -> None:
+        """Cancel the futures which haven't started, and remove the output of
+        the others once they finish
+        """
+        futures, self._futures = self._futures, {}
+        for future in futures.values():
+            if not future.cancel():
+                future.add_done_callback(_remove_prefetched)
+
+    def _submit(self, folder: Path) -> Future:
+        assert (self._executor is not None) and (self._tmp_dir is not None)
+        output_folder = self._tmp_dir / f"{folder.name}_{self._num_submitted}"
+        self._num_submitted += 1
+
+        future = self._executor.submit(_prefetch_folder, folder, output_folder)
+        self._futures[str(folder)] = future
+        return future
+
+    def _fill(self) -> None:
+        while (len(self._futures) < self.max_pending) and (len(self._queue) > 0):
+            folder = self._queue.pop(0)
+            if str(folder) in self._futures:
+                continue
+            if (self.cache is not None) and (folder.name in self.cache):
+                continue
+            self._submit(folder)
+
+    def get(self, folder: Path) -> ModelArrays:
+        """Return the ModelArrays for a folder, waiting for the workers
+        if they have not processed it yet
+        """
+        if self._executor is None:
+            self._start_executor()
+
+        future = self._futures.pop(str(folder), None)
+        if future is None:
+            # not prefetched (e.g. it was evicted from the cache), so it
+            # is requested directly
+            self._queue = [f for f in self._queue if f != folder]
+            future = self._submit(folder)
+            self._futures.pop(str(folder))
+        self._fill()
+
+        output_folder = future.result()
+        arrays = load_model_arrays(output_folder)
+        shutil.rmtree(output_folder)
+        return arrays
+
+    def close(self) -> None:
+        if self._finalizer is not None:
+            self._finalizer()
+        self._executor = None
+        self._futures = {}
+
+
+# the iterator used by each prefetching worker process
+_prefetch_iter: Optional[_BaseIter] = None
+
+
+def _init_prefetch_worker(loader: DataLoader) -> None:
+    global _prefetch_iter
+    _prefetch_iter = _BaseIter(loader)
+
+
+def _prefetch_folder(folder: Path, output_folder: Path) -> Path:
+    assert _prefetch_iter is not None, "The prefetch worker was not initialized"
+    arrays = _prefetch_iter.ds_folder_to_np(
+        folder, clear_nans=_prefetch_iter.clear_nans, to_tensor=False
+    )
+    save_model_arrays(output_folder, arrays)
+    return output_folder
+
+
+def _remove_prefetched(future: Future) -> None:
+    if (not future.cancelled()) and (future.exception() is None):
+        shutil.rmtree(future.result(), ignore_errors=True)
+
+
+def _close_prefetcher(executor: ProcessPoolExecutor, tmp_dir: Path) -> None:
+    executor.shutdown(wait=True)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
 class DataLoader:
     """Dataloader; lazily load the training and test data
     Attributes:
@@ -262,6 +570,23 @@ class DataLoader:
         instead of the raw target variable.
     normalize_y: bool = True
         Whether to normalize y
+    backend: str {'netcdf', 'store', 'virtual'} = 'netcdf'
+        Where to read the engineered data from. 'netcdf' reads the {year}_{month}/{x, y}.nc
+        files. 'store' memory-maps the consolidated store written by the engineer (with
+        `feature_store=True`), avoiding the NetCDF decoding every epoch. 'virtual' slices
+        each {x, y} pair from the merged data saved by the engineer (with `virtual=True`)
+    cache_bytes: Optional[int] = None
+        If not None, the processed arrays of each file are cached (up to this many bytes in
+        memory) so that they are only loaded and processed once, rather than every epoch
+    cache_dir: Optional[Path] = None
+        If not None (and cache_bytes is not None), arrays which don't fit in memory are
+        saved here as .npy files instead of being discarded
+    num_workers: int = 0
+        If greater than 0, the upcoming files of each epoch are processed by this many
+        worker processes in the background, while the current batch is being used
+    prefetch_factor: int = 2
+        The number of files each worker processes ahead of the current file. Only used
+        if num_workers > 0
     """
 
     def __init__(
@@ -285,12 +610,34 @@ class DataLoader:
         device: str = "cpu",
         spatial_mask: Optional[xr.DataArray] = None,
         normalize_y: bool = False,
+        backend: str = "netcdf",
+        cache_bytes: Optional[int] = None,
+        cache_dir: Optional[Path] = None,
+        num_workers: int = 0,
+        prefetch_factor: int = 2,
     ) -> None:
 
+        assert backend in {
+            "netcdf",
+            "store",
+            "virtual",
+        }, f"Backend must be one of {{netcdf, store, virtual}}, got {backend}"
+
         self.batch_file_size = batch_file_size
         self.mode = mode
         self.shuffle = shuffle_data
         self.experiment = experiment
+        self.backend = backend
+        self.feature_store: Optional[FeatureStore] = None
+        if backend == "store":
+            self.feature_store = FeatureStore(
+                data_path / f"features/{experiment}/store/{mode}"
+            )
+        self.virtual_features: Optional[VirtualFeatures] = None
+        if backend == "virtual":
+            self.virtual_features = VirtualFeatures(
+                data_path / f"features/{experiment}/virtual", dataset_type=mode
+            )
         self.data_files = self._load_datasets(
             data_path=data_path,
             mode=mode,
@@ -298,6 +645,7 @@ class DataLoader:
             experiment=experiment,
             mask=mask,
             pred_months=pred_months,
+            backend=backend,
         )
         self.predict_delta = predict_delta
 
@@ -344,10 +692,19 @@ class DataLoader:
 
             if static == "embeddings":
                 # in case no static dataset was generated, we use the first
-                # historical dataset
-                self.static, self.max_loc_int = self._loc_to_int(
-                    xr.open_dataset(self.data_files[0] / "x.nc")
-                )
+                # historical dataset (or the grid of the feature store)
+                if self.feature_store is not None:
+                    base_ds = xr.Dataset(
+                        coords={
+                            "lat": self.feature_store.lat,
+                            "lon": self.feature_store.lon,
+                        }
+                    )
+                elif self.virtual_features is not None:
+                    base_ds = self.virtual_features.cube
+                else:
+                    base_ds = xr.open_dataset(self.data_files[0] / "x.nc")
+                self.static, self.max_loc_int = self._loc_to_int(base_ds)
 
         self.device = torch.device(device)
         self.spatial_mask = spatial_mask
@@ -359,6 +716,66 @@ class DataLoader:
             )
         self.clear_nans = clear_nans
 
+        self.cache: Optional[ModelArraysCache] = None
+        if cache_bytes is not None:
+            config_hash = ModelArraysCache.config_hash(
+                self._cache_config(data_path, mode, normalize)
+            )
+            self.cache = ModelArraysCache(
+                max_bytes=cache_bytes,
+                cache_dir=cache_dir / config_hash if cache_dir is not None else None,
+            )
+
+        self.prefetcher: Optional[_Prefetcher] = None
+        if num_workers > 0:
+            self.prefetcher = _Prefetcher(
+                self, num_workers=num_workers, prefetch_factor=prefetch_factor
+            )
+
+    def _cache_config(self, data_path: Path, mode: str, normalize: bool) -> Dict:
+        """Everything which affects the output of `ds_folder_to_np`
+        """
+        mask_hash = None
+        if self.spatial_mask is not None:
+            mask_hash = hashlib.md5(
+                pickle.dumps(
+                    (
+                        self.spatial_mask.values,
+                        self.spatial_mask.lat.values,
+                        self.spatial_mask.lon.values,
+                    )
+                )
+            ).hexdigest()
+
+        # this is rewritten every time the engineer is run, so the cache
+        # is invalidated if the features change
+        normalizing_dict_path = (
+            data_path / f"features/{self.experiment}/normalizing_dict.pkl"
+        )
+        features_mtime = (
+            normalizing_dict_path.stat().st_mtime
+            if normalizing_dict_path.exists()
+            else None
+        )
+
+        return {
+            "data_path": str(data_path.resolve()),
+            "features_mtime": features_mtime,
+            "mode": mode,
+            "experiment": self.experiment,
+            "backend": self.backend,
+            "ignore_vars": self.ignore_vars,
+            "surrounding_pixels": self.surrounding_pixels,
+            "monthly_aggs": self.monthly_aggs,
+            "incl_yearly_aggs": self.incl_yearly_aggs,
+            "static": None if self.static is None else list(self.static.data_vars),
+            "normalize": normalize,
+            "normalize_y": self.normalize_y,
+            "predict_delta": self.predict_delta,
+            "clear_nans": self.clear_nans,
+            "spatial_mask": mask_hash,
+        }
+
     def __iter__(self):
         if self.mode == "train":
             return _TrainIter(self)
@@ -395,19 +812,40 @@ class DataLoader:
         experiment: str,
         mask: Optional[List[bool]] = None,
         pred_months: Optional[List[int]] = None,
+        backend: str = "netcdf",
     ) -> List[Path]:
 
         data_folder = data_path / f"features/{experiment}/{mode}"
         output_paths: List[Path] = []
 
-        for subtrain in data_folder.iterdir():
-            if (subtrain / "x.nc").exists() and (subtrain / "y.nc").exists():
-                if pred_months is None:
+        if backend == "store":
+            # the store keys are the {year}_{month} folder names, so the
+            # paths (and therefore masks and pred_months) are the same
+            # as for the netcdf files, even if the folders don't exist
+            store_folder = data_path / f"features/{experiment}/store/{mode}"
+            subfolders = [
+                data_folder / key for key in FeatureStore.read_keys(store_folder)
+            ]
+        elif backend == "virtual":
+            virtual_folder = data_path / f"features/{experiment}/virtual"
+            subfolders = [
+                data_folder / key
+                for key in VirtualFeatures.read_keys(virtual_folder, mode)
+            ]
+        else:
+            subfolders = [
+                subtrain
+                for subtrain in data_folder.iterdir()
+                if (subtrain / "x.nc").exists() and (subtrain / "y.nc").exists()
+            ]
+
+        for subtrain in subfolders:
+            if pred_months is None:
+                output_paths.append(subtrain)
+            else:
+                month = int(str(subtrain.parts[-1])[5:])
+                if month in pred_months:
                     output_paths.append(subtrain)
-                else:
-                    month = int(str(subtrain.parts[-1])[5:])
-                    if month in pred_months:
-                        output_paths.append(subtrain)
 
         if mask is not None:
             output_paths.sort()
@@ -440,6 +878,10 @@ class _BaseIter:
         self.normalize_y = loader.normalize_y
         self.incl_yearly_aggs = loader.incl_yearly_aggs
         self.ignore_vars = loader.ignore_vars
+        self.feature_store = loader.feature_store
+        self.virtual_features = loader.virtual_features
+        self.cache = loader.cache
+        self.prefetcher = loader.prefetcher
 
         self.static = loader.static
         self.static_normalizing_dict = loader.static_normalizing_dict
@@ -449,6 +891,8 @@ class _BaseIter:
         if self.shuffle:
             # makes sure they are shuffled every epoch
             shuffle(self.data_files)
+        if self.prefetcher is not None:
+            self.prefetcher.start(self.data_files)
 
         self.normalizing_dict = loader.normalizing_dict
         self.normalizing_array: Optional[Dict[str, np.ndarray]] = None
@@ -475,12 +919,24 @@ class _BaseIter:
 
         new_path = folder.parent / f"{previous_year}_{month}"
 
-        if new_path.exists():
-            y = xr.open_dataset(new_path / "y.nc")
-            y_np = y[y_var].values
-            y_np = y_np.reshape(y_np.shape[0], y_np.shape[1] * y_np.shape[2])
-            y_np = np.moveaxis(y_np, -1, 0)
-
+        y_np: Optional[np.ndarray] = None
+        if self.feature_store is not None:
+            if new_path.name in self.feature_store:
+                y_np = np.array(self.feature_store.get(new_path.name)[1])
+        else:
+            y: Optional[xr.Dataset] = None
+            if self.virtual_features is not None:
+                if new_path.name in self.virtual_features:
+                    y = self.virtual_features.get(new_path.name)["y"]
+            elif new_path.exists():
+                y = xr.open_dataset(new_path / "y.nc")
+
+            if y is not None:
+                y_np = y[y_var].values
+                y_np = y_np.reshape(y_np.shape[0], y_np.shape[1] * y_np.shape[2])
+                y_np = np.moveaxis(y_np, -1, 0)
+
+        if y_np is not None:
             if self.normalizing_dict is not None:
                 y_np = (
                     y_np - self.normalizing_dict[y_var]["mean"]
@@ -582,23 +1038,22 @@ class _BaseIter:
             )
 
         if self.normalize_y:
-            # normalizing_dict will not be None
-            y_var = list(y.data_vars)[0]
-            if not self.predict_delta:
-                y_np = (
-                    (
-                        y_np - self.normalizing_dict[y_var]["mean"]  # type: ignore
-                    )
-                    / self.normalizing_dict[y_var]["std"]  # type: ignore
-                )
-            else:
-                # if we are doing predict_delta, then there is no need to shift by mean, since
-                # the x we will be adding to has already been shifting. Shifting this value would
-                # be "double shifting"
-                y_np = y_np / self.normalizing_dict[y_var]["std"]  # type: ignore
+            y_np = self._normalize_target(y_np, list(y.data_vars)[0])
 
         return x_np, y_np
 
+    def _normalize_target(self, y_np: np.ndarray, y_var: str) -> np.ndarray:
+        # normalizing_dict will not be None
+        norm_values = self.normalizing_dict[y_var]  # type: ignore
+        if not self.predict_delta:
+            y_np = (y_np - norm_values["mean"]) / norm_values["std"]
+        else:
+            # if we are doing predict_delta, then there is no need to shift by mean, since
+            # the x we will be adding to has already been shifting. Shifting this value would
+            # be "double shifting"
+            y_np = y_np / norm_values["std"]
+        return y_np
+
     @staticmethod
     def _calculate_target_months(y: xr.Dataset, num_instances: int) -> np.ndarray:
         # then, the x month
@@ -720,11 +1175,43 @@ class _BaseIter:
         # calculate the derivative
         return (y[y_var] - prev_ts).to_dataset(name=y_var)
 
+    def load_arrays(
+        self, folder: Path, clear_nans: bool = True, to_tensor: bool = False
+    ) -> ModelArrays:
+        """Return the ModelArrays for a folder, from the cache or the
+        prefetching workers if possible
+        """
+        arrays = self.cache.get(folder.name) if self.cache is not None else None
+        if arrays is None:
+            if self.prefetcher is not None:
+                arrays = self.prefetcher.get(folder)
+            else:
+                arrays = self.ds_folder_to_np(
+                    folder, clear_nans=clear_nans, to_tensor=False
+                )
+            if self.cache is not None:
+                self.cache.put(folder.name, arrays)
+
+        if self.cache is not None:
+            # so that the batching (concatenating, tensorizing) doesn't modify
+            # the cached arrays
+            arrays = arrays.shallow_copy()
+        if to_tensor:
+            arrays.to_tensor(self.device)
+        return arrays
+
     def ds_folder_to_np(
         self, folder: Path, clear_nans: bool = True, to_tensor: bool = False
     ) -> ModelArrays:
 
-        x, y = xr.open_dataset(folder / "x.nc"), xr.open_dataset(folder / "y.nc")
+        if self.feature_store is not None:
+            return self.store_to_np(folder.name, folder, clear_nans, to_tensor)
+
+        if self.virtual_features is not None:
+            xy = self.virtual_features.get(folder.name)
+            x, y = xy["x"], xy["y"]
+        else:
+            x, y = xr.open_dataset(folder / "x.nc"), xr.open_dataset(folder / "y.nc")
         # SORT values to make sure that predictions aren't upside down
         # x = x.sortby(["time", "lat", "lon"])
         # y = y.sortby(["time", "lat", "lon"])
@@ -806,6 +1293,42 @@ class _BaseIter:
             f"number of instances! x: {x_np.shape[0]}, y: {y_np.shape[0]}"
         )
 
+        y_var = list(y.data_vars)[0]
+        historical_target_np = (
+            self._calculate_historical_target(x, y_var) if self.predict_delta else None
+        )
+
+        return self._to_model_arrays(
+            train_data=train_data,
+            y_np=y_np,
+            latlons=latlons,
+            x_vars=list(x.data_vars),
+            y_var=y_var,
+            target_time=target_time,
+            x_datetimes=x_datetimes,
+            historical_target_np=historical_target_np,
+            clear_nans=clear_nans,
+            to_tensor=to_tensor,
+        )
+
+    def _to_model_arrays(
+        self,
+        train_data: TrainData,
+        y_np: np.ndarray,
+        latlons: np.ndarray,
+        x_vars: List[str],
+        y_var: str,
+        target_time: Timestamp,
+        x_datetimes: List[Timestamp],
+        historical_target_np: Optional[np.ndarray],
+        clear_nans: bool,
+        to_tensor: bool,
+    ) -> ModelArrays:
+        """Remove the nan instances (if `clear_nans`) and create the ModelArrays
+        """
+        prev_y_var = train_data.prev_y_var
+        notnan_indices, nan_mask = None, None
+
         if clear_nans:
             # remove nans if they are in the x or y data
             historical_nans, y_nans = np.isnan(train_data.historical), np.isnan(y_np)
@@ -862,11 +1385,10 @@ class _BaseIter:
             y_np = y_np[notnan_indices]
             latlons = latlons[notnan_indices]
 
-        y_var = list(y.data_vars)[0]
         model_arrays = ModelArrays(
             x=train_data,
             y=y_np,
-            x_vars=list(x.data_vars),
+            x_vars=x_vars,
             y_var=y_var,
             latlons=latlons,
             target_time=target_time,
@@ -881,12 +1403,176 @@ class _BaseIter:
         if self.predict_delta:
             # NOTE: data is not normalised in this function
             model_arrays.predict_delta = True
-            historical_target_np = self._calculate_historical_target(x, y_var)
-            historical_target_np = historical_target_np[notnan_indices].flatten()
-            model_arrays.historical_target = historical_target_np
+            historical_target_np = cast(np.ndarray, historical_target_np)
+            if notnan_indices is not None:
+                historical_target_np = historical_target_np[notnan_indices]
+            model_arrays.historical_target = historical_target_np.flatten()
 
         return model_arrays  # , (train_data, y_np)
 
+    def store_to_np(
+        self, key: str, folder: Path, clear_nans: bool = True, to_tensor: bool = False
+    ) -> ModelArrays:
+        """The equivalent of `ds_folder_to_np` for the consolidated feature store.
+
+        The x, y arrays are read as views onto the memory-mapped store, and all the
+        processing (extra dims, normalization, masking) happens on numpy arrays, so
+        no NetCDF decoding or xarray reshaping is required.
+        """
+        store = cast(FeatureStore, self.feature_store)
+        x_np, y_np = store.get(key)
+        target_time_np, historical_times = store.get_times(key)
+        x_vars, y_var = list(store.x_vars), store.y_var
+
+        if self.predict_delta:
+            y_idx = x_vars.index(y_var)
+            y_np = y_np - x_np[:, -1, y_idx : y_idx + 1]
+
+        if self.ignore_vars is not None:
+            #  only include the vars in ignore_vars that are in the x vars
+            self.ignore_vars = [v for v in self.ignore_vars if v in x_vars]
+            keep_indices = [
+                idx for idx, v in enumerate(x_vars) if v not in self.ignore_vars
+            ]
+            x_np = x_np[:, :, keep_indices]
+            x_vars = [x_vars[idx] for idx in keep_indices]
+
+        target_time = pd.to_datetime(target_time_np)
+        all_x_datetimes = [pd.to_datetime(time) for time in historical_times]
+        if self.experiment == "nowcast":
+            x_datetimes = [time for time in all_x_datetimes if time != target_time]
+        else:
+            x_datetimes = all_x_datetimes
+
+        if self.spatial_mask is not None:
+            # anywhere where the mask is 1, make NaN
+            mask = (
+                self.spatial_mask.sel(lat=store.lat, lon=store.lon)
+                .transpose("lat", "lon")
+                .values.astype(bool)
+                .reshape(-1)
+            )
+            x_np = np.where(mask[:, np.newaxis, np.newaxis], np.nan, x_np)
+            y_np = np.where(mask[:, np.newaxis], np.nan, y_np)
+
+        if self.incl_yearly_aggs:
+            warnings.warn("Deprecated for causing the static data to vary")
+            # before to avoid aggs from surrounding pixels
+            yearly_agg = np.nanmean(x_np, axis=(0, 1))
+            if (self.normalizing_dict is not None) and (self.normalizing_array is None):
+                self.normalizing_array_ym = self.calculate_normalizing_array(x_vars)
+            if self.normalizing_array_ym is not None:
+                yearly_agg = (
+                    yearly_agg - self.normalizing_array_ym["mean"]
+                ) / self.normalizing_array_ym["std"]
+            yearly_agg = np.vstack([yearly_agg] * x_np.shape[0])
+
+        historical_target_np = None
+        if self.predict_delta:
+            # the raw (not normalized) final timestep of the target variable
+            y_idx = x_vars.index(y_var)
+            historical_target_np = np.array(x_np[:, -1, y_idx]).reshape(-1, 1)
+
+        x_np, x_vars = self._add_extra_dims_np(
+            x_np, x_vars, len(store.lat), len(store.lon)
+        )
+        if (self.normalizing_dict is not None) and (self.normalizing_array is None):
+            self.normalizing_array = self.calculate_normalizing_array(x_vars)
+        if self.normalizing_array is not None:
+            x_np = (x_np - self.normalizing_array["mean"]) / (
+                self.normalizing_array["std"]
+            )
+        y_np = np.array(y_np)
+        if self.normalize_y:
+            y_np = self._normalize_target(y_np, y_var)
+
+        x_months = np.array([target_time.month] * x_np.shape[0])
+        static_np = (
+            self._calculate_static(x_np.shape[0]) if self.static is not None else None
+        )
+        prev_y_var = self._get_prev_y_var(folder, y_var, y_np.shape[0])
+        latlons = store.latlons
+
+        if self.experiment == "nowcast":
+            # the target timestep of the NON-TARGET vars
+            time_ix = all_x_datetimes.index(target_time)
+            relevant_indices = [
+                idx for idx, feat in enumerate(x_vars) if not feat.endswith(y_var)
+            ]
+            historical = x_np[:, :-1, :]
+            current = x_np[:, time_ix, relevant_indices]
+        else:
+            historical, current = x_np, None
+
+        train_data = TrainData(
+            current=current,
+            historical=historical,
+            pred_months=x_months,
+            latlons=latlons.copy(),
+            yearly_aggs=yearly_agg if self.incl_yearly_aggs else None,
+            static=static_np,
+            prev_y_var=prev_y_var,
+        )
+
+        return self._to_model_arrays(
+            train_data=train_data,
+            y_np=y_np,
+            latlons=latlons,
+            x_vars=x_vars,
+            y_var=y_var,
+            target_time=target_time,
+            x_datetimes=x_datetimes,
+            historical_target_np=historical_target_np,
+            clear_nans=clear_nans,
+            to_tensor=to_tensor,
+        )
+
+    def _add_extra_dims_np(
+        self, x_np: np.ndarray, x_vars: List[str], num_lat: int, num_lon: int
+    ) -> Tuple[np.ndarray, List[str]]:
+        """The numpy equivalent of `_add_extra_dims`, for (pixel, time, feature)
+        arrays whose pixels are flattened from a (lat, lon) grid
+        """
+        arrays, output_vars = [x_np], list(x_vars)
+
+        if self.monthly_aggs:
+            monthly_mean_values = np.nanmean(x_np, axis=0, keepdims=True)
+            arrays.append(np.broadcast_to(monthly_mean_values, x_np.shape))
+            output_vars.extend([f"spatial_mean_{var}" for var in x_vars])
+
+        if self.surrounding_pixels is not None:
+            grid = x_np.reshape(num_lat, num_lon, x_np.shape[1], x_np.shape[2])
+            shifts = range(-self.surrounding_pixels, self.surrounding_pixels + 1)
+            for idx, var in enumerate(x_vars):
+                for lat_shift in shifts:
+                    for lon_shift in shifts:
+                        if lat_shift == lon_shift == 0:
+                            continue
+                        shifted = self._shift_grid(grid[..., idx], lat_shift, lon_shift)
+                        arrays.append(shifted.reshape(x_np.shape[0], x_np.shape[1], 1))
+                        output_vars.append(f"lat_{lat_shift}_lon_{lon_shift}_{var}")
+
+        return np.concatenate(arrays, axis=-1), output_vars
+
+    @staticmethod
+    def _shift_grid(grid: np.ndarray, lat_shift: int, lon_shift: int) -> np.ndarray:
+        """Shift a (lat, lon, ...) array, filling with NaNs
+        (equivalent to xarray's `shift(lat=lat_shift, lon=lon_shift)`)
+        """
+        shifted = np.full(grid.shape, np.nan, dtype=np.result_type(grid, np.float32))
+        num_lat, num_lon = grid.shape[0], grid.shape[1]
+
+        def _slices(shift: int, length: int) -> Tuple[slice, slice]:
+            return (
+                slice(max(shift, 0), length + min(shift, 0)),
+                slice(max(-shift, 0), length + min(-shift, 0)),
+            )
+
+        lat_to, lat_from = _slices(lat_shift, num_lat)
+        lon_to, lon_from = _slices(lon_shift, num_lon)
+        shifted[lat_to, lon_to] = grid[lat_from, lon_from]
+        return shifted
+
     @staticmethod
     def _add_extra_dims(
         x: xr.Dataset, surrounding_pixels: Optional[int], monthly_agg: bool
@@ -963,7 +1649,7 @@ class _TrainIter(_BaseIter):
             cur_max_idx = min(self.idx + self.batch_file_size, self.max_idx)
             while self.idx < cur_max_idx:
                 subfolder = self.data_files[self.idx]
-                arrays = self.ds_folder_to_np(  # , (train_data, y_np)
+                arrays = self.load_arrays(
                     subfolder, clear_nans=self.clear_nans, to_tensor=False
                 )
                 if arrays.x.historical.shape[0] == 0:
@@ -1016,7 +1702,7 @@ class _TestIter(_BaseIter):
             cur_max_idx = min(self.idx + self.batch_file_size, self.max_idx)
             while self.idx < cur_max_idx:
                 subfolder = self.data_files[self.idx]
-                arrays = self.ds_folder_to_np(
+                arrays = self.load_arrays(
                     subfolder, clear_nans=self.clear_nans, to_tensor=self.to_tensor
                 )
 
@@ -38,6 +38,7 @@ class GBDT(ModelBase):
         spatial_mask: Union[xr.DataArray, Path] = None,
         include_prev_y: bool = True,
         normalize_y: bool = True,
+        dataloader_kwargs: Optional[Dict[str, Any]] = None,
     ) -> None:
         super().__init__(
             data_folder,
@@ -55,6 +56,7 @@ class GBDT(ModelBase):
             spatial_mask=spatial_mask,
             include_prev_y=include_prev_y,
             normalize_y=normalize_y,
+            dataloader_kwargs=dataloader_kwargs,
         )
 
         self.early_stopping = False
@@ -76,6 +78,7 @@ class GBDT(ModelBase):
                     mode="train",
                     shuffle_data=False,
                     experiment=self.experiment,
+                    backend=self.dataloader_kwargs.get("backend", "netcdf"),
                 )
             )
             train_mask, val_mask = train_val_mask(len_mask, val_split)
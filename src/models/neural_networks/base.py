@@ -8,7 +8,7 @@ import xarray as xr
 import torch
 from torch.nn import functional as F
 
-from typing import cast, Dict, List, Optional, Tuple, Union
+from typing import cast, Any, Dict, List, Optional, Tuple, Union
 
 from ..base import ModelBase
 from ..utils import chunk_array, _to_xarray_dataset
@@ -39,6 +39,7 @@ class NNBase(ModelBase):
         clear_nans: bool = True,
         weight_observations: bool = False,
         explain: bool = False,
+        dataloader_kwargs: Optional[Dict[str, Any]] = None,
     ) -> None:
         super().__init__(
             data_folder=data_folder,
@@ -57,6 +58,7 @@ class NNBase(ModelBase):
             include_prev_y=include_prev_y,
             normalize_y=normalize_y,
             clear_nans=clear_nans,
+            dataloader_kwargs=dataloader_kwargs,
         )
 
         # for reproducibility
@@ -134,6 +136,7 @@ class NNBase(ModelBase):
                     experiment=self.experiment,
                     shuffle_data=False,
                     pred_months=self.pred_months,
+                    backend=self.dataloader_kwargs.get("backend", "netcdf"),
                 )
             )
             train_mask, val_mask = train_val_mask(len_mask, val_split)
@@ -5,7 +5,7 @@ from pathlib import Path
 from copy import copy
 import xarray as xr
 
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from .base import NNBase
 
@@ -39,6 +39,7 @@ class EARecurrentNetwork(NNBase):
         clear_nans: bool = True,
         weight_observations: bool = False,
         pred_month_static: bool = True,
+        dataloader_kwargs: Optional[Dict[str, Any]] = None,
     ) -> None:
         super().__init__(
             data_folder,
@@ -59,6 +60,7 @@ class EARecurrentNetwork(NNBase):
             normalize_y=normalize_y,
             clear_nans=clear_nans,
             weight_observations=weight_observations,
+            dataloader_kwargs=dataloader_kwargs,
         )
 
         # to initialize and save the model
@@ -4,7 +4,7 @@ import xarray as xr
 
 import torch
 from torch import nn
-from typing import cast, Dict, List, Optional, Tuple, Union
+from typing import cast, Any, Dict, List, Optional, Tuple, Union
 
 from .base import NNBase
 
@@ -34,6 +34,7 @@ class LinearNetwork(NNBase):
         include_prev_y: bool = True,
         normalize_y: bool = True,
         clear_nans: bool = True,
+        dataloader_kwargs: Optional[Dict[str, Any]] = None,
     ) -> None:
         super().__init__(
             data_folder,
@@ -53,6 +54,7 @@ class LinearNetwork(NNBase):
             include_prev_y=include_prev_y,
             normalize_y=normalize_y,
             clear_nans=clear_nans,
+            dataloader_kwargs=dataloader_kwargs,
         )
 
         self.input_layer_sizes = copy(layer_sizes)
@@ -6,7 +6,7 @@ import xarray as xr
 import torch
 from torch import nn
 
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from .base import NNBase
 
@@ -38,6 +38,7 @@ class RecurrentNetwork(NNBase):
         normalize_y: bool = True,
         clear_nans: bool = True,
         weight_observations: bool = False,
+        dataloader_kwargs: Optional[Dict[str, Any]] = None,
     ) -> None:
         super().__init__(
             data_folder,
@@ -58,6 +59,7 @@ class RecurrentNetwork(NNBase):
             normalize_y=normalize_y,
             clear_nans=clear_nans,
             weight_observations=weight_observations,
+            dataloader_kwargs=dataloader_kwargs,
         )
 
         # to initialize and save the model
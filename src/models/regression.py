@@ -5,7 +5,7 @@ from sklearn.metrics import mean_squared_error
 import pickle
 import xarray as xr
 
-from typing import cast, Dict, List, Tuple, Optional, Union
+from typing import cast, Any, Dict, List, Tuple, Optional, Union
 
 from .base import ModelBase
 from .utils import chunk_array
@@ -36,6 +36,7 @@ class LinearRegression(ModelBase):
         include_prev_y: bool = True,
         normalize_y: bool = True,
         explain: bool = False,
+        dataloader_kwargs: Optional[Dict[str, Any]] = None,
     ) -> None:
         super().__init__(
             data_folder,
@@ -53,6 +54,7 @@ class LinearRegression(ModelBase):
             spatial_mask=spatial_mask,
             include_prev_y=include_prev_y,
             normalize_y=normalize_y,
+            dataloader_kwargs=dataloader_kwargs,
         )
         if explain:
             global shap
@@ -77,6 +79,7 @@ class LinearRegression(ModelBase):
                     mode="train",
                     shuffle_data=False,
                     experiment=self.experiment,
+                    backend=self.dataloader_kwargs.get("backend", "netcdf"),
                 )
             )
             train_mask, val_mask = train_val_mask(len_mask, val_split)
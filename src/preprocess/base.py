@@ -1,8 +1,10 @@
+import hashlib
+import os
 from pathlib import Path
 import xarray as xr
 import numpy as np
 
-from typing import List, Optional, Union, Tuple
+from typing import Any, Dict, List, Optional, Union, Tuple
 
 from ..utils import Region, region_lookup
 from .utils import select_bounding_box
@@ -11,6 +13,10 @@ __all__ = ["BasePreProcessor", "Region"]
 
 xesmf = None
 
+# regridders are cached for the lifetime of the process (including pool
+# workers forked from it), keyed on (method, source grid hash, target grid hash)
+_regridders: Dict[Tuple[str, str, str], Any] = {}
+
 
 class BasePreProcessor:
     """Base for all pre-processor classes. The preprocessing classes
@@ -103,6 +109,11 @@ class BasePreProcessor:
             The reference dataset, onto which `ds` will be regridded
         method: str, {'bilinear', 'conservative', 'nearest_s2d', 'nearest_d2s', 'patch'}
             The method applied for the regridding
+        reuse_weights: bool = False
+            Unused; the regridding weights are always cached (for each method, input and
+            output grid), and shared between processes
+        clean: bool = False
+            If True, the cached weights are deleted after regridding
         """
 
         assert ("lat" in reference_ds.dims) & (
@@ -128,48 +139,129 @@ class BasePreProcessor:
             {"lat": (["lat"], reference_ds.lat), "lon": (["lon"], reference_ds.lon)}
         )
 
-        shape_in = len(ds.lat), len(ds.lon)
-        shape_out = len(reference_ds.lat), len(reference_ds.lon)
-        # unique id so when parallel process doesn't write to same file
-        uid = f"{np.random.rand(1)[0]:.2f}"
-
-        # The weight file should be deleted by regridder.clean_weight_files(), but in case
-        # something goes wrong and its not, lets use a descriptive filename
-        if reuse_weights:
-            # if not running in parallel can save time by reusing weights
-            filename = f"{method}_{shape_in[0]}x{shape_in[1]}_\
-            {shape_out[0]}x{shape_out[1]}.nc".replace(
-                " ", ""
-            )
-        else:
-            filename = f"{method}_{shape_in[0]}x{shape_in[1]}_\
-            {shape_out[0]}x{shape_out[1]}_{uid}.nc".replace(
-                " ", ""
-            )
-        savedir = self.preprocessed_folder / filename
+        regridder = self._get_regridder(ds, ds_out, method, clean=clean)
 
-        regridder = xesmf.Regridder(  # type: ignore
-            ds, ds_out, method, filename=str(savedir), reuse_weights=False
-        )
-
-        variables = [v for v in ds.data_vars]
-        output_dict = {}
-        for var in variables:
-            print(f"- regridding var {var} -")
-            output_dict[var] = regridder(ds[var])
-        ds = xr.Dataset(output_dict)
+        print(f"- regridding vars {list(ds.data_vars)} -")
+        ds = self._regrid_batched(self._weights_matrix(regridder), ds, ds_out)
 
         # print(
         #     f"Regridded from {(regridder.Ny_in, regridder.Nx_in)} "
         #     f"to {(regridder.Ny_out, regridder.Nx_out)}"
         # )
 
-        if clean:
-            # TODO: fix this as no longer an attribute of regridder objects
-            regridder.clean_weight_file()
-
         return ds
 
+    @staticmethod
+    def _weights_matrix(regridder: Any) -> Any:
+        """The regridder's weights, as a (n_pixels_out, n_pixels_in) scipy.sparse
+        CSR matrix
+        """
+        weights = regridder.weights
+        if isinstance(weights, xr.DataArray):
+            # newer versions of xesmf wrap a sparse.COO array
+            weights = weights.data
+        return weights.tocsr()
+
+    @staticmethod
+    def _regrid_batched(weights: Any, ds: xr.Dataset, ds_out: xr.Dataset) -> xr.Dataset:
+        """Regrid all the variables (and timesteps) of `ds` with a single sparse
+        matrix multiplication.
+
+        Every (lat, lon) slice is a column of one (n_pixels_in, n_slices) matrix.
+        NaN inputs are given no weight, and the remaining weights of each output
+        pixel are renormalised so that they sum to 1. Output pixels with no valid
+        inputs are NaN.
+        """
+        n_pixels_in = ds.lat.size * ds.lon.size
+        out_shape = (ds_out.lat.size, ds_out.lon.size)
+
+        variables = [v for v in ds.data_vars]
+        arrays, slice_dims = [], []
+        for var in variables:
+            other_dims = [d for d in ds[var].dims if d not in ["lat", "lon"]]
+            values = ds[var].transpose(*other_dims, "lat", "lon").values
+            arrays.append(values.reshape(-1, n_pixels_in))
+            slice_dims.append(other_dims)
+
+        values = np.concatenate(arrays, axis=0).astype(np.float64).T
+        is_nan = np.isnan(values)
+        if is_nan.any():
+            values[is_nan] = 0
+            weight_sums = weights @ (~is_nan).astype(np.float64)
+        else:
+            # the same weights apply to every slice
+            weight_sums = np.asarray(weights.sum(axis=1))
+        regridded = weights @ values
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            regridded = np.where(weight_sums > 0, regridded / weight_sums, np.nan)
+        regridded = regridded.T
+
+        output_dict = {}
+        start = 0
+        for var, array, other_dims in zip(variables, arrays, slice_dims):
+            end = start + array.shape[0]
+            var_values = regridded[start:end].reshape(
+                *[ds[var].sizes[d] for d in other_dims], *out_shape
+            )
+            if np.issubdtype(ds[var].dtype, np.floating):
+                var_values = var_values.astype(ds[var].dtype)
+            coords = {d: ds[var][d] for d in other_dims if d in ds[var].coords}
+            coords.update({"lat": ds_out.lat.values, "lon": ds_out.lon.values})
+            output_dict[var] = xr.DataArray(
+                var_values, dims=other_dims + ["lat", "lon"], coords=coords
+            )
+            start = end
+        return xr.Dataset(output_dict)
+
+    @staticmethod
+    def _grid_hash(ds: xr.Dataset) -> str:
+        grid_hash = hashlib.md5(f"{len(ds.lat)}x{len(ds.lon)}".encode())
+        for dim in ["lat", "lon"]:
+            grid_hash.update(np.ascontiguousarray(ds[dim].values, dtype=np.float64))
+        return grid_hash.hexdigest()[:16]
+
+    def _get_regridder(
+        self, ds: xr.Dataset, ds_out: xr.Dataset, method: str, clean: bool = False
+    ) -> Any:
+        """Return a regridder from `ds`'s grid to `ds_out`'s grid, only calculating
+        the weights if no other file (or process) has already done so.
+
+        The weights are saved (as a sparse matrix) in interim/regrid_weights, so that
+        they can be read by the other processes in a multiprocessing.Pool
+        """
+        key = (method, self._grid_hash(ds), self._grid_hash(ds_out))
+
+        weights_folder = self.preprocessed_folder / "regrid_weights"
+        weights_folder.mkdir(exist_ok=True)
+        filename = weights_folder / f"{key[0]}_{key[1]}_{key[2]}.nc"
+
+        regridder = _regridders.get(key)
+        if regridder is None:
+            if filename.exists():
+                regridder = xesmf.Regridder(  # type: ignore
+                    ds, ds_out, method, filename=str(filename), reuse_weights=True
+                )
+            else:
+                # the weights are written to a file unique to this process and then
+                # moved, so that other processes never read a partially written file
+                tmp_filename = weights_folder / f"{filename.stem}_{os.getpid()}.tmp.nc"
+                regridder = xesmf.Regridder(  # type: ignore
+                    ds, ds_out, method, filename=str(tmp_filename), reuse_weights=False
+                )
+                if not tmp_filename.exists():
+                    # newer versions of xesmf only save the weights when asked to
+                    regridder.to_netcdf(str(tmp_filename))
+                os.replace(tmp_filename, filename)
+            _regridders[key] = regridder
+
+        if clean:
+            # the weights stay in memory for this regridder, but won't be reused
+            _regridders.pop(key)
+            if filename.exists():
+                filename.unlink()
+        return regridder
+
     @staticmethod
     def load_reference_grid(path_to_grid: Path) -> xr.Dataset:
         """Since the regridder only needs to the lat and lon values,
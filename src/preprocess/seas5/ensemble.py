@@ -0,0 +1,145 @@
+import numpy as np
+
+from ...utils import grouped_nanquantile
+
+from typing import Dict, List, Optional, Tuple
+
+
+class EnsembleStatistics:
+    """Statistics over the ensemble members of a forecast, accumulated one batch of
+    members at a time, so that the members can be read (lazily) in batches
+    instead of all at once.
+
+    The mean and std are updated with the pairwise (Chan et al.) update of the
+    count, mean and sum of squared differences, and the exceedance probabilities
+    from the count of members above each threshold. NaN members are ignored.
+    Quantiles need every member, so the members are only kept if quantiles are
+    asked for.
+
+    >>> stats = EnsembleStatistics((10, 20), n_members=25, quantiles=[0.1, 0.9])
+    >>> for i in range(0, 25, 5):
+    ...     stats.update(values[i : i + 5])  # (member, 10, 20)
+    >>> stats.statistics("precip")  # {"precip_mean": (10, 20) array, ...}
+
+    Attributes:
+    ----------
+    shape: Tuple[int, ...]
+        The shape of one ensemble member
+    n_members: int
+        The number of members which will be passed to `update`. Only needed
+        (to allocate the members) if there are quantiles
+    quantiles: Optional[List[float]] = None
+        The quantiles (between 0 and 1) to calculate
+    thresholds: Optional[List[float]] = None
+        The thresholds to calculate the probability of exceeding
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...],
+        n_members: Optional[int] = None,
+        quantiles: Optional[List[float]] = None,
+        thresholds: Optional[List[float]] = None,
+    ) -> None:
+        self.shape = shape
+        self.quantiles = [] if quantiles is None else quantiles
+        self.thresholds = [] if thresholds is None else thresholds
+        assert all(0 <= q <= 1 for q in self.quantiles), "Quantiles must be in [0, 1]"
+
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self.m2 = np.zeros(shape, dtype=np.float64)
+        self.exceedances = np.zeros((len(self.thresholds),) + shape, dtype=np.int64)
+
+        self.dtype = np.dtype(np.float64)
+        self.members: Optional[np.ndarray] = None
+        if len(self.quantiles) > 0:
+            assert n_members is not None, "n_members is needed to calculate quantiles"
+            self.members = np.full((n_members,) + shape, np.nan, dtype=np.float32)
+        self.n_updated = 0
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a (member, *shape) batch of ensemble members"""
+        assert (
+            values.shape[1:] == self.shape
+        ), f"Expected members of shape {self.shape}. Got {values.shape[1:]}"
+        if self.n_updated == 0:
+            self.dtype = values.dtype
+        if self.members is not None:
+            self.members[self.n_updated : self.n_updated + len(values)] = values
+        self.n_updated += len(values)
+
+        # only the elements with a (non NaN) member in the batch, as most of the
+        # elements can be NaN (e.g. forecast horizons which an initialisation
+        # date doesn't have)
+        values = values.reshape(len(values), -1)
+        is_valid = ~np.isnan(values)
+        count = is_valid.sum(axis=0)
+        idx = np.flatnonzero(count)
+        values, is_valid, count = values[:, idx], is_valid[:, idx], count[idx]
+        values = values.astype(np.float64)
+
+        mean = np.where(is_valid, values, 0).sum(axis=0) / count
+        m2 = np.where(is_valid, (values - mean) ** 2, 0).sum(axis=0)
+
+        # combine the batch with the members so far
+        self_count = self.count.reshape(-1)[idx]
+        total = self_count + count
+        delta = mean - self.mean.reshape(-1)[idx]
+        weight = count / total
+        self.mean.reshape(-1)[idx] += delta * weight
+        self.m2.reshape(-1)[idx] += m2 + delta ** 2 * self_count * weight
+        self.count.reshape(-1)[idx] = total
+
+        for i, threshold in enumerate(self.thresholds):
+            with np.errstate(invalid="ignore"):
+                self.exceedances[i].reshape(-1)[idx] += (values > threshold).sum(axis=0)
+
+    def statistics(
+        self, name: str, mask: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """The statistics of the members so far, where there is at least one
+        (non NaN) member.
+
+        Arguments:
+        ---------
+        name: str
+            The name of the variable. The statistics are `{name}_mean`,
+            `{name}_std`, `{name}_q{100 * quantile}` and `{name}_exceed_{threshold}`
+        mask: Optional[np.ndarray] = None
+            A boolean array of the leading dimensions of `shape`. If not None,
+            only the statistics where it is True are calculated (and returned)
+
+        Returns:
+        -------
+        stats: Dict[str, np.ndarray]
+            The mean and std (as the dtype of the members) and the quantiles and
+            exceedance probabilities (as float32)
+        """
+        count, mean, m2 = self.count, self.mean, self.m2
+        exceedances, members = self.exceedances, self.members
+        if mask is not None:
+            count, mean, m2 = count[mask], mean[mask], m2[mask]
+            exceedances = exceedances[:, mask]
+            if members is not None:
+                members = members[:, mask]
+
+        has_data = count > 0
+        stats = {
+            f"{name}_mean": np.where(has_data, mean, np.nan).astype(self.dtype),
+            f"{name}_std": np.where(
+                has_data, np.sqrt(m2 / np.maximum(count, 1)), np.nan
+            ).astype(self.dtype),
+        }
+        if members is not None:
+            # all the members are one group
+            quantiles = grouped_nanquantile(
+                members, np.zeros(len(members), dtype=int), self.quantiles
+            )[:, 0]
+            for quantile, values in zip(self.quantiles, quantiles):
+                stats[f"{name}_q{100 * quantile:g}"] = values.astype(np.float32)
+        for threshold, exceeding in zip(self.thresholds, exceedances):
+            stats[f"{name}_exceed_{threshold:g}"] = np.where(
+                has_data, exceeding / np.maximum(count, 1), np.nan
+            ).astype(np.float32)
+        return stats
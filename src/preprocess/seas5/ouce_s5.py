@@ -43,8 +43,13 @@ class OuceS5Data:
     daily_s5_dir = Path("/soge-home/data/model/seas5/1.0x1.0/daily")
 
     @staticmethod
-    def add_initialisation_date(ds: xr.Dataset, fname: Path) -> xr.Dataset:
+    def add_initialisation_date(
+        ds: xr.Dataset, fname: Path, expand_dims: bool = True
+    ) -> xr.Dataset:
         date_from_fname = pd.to_datetime(fname.stem.split("_")[-1], format="%Y%m")
+        if not expand_dims:
+            # expanding the dimensions reads the data into memory
+            return ds.assign_coords(initialisation_date=date_from_fname)
         return ds.expand_dims({"initialisation_date": [date_from_fname]})
 
     @staticmethod
@@ -67,23 +72,32 @@ class OuceS5Data:
         time = ds.initialisation_date + ds.forecast_horizon
         return ds.assign_coords(time=time)
 
-    def recreate_cds_s5(self, ds: xr.Dataset, fname: Path, infer: bool) -> xr.Dataset:
+    def recreate_cds_s5(
+        self, ds: xr.Dataset, fname: Path, infer: bool, expand_dims: bool = True
+    ) -> xr.Dataset:
         """convert the preprocessed S5 data into format consistent with
         that downloaded from the CDS API for reproducibility.
         Required because of preprocessing done on OUCE server
+
+        If not `expand_dims`, `initialisation_date` is a scalar coordinate,
+        so that the data is not read until it is used
         """
         # add `initialisation_date` from filename
-        ds = self.add_initialisation_date(ds, fname)
+        ds = self.add_initialisation_date(ds, fname, expand_dims)
         # convert `time` to `forecast_horizon`
         ds = self.create_forecast_horizon(ds, infer)
         # create 2D `time` object (as in CDS API objects)
         ds = self.create_2D_time_coord(ds)
         return ds
 
-    def read_ouce_s5_data(self, path: Path, infer: bool = False) -> xr.Dataset:
+    def read_ouce_s5_data(
+        self, path: Path, infer: bool = False, expand_dims: bool = True
+    ) -> xr.Dataset:
         """ Read and process OUCE S5 data into format consistent with CDS API """
         ds = xr.open_dataset(path)
-        return self.recreate_cds_s5(ds, fname=path, infer=infer)
+        return self.recreate_cds_s5(
+            ds, fname=path, infer=infer, expand_dims=expand_dims
+        )
 
     def get_ouce_filepaths(
         self, variable: str, parent_dir: Optional[Path] = None
@@ -1,15 +1,18 @@
 import numpy as np
 from pathlib import Path
-import pandas as pd
 import xarray as xr
+from collections import defaultdict
 from functools import partial
 import multiprocessing
 from shutil import rmtree
-from typing import Optional, List, Tuple, cast
+from typing import Any, Dict, Optional, List, Tuple, cast
 
 from ..base import BasePreProcessor
+from .ensemble import EnsembleStatistics
 from .ouce_s5 import OuceS5Data
 
+netCDF4 = None
+
 
 class S5Preprocessor(BasePreProcessor):
     dataset: str = "s5"
@@ -45,6 +48,8 @@ class S5Preprocessor(BasePreProcessor):
             ".grb",
         ], f"This method is for \
         `grib` files. Not for {filepath.name}"
+        # the data is read lazily, so only the messages of the selected
+        # initialisation dates / ensemble members are read
         ds = xr.open_dataset(filepath, engine="cfgrib")
 
         ds = ds.rename(
@@ -81,16 +86,25 @@ class S5Preprocessor(BasePreProcessor):
         subset_str: Optional[str] = None,
         regrid: Optional[xr.Dataset] = None,
         ouce_server: bool = False,
+        batch_size: int = 1,
+        member_batch_size: Optional[int] = None,
         **kwargs,
     ) -> Tuple[Path, str]:
-        """preprocess a single s5 dataset (multi-variables per `.nc` file)"""
+        """preprocess a single s5 dataset (multi-variables per `.nc` file)
+
+        The file is read lazily, and converted `batch_size` initialisation dates
+        (and `member_batch_size` ensemble members) at a time, so only one
+        batch is ever in memory. See `_stream_to_netcdf`
+        """
         print(f"\nWorking on {filepath.name}")
 
         if self.ouce_server:
             # undoes the preprocessing so that both are consistent
             infer = kwargs.pop("infer") if "infer" in kwargs.keys() else False
-            # 1. read nc file
-            ds = OuceS5Data().read_ouce_s5_data(filepath, infer=infer)
+            # 1. read nc file (lazily)
+            ds = OuceS5Data().read_ouce_s5_data(
+                filepath, infer=infer, expand_dims=False
+            )
         else:  # downloaded from CDSAPI as .grib
             # 1. read grib file
             ds = self.read_grib_file(filepath)
@@ -123,7 +137,27 @@ class S5Preprocessor(BasePreProcessor):
         if "longitude" in coords:
             ds = ds.rename({"longitude": "lon"})
 
-        # 4. subset ROI
+        # 4. subset, regrid and save each batch
+        self._stream_to_netcdf(
+            ds,
+            vars,
+            output_path,
+            subset_str=subset_str,
+            regrid=regrid,
+            batch_size=batch_size,
+            member_batch_size=member_batch_size,
+        )
+        return output_path, variable
+
+    def _process_batch(
+        self,
+        ds: xr.Dataset,
+        vars: List[str],
+        subset_str: Optional[str] = None,
+        regrid: Optional[xr.Dataset] = None,
+    ) -> xr.Dataset:
+        """Subset and regrid one (lazily read) batch of a s5 dataset"""
+        # subset ROI
         if subset_str is not None:
             try:
                 ds = self.chop_roi(ds, subset_str)
@@ -131,7 +165,7 @@ class S5Preprocessor(BasePreProcessor):
                 print("Retrying regridder with latitudes inverted")
                 ds = self.chop_roi(ds, subset_str, inverse_lat=True)
 
-        # 5. regrid (one variable at a time)
+        # regrid (one variable at a time)
         if regrid is not None:
             assert all(
                 np.isin(["lat", "lon"], [c for c in ds.coords])
@@ -141,39 +175,138 @@ class S5Preprocessor(BasePreProcessor):
             # regrid each variable individually
             all_vars = []
             for var in vars:
-                if self.n_processes > 1:
-                    # if parallel need to recreate new file each time
-                    time = ds[var].time
-                    d_ = self.regrid(
-                        ds[var].to_dataset(name=var),
-                        regrid,
-                        clean=True,
-                        reuse_weights=False,
-                    )
-                    d_ = d_.assign_coords(valid_time=time)
-                else:
-                    time = ds[var].time
-                    d_ = self.regrid(
-                        ds[var].to_dataset(name=var),
-                        regrid,
-                        clean=False,
-                        reuse_weights=True,
-                    )
-                    d_ = d_.assign_coords(valid_time=time)
+                # the regridding weights are cached, so they are only calculated
+                # once (even when running in parallel)
+                time = ds[var].time
+                d_ = self.regrid(ds[var].to_dataset(name=var), regrid)
+                d_ = d_.assign_coords(valid_time=time)
                 all_vars.append(d_)
             # merge the variables into one dataset
-            try:
-                ds = xr.merge(all_vars).sortby("initialisation_date")
-            except ValueError:
-                ds = xr.merge(all_vars)
+            ds = xr.merge(all_vars)
 
         if "initialisation_date" not in [d for d in ds.dims]:
             # add initialisation_date as a dimension
             ds = ds.expand_dims(dim="initialisation_date")
 
-        # 6. save ds to output_path
-        ds.to_netcdf(output_path)
-        return output_path, variable
+        return ds.load()
+
+    @staticmethod
+    def _batches(
+        ds: xr.Dataset, batch_size: int = 1, member_batch_size: Optional[int] = None
+    ) -> List[Dict[str, slice]]:
+        """The indexers of each batch of initialisation dates and ensemble members"""
+        batches: List[Dict[str, slice]] = [{}]
+        for dim, size in [
+            ("initialisation_date", batch_size),
+            ("number", member_batch_size),
+        ]:
+            if dim not in ds.dims:
+                continue
+            size = ds.dims[dim] if size is None else max(size, 1)
+            batches = [
+                {**batch, dim: slice(i, i + size)}
+                for batch in batches
+                for i in range(0, ds.dims[dim], size)
+            ]
+        return batches
+
+    def _stream_to_netcdf(
+        self,
+        ds: xr.Dataset,
+        vars: List[str],
+        output_path: Path,
+        subset_str: Optional[str] = None,
+        regrid: Optional[xr.Dataset] = None,
+        batch_size: int = 1,
+        member_batch_size: Optional[int] = None,
+    ) -> None:
+        """Subset, regrid and write a (lazily read) s5 dataset to netcdf, one batch
+        of `batch_size` initialisation dates and `member_batch_size` ensemble
+        members (all of them, if None) at a time. Only one batch is in memory at once.
+
+        The first batch defines the file, with an unlimited `initialisation_date`
+        dimension and one chunk per initialisation date and batch of members. Every
+        batch is then written into its slice of the file. The file is written to
+        a `.part` file, which is renamed once it is complete
+        """
+        global netCDF4
+        if netCDF4 is None:
+            import netCDF4
+
+        # the same units for every batch, so they can be written to one variable
+        time_encoding = {
+            "units": "hours since 1900-01-01 00:00:00",
+            "calendar": "proleptic_gregorian",
+            "dtype": np.float64,
+        }
+        part_path = output_path.with_name(f"{output_path.name}.part")
+        with netCDF4.Dataset(part_path, "w") as nc:  # type: ignore
+            for indexers in self._batches(ds, batch_size, member_batch_size):
+                batch = self._process_batch(ds.isel(indexers), vars, subset_str, regrid)
+                for name in batch.variables:
+                    if np.issubdtype(batch[name].dtype, np.datetime64):
+                        batch[name].encoding.update(time_encoding)
+                variables, attrs = xr.conventions.encode_dataset_coordinates(batch)
+                variables, attrs = xr.conventions.cf_encoder(variables, attrs)
+
+                if len(nc.dimensions) == 0:
+                    self._create_netcdf(nc, ds, variables, attrs, member_batch_size)
+
+                for name, variable in variables.items():
+                    # the batch's slice of the file
+                    starts = [
+                        indexers[dim].start if dim in indexers else 0
+                        for dim in variable.dims
+                    ]
+                    key = tuple(
+                        slice(start, start + size)
+                        for start, size in zip(starts, variable.shape)
+                    )
+                    nc[name][key] = variable.values
+                print(f"Written {indexers}")
+
+        part_path.replace(output_path)
+
+    @staticmethod
+    def _create_netcdf(
+        nc: Any,
+        ds: xr.Dataset,
+        variables: Dict[str, xr.Variable],
+        attrs: Dict,
+        member_batch_size: Optional[int] = None,
+    ) -> None:
+        """Create the dimensions and variables of the netcdf file from the
+        (cf encoded) variables of the first batch
+        """
+        sizes: Dict[str, Optional[int]] = {}
+        for variable in variables.values():
+            sizes.update({str(dim): size for dim, size in variable.sizes.items()})
+        # the first batch only has some of the initialisation dates / members
+        sizes["initialisation_date"] = None
+        if "number" in ds.dims:
+            sizes["number"] = ds.dims["number"]
+
+        chunks = {"initialisation_date": 1}
+        if member_batch_size is not None:
+            chunks["number"] = max(member_batch_size, 1)
+
+        nc.setncatts(attrs)
+        for dim, size in sizes.items():
+            nc.createDimension(dim, size)
+        for name, variable in variables.items():
+            var_attrs = dict(variable.attrs)
+            fill_value = var_attrs.pop("_FillValue", None)
+            chunksizes = None
+            if "initialisation_date" in variable.dims:
+                chunksizes = [chunks.get(dim, sizes[dim]) for dim in variable.dims]
+            nc.createVariable(
+                name,
+                variable.dtype,
+                variable.dims,
+                fill_value=fill_value,
+                chunksizes=chunksizes,
+            )
+            nc[name].setncatts(var_attrs)
 
     def merge_all_interim_files(self, variable: str) -> xr.Dataset:
         # open all interim processed files (one variable)
@@ -200,30 +333,22 @@ class S5Preprocessor(BasePreProcessor):
     #     return ds
 
     @staticmethod
-    def _map_forecast_horizon_to_months_ahead(stacked: xr.Dataset) -> xr.Dataset:
+    def _months_ahead(forecast_horizons: np.ndarray) -> np.ndarray:
+        """The number of months ahead of each forecast horizon; the nearest whole
+        number of (average length) months. e.g. horizons of 28 - 31 days are 1
+        month ahead, and of 59 - 62 days are 2 months ahead
+        """
+        days = forecast_horizons / np.timedelta64(1, "D")
+        return np.rint(days / 30.4375).astype(int)
+
+    def _map_forecast_horizon_to_months_ahead(self, stacked: xr.Dataset) -> xr.Dataset:
         assert "forecast_horizon" in [c for c in stacked.coords], (
             "Expect the"
             "`stacked` dataset object to have `forecast_horizon` as a coord"
         )
 
         # map forecast horizons to months ahead
-        map_ = {
-            pd.Timedelta("28 days 00:00:00"): 1,
-            pd.Timedelta("29 days 00:00:00"): 1,
-            pd.Timedelta("30 days 00:00:00"): 1,
-            pd.Timedelta("31 days 00:00:00"): 1,
-            pd.Timedelta("59 days 00:00:00"): 2,
-            pd.Timedelta("60 days 00:00:00"): 2,
-            pd.Timedelta("61 days 00:00:00"): 2,
-            pd.Timedelta("62 days 00:00:00"): 2,
-            pd.Timedelta("89 days 00:00:00"): 3,
-            pd.Timedelta("90 days 00:00:00"): 3,
-            pd.Timedelta("91 days 00:00:00"): 3,
-            pd.Timedelta("92 days 00:00:00"): 3,
-        }
-
-        fhs = [pd.Timedelta(fh) for fh in stacked.forecast_horizon.values]
-        months = [map_[fh] for fh in fhs]
+        months = self._months_ahead(stacked.forecast_horizon.values)
         stacked = stacked.assign_coords(months_ahead=("time", months))
 
         return stacked
@@ -275,11 +400,11 @@ class S5Preprocessor(BasePreProcessor):
         """
         print("Stacking the [initialisation_date, forecast_horizon] coords")
         stacked = ds.stack(time=("initialisation_date", "forecast_horizon"))
-        t = stacked.time.values
+        index = stacked.indexes["time"]
 
         # flatten the 2D time array [(timestamp, delta), ...]
-        initialisation_dates = np.array(list(zip(*t))[0])
-        forecast_horizons = np.array(list(zip(*t))[1])
+        initialisation_dates = index.get_level_values("initialisation_date").values
+        forecast_horizons = index.get_level_values("forecast_horizon").values
         times = initialisation_dates + forecast_horizons
 
         # store as dimensions
@@ -323,80 +448,163 @@ class S5Preprocessor(BasePreProcessor):
         ds = ds.isel(number=slice(0, n))
         return ds
 
-    @staticmethod
-    def get_n_timestep_ahead_data(
-        ds: xr.Dataset, n_tstep: int, tstep_coord_name: str = "months_ahead"
-    ) -> xr.Dataset:
-        """ Get the data for the n timesteps ahead """
-        assert tstep_coord_name in [c for c in ds.coords], (
-            "expect the number of timesteps ahead to have been calculated"
-            f" already. Coords: {[c for c in ds.coords]}"
-        )
-
-        variables = [v for v in ds.data_vars]
-        all_nstep_list = []
-        for var in variables:
-            d_nstep = ds.loc[dict(time=ds[tstep_coord_name] == n_tstep)].rename(
-                {var: var + f"_{n_tstep}"}
-            )
-            all_nstep_list.append(d_nstep)
+    def _ensemble_statistics(
+        self,
+        ds: xr.Dataset,
+        quantiles: Optional[List[float]] = None,
+        thresholds: Optional[List[float]] = None,
+        batch_size: int = 1,
+        member_batch_size: Optional[int] = None,
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """The statistics of each variable over the ensemble members (see
+        `EnsembleStatistics`), for the forecasts with data. The (lazily read)
+        members are read in batches of `batch_size` initialisation dates and
+        `member_batch_size` members (all of them, if None), and every
+        statistic is calculated in one pass over them.
 
-        return xr.auto_combine(all_nstep_list)
+        Returns:
+        -------
+        has_data: np.ndarray
+            An (initialisation_date, forecast_horizon) boolean array of the forecasts
+            with any (non NaN) data
+        stats: Dict[str, np.ndarray]
+            (forecast, lat, lon) arrays of each statistic, with one forecast for
+            each True value of has_data
+        """
+        assert "number" in [c for c in ds.coords], (
+            "require `number` to "
+            "be a coord in the Dataset object to collapse the ensemble members"
+        )
+        dims = ["number", "initialisation_date", "forecast_horizon", "lat", "lon"]
+        n_members = ds.dims["number"]
+        member_batch_size = (
+            n_members if member_batch_size is None else max(member_batch_size, 1)
+        )
 
-    def create_variables_for_n_timesteps_predictions(
-        self, ds: xr.Dataset, tstep_coord_name: str = "months_ahead"
-    ) -> xr.Dataset:
-        """Drop the forecast_horizon & initialisation_date variables"""
-        assert all(
-            np.isin(
-                ["initialisation_date", "forecast_horizon", tstep_coord_name],
-                [c for c in ds.coords],
+        has_data = []
+        stats: Dict[str, List[np.ndarray]] = defaultdict(list)
+        for indexers in self._batches(ds, batch_size):
+            batch = ds.isel(initialisation_date=indexers["initialisation_date"])
+            var_stats = []
+            for var in batch.data_vars:
+                print(f"Calculating the ensemble statistics for variable: {var}")
+                ensemble = EnsembleStatistics(
+                    tuple(batch.dims[d] for d in dims[1:]),
+                    n_members=n_members,
+                    quantiles=quantiles,
+                    thresholds=thresholds,
+                )
+                for i in range(0, n_members, member_batch_size):
+                    members = batch[var].isel(number=slice(i, i + member_batch_size))
+                    ensemble.update(members.transpose(*dims).values)
+                var_stats.append((var, ensemble))
+
+            # most (initialisation_date, forecast_horizon) pairs have no forecast
+            batch_has_data = np.any(
+                [(ensemble.count > 0).any(axis=(2, 3)) for _, ensemble in var_stats],
+                axis=0,
             )
-        ), (
-            "Expecting to have "
-            f"initialisation_date forecast_horizon {tstep_coord_name} in ds.coords"
-            f"currently: {[c for c in ds.coords]}"
+            for var, ensemble in var_stats:
+                for name, values in ensemble.statistics(var, batch_has_data).items():
+                    stats[name].append(values)
+            has_data.append(batch_has_data)
+
+        return (
+            np.concatenate(has_data),
+            {name: np.concatenate(values) for name, values in stats.items()},
         )
 
-        timesteps = np.unique(ds[tstep_coord_name])
-        variables = [v for v in ds.data_vars]
+    @staticmethod
+    def _pivot_lead_months(
+        stats: Dict[str, np.ndarray],
+        times: np.ndarray,
+        months_ahead: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+    ) -> xr.Dataset:
+        """Pivot (forecast, lat, lon) arrays into one (lat, lon, time) variable for
+        each array and number of months ahead, `{name}_{n}`.
 
-        all_timesteps = []
-        for step in timesteps:
-            d = self.get_n_timestep_ahead_data(
-                ds, step, tstep_coord_name=tstep_coord_name
+        Every forecast is put in its (months ahead, time) position with one
+        (integer array) assignment per array, rather than selecting each number
+        of months ahead in turn
+        """
+        out_times, time_idx = np.unique(times, return_inverse=True)
+        out_months, month_idx = np.unique(months_ahead, return_inverse=True)
+
+        pivoted = {}
+        for name, values in stats.items():
+            # (months ahead, lat, lon, time)
+            pivoted[name] = np.full(
+                (len(out_months), len(lat), len(lon), len(out_times)),
+                np.nan,
+                dtype=values.dtype,
             )
-            d = d.drop(["initialisation_date", "forecast_horizon", tstep_coord_name])
-            # drop the old variables too (so not duplicated)
-            d = d.drop(variables)
-            all_timesteps.append(d)
+            pivoted[name][month_idx, :, :, time_idx] = values
 
-        return xr.auto_combine(all_timesteps)
+        return xr.Dataset(
+            {
+                f"{name}_{n}": (("lat", "lon", "time"), values[j])
+                for name, values in pivoted.items()
+                for j, n in enumerate(out_months)
+            },
+            coords={"lat": lat, "lon": lon, "time": out_times},
+        )
 
-    @staticmethod
-    def get_variance_and_mean_over_number(ds: xr.Dataset) -> xr.Dataset:
-        """Collapse the 'number' dimension (ensemble members) and return a
-        Dataset with (lat, lon, time) coords and two variables:
-        ['{var}_mean', '{var}_std']
+    def create_lead_month_variables(
+        self,
+        ds: xr.Dataset,
+        n_members: Optional[int] = 25,
+        quantiles: Optional[List[float]] = None,
+        thresholds: Optional[List[float]] = None,
+        batch_size: int = 1,
+        member_batch_size: Optional[int] = None,
+    ) -> xr.Dataset:
+        """Collapse the ensemble members of an
+        (initialisation_date, forecast_horizon, number, lat, lon) dataset to their
+        statistics, and pivot the forecasts into one variable for each number of
+        months ahead: e.g. `{var}_mean_{n}` & `{var}_std_{n}`, with (lat, lon, time)
+        coords, where the time is the time the forecast is of
+        (initialisation_date + forecast_horizon). Forecasts with no data
+        are dropped.
+
+        Arguments:
+        ---------
+        ds: xr.Dataset
+            The merged interim files
+        n_members: Optional[int] = 25
+            Only use the first `n_members` ensemble members (see
+            `select_n_ensemble_members`). If None, all of them are used
+        quantiles: Optional[List[float]] = None
+            The ensemble quantiles to keep as well as the mean and std,
+            `{var}_q{100 * quantile}_{n}`
+        thresholds: Optional[List[float]] = None
+            The thresholds to keep the probability (the fraction of the members)
+            of exceeding, `{var}_exceed_{threshold}_{n}`
+        batch_size: int = 1
+            The number of initialisation dates to read at a time
+        member_batch_size: Optional[int] = None
+            The number of ensemble members to read at a time. If None, all the
+            ensemble members are read at once
         """
-        variables = [v for v in ds.data_vars]
+        if n_members is not None:
+            ds = self.select_n_ensemble_members(ds, n=n_members)
 
-        # ensure that 'number' still exists in the coords
-        assert "number" in [c for c in ds.coords], (
-            "require `number` to "
-            "be a coord in the Dataset object to collapse by mean/std"
+        has_data, stats = self._ensemble_statistics(
+            ds, quantiles, thresholds, batch_size, member_batch_size
         )
 
-        # calculate mean and std collapsing the 'number' coordinate
-        predict_ds_list = []
-        for var in variables:
-            print(f"Calculating the mean / std for forecast variable: {var}")
-            mean_std = []
-            mean_std.append(ds.mean(dim="number").rename({var: var + "_mean"}))
-            mean_std.append(ds.std(dim="number").rename({var: var + "_std"}))
-            predict_ds_list.append(xr.auto_combine(mean_std))
+        # (initialisation_date, forecast_horizon)
+        initialisation_dates = ds.initialisation_date.values[:, np.newaxis]
+        forecast_horizons = ds.forecast_horizon.values[np.newaxis, :]
+        times = (initialisation_dates + forecast_horizons)[has_data]
+        months_ahead = np.broadcast_to(
+            self._months_ahead(forecast_horizons), has_data.shape
+        )[has_data]
 
-        return xr.auto_combine(predict_ds_list)
+        return self._pivot_lead_months(
+            stats, times, months_ahead, ds.lat.values, ds.lon.values
+        )
 
     def _process_interim_files(
         self,
@@ -404,29 +612,29 @@ class S5Preprocessor(BasePreProcessor):
         resample_time: Optional[str] = "M",
         upsampling: bool = False,
         subset_str: Optional[str] = "kenya",
+        n_members: Optional[int] = 25,
+        quantiles: Optional[List[float]] = None,
+        thresholds: Optional[List[float]] = None,
+        batch_size: int = 1,
+        member_batch_size: Optional[int] = None,
     ) -> None:
         # merge all of the preprocessed interim timesteps (../s5_interim/)
         for var in np.unique(variables):
             cast(str, var)
             ds = self.merge_all_interim_files(var)
 
-            # remove 'time' from raw data (calculate from initialisation_date/forecast_horizon)
-            if "time" in [c for c in ds.coords]:
-                ds = ds.drop("time")
-
-            # stack the timesteps to get a more standard dataset format
-            # ('forecast_horizon', 'initialisation_date', 'lat', 'lon', 'number')
-            # --> dims = ('lat', 'lon', 'time', 'number')
-            ds = self.stack_time(ds)
-
-            # select first 25 ensemble members (complete dataset)
-            ds = self.select_n_ensemble_members(ds, n=25)
-
-            # calculate mean/std over 'number'
-            ds = self.get_variance_and_mean_over_number(ds)
-
-            # calculate n_timestep ahead variables
-            ds = self.create_variables_for_n_timesteps_predictions(ds)
+            # calculate the ensemble statistics over the first 25 ensemble members
+            # (the complete dataset) for each number of months ahead
+            # ('initialisation_date', 'forecast_horizon', 'number', 'lat', 'lon')
+            # --> dims = ('lat', 'lon', 'time')
+            ds = self.create_lead_month_variables(
+                ds,
+                n_members=n_members,
+                quantiles=quantiles,
+                thresholds=thresholds,
+                batch_size=batch_size,
+                member_batch_size=member_batch_size,
+            )
 
             # resample time (N.B. if done before stacking time changes initialisation_date ...)
             if resample_time is not None:
@@ -448,6 +656,11 @@ class S5Preprocessor(BasePreProcessor):
         resample_time: Optional[str] = "M",
         upsampling: bool = False,
         cleanup: bool = False,
+        batch_size: int = 1,
+        member_batch_size: Optional[int] = None,
+        n_members: Optional[int] = 25,
+        quantiles: Optional[List[float]] = None,
+        exceedance_thresholds: Optional[List[float]] = None,
         **kwargs,
     ) -> None:
         """Preprocesses the S5 data for all variables in the 'ds' file at once
@@ -478,6 +691,25 @@ class S5Preprocessor(BasePreProcessor):
         cleanup: bool = False
             Whether to cleanup the self.interim directory
 
+        batch_size: int = 1
+            The number of initialisation dates to read, regrid and write at a time
+
+        member_batch_size: Optional[int] = None
+            The number of ensemble members to read, regrid and write at a time.
+            If None, all the ensemble members are in each batch
+
+        n_members: Optional[int] = 25
+            The number of ensemble members to calculate the ensemble statistics
+            over (the first 25 are complete). If None, all of them are used
+
+        quantiles: Optional[List[float]] = None
+            The ensemble quantiles (between 0 and 1) to keep as well as the
+            mean and std. e.g. [0.1, 0.5, 0.9]. They are stored as float32
+
+        exceedance_thresholds: Optional[List[float]] = None
+            The thresholds to keep the probability (the fraction of the
+            ensemble members) of exceeding. They are stored as float32
+
         kwargs: dict
             keyword arguments (mostly for pytest!)
             'ouce_dir' : Path - the test directory to use for reading .nc files
@@ -516,6 +748,8 @@ class S5Preprocessor(BasePreProcessor):
                     subset_str=subset_str,
                     regrid=regrid_ds,
                     ouce_server=self.ouce_server,
+                    batch_size=batch_size,
+                    member_batch_size=member_batch_size,
                     **kwargs,
                 )
                 out_paths.append(output_path)
@@ -530,6 +764,8 @@ class S5Preprocessor(BasePreProcessor):
                     ouce_server=self.ouce_server,
                     subset_str=subset_str,
                     regrid=regrid,
+                    batch_size=batch_size,
+                    member_batch_size=member_batch_size,
                 ),
                 filepaths,
             )
@@ -541,6 +777,11 @@ class S5Preprocessor(BasePreProcessor):
             subset_str=subset_str,
             resample_time=resample_time,
             upsampling=upsampling,
+            n_members=n_members,
+            quantiles=quantiles,
+            thresholds=exceedance_thresholds,
+            batch_size=batch_size,
+            member_batch_size=member_batch_size,
         )
 
         if cleanup:
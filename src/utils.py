@@ -10,7 +10,7 @@ import xarray as xr
 import numpy as np
 from scipy import stats
 
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple, Union
 
 
 Region = namedtuple("Region", ["name", "lonmin", "lonmax", "latmin", "latmax"])
@@ -107,12 +107,15 @@ def get_ds_mask(ds: xr.Dataset) -> xr.Dataset:
 
 
 def create_shape_aligned_climatology(
-    ds: xr.Dataset, clim: xr.Dataset, variable: str, time_period: str
-):
+    ds: xr.Dataset, clim: xr.Dataset, variable: str, time_period: str = "month"
+) -> xr.Dataset:
     """match the time dimension of `clim` to the shape of `ds` so that can
     perform simple calculations / arithmetic on the values of clim.
 
-    Copy the climatology array forwards through time. Copy forwards through time.
+    The climatology of each timestep is gathered with a single (vectorised) index
+    on its `time_period`, rather than being copied forwards timestep by timestep.
+    If `ds` is backed by dask arrays, the climatology is gathered lazily, with the
+    same chunks as `ds`, so that it can be compared to `ds` out-of-core.
 
     Arguments:
     ---------
@@ -137,34 +140,98 @@ def create_shape_aligned_climatology(
     for coord in ["lat", "lon"]:
         assert coord in [c for c in ds.coords]
 
-    ds[time_period] = ds[f"time.{time_period}"]
+    da = ds[variable]
+    clim_da = clim[variable]
+    if da.chunks is not None:
+        # a dask array, so the gathered climatology is too
+        clim_da = clim_da.chunk()
 
-    values = clim[variable].values
-    keys = clim[time_period].values
-    # map the `time_period` to the `values` of the climatology (threshold or mean)
-    lookup_dict = dict(zip(keys, values))
-
-    # extract an array of the `time_period` values from the `ds`
-    timevals = ds[time_period].values
-
-    # use the lat lon arrays (climatology values) in `lookup_dict` corresponding
-    #  to time_period values defined in `timevals` and stack into new array
-    new_clim_vals = np.stack([lookup_dict[timevals[i]] for i in range(len(timevals))])
+    # the `time_period` of each timestep in `ds` (e.g. its month) selects the
+    # climatology values of that period
+    new_clim = clim_da.sel({time_period: ds[f"time.{time_period}"]})
+    new_clim = new_clim.drop(time_period).transpose(*da.dims)
 
     assert (
-        new_clim_vals.shape == ds[variable].shape
+        new_clim.shape == da.shape
     ), f"\
         Shapes for new_clim_vals and ds must match! \
-         new_clim_vals.shape: {new_clim_vals.shape} \
-         ds.shape: {ds[variable].shape}"
+         new_clim_vals.shape: {new_clim.shape} \
+         ds.shape: {da.shape}"
 
-    # copy that forward in time
-    new_clim = xr.Dataset(
-        {variable: (["time", "lat", "lon"], new_clim_vals)},
-        coords={"lat": clim.lat, "lon": clim.lon, "time": ds.time},
-    )
+    if da.chunks is not None:
+        new_clim = new_clim.chunk(dict(zip(da.dims, da.chunks)))
+
+    return new_clim.to_dataset(name=variable)
+
+
+def grouped_nanquantile(
+    values: np.ndarray,
+    groups: np.ndarray,
+    q: Union[float, List[float]],
+    chunk_size: Optional[int] = None,
+) -> np.ndarray:
+    """Calculate the quantiles `q` of `values` (along the first, time, axis) in each
+    group of timesteps, ignoring NaNs and linearly interpolating between the
+    values as `np.nanpercentile` does.
+
+    The timesteps of each group are sorted once, for all the pixels at the same
+    time, and every quantile is read from the sorted values.
 
-    return new_clim
+    Arguments:
+    ---------
+    values: np.ndarray
+        the (time, ...) values, e.g. (time, lat, lon)
+
+    groups: np.ndarray
+        the group (from 0 to n_groups - 1) of each timestep, e.g. its month - 1
+
+    q: Union[float, List[float]]
+        the quantile(s) to calculate, between 0 and 1
+
+    chunk_size: Optional[int] = None
+        the number of rows of the second (e.g. lat) axis sorted at once, to limit
+        the memory used. By default the whole array is sorted at once
+
+    Returns:
+    -------
+    np.ndarray of shape (len(q), n_groups, ...)
+    """
+    quantiles = np.atleast_1d(np.asarray(q, dtype=np.float64))
+    assert ((quantiles >= 0) & (quantiles <= 1)).all(), "q must be in [0, 1]"
+    assert values.ndim >= 2, "values must have at least (time, pixel) dimensions"
+
+    n_groups = int(groups.max()) + 1
+    output = np.full((len(quantiles), n_groups) + values.shape[1:], np.nan)
+
+    # the timesteps of each group, in order
+    order = np.argsort(groups, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(groups, minlength=n_groups))])
+
+    if chunk_size is None:
+        chunk_size = max(values.shape[1], 1)
+    # quantiles, broadcastable against the (1, ...) counts
+    q_shape = quantiles.reshape((-1,) + (1,) * (values.ndim - 1))
+
+    for start in range(0, values.shape[1], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        for group in range(n_groups):
+            in_group = order[bounds[group] : bounds[group + 1]]
+            if len(in_group) == 0:
+                continue
+            # NaNs are sorted last
+            sorted_values = np.sort(values[in_group, chunk], axis=0)
+            count = (~np.isnan(sorted_values)).sum(axis=0, keepdims=True)
+
+            position = q_shape * (count - 1)
+            lower = np.maximum(np.floor(position).astype(np.int64), 0)
+            upper = np.minimum(lower + 1, np.maximum(count - 1, 0))
+
+            lower_values = np.take_along_axis(sorted_values, lower, axis=0)
+            upper_values = np.take_along_axis(sorted_values, upper, axis=0)
+            quantile = lower_values + (position - lower) * (upper_values - lower_values)
+            output[:, group, chunk] = np.where(count > 0, quantile, np.nan)
+
+    return output
 
 
 def get_modal_value_across_time(da: xr.DataArray) -> xr.DataArray:
@@ -1,5 +1,9 @@
+import numpy as np
 import xarray as xr
 
+import pytest
+
+from src.analysis.indices import DecileIndex, DroughtSeverityIndex, MovingAverage
 from src.analysis.indices.base import BaseIndices
 from tests.utils import _create_dummy_precip_data
 
@@ -27,3 +31,42 @@ class TestBase:
         assert (
             data_path / "analysis" / "indices" / "SPI.nc"
         ).exists(), "Expected to have created a new `.nc` file"
+
+    @pytest.mark.parametrize(
+        "index,kwargs",
+        [
+            (DroughtSeverityIndex, {}),
+            (DecileIndex, {}),
+            (MovingAverage, {"resample_str": "M"}),
+        ],
+    )
+    def test_chunked_save(self, tmp_path, index, kwargs):
+        file_path = _create_dummy_precip_data(
+            tmp_path, start_date="2000-01-01", end_date="2010-01-01"
+        )
+        ds = xr.open_dataset(file_path / "data_kenya.nc")
+        ds["precip"] = ds.precip.astype(float)
+        # a block which is missing for the first year
+        ds["precip"][:12, :10, :10] = np.nan
+        ds.to_netcdf(tmp_path / "data.nc")
+
+        in_memory = index(tmp_path / "data.nc", **kwargs)
+        in_memory.fit(variable="precip")
+
+        chunked = index(tmp_path / "data.nc", chunks={"lat": 10, "lon": 7}, **kwargs)
+        chunked.fit(variable="precip")
+        with pytest.raises(AttributeError):
+            # the index is only calculated when it is saved
+            chunked.index
+        chunked.save(tmp_path / "data")
+
+        assert (
+            tmp_path / "data" / "analysis" / "indices" / f"{chunked.name}.nc"
+        ).exists()
+        for var in in_memory.index.data_vars:
+            expected = in_memory.index[var].transpose("time", "lat", "lon")
+            got = chunked.index[var].sel(
+                time=expected.time, lat=expected.lat, lon=expected.lon
+            )
+            assert got.dtype == expected.dtype
+            assert np.allclose(got.values, expected.values, equal_nan=True)
@@ -0,0 +1,101 @@
+import numpy as np
+import xarray as xr
+
+import pytest
+
+from src.analysis.indices import ZScoreIndex, DroughtSeverityIndex
+from src.analysis.indices.climatology import Climatology
+from src.analysis.indices.utils import rolling_cumsum
+from tests.utils import _create_dummy_precip_data
+
+
+class TestClimatology:
+    @staticmethod
+    def _make_ds(tmp_path):
+        data_path = _create_dummy_precip_data(
+            tmp_path, start_date="2000-01-01", end_date="2010-01-01"
+        )
+        ds = xr.open_dataset(data_path / "data_kenya.nc")
+        ds["precip"] = ds.precip.astype(np.float64)
+        # missing values, and ties within a month
+        ds["precip"][5:7, 3, 3] = np.nan
+        ds["precip"][:, 0, 0] = 1
+        return ds
+
+    def test_ds_window(self, tmp_path):
+        ds = self._make_ds(tmp_path)
+        clim = Climatology(ds, "precip", rolling_window=3)
+
+        expected = rolling_cumsum(ds, 3).precip.transpose("time", "lat", "lon")
+        assert (clim.ds_window.time.values == expected.time.values).all()
+        assert np.allclose(clim.values, expected.values, equal_nan=True)
+
+    def test_statistics(self, tmp_path):
+        ds = self._make_ds(tmp_path)
+        clim = Climatology(ds, "precip", rolling_window=3, time_period="month")
+        da = rolling_cumsum(ds, 3).precip.transpose("time", "lat", "lon")
+        grouped = da.groupby("time.month")
+
+        expected = {
+            "mean": grouped.mean(dim="time"),
+            "std": grouped.std(dim="time"),
+            "min": grouped.min(dim="time"),
+            "max": grouped.max(dim="time"),
+            "median": grouped.median(dim="time"),
+        }
+        for stat, expected_stat in expected.items():
+            aligned = expected_stat.sel(month=da["time.month"])
+            got = getattr(clim, stat)()
+            assert got.dims == ("time", "lat", "lon")
+            assert np.allclose(got.values, aligned.values, equal_nan=True), stat
+
+        quantile = grouped.quantile(0.9, dim="time").sel(month=da["time.month"])
+        assert np.allclose(clim.quantile(0.9).values, quantile.values, equal_nan=True)
+
+        sizes = clim.period_size().isel(lat=0, lon=0).values
+        expected_sizes = (
+            da.time.groupby("time.month").count().sel(month=da["time.month"])
+        )
+        assert (sizes == expected_sizes.values).all()
+
+    def test_rank(self, tmp_path):
+        ds = self._make_ds(tmp_path)
+        clim = Climatology(ds, "precip", rolling_window=3, time_period="month")
+        da = rolling_cumsum(ds, 3).precip.transpose("time", "lat", "lon")
+
+        expected = np.full(da.shape, np.nan)
+        for month in range(1, 13):
+            in_month = (da["time.month"] == month).values
+            expected[in_month] = da.isel(time=in_month).rank(dim="time").values
+        got = clim.rank()
+        assert np.allclose(got.values, expected, equal_nan=True)
+        # tied values are given their average rank
+        tied = got.isel(lat=0, lon=0).values
+        expected_tied = (clim.period_size().isel(lat=0, lon=0).values + 1) / 2
+        assert (tied == expected_tied).all()
+
+        rank_norm = clim.normalised_rank().values
+        assert np.nanmin(rank_norm) == 0
+        assert np.nanmax(rank_norm) == 100
+        assert np.isnan(rank_norm).sum() == np.isnan(expected).sum()
+
+    def test_shared_climatology(self, tmp_path):
+        ds = self._make_ds(tmp_path)
+        clim = Climatology(ds, "precip", rolling_window=3, time_period="month")
+
+        shared = ZScoreIndex(ds=ds)
+        shared.fit(variable="precip", climatology=clim)
+        own = ZScoreIndex(ds=ds)
+        own.fit(variable="precip")
+        assert np.allclose(
+            shared.index.ZSI.values, own.index.ZSI.values, equal_nan=True
+        )
+
+        # the statistics are calculated once, and reused by the other indices
+        assert "quantile_0.5" in clim._cache
+        dsi = DroughtSeverityIndex(ds=ds)
+        dsi.fit(variable="precip", climatology=clim)
+        assert "rank" in clim._cache
+
+        with pytest.raises(AssertionError):
+            dsi.fit(variable="precip", rolling_window=6, climatology=clim)
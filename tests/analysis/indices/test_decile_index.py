@@ -1,4 +1,5 @@
 import numpy as np
+import xarray as xr
 import pytest
 
 from tests.utils import _create_dummy_precip_data
@@ -43,3 +44,18 @@ class TestDecileIndex:
             f"Expect max "
             f"rank_norm to be 100. Got: {di.index.rank_norm.max().values}"
         )
+
+    def test_bin_to_classes(self):
+        rank_norm = xr.DataArray(
+            np.append(np.linspace(0, 100, 101), np.nan), dims=["time"], name="rank"
+        )
+        decile = DecileIndex.bin_to_classes(rank_norm, 10, "decile")
+        assert decile.dtype == np.int8
+        assert decile.name == "decile"
+
+        # 0 is missing, and the classes are the same size (100 is in the last)
+        counts = np.bincount(decile.values)
+        assert (counts == [1] + [10] * 9 + [11]).all()
+
+        quintile = DecileIndex.bin_to_quintiles(rank_norm)
+        assert (quintile.values[:-1] == (decile.values[:-1] + 1) // 2).all()
@@ -3,6 +3,7 @@ import numpy as np
 
 from tests.utils import _create_dummy_precip_data
 from src.analysis.indices import SPI
+from src.analysis.indices.spi import compute_spi, pearson_cdf, pearson_parameters
 
 
 class TestSPI:
@@ -71,3 +72,78 @@ class TestSPI:
             "Expect the `std()` SPI6 value to be close to 0 because"
             "converted to a standard normal distribution"
         )
+
+    def test_pearson(self, tmp_path):
+        data_path = _create_dummy_precip_data(
+            tmp_path, start_date="2000-01-01", end_date="2010-01-01"
+        )
+        spi = SPI(data_path / "data_kenya.nc")
+        spi.fit(variable="precip", distribution="pearson", n_workers=2)
+
+        assert spi.index.SPI3.shape == spi.ds.precip.shape
+        assert np.isclose(spi.index.SPI3.mean(), 0, atol=0.05)
+        # the (uniformly distributed) dummy data isn't well fitted by the
+        # pearson distribution, so its SPI is less spread out than the gamma's
+        assert 0.8 < spi.index.SPI3.std() < 1.1
+
+    def test_compute_spi(self):
+        from scipy import stats
+
+        years = np.repeat(np.arange(2000, 2020), 12)
+        months = np.tile(np.arange(1, 13), 20)
+        precip = np.random.gamma(2, 10, size=(len(years), 20))
+        precip[:, 0] = 0
+        precip[5, 1] = np.nan
+
+        spi = compute_spi(precip, months, years, scale=1, distribution="gamma")
+        assert np.isnan(spi[5, 1]), "Missing values should stay missing"
+        # a pixel with no rain is always at its probability of zero (1)
+        assert (spi[:, 0] == 3.09).all()
+
+        # the same as fitting each month of each pixel individually
+        values = precip[months == 1, 2]
+        a = np.log(values.mean()) - np.log(values).mean()
+        alpha = (1 + np.sqrt(1 + 4 * a / 3)) / (4 * a)
+        expected = stats.norm.ppf(
+            stats.gamma.cdf(values, a=alpha, scale=values.mean() / alpha)
+        )
+        assert np.allclose(spi[months == 1, 2], np.clip(expected, -3.09, 3.09))
+
+        # chunking the pixels gives the same values
+        chunked = compute_spi(
+            precip, months, years, scale=1, pixel_chunk_size=3, n_workers=2
+        )
+        assert np.allclose(spi, chunked, equal_nan=True)
+
+    def test_compute_spi_calibration(self):
+        years = np.repeat(np.arange(2000, 2020), 12)
+        months = np.tile(np.arange(1, 13), 20)
+        precip = np.random.gamma(2, 10, size=(len(years), 5))
+        # a much wetter period outside of the calibration years
+        precip[years >= 2015] *= 10
+
+        spi = compute_spi(
+            precip,
+            months,
+            years,
+            scale=3,
+            calibration_year_initial=2000,
+            calibration_year_final=2014,
+        )
+        assert np.isnan(spi[:2]).all()
+        assert np.isclose(np.nanmean(spi[years < 2015]), 0, atol=0.1)
+        assert (spi[years >= 2016] > 1).all()
+
+    def test_pearson_parameters(self):
+        from scipy import stats
+
+        values = stats.pearson3.rvs(1.0, loc=10, scale=3, size=(5000, 1))
+        loc, scale, skew = pearson_parameters(values)
+        assert np.allclose([loc[0], scale[0], skew[0]], [10, 3, 1], rtol=0.1)
+
+        x = np.linspace(0, 20, 10)
+        assert np.allclose(
+            pearson_cdf(x, loc, scale, skew),
+            stats.pearson3.cdf(x, 1.0, 10, 3),
+            atol=0.02,
+        )
@@ -130,6 +130,22 @@ class TestAdministrativeRegionAnalysis(TestRegionAnalysis):
             ["datetime", "region_name", "predicted_mean_value", "true_mean_value"],
             df.columns,
         ).all()
+        # the index column is the region's position in its timestep
+        for _, positions in df.groupby("datetime")["index"]:
+            assert sorted(positions) == [0, 1, 2]
+
+    def test_analyze_single_no_true_data(self, tmp_path, capsys):
+        self._create_dummy_true_preds_data(tmp_path)
+        self._create_dummy_admin_boundaries_data(tmp_path, prefix="1")
+        for path in (tmp_path / "features").glob("**/y.nc"):
+            path.unlink()
+
+        region_data_dir = tmp_path / "analysis" / "boundaries_preprocessed"
+        region_data_path = region_data_dir / f"province_l1_kenya.nc"
+
+        analyser = AdministrativeRegionAnalysis(tmp_path)
+        assert analyser._analyze_single(region_data_path=region_data_path) is None
+        assert "No DataFrames Created" in capsys.readouterr().out
 
     def test_analyzer_analyze(self, tmp_path):
         # create the dummy data
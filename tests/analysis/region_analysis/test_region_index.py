@@ -0,0 +1,62 @@
+import numpy as np
+import xarray as xr
+
+from src.analysis.region_analysis import RegionIndex
+from tests.utils import _make_dataset
+
+
+class TestRegionIndex:
+    @staticmethod
+    def _make_data():
+        ds, _, _ = _make_dataset(
+            (30, 30),
+            variable_name="VHI",
+            lonmin=30,
+            lonmax=35,
+            latmin=-2,
+            latmax=2,
+            start_date="2018-01-31",
+            end_date="2018-06-30",
+        )
+        da = ds.VHI.astype(float)
+        da.values[0, :5, :5] = np.nan
+        region_da = xr.DataArray(
+            np.random.randint(0, 4, (30, 30)),
+            dims=["lat", "lon"],
+            coords={"lat": da.lat, "lon": da.lon},
+        )
+        return da, region_da
+
+    def test_from_region_da(self):
+        da, region_da = self._make_data()
+        # region 3 is not in the lookup, and region 5 has no pixels
+        region_lookup = {2: "region_2", 0: "region_0", 1: "region_1", 5: "region_5"}
+        region_index = RegionIndex.from_region_da(region_da, region_lookup)
+        assert region_index.region_names == list(region_lookup.values())
+
+        means = region_index.mean(da)
+        assert means.dims == ("region", "time")
+        for region_id, region_name in region_lookup.items():
+            expected = da.where(region_da == region_id).mean(dim=["lat", "lon"])
+            got = means.sel(region=region_name)
+            assert np.allclose(got.values, expected.values, equal_nan=True)
+
+            total = region_index.total_mean(da)[list(region_lookup).index(region_id)]
+            expected_total = da.where(region_da == region_id).mean().values
+            assert np.allclose(total, expected_total, equal_nan=True)
+
+    def test_from_landcover_das(self):
+        da, region_da = self._make_data()
+        landcover_das = [(region_da == i).astype(int) for i in range(4)]
+        region_index = RegionIndex.from_landcover_das(
+            landcover_das, [f"lc_{i}" for i in range(4)]
+        )
+
+        # the data are put on the grid of the regions
+        means = region_index.mean(da.isel(lat=slice(0, 20)))
+        for i, landcover_da in enumerate(landcover_das):
+            expected = da.isel(lat=slice(0, 20)).where(landcover_da == 1)
+            assert np.allclose(
+                means.sel(region=f"lc_{i}").values,
+                expected.mean(dim=["lat", "lon"]).values,
+            )
@@ -1,18 +1,23 @@
+import pandas as pd
 import xarray as xr
 import numpy as np
+import pytest
+from sklearn.metrics import r2_score, mean_absolute_error
 
 from src.analysis.evaluation import (
     # spatial_rmse,
     # spatial_r2,
-    # rmse,
-    # annual_scores,
+    rmse,
+    annual_scores,
     # annual_scores_to_dataframe,
     # read_pred_data,
     # read_true_data,
-    # monthly_score,
+    monthly_score,
     # plot_predictions,
     read_train_data,
     read_test_data,
+    load_predictions,
+    skill_scores,
 )
 
 from ..utils import _create_features_dir
@@ -35,3 +40,123 @@ class TestEvaluation:
         X, y = read_test_data(tmp_path)
         assert isinstance(X, xr.Dataset)
         assert isinstance(y, xr.Dataset)
+
+    @staticmethod
+    def _create_preds(tmp_path, models, pred_years):
+        """save noisy predictions of the test y, for some of the pixels (as the
+        models do), to data/models/one_month_forecast/{model}
+        """
+        for i, model in enumerate(models):
+            model_dir = tmp_path / "models" / "one_month_forecast" / model
+            model_dir.mkdir(parents=True, exist_ok=True)
+            for year in pred_years:
+                for month in range(1, 13):
+                    y = xr.open_dataset(
+                        tmp_path
+                        / "features"
+                        / "one_month_forecast"
+                        / "test"
+                        / f"{year}_{month}"
+                        / "y.nc"
+                    )
+                    noise = np.random.normal(scale=10 * (i + 1), size=y.vci.shape)
+                    preds = (y.vci + noise).rename("preds").isel(lat=slice(0, 25))
+                    preds.to_dataset().to_netcdf(model_dir / f"preds_{year}_{month}.nc")
+
+    def test_skill_scores(self, tmp_path):
+        _create_features_dir(tmp_path, train=False)
+        models = ["linear_regression", "ealstm"]
+        self._create_preds(tmp_path, models, [2000, 2001])
+
+        true_da, pred_da = load_predictions(
+            models, pred_years=[2000, 2001], data_path=tmp_path, target_var="vci"
+        )
+        assert pred_da.dims == ("model", "time", "lat", "lon")
+        assert pred_da.shape == (2, 24, 30, 30)
+        assert np.isnan(pred_da.values[:, :, 25:]).all()
+
+        scores = skill_scores(true_da, pred_da, reference="linear_regression")
+        for model in models:
+            for time in range(24):
+                true = true_da.values[time, :25].ravel()
+                preds = pred_da.sel(model=model).values[time, :25].ravel()
+                got = scores.sel(model=model).isel(time=time)
+                assert np.isclose(got.rmse, rmse(true, preds))
+                assert np.isclose(got.r2, r2_score(true, preds))
+                assert np.isclose(got.mae, mean_absolute_error(true, preds))
+                assert np.isclose(got.bias, (preds - true).mean())
+        assert (scores.skill.sel(model="linear_regression") == 0).all()
+
+        by_month = skill_scores(true_da, pred_da, groupby="month", metrics=["rmse"])
+        by_year = skill_scores(true_da, pred_da, groupby="year", metrics=["rmse"])
+        assert by_month.rmse.shape == (2, 12)
+        assert (by_year.year.values == [2000, 2001]).all()
+        for year in [2000, 2001]:
+            in_year = (true_da["time.year"] == year).values
+            true = true_da.values[in_year, :25].ravel()
+            preds = pred_da.values[0, in_year, :25].ravel()
+            assert np.isclose(by_year.rmse.sel(year=year)[0], rmse(true, preds))
+
+        by_pixel = skill_scores(true_da, pred_da, groupby="pixel", metrics=["bias"])
+        assert by_pixel.bias.dims == ("model", "lat", "lon")
+        expected = (pred_da - true_da).mean(dim="time")
+        assert np.allclose(by_pixel.bias.values, expected.values, equal_nan=True)
+
+        regions = xr.ones_like(true_da.isel(time=0)) * np.nan
+        regions[:10] = 1
+        regions[10:20] = 5
+        by_region = skill_scores(
+            true_da, pred_da, groupby="region", metrics=["mae"], regions=regions
+        )
+        assert (by_region.region.values == [1, 5]).all()
+        true = true_da.values[:, 10:20].ravel()
+        preds = pred_da.values[1, :, 10:20].ravel()
+        assert np.isclose(
+            by_region.mae.sel(region=5)[1], mean_absolute_error(true, preds)
+        )
+
+        with pytest.raises(AssertionError):
+            skill_scores(true_da, pred_da, metrics=["skill"])
+
+    def test_annual_scores(self, tmp_path):
+        _create_features_dir(tmp_path, train=False)
+        models = ["linear_regression", "ealstm"]
+        self._create_preds(tmp_path, models, [2000, 2001])
+
+        scores = annual_scores(
+            models,
+            data_path=tmp_path,
+            pred_years=[2000, 2001],
+            target_var="vci",
+            verbose=False,
+        )
+        assert list(scores[2001]["rmse"]["month"]) == list(range(1, 13))
+        assert list(scores[2001]["rmse"]["year"]) == [2001] * 12
+
+        for month in [1, 7]:
+            month_scores = monthly_score(
+                month,
+                models,
+                metrics=["rmse", "r2"],
+                data_path=tmp_path,
+                pred_year=2001,
+                target_var="vci",
+                verbose=False,
+            )
+            for model in models:
+                for metric in ["rmse", "r2"]:
+                    assert np.isclose(
+                        scores[2001][metric][model][month - 1],
+                        month_scores[model][metric],
+                    )
+
+        df = annual_scores(
+            models,
+            data_path=tmp_path,
+            pred_years=[2000, 2001],
+            target_var="vci",
+            verbose=False,
+            to_dataframe=True,
+        )
+        assert isinstance(df, pd.DataFrame)
+        assert len(df) == 2 * 12 * 2
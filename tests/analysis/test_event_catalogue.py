@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import pytest
+
+from src.analysis import EventCatalogue
+
+
+class TestEventCatalogue:
+    @staticmethod
+    def _make_exceedences(exceed):
+        times = pd.date_range("2000-01-01", freq="M", periods=exceed.shape[0])
+        return xr.DataArray(
+            exceed,
+            dims=["time", "lat", "lon"],
+            coords={
+                "time": times,
+                "lat": np.arange(exceed.shape[1]),
+                "lon": np.arange(exceed.shape[2]),
+            },
+        )
+
+    def test_label(self):
+        exceed = np.zeros((6, 4, 4), dtype=bool)
+        # an event which moves diagonally over 3 timesteps
+        exceed[0, 0, 0] = exceed[1, 1, 1] = exceed[2, 2, 2] = True
+        # a 2 pixel event lasting 2 timesteps
+        exceed[3:5, 0, 0:2] = True
+        da = self._make_exceedences(exceed)
+        intensity = xr.ones_like(da, dtype=float) * np.arange(6)[:, None, None]
+
+        # only connected through corners
+        catalogue = EventCatalogue(connectivity=1)
+        catalogue.label(da, intensity)
+        assert len(catalogue.events) == 4
+
+        catalogue = EventCatalogue(connectivity=3)
+        catalogue.label(da, intensity)
+        events = catalogue.events
+        assert len(events) == 2
+
+        diagonal = events.loc[catalogue.labels.values[0, 0, 0]]
+        assert diagonal.duration == 3
+        assert diagonal.max_area == 1
+        assert diagonal.peak_intensity == 2
+
+        second = events.loc[catalogue.labels.values[3, 0, 0]]
+        assert second.start_time == pd.to_datetime("2000-04-30")
+        assert second.duration == 2
+        assert second.total_area == 4
+
+        track = catalogue.tracks[catalogue.tracks.label == diagonal.name]
+        assert (track.lat.values == [0, 1, 2]).all()
+        assert (catalogue.labels.values[~exceed] == 0).all()
+
+    @pytest.mark.parametrize("connectivity", [1, 2, 3])
+    def test_update(self, connectivity):
+        exceed = np.random.uniform(size=(30, 8, 10)) < 0.4
+        da = self._make_exceedences(exceed)
+
+        full = EventCatalogue(connectivity)
+        full.label(da)
+
+        incremental = EventCatalogue(connectivity)
+        incremental.label(da.isel(time=slice(0, 10)))
+        incremental.update(da.isel(time=slice(10, 11)))
+        incremental.update(da.isel(time=slice(11, 30)))
+
+        assert len(incremental.events) == len(full.events)
+        # the events are the same, even though the labels may differ
+        pairs = set(zip(full.labels.values[exceed], incremental.labels.values[exceed]))
+        assert len(pairs) == len(full.events)
+
+        label_map = dict(pairs)
+        full_events = full.events.rename(index=label_map).sort_index()
+        assert (
+            full_events[["duration", "total_area"]].values
+            == incremental.events[["duration", "total_area"]].values
+        ).all()
+
+    def test_save_load(self, tmp_path):
+        exceed = np.random.uniform(size=(10, 5, 5)) < 0.4
+        da = self._make_exceedences(exceed)
+
+        catalogue = EventCatalogue(connectivity=2)
+        catalogue.label(da.isel(time=slice(0, 5)))
+        catalogue.save(tmp_path / "events")
+
+        for filename in ["labels.nc", "tracks.csv", "events.csv"]:
+            assert (tmp_path / "events" / filename).exists()
+
+        loaded = EventCatalogue.load(tmp_path / "events")
+        assert loaded.connectivity == 2
+        assert loaded.events.equals(catalogue.events)
+
+        loaded.update(da.isel(time=slice(5, 10)))
+        catalogue.update(da.isel(time=slice(5, 10)))
+        assert (loaded.labels.values == catalogue.labels.values).all()
+
+        with pytest.raises(AssertionError):
+            # the timesteps have already been labelled
+            loaded.update(da.isel(time=slice(5, 10)))
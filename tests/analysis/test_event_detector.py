@@ -150,6 +150,60 @@ class TestEventDetector:
         runs = e.calculate_runs()
         assert runs.max().values == 4, f"Expected the longest run to be 4 (below q10)"
 
+    def test_run_statistics(self, tmp_path):
+        in_path = self.create_test_consec_data(tmp_path)
+
+        e = EventDetector(in_path)
+        e.detect(variable="precip", time_period="month", hilo="low", method="q10")
+
+        runs = e.calculate_runs(lat_chunk_size=2)
+        assert (runs == e.calculate_runs()).all()
+
+        longest = e.calculate_longest_run(lat_chunk_size=2)
+        assert longest.dims == ("lat", "lon")
+        assert (longest == 4).all()
+        assert (e.calculate_run_count(lat_chunk_size=3) == 2).all()
+        assert e.calculate_current_run_length().max() == 4
+
+        events = e.calculate_events(lat_chunk_size=2)
+        # two events in every pixel
+        assert len(events) == 2 * 25
+        assert (events.lat.value_counts() == 10).all()
+        first = events[(events.lat == 0) & (events.lon == 0)].iloc[0]
+        assert first.start_time == pd.to_datetime("2000-04-30")
+        assert first.end_time == pd.to_datetime("2000-07-31")
+        assert first.duration == 4
+        assert first.severity > 0
+
+    def test_label_events(self, tmp_path):
+        in_path = self.create_test_consec_data(tmp_path)
+
+        e = EventDetector(in_path)
+        e.detect(variable="precip", time_period="month", hilo="low", method="q10")
+        catalogue = e.label_events(connectivity=1)
+
+        # the two runs cover every pixel, so each is one event
+        events = catalogue.events
+        assert len(events) == 2
+        assert (events.duration.values == [4, 3]).all()
+        assert (events.max_area == 25).all()
+        assert np.isclose(events.peak_intensity.values, 10 - 0.2).all()
+
+    def test_calculate_quantiles(self, tmp_path):
+        _create_dummy_precip_data(tmp_path)
+        ds = xr.open_dataset(
+            tmp_path / "data" / "interim" / "chirps_preprocessed" / "data_kenya.nc"
+        )
+
+        expected = ds.groupby("time.month").reduce(np.nanpercentile, dim="time", q=90)
+        got = EventDetector.calculate_quantiles(ds, 0.9, "month", lat_chunk_size=7)
+        assert got.precip.dims == ("month", "lat", "lon")
+        assert np.allclose(got.precip.values, expected.precip.values)
+
+        got = EventDetector.calculate_quantiles(ds, [0.1, 0.9], "month")
+        assert (got["quantile"].values == [0.1, 0.9]).all()
+        assert np.allclose(got.precip.sel(quantile=0.9).values, expected.precip.values)
+
     def test_abs(self, tmp_path):
         # TEST the absolute threshold
         in_path = self.create_test_consec_data(tmp_path)
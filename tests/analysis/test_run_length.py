@@ -0,0 +1,69 @@
+import numpy as np
+
+from src.analysis.run_length import (
+    current_run_length,
+    run_lengths,
+    longest_run,
+    run_count,
+    find_runs,
+)
+
+
+class TestRunLength:
+    exceed = np.array([True, True, False, True, False, True, True, True])
+
+    @staticmethod
+    def _reference_runs(exceed):
+        """(start, end) of each run, found with a python loop"""
+        runs, start = [], None
+        for i, value in enumerate(exceed):
+            if value and start is None:
+                start = i
+            if (not value) and (start is not None):
+                runs.append((start, i - 1))
+                start = None
+        if start is not None:
+            runs.append((start, len(exceed) - 1))
+        return runs
+
+    def test_current_run_length(self):
+        expected = [1, 2, 0, 1, 0, 1, 2, 3]
+        assert (current_run_length(self.exceed) == expected).all()
+
+    def test_run_lengths(self):
+        expected = [2, 0, 0, 1, 0, 3, 0, 0]
+        assert (run_lengths(self.exceed) == expected).all()
+
+    def test_random_pixels(self):
+        exceed = np.random.uniform(size=(100, 4, 5)) < 0.6
+
+        lengths = run_lengths(exceed)
+        longest = longest_run(exceed)
+        count = run_count(exceed)
+        runs = find_runs(exceed)
+        assert lengths.dtype == np.int32
+
+        for pixel in range(20):
+            lat, lon = np.divmod(pixel, 5)
+            expected = self._reference_runs(exceed[:, lat, lon])
+
+            expected_lengths = np.zeros(100)
+            for start, end in expected:
+                expected_lengths[start] = end - start + 1
+            assert (lengths[:, lat, lon] == expected_lengths).all()
+
+            assert longest[lat, lon] == max([e - s + 1 for s, e in expected] + [0])
+            assert count[lat, lon] == len(expected)
+
+            in_pixel = runs.pixel == pixel
+            assert list(zip(runs.start[in_pixel], runs.end[in_pixel])) == expected
+
+    def test_severity(self):
+        values = np.arange(8, dtype=np.float64)[:, np.newaxis]
+        values[6] = np.nan
+        runs = find_runs(self.exceed[:, np.newaxis], values)
+
+        assert (runs.start == [0, 3, 5]).all()
+        assert (runs.end == [1, 3, 7]).all()
+        # NaNs are treated as 0
+        assert (runs.severity == [0 + 1, 3, 5 + 7]).all()
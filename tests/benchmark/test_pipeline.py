@@ -0,0 +1,87 @@
+import json
+import pytest
+
+from src.benchmark import PipelineBenchmark, compare_results
+
+
+class TestPipelineBenchmark:
+    @pytest.mark.parametrize("backend", ["netcdf", "virtual"])
+    def test_run(self, tmp_path, backend):
+        benchmarker = PipelineBenchmark(
+            tmp_path / "data",
+            grid_size=(5, 6),
+            start_year=2000,
+            end_year=2002,
+            backend=backend,
+        )
+        results = benchmarker.run(
+            stages=["merge_files", "engineer", "dataloader_epoch"]
+        )
+
+        assert list(results["stages"].keys()) == [
+            "merge_files",
+            "engineer",
+            "dataloader_epoch",
+        ]
+        # merge_files needs the preprocessors' dependencies, but the later
+        # stages run whether or not it succeeds
+        for stage in ["engineer", "dataloader_epoch"]:
+            assert results["stages"][stage]["status"] == "ok", results["stages"][stage]
+            assert results["stages"][stage]["seconds"] > 0
+            assert results["stages"][stage]["peak_memory_mb"] > 0
+
+        assert results["stages"]["dataloader_epoch"]["info"]["batches"] > 0
+        assert results["config"]["backend"] == backend
+
+        benchmarker.save(tmp_path / "results.json")
+        with (tmp_path / "results.json").open("r") as f:
+            saved = json.load(f)
+        assert saved["stages"].keys() == results["stages"].keys()
+
+    def test_run_no_memory(self, tmp_path):
+        benchmarker = PipelineBenchmark(
+            tmp_path,
+            grid_size=(5, 6),
+            start_year=2000,
+            end_year=2001,
+            trace_memory=False,
+        )
+        results = benchmarker.run(stages=["merge_files", "engineer"])
+        assert results["stages"]["engineer"]["peak_memory_mb"] is None
+
+    def test_failed_stage(self, tmp_path):
+        benchmarker = PipelineBenchmark(
+            tmp_path, grid_size=(5, 6), start_year=2000, end_year=2001
+        )
+        results = benchmarker.run(stages=["evaluate"])
+        assert results["stages"]["evaluate"]["status"] == "failed"
+        assert "train stage must be run first" in results["stages"]["evaluate"]["error"]
+
+    def test_compare_results(self):
+        def stage(seconds, peak_memory_mb, status="ok"):
+            return {
+                "status": status,
+                "seconds": seconds,
+                "peak_memory_mb": peak_memory_mb,
+            }
+
+        baseline = {
+            "stages": {
+                "engineer": stage(10, 100),
+                "train": stage(20, 200),
+                "evaluate": stage(5, 50, status="failed"),
+            }
+        }
+        current = {
+            "stages": {
+                "engineer": stage(5, 150),
+                "train": stage(20, None),
+                "evaluate": stage(4, 50),
+                "region_analysis": stage(1, 10),
+            }
+        }
+        ratios = compare_results(baseline, current)
+        assert ratios == {
+            "engineer": {"seconds": 0.5, "peak_memory_mb": 1.5},
+            "train": {"seconds": 1, "peak_memory_mb": None},
+        }
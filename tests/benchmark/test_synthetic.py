@@ -0,0 +1,57 @@
+import numpy as np
+import xarray as xr
+
+from src.benchmark import make_synthetic_boundaries, make_synthetic_data
+
+
+class TestSynthetic:
+    def test_make_synthetic_data(self, tmp_path):
+        output_files = make_synthetic_data(
+            tmp_path, grid_size=(5, 6), start_year=2000, end_year=2001
+        )
+
+        assert set(output_files.keys()) == {"vhi", "chirps", "era5"}
+        for files in output_files.values():
+            assert len(files) == 2, "Expected a file per year"
+
+        vhi = xr.open_dataset(tmp_path / "interim/vhi_interim/2000_vhi_kenya.nc")
+        assert vhi.VHI.shape[1:] == (5, 6)
+        assert vhi.VHI.shape[0] in {52, 53}, "Expected weekly VHI data"
+        assert (vhi.VHI.min() >= 0) & (vhi.VHI.max() <= 100)
+        # the masked pixels are always missing
+        is_nan = np.isnan(vhi.VHI.values)
+        assert (is_nan.all(axis=0) == is_nan.any(axis=0)).all()
+
+        era5 = xr.open_dataset(
+            tmp_path
+            / "interim/reanalysis-era5-single-levels-monthly-means_interim"
+            / "2001_era5_kenya.nc"
+        )
+        assert set(era5.data_vars) == {"t2m", "swvl1"}
+        assert era5.time.size == 12
+
+        chirps = xr.open_dataset(
+            tmp_path / "interim/chirps_interim/2000_chirps_kenya.nc"
+        )
+        assert chirps.time.size == 366
+        assert (chirps.precip >= 0).all()
+
+    def test_make_synthetic_data_is_reproducible(self, tmp_path):
+        first = make_synthetic_data(
+            tmp_path / "first", grid_size=(5, 6), start_year=2000, end_year=2000
+        )
+        second = make_synthetic_data(
+            tmp_path / "second", grid_size=(5, 6), start_year=2000, end_year=2000
+        )
+        for dataset in first:
+            assert xr.open_dataset(first[dataset][0]).identical(
+                xr.open_dataset(second[dataset][0])
+            )
+
+    def test_make_synthetic_boundaries(self, tmp_path):
+        filename = make_synthetic_boundaries(tmp_path, grid_size=(5, 6), num_regions=3)
+
+        ds = xr.open_dataset(filename)
+        assert ds.province_l1.shape == (5, 6)
+        assert set(np.unique(ds.province_l1.values)) == {0, 1, 2}
+        assert ds.attrs["values"] == "region_0, region_1, region_2"
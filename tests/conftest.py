@@ -28,21 +28,11 @@ try:
 except ImportError:
     collect_ignore.append("exporters/test_chirps.py")
 
-try:
-    import xclim
-except ImportError:
-    collect_ignore.append("analysis/test_event_detector.py")
-
 try:
     import bottleneck
 except ImportError:
     collect_ignore.append("analysis/indices")
 
-try:
-    import climate_indices
-except ImportError:
-    collect_ignore.append("analysis/indices/test_spi.py")
-
 try:
     import cfgrib
 except ImportError:
@@ -0,0 +1,78 @@
+import numpy as np
+import xarray as xr
+
+from src.engineer import _OneMonthForecastEngineer as OneMonthForecastEngineer
+from src.engineer.feature_store import FeatureStore, FeatureStoreWriter
+
+from ..utils import _make_dataset
+from .test_base import _setup
+
+
+class TestFeatureStore:
+    def test_write_read(self, tmp_path):
+        ds_target, _, _ = _make_dataset(size=(3, 4))
+        ds_predictor, _, _ = _make_dataset(size=(3, 4), variable_name="precip")
+        ds = ds_predictor.merge(ds_target)
+
+        writer = FeatureStoreWriter(tmp_path / "store")
+        keys = ["1999_5", "1999_6"]
+        for idx, key in enumerate(keys):
+            x = ds.isel(time=slice(idx, idx + 4))
+            y = ds[["VHI"]].isel(time=[idx + 4])
+            writer.append({"x": x, "y": y}, key=key)
+        writer.close()
+
+        store = FeatureStore(tmp_path / "store")
+        assert store.keys() == keys
+        assert store.x_vars == ["precip", "VHI"]
+        assert store.y_var == "VHI"
+
+        x_np, y_np = store.get("1999_6")
+        assert x_np.shape == (12, 4, 2)
+        assert y_np.shape == (12, 1)
+        assert x_np.dtype == np.float32
+
+        # the pixels should be flattened (lat, lon) in the same order as the latlons
+        for idx, (lat, lon) in enumerate(store.latlons):
+            expected = ds.isel(time=slice(1, 5)).sel(lat=lat, lon=lon)
+            assert (x_np[idx, :, 0] == expected.precip.values).all()
+            assert (x_np[idx, :, 1] == expected.VHI.values).all()
+            assert y_np[idx, 0] == ds.VHI.isel(time=5).sel(lat=lat, lon=lon).values
+
+        target_time, historical_times = store.get_times("1999_6")
+        assert target_time == ds.time.values[5]
+        assert (historical_times == ds.time.values[1:5]).all()
+
+        assert FeatureStore.read_keys(tmp_path / "store") == keys
+
+    def test_engineer(self, tmp_path):
+        _setup(tmp_path)
+
+        engineer = OneMonthForecastEngineer(tmp_path)
+        engineer.engineer(
+            test_year=2001,
+            target_variable="a",
+            pred_months=11,
+            expected_length=11,
+            feature_store=True,
+        )
+        assert engineer.feature_stores is None, "Stores should have been closed"
+
+        for split in ["train", "test"]:
+            store = FeatureStore(
+                tmp_path / f"features/one_month_forecast/store/{split}"
+            )
+            folders = [
+                f.name
+                for f in (tmp_path / f"features/one_month_forecast/{split}").iterdir()
+            ]
+            assert set(store.keys()) == set(folders)
+
+            for key in store.keys():
+                x_np, y_np = store.get(key)
+                x = xr.open_dataset(
+                    tmp_path / f"features/one_month_forecast/{split}/{key}/x.nc"
+                )
+                assert x_np.shape == (100, 11, 2)
+                assert y_np.shape == (100, 1)
+                assert list(x.data_vars) == store.x_vars
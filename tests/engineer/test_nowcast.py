@@ -165,3 +165,44 @@ class TestNowcastEngineer:
             xy_dict is None
         ), f"xy_dict should be None because the number of\
         expected timesteps is different from `expected_length`"
+
+    def test_stratify_all(self, tmp_path):
+        _setup(tmp_path)
+        engineer = NowcastEngineer(tmp_path)
+        ds_target, _, _ = _make_dataset(size=(5, 5))
+        ds_predictor, _, _ = _make_dataset(size=(5, 5))
+        ds_predictor = ds_predictor.rename({"VHI": "predictor"})
+        ds = ds_predictor.merge(ds_target)
+        # a missing timestep, so that some windows are invalid
+        ds = ds.isel(time=ds.time.values != np.datetime64("2000-06-30"))
+
+        target_months = [
+            (year, month) for year in [2000, 2001] for month in range(1, 13)
+        ]
+        all_xy = engineer._stratify_all(
+            ds=ds,
+            target_months=target_months,
+            target_variable="VHI",
+            pred_months=4,
+            expected_length=4,
+        )
+        assert len(all_xy) == len(target_months)
+
+        num_valid = 0
+        for (year, month), xy_dict in zip(target_months, all_xy):
+            expected, _ = engineer._stratify_xy(
+                ds=ds,
+                year=year,
+                target_variable="VHI",
+                target_month=month,
+                pred_months=4,
+                expected_length=4,
+            )
+            if expected is None:
+                assert xy_dict is None, f"{year}_{month} should be skipped"
+            else:
+                num_valid += 1
+                for key in ["x", "y"]:
+                    assert list(xy_dict[key].data_vars) == list(expected[key].data_vars)
+                    xr.testing.assert_equal(xy_dict[key], expected[key])
+        assert num_valid == len(target_months) - 5
@@ -5,6 +5,7 @@ import xarray as xr
 import datetime as dt
 
 from src.engineer import _OneMonthForecastEngineer as OneMonthForecastEngineer
+from src.engineer.manifest import EngineerManifest
 
 from ..utils import _make_dataset
 from .test_base import _setup
@@ -142,3 +143,111 @@ class TestOneMonthForecastEngineer:
         ), f"\
         the max_train_date should be one month before the `target_month`,\
         `year`"
+
+    def test_stratify_all(self, tmp_path):
+        _setup(tmp_path)
+        engineer = OneMonthForecastEngineer(tmp_path)
+        ds_target, _, _ = _make_dataset(size=(5, 5))
+        ds_predictor, _, _ = _make_dataset(size=(5, 5))
+        ds_predictor = ds_predictor.rename({"VHI": "predictor"})
+        ds = ds_predictor.merge(ds_target)
+        # a missing timestep, so that some windows are invalid
+        ds = ds.isel(time=ds.time.values != np.datetime64("2000-06-30"))
+
+        target_months = [
+            (year, month) for year in [2000, 2001] for month in range(1, 13)
+        ]
+        all_xy = engineer._stratify_all(
+            ds=ds,
+            target_months=target_months,
+            target_variable="VHI",
+            pred_months=4,
+            expected_length=4,
+        )
+        assert len(all_xy) == len(target_months)
+
+        num_valid = 0
+        for (year, month), xy_dict in zip(target_months, all_xy):
+            expected, _ = engineer._stratify_xy(
+                ds=ds,
+                year=year,
+                target_variable="VHI",
+                target_month=month,
+                pred_months=4,
+                expected_length=4,
+            )
+            if expected is None:
+                assert xy_dict is None, f"{year}_{month} should be skipped"
+            else:
+                num_valid += 1
+                for key in ["x", "y"]:
+                    assert list(xy_dict[key].data_vars) == list(expected[key].data_vars)
+                    xr.testing.assert_equal(xy_dict[key], expected[key])
+        assert num_valid == len(target_months) - 5
+
+    def test_engineer_incremental(self, tmp_path, capsys, monkeypatch):
+        data = {
+            var: _make_dataset((4, 4), var, start_date="1999-01-01")[0]
+            for var in ["a", "b"]
+        }
+
+        def _write_interim(data_path, start_date, end_date):
+            for var, ds in data.items():
+                (data_path / f"interim/{var}_preprocessed").mkdir(
+                    parents=True, exist_ok=True
+                )
+                ds.sel(time=slice(start_date, end_date)).to_netcdf(
+                    data_path / f"interim/{var}_preprocessed/data.nc"
+                )
+
+        engineer_kwargs = dict(
+            test_year=2001, target_variable="a", pred_months=3, expected_length=3
+        )
+
+        _write_interim(tmp_path, "1999-06-01", "2001-06-30")
+        OneMonthForecastEngineer(tmp_path).engineer(**engineer_kwargs)
+        output_folder = tmp_path / "features/one_month_forecast"
+        assert (output_folder / "manifest.json").exists()
+        existing_mtimes = {f: f.stat().st_mtime for f in output_folder.glob("*/*/x.nc")}
+
+        # new months arrive at both ends of the data
+        _write_interim(tmp_path, "1999-01-01", "2001-09-30")
+        OneMonthForecastEngineer(tmp_path).engineer(incremental=True, **engineer_kwargs)
+        assert "new or stale" in capsys.readouterr().out
+
+        # compare to engineering everything from scratch
+        _write_interim(tmp_path / "full", "1999-01-01", "2001-09-30")
+        OneMonthForecastEngineer(tmp_path / "full").engineer(**engineer_kwargs)
+        full_folder = tmp_path / "full/features/one_month_forecast"
+
+        for split in ["train", "test"]:
+            folders = {f.name for f in (output_folder / split).iterdir()}
+            full_folders = {f.name for f in (full_folder / split).iterdir()}
+            assert folders == full_folders
+            for folder in folders:
+                for x_or_y in ["x", "y"]:
+                    filename = f"{split}/{folder}/{x_or_y}.nc"
+                    xr.testing.assert_equal(
+                        xr.open_dataset(output_folder / filename),
+                        xr.open_dataset(full_folder / filename),
+                    )
+
+        # folders whose data didn't change shouldn't have been rewritten
+        for f, mtime in existing_mtimes.items():
+            assert f.stat().st_mtime == mtime, f"{f} was rewritten"
+
+        with (output_folder / "normalizing_dict.pkl").open("rb") as f:
+            norm_dict = pickle.load(f)
+        with (full_folder / "normalizing_dict.pkl").open("rb") as f:
+            full_norm_dict = pickle.load(f)
+        for var in ["a", "b"]:
+            for key in ["mean", "std", "min", "max", "count"]:
+                assert np.isclose(norm_dict[var][key], full_norm_dict[var][key])
+
+        # the data isn't hashed if no interim file has changed
+        def _hash_times(*args, **kwargs):
+            assert False, "The timesteps shouldn't be hashed"
+
+        monkeypatch.setattr(EngineerManifest, "_hash_times", _hash_times)
+        OneMonthForecastEngineer(tmp_path).engineer(incremental=True, **engineer_kwargs)
+        assert "No interim files have changed" in capsys.readouterr().out
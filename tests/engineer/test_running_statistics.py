@@ -0,0 +1,75 @@
+import numpy as np
+
+from src.engineer.running_statistics import RunningStatistics, calculate_statistics
+
+from ..utils import _make_dataset
+
+
+class TestRunningStatistics:
+    @staticmethod
+    def _make_values(shape, nan_fraction=0.1):
+        values = np.random.rand(*shape) * 100
+        values[np.random.rand(*shape) < nan_fraction] = np.nan
+        return values
+
+    def test_update(self):
+        values = self._make_values((30, 4, 5))
+
+        stats = RunningStatistics()
+        for start in range(0, 30, 7):
+            stats.update(values[start : start + 7])
+
+        assert stats.count == (~np.isnan(values)).sum()
+        assert np.isclose(stats.mean, np.nanmean(values))
+        assert np.isclose(stats.std, np.nanstd(values))
+        assert stats.min == np.nanmin(values)
+        assert stats.max == np.nanmax(values)
+
+    def test_per_pixel(self):
+        values = self._make_values((30, 4, 5))
+        # a pixel which is always NaN
+        values[:, 0, 0] = np.nan
+
+        stats = RunningStatistics(shape=(4, 5))
+        for start in range(0, 30, 7):
+            stats.update(values[start : start + 7], axis=0)
+
+        assert np.isnan(stats.mean[0, 0]) and (stats.count[0, 0] == 0)
+        assert np.allclose(stats.mean[1:], np.nanmean(values[:, 1:], axis=0))
+        assert np.allclose(stats.std[1:], np.nanstd(values[:, 1:], axis=0))
+
+        total = stats.total()
+        assert np.isclose(total.mean, np.nanmean(values))
+        assert np.isclose(total.std, np.nanstd(values))
+        assert total.max == np.nanmax(values)
+
+    def test_merge_and_dict(self):
+        values = self._make_values((100,))
+
+        first, second = RunningStatistics(), RunningStatistics()
+        first.update(values[:60])
+        second.update(values[60:])
+
+        # partial statistics can be saved, reloaded and merged
+        merged = RunningStatistics.from_dict(first.to_dict())
+        merged.merge(second)
+
+        expected = RunningStatistics()
+        expected.update(values)
+        for key, val in expected.to_dict().items():
+            assert np.isclose(merged.to_dict()[key], val), f"{key} is different"
+
+        empty = RunningStatistics.from_dict(RunningStatistics().to_dict())
+        empty.merge(expected)
+        assert np.isclose(empty.mean, expected.mean)
+
+    def test_calculate_statistics(self):
+        ds, _, _ = _make_dataset((4, 5), random_nan=1)
+
+        stats = calculate_statistics(ds.VHI, dims=["lat", "lon", "time"])
+        assert np.isclose(stats.mean, ds.VHI.mean().values)
+        assert np.isclose(stats.std, ds.VHI.std().values)
+
+        pixel_stats = calculate_statistics(ds.VHI, dims=["time"], time_chunk_size=5)
+        assert pixel_stats.mean.shape == (4, 5)
+        assert np.allclose(pixel_stats.mean, ds.VHI.mean(dim="time").values)
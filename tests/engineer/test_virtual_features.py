@@ -0,0 +1,44 @@
+import pytest
+import xarray as xr
+
+from src.engineer import Engineer
+from src.engineer.virtual_features import VirtualFeatures
+
+from ..utils import _make_dataset
+
+
+class TestVirtualFeatures:
+    @pytest.mark.parametrize("experiment", ["one_month_forecast", "nowcast"])
+    def test_engineer(self, tmp_path, experiment):
+        for var in ["VHI", "precip"]:
+            (tmp_path / f"interim/{var}_preprocessed").mkdir(parents=True)
+            data, _, _ = _make_dataset((4, 4), var, end_date="2002-12-31")
+            data.to_netcdf(tmp_path / f"interim/{var}_preprocessed/data.nc")
+
+        engineer = Engineer(tmp_path, process_static=False, experiment=experiment)
+        engineer_kwargs = dict(
+            test_year=2002, target_variable="VHI", pred_months=3, expected_length=3
+        )
+        engineer.engineer(**engineer_kwargs)
+        engineer.engineer(virtual=True, **engineer_kwargs)
+        assert engineer.engineer_class.virtual_features is None, "Should be closed"
+
+        virtual_folder = tmp_path / f"features/{experiment}/virtual"
+        assert (virtual_folder / "cube.nc").exists()
+
+        for split in ["train", "test"]:
+            virtual = VirtualFeatures(virtual_folder, split)
+            folders = [
+                f.name for f in (tmp_path / f"features/{experiment}/{split}").iterdir()
+            ]
+            assert set(virtual.keys()) == set(folders)
+            assert set(VirtualFeatures.read_keys(virtual_folder, split)) == set(folders)
+
+            for key in virtual.keys():
+                xy = virtual.get(key)
+                for x_or_y in ["x", "y"]:
+                    expected = xr.open_dataset(
+                        tmp_path / f"features/{experiment}/{split}/{key}/{x_or_y}.nc"
+                    )
+                    assert list(xy[x_or_y].data_vars) == list(expected.data_vars)
+                    xr.testing.assert_equal(xy[x_or_y], expected)
@@ -1,11 +1,62 @@
 from pathlib import Path
+import threading
+from types import SimpleNamespace
+
+import numpy as np
 import pytest
+import xarray as xr
 from unittest.mock import patch, Mock
 
+from src.exporters import cds
 from src.exporters.cds import CDSExporter, ERA5Exporter
 from src.exporters.base import get_kenya
 
 
+class FakeClient:
+    """A stand in for cdsapi.Client, which writes a netcdf file covering the area
+    of each request. Retrievals to targets starting with one of the `failures`
+    fail once
+    """
+
+    clients: list = []
+    retrieved: list = []
+    failures: list = []
+    lock = threading.Lock()
+
+    def __init__(self):
+        with self.lock:
+            FakeClient.clients.append(self)
+
+    def retrieve(self, dataset, selection_request, target):
+        north, west, south, east = [
+            float(x) for x in selection_request["area"].split("/")
+        ]
+        with self.lock:
+            FakeClient.retrieved.append((dataset, selection_request, target))
+            for failure in FakeClient.failures:
+                if target.startswith(failure):
+                    FakeClient.failures.remove(failure)
+                    raise RuntimeError("The request failed")
+
+        lat = np.round(np.arange(north, south - 0.05, -0.1), 3)
+        lon = np.round(np.arange(west, east + 0.05, 0.1), 3)
+        ds = xr.Dataset(
+            {"t2m": (("latitude", "longitude"), np.outer(lat, np.ones(len(lon))))},
+            coords={"latitude": lat, "longitude": lon},
+        )
+        # netCDF4 isn't thread safe
+        with cds.netcdf_lock:
+            ds.to_netcdf(target)
+
+
+@pytest.fixture
+def fake_cdsapi(monkeypatch):
+    FakeClient.clients = []
+    FakeClient.retrieved = []
+    FakeClient.failures = []
+    monkeypatch.setattr(cds, "cdsapi", SimpleNamespace(Client=FakeClient))
+
+
 class TestCDSExporter:
     @pytest.mark.xfail(reason="cdsapi may not be installed")
     @patch("cdsapi.Client")
@@ -289,3 +340,109 @@ class TestCDSExporter:
             assert (
                 corrected_input == expected_input[key]
             ), f"When checking iterable, expected {expected_input[key]}, got {corrected_input}"
+
+    def test_plan_requests(self, tmp_path, fake_cdsapi):
+        exporter = ERA5Exporter(tmp_path)
+        selection_request = exporter.create_selection_request(
+            "precipitation",
+            {"year": [2018, 2019], "month": [1, 2, 3]},
+            granularity="monthly",
+        )
+        dataset = "reanalysis-era5-single-levels-monthly-means"
+
+        # small enough to be retrieved at once
+        requests = exporter.plan_requests(dataset, selection_request)
+        assert len(requests) == 1
+        assert requests[0].output_file == (
+            tmp_path / f"raw/{dataset}/precipitation/2018_2019/01_03.nc"
+        )
+        # 2 years * 3 months * 24 times, on a 46 * 36 grid
+        assert requests[0].size == 2 * 3 * 24 * 46 * 36 * 4
+        assert requests[0].tiles == ()
+
+        # broken up by year, then by month when the years are too large
+        max_size = 3 * 24 * 46 * 36 * 4 - 1
+        requests = exporter.plan_requests(
+            dataset, selection_request, ["year"], max_request_size=max_size
+        )
+        assert [
+            r.output_file.relative_to(tmp_path / "raw" / dataset) for r in requests
+        ] == [
+            Path(f"precipitation/{year}/{month}.nc")
+            for year in ["2018", "2019"]
+            for month in ["01", "02", "03"]
+        ]
+        assert all(r.size <= max_size for r in requests)
+
+        # and finally into tiles
+        requests = exporter.plan_requests(
+            dataset, selection_request, max_request_size=24 * 23 * 36 * 4
+        )
+        assert len(requests) == 6
+        assert requests[0].tiles == (
+            "6.002/33.501/0.502/42.283",
+            "0.252/33.501/-5.248/42.283",
+        )
+
+        # units which are on disk are planned, but not retrieved
+        requests = exporter.plan_requests(dataset, selection_request, ["month"])
+        requests[0].output_file.touch()
+        output_files = exporter.retrieve_requests(requests)
+        assert output_files == [r.output_file for r in requests]
+        assert [target for _, _, target in FakeClient.retrieved] == [
+            f"{r.output_file}.part" for r in requests[1:]
+        ]
+
+    def test_retrieve_requests(self, tmp_path, fake_cdsapi):
+        exporter = ERA5Exporter(tmp_path)
+        exporter.grid_resolution = 0.1
+        selection_request = exporter.create_selection_request(
+            "2m_temperature",
+            {"year": [2018, 2019], "month": [1, 2]},
+            granularity="monthly",
+        )
+        dataset = "reanalysis-era5-single-levels-monthly-means"
+
+        # the first month is split into tiles, and one tile fails once
+        requests = exporter.plan_requests(
+            dataset, selection_request, ["year", "month"], max_request_size=10 ** 5
+        )
+        assert len(requests) == 4
+        assert len(requests[0].tiles) == 10
+        FakeClient.failures = [
+            f"{requests[0].output_file}.tile3",
+            f"{requests[1].output_file}.tile0",
+        ]
+
+        output_files = exporter.retrieve_requests(
+            requests, n_parallel_requests=3, retries=1, backoff=0
+        )
+        # the failed requests are not returned, and their retrieved tiles are kept
+        assert output_files == [r.output_file for r in requests[2:]]
+        assert sorted(requests[0].output_file.parent.glob("*.tile*")) == [
+            requests[0].output_file.with_name(f"01.nc.tile{i}") for i in range(3)
+        ]
+
+        # one client per worker
+        assert 1 < len(FakeClient.clients) <= 4
+
+        # running the export again only retrieves the missing tiles
+        FakeClient.retrieved = []
+        FakeClient.failures = [f"{requests[0].output_file}.tile3"]
+        output_files = exporter.retrieve_requests(
+            requests, n_parallel_requests=3, retries=2, backoff=0
+        )
+        assert output_files == [r.output_file for r in requests]
+        retrieved = [target for _, _, target in FakeClient.retrieved]
+        assert len(retrieved) == 1 + 7 + 10
+        assert retrieved.count(f"{requests[0].output_file}.tile3.part") == 2
+        assert f"{requests[0].output_file}.tile0.part" not in retrieved
+        assert list(tmp_path.glob("**/*.tile*")) == []
+        assert list(tmp_path.glob("**/*.part")) == []
+
+        # the tiles are merged into the complete area
+        ds = xr.open_dataset(requests[0].output_file)
+        expected = np.round(np.arange(6.002, -5.25, -0.1), 3)
+        assert np.allclose(np.sort(ds.latitude.values), np.sort(expected))
+        assert ds.longitude.size == 89
+        ds.close()
@@ -0,0 +1,244 @@
+import ftplib
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.exporters.download import DownloadManager, DownloadManifest, DownloadTask
+
+FILES = {f"/data/file_{i}.nc": bytes(range(256)) * (i + 10) for i in range(5)}
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves `FILES`, with support for byte ranges"""
+
+    requests: list = []
+    ignore_range = False
+
+    def do_GET(self):
+        RangeHandler.requests.append((self.path, self.headers.get("Range")))
+        if self.path not in FILES:
+            self.send_error(404)
+            return
+        content = FILES[self.path]
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if (range_header is not None) and (not self.ignore_range):
+            start = int(range_header.replace("bytes=", "").split("-")[0])
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    RangeHandler.requests = []
+    RangeHandler.ignore_range = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class FakeFTP:
+    """A stand in for ftplib.FTP, serving `FILES`"""
+
+    connections: list = []
+
+    def __init__(self, timeout=None):
+        self.retrieved = []
+        FakeFTP.connections.append(self)
+
+    def connect(self, host, port):
+        self.host = host
+
+    def login(self):
+        pass
+
+    def voidcmd(self, cmd):
+        pass
+
+    def size(self, path):
+        if path not in FILES:
+            raise ftplib.error_perm("550 No such file")
+        return len(FILES[path])
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        path = cmd.replace("RETR ", "")
+        self.retrieved.append((path, rest))
+        content = FILES[path][rest or 0 :]
+        for i in range(0, len(content), blocksize):
+            callback(content[i : i + blocksize])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestDownloadManager:
+    def test_http_download(self, tmp_path, http_server):
+        tasks = [
+            DownloadTask(f"{http_server}{path}", tmp_path / "out" / path.split("/")[-1])
+            for path in FILES
+        ]
+        manager = DownloadManager(
+            tmp_path / "manifest.json", max_workers=4, max_per_host=2
+        )
+        outputs = manager.download(tasks)
+
+        assert sorted(outputs["completed"]) == sorted(t.url for t in tasks)
+        assert outputs["failed"] == []
+        for task, content in zip(tasks, FILES.values()):
+            assert task.path.read_bytes() == content
+            assert not task.path.with_name(f"{task.path.name}.part").exists()
+
+        # the completed files are skipped, without any requests
+        num_requests = len(RangeHandler.requests)
+        manifest = DownloadManifest(tmp_path / "manifest.json")
+        assert sorted(manifest.completed) == sorted(str(t.path) for t in tasks)
+        manager = DownloadManager(tmp_path / "manifest.json")
+        manager.download(tasks)
+        assert len(RangeHandler.requests) == num_requests
+
+    @pytest.mark.parametrize("ignore_range", [True, False])
+    def test_http_resume(self, tmp_path, http_server, ignore_range):
+        RangeHandler.ignore_range = ignore_range
+        path = "/data/file_1.nc"
+        content = FILES[path]
+        task = DownloadTask(f"{http_server}{path}", tmp_path / "file_1.nc")
+
+        # an interrupted download
+        (tmp_path / "file_1.nc.part").write_bytes(content[:1000])
+        manager = DownloadManager(tmp_path / "manifest.json")
+        outputs = manager.download([task])
+
+        assert outputs["completed"] == [task.url]
+        assert task.path.read_bytes() == content
+        assert RangeHandler.requests == [(path, "bytes=1000-")]
+
+    def test_verification(self, tmp_path, http_server):
+        path = "/data/file_0.nc"
+        md5 = hashlib.md5(FILES[path]).hexdigest()
+        good = DownloadTask(f"{http_server}{path}", tmp_path / "good.nc", md5=md5)
+        bad_md5 = DownloadTask(f"{http_server}{path}", tmp_path / "bad.nc", md5="0")
+        bad_size = DownloadTask(f"{http_server}{path}", tmp_path / "bad2.nc", size=1)
+        missing = DownloadTask(f"{http_server}/missing.nc", tmp_path / "missing.nc")
+
+        manager = DownloadManager(tmp_path / "manifest.json", retries=2)
+        outputs = manager.download([good, bad_md5, bad_size, missing])
+        assert outputs["completed"] == [good.url]
+        assert len(outputs["failed"]) == 3
+        for task in [bad_md5, bad_size, missing]:
+            assert not task.path.exists()
+
+        # the failures are recorded, and retried by the next download
+        manifest = DownloadManifest(tmp_path / "manifest.json")
+        assert "404" in manifest.entries[str(missing.path)]["error"]
+        assert manifest.status(good.path) == "completed"
+
+        FILES["/missing.nc"] = b"now it exists"
+        try:
+            outputs = manager.download([good, missing])
+        finally:
+            FILES.pop("/missing.nc")
+        assert outputs["completed"] == [good.url, missing.url]
+        assert DownloadManifest(tmp_path / "manifest.json").failed == [
+            str(bad_md5.path),
+            str(bad_size.path),
+        ]
+
+    def test_ftp_download(self, tmp_path, monkeypatch):
+        FakeFTP.connections = []
+        monkeypatch.setattr(ftplib, "FTP", FakeFTP)
+
+        tasks = [
+            DownloadTask(f"ftp://ftp.test.org{path}", tmp_path / path.split("/")[-1])
+            for path in FILES
+        ]
+        # a partially downloaded file
+        (tmp_path / "file_2.nc.part").write_bytes(FILES["/data/file_2.nc"][:10])
+
+        manager = DownloadManager(
+            tmp_path / "manifest.json", max_workers=4, max_per_host=1
+        )
+        outputs = manager.download(tasks)
+        assert len(outputs["completed"]) == len(FILES)
+        for task, content in zip(tasks, FILES.values()):
+            assert task.path.read_bytes() == content
+
+        # one connection is reused for all the files from the host
+        assert len(FakeFTP.connections) == 1
+        retrieved = dict(FakeFTP.connections[0].retrieved)
+        assert retrieved["/data/file_2.nc"] == 10
+        assert retrieved["/data/file_0.nc"] is None
+
+    def test_manifest_writes(self, tmp_path, http_server, monkeypatch):
+        writes = {"save": 0, "append": 0}
+        save, append = DownloadManifest._save, DownloadManifest._append
+
+        def _save(self):
+            writes["save"] += 1
+            save(self)
+
+        def _append(self, records):
+            writes["append"] += 1
+            append(self, records)
+
+        monkeypatch.setattr(DownloadManifest, "_save", _save)
+        monkeypatch.setattr(DownloadManifest, "_append", _append)
+
+        # many tasks, most of which fail (as they don't exist)
+        tasks = [
+            DownloadTask(f"{http_server}/missing_{i}.nc", tmp_path / f"missing_{i}.nc")
+            for i in range(200)
+        ] + [DownloadTask(f"{http_server}/data/file_0.nc", tmp_path / "file_0.nc")]
+        manager = DownloadManager(tmp_path / "manifest.json", retries=1)
+        outputs = manager.download(tasks)
+        assert len(outputs["failed"]) == 200
+
+        # the manifest is rewritten once, and each task is logged once (when
+        # it finishes) as well as once for all the pending tasks
+        assert writes["save"] == 1
+        assert writes["append"] == len(tasks) + 1
+        assert not (tmp_path / "manifest.json.log").exists()
+
+    def test_manifest_log(self, tmp_path):
+        # the changes of an interrupted download are in the log
+        manifest = DownloadManifest(tmp_path / "manifest.json")
+        manifest.update_many(
+            "pending", {tmp_path / f"{i}.nc": {"url": f"{i}"} for i in range(3)}
+        )
+        manifest.update(tmp_path / "0.nc", "completed", url="0", size=10)
+        manifest.update(tmp_path / "1.nc", "failed", url="1", error="404")
+        with (tmp_path / "manifest.json.log").open("a") as f:
+            f.write('{"path": "partial')
+        assert not (tmp_path / "manifest.json").exists()
+
+        manifest = DownloadManifest(tmp_path / "manifest.json")
+        assert manifest.completed == [str(tmp_path / "0.nc")]
+        assert manifest.failed == [str(tmp_path / "1.nc")]
+        assert manifest.pending == [str(tmp_path / "2.nc")]
+        assert manifest.entries[str(tmp_path / "0.nc")]["size"] == 10
+        # and compacted into the manifest
+        assert (tmp_path / "manifest.json").exists()
+        assert not (tmp_path / "manifest.json.log").exists()
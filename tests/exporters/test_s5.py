@@ -1,8 +1,10 @@
+from types import SimpleNamespace
 from unittest.mock import patch, Mock
 import pytest
 import numpy as np
 
 from src.exporters import S5Exporter
+from src.exporters import cds
 from src.exporters.seas5.all_valid_s5 import datasets as dataset_reference
 
 
@@ -317,3 +319,50 @@ class TestS5Exporter:
             /total_precipitation/2017/M01.grib"
         ).as_posix().replace(" ", "")
         cdsapi_mock.assert_called()
+
+    def test_export_breaks_up_requests(self, tmp_path, monkeypatch):
+        client = Mock()
+        client.retrieve.side_effect = lambda dataset, request, target: open(
+            target, "w"
+        ).close()
+        monkeypatch.setattr(cds, "cdsapi", SimpleNamespace(Client=lambda: client))
+
+        s5 = S5Exporter(
+            data_folder=tmp_path, granularity="monthly", pressure_level=False
+        )
+        output_paths = s5.export(
+            variable="total_precipitation",
+            min_year=2017,
+            max_year=2018,
+            min_month=1,
+            max_month=2,
+            max_leadtime=3,
+            show_api_request=False,
+        )
+        folder = tmp_path / "raw/seasonal-monthly-single-levels/total_precipitation"
+        expected_paths = [
+            folder / f"{year}/Y{year}_M{month}.grib"
+            for year in ["2017", "2018"]
+            for month in ["01", "02"]
+        ]
+        assert output_paths == expected_paths
+        assert client.retrieve.call_count == 4
+
+        # the request is for one initialisation, with 51 ensemble members
+        request = client.retrieve.call_args[0][1]
+        assert (request["year"], request["month"]) == (["2018"], ["02"])
+        assert s5.estimate_request_size(request) == 51 * 3 * 12 * 10 * 4
+
+        # the files on disk are not retrieved again
+        output_paths = s5.export(
+            variable="total_precipitation",
+            min_year=2017,
+            max_year=2018,
+            min_month=1,
+            max_month=2,
+            max_leadtime=3,
+            show_api_request=False,
+            n_parallel_requests=2,
+        )
+        assert output_paths == expected_paths
+        assert client.retrieve.call_count == 4
@@ -4,7 +4,13 @@ import pytest
 import xarray as xr
 import pandas as pd
 
-from src.models.data import DataLoader, _BaseIter, TrainData
+from src.models.data import (
+    DataLoader,
+    _BaseIter,
+    TrainData,
+    ModelArrays,
+    ModelArraysCache,
+)
 
 from ..utils import _make_dataset
 
@@ -159,6 +165,10 @@ class TestBaseIter:
                 self.spatial_mask = None
                 self.static_normalizing_dict = None
                 self.normalize_y = normalize
+                self.feature_store = None
+                self.cache = None
+                self.prefetcher = None
+                self.virtual_features = None
 
         base_iterator = _BaseIter(MockLoader())
 
@@ -375,3 +385,288 @@ class TestBaseIter:
                 )
 
                 assert actual_mean == output_mean, f"Mean values don't match!"
+
+
+class TestDataLoader:
+    @pytest.mark.parametrize(
+        "experiment,surrounding_pixels,monthly_aggs,predict_delta",
+        [
+            ("one_month_forecast", None, True, False),
+            ("one_month_forecast", 1, False, True),
+            ("nowcast", None, False, False),
+            ("nowcast", 1, True, False),
+        ],
+    )
+    def test_store_backend(
+        self, tmp_path, experiment, surrounding_pixels, monthly_aggs, predict_delta
+    ):
+        from src.engineer import Engineer
+
+        for var in ["VHI", "precip"]:
+            (tmp_path / f"interim/{var}_preprocessed").mkdir(parents=True)
+            data, _, _ = _make_dataset((6, 5), var, end_date="2002-12-31")
+            data[var].values = data[var].values.astype(float)
+            data.to_netcdf(tmp_path / f"interim/{var}_preprocessed/data.nc")
+
+        Engineer(tmp_path, process_static=False, experiment=experiment).engineer(
+            test_year=2002,
+            target_variable="VHI",
+            pred_months=3,
+            expected_length=3,
+            feature_store=True,
+        )
+
+        loader_kwargs = dict(
+            data_path=tmp_path,
+            mode="test",
+            shuffle_data=False,
+            experiment=experiment,
+            surrounding_pixels=surrounding_pixels,
+            monthly_aggs=monthly_aggs,
+            incl_yearly_aggs=False,
+            static=None,
+            normalize=True,
+            normalize_y=True,
+            predict_delta=predict_delta,
+        )
+        netcdf_loader = DataLoader(**loader_kwargs)
+        store_loader = DataLoader(backend="store", **loader_kwargs)
+
+        netcdf_arrays = {k: v for d in netcdf_loader for k, v in d.items()}
+        store_arrays = {k: v for d in store_loader for k, v in d.items()}
+
+        assert netcdf_arrays.keys() == store_arrays.keys()
+        for key, netcdf_array in netcdf_arrays.items():
+            store_array = store_arrays[key]
+            assert netcdf_array.x_vars == store_array.x_vars
+            assert netcdf_array.target_time == store_array.target_time
+            assert netcdf_array.historical_times == store_array.historical_times
+            assert (netcdf_array.latlons == store_array.latlons).all()
+            np.testing.assert_allclose(
+                netcdf_array.y, store_array.y, rtol=1e-5, atol=1e-5
+            )
+            for attr in ["historical", "current", "pred_months", "prev_y_var"]:
+                netcdf_val = getattr(netcdf_array.x, attr)
+                store_val = getattr(store_array.x, attr)
+                if netcdf_val is None:
+                    assert store_val is None
+                else:
+                    np.testing.assert_allclose(
+                        netcdf_val, store_val, rtol=1e-5, atol=1e-5
+                    )
+            if predict_delta:
+                np.testing.assert_allclose(
+                    netcdf_array.historical_target, store_array.historical_target
+                )
+
+    @pytest.mark.parametrize("experiment", ["one_month_forecast", "nowcast"])
+    def test_virtual_backend(self, tmp_path, experiment):
+        from src.engineer import Engineer
+
+        for var in ["VHI", "precip"]:
+            (tmp_path / f"interim/{var}_preprocessed").mkdir(parents=True)
+            data, _, _ = _make_dataset((6, 5), var, end_date="2002-12-31")
+            data[var].values = data[var].values.astype(float)
+            data.to_netcdf(tmp_path / f"interim/{var}_preprocessed/data.nc")
+
+        engineer = Engineer(tmp_path, process_static=False, experiment=experiment)
+        engineer_kwargs = dict(
+            test_year=2002, target_variable="VHI", pred_months=3, expected_length=3
+        )
+        engineer.engineer(**engineer_kwargs)
+        engineer.engineer(virtual=True, **engineer_kwargs)
+
+        for mode in ["train", "test"]:
+            loader_kwargs = dict(
+                data_path=tmp_path,
+                mode=mode,
+                shuffle_data=False,
+                experiment=experiment,
+                static=None,
+                normalize_y=True,
+            )
+            netcdf_loader = DataLoader(**loader_kwargs)
+            virtual_loader = DataLoader(backend="virtual", **loader_kwargs)
+            netcdf_loader.data_files.sort()
+            virtual_loader.data_files.sort()
+            assert netcdf_loader.data_files == virtual_loader.data_files
+
+            for netcdf_batch, virtual_batch in zip(netcdf_loader, virtual_loader):
+                if mode == "train":
+                    (netcdf_x, netcdf_y), (virtual_x, virtual_y) = (
+                        netcdf_batch,
+                        virtual_batch,
+                    )
+                    assert (netcdf_y == virtual_y).all()
+                    for netcdf_val, virtual_val in zip(netcdf_x, virtual_x):
+                        if netcdf_val is None:
+                            assert virtual_val is None
+                        else:
+                            assert (netcdf_val == virtual_val).all()
+                else:
+                    assert netcdf_batch.keys() == virtual_batch.keys()
+                    for key, netcdf_arrays in netcdf_batch.items():
+                        virtual_arrays = virtual_batch[key]
+                        assert (netcdf_arrays.y == virtual_arrays.y).all()
+                        assert (
+                            netcdf_arrays.x.historical == virtual_arrays.x.historical
+                        ).all()
+                        assert (
+                            netcdf_arrays.x.prev_y_var == virtual_arrays.x.prev_y_var
+                        ).all()
+
+    def test_cache(self, tmp_path, monkeypatch):
+        from src.engineer import Engineer
+
+        for var in ["VHI", "precip"]:
+            (tmp_path / f"interim/{var}_preprocessed").mkdir(parents=True)
+            data, _, _ = _make_dataset((6, 5), var, end_date="2002-12-31")
+            data.to_netcdf(tmp_path / f"interim/{var}_preprocessed/data.nc")
+        Engineer(tmp_path, process_static=False).engineer(
+            test_year=2002,
+            target_variable="VHI",
+            pred_months=3,
+            expected_length=3,
+        )
+
+        num_calls = {"count": 0}
+        ds_folder_to_np = _BaseIter.ds_folder_to_np
+
+        def counting_ds_folder_to_np(self, *args, **kwargs):
+            num_calls["count"] += 1
+            return ds_folder_to_np(self, *args, **kwargs)
+
+        monkeypatch.setattr(_BaseIter, "ds_folder_to_np", counting_ds_folder_to_np)
+
+        # small enough that some arrays have to be spilled to disk
+        loader = DataLoader(
+            data_path=tmp_path,
+            mode="train",
+            batch_file_size=3,
+            static=None,
+            to_tensor=True,
+            cache_bytes=10000,
+            cache_dir=tmp_path / "cache",
+        )
+        num_files = len(loader.data_files)
+
+        num_instances = []
+        for _ in range(3):
+            epoch_instances = 0
+            for x, y in loader:
+                assert isinstance(x[0], torch.Tensor)
+                epoch_instances += len(y)
+            num_instances.append(epoch_instances)
+
+        assert num_calls["count"] == num_files, "Files should only be processed once"
+        assert num_instances[0] == num_instances[1] == num_instances[2]
+        assert len(list((tmp_path / "cache").glob("*/*/metadata.pkl"))) > 0
+
+    @pytest.mark.parametrize("backend", ["netcdf", "store", "virtual"])
+    def test_prefetch(self, tmp_path, backend):
+        from src.engineer import Engineer
+
+        for var in ["VHI", "precip"]:
+            (tmp_path / f"interim/{var}_preprocessed").mkdir(parents=True)
+            data, _, _ = _make_dataset((6, 5), var, end_date="2002-12-31")
+            data[var].values = data[var].values.astype(float)
+            if var == "VHI":
+                # so that the 2001_6 and 2001_7 folders return no values
+                data[var].loc[{"time": "2001-06"}] = np.nan
+            data.to_netcdf(tmp_path / f"interim/{var}_preprocessed/data.nc")
+        Engineer(tmp_path, process_static=False).engineer(
+            test_year=2002,
+            target_variable="VHI",
+            pred_months=3,
+            expected_length=3,
+            feature_store=backend == "store",
+            virtual=backend == "virtual",
+        )
+
+        loader_kwargs = dict(
+            data_path=tmp_path,
+            mode="train",
+            shuffle_data=False,
+            static=None,
+            backend=backend,
+            pred_months=[2, 3, 4, 5, 6, 7],
+        )
+        loader = DataLoader(**loader_kwargs)
+        prefetch_loader = DataLoader(num_workers=2, prefetch_factor=2, **loader_kwargs)
+        assert prefetch_loader.data_files == loader.data_files
+
+        for _ in range(2):
+            batches = list(loader)
+            prefetched_batches = list(prefetch_loader)
+
+            assert len(batches) == len(prefetched_batches)
+            for (x, y), (prefetched_x, prefetched_y) in zip(
+                batches, prefetched_batches
+            ):
+                assert (y == prefetched_y).all()
+                for val, prefetched_val in zip(x, prefetched_x):
+                    if val is None:
+                        assert prefetched_val is None
+                    else:
+                        assert (val == prefetched_val).all()
+
+        # the empty folder should have been removed
+        assert "2001_6" not in [f.name for f in prefetch_loader.data_files]
+        assert prefetch_loader.data_files == loader.data_files
+
+        # an epoch which isn't finished
+        for _ in prefetch_loader:
+            break
+        assert len(prefetch_loader.prefetcher._futures) > 0
+        # doesn't hold up the next one, or leave its prefetched files behind
+        assert len(list(prefetch_loader)) == len(batches)
+        assert prefetch_loader.prefetcher._futures == {}
+
+        tmp_dir = prefetch_loader.prefetcher._tmp_dir
+        assert len(list(tmp_dir.iterdir())) == 0, "Prefetched files should be removed"
+        prefetch_loader.prefetcher.close()
+        assert not tmp_dir.exists()
+
+    def test_model_arrays_cache(self, tmp_path):
+        def _make_arrays(num_instances):
+            train_data = TrainData(
+                historical=np.random.rand(num_instances, 3, 2),
+                current=None,
+                pred_months=np.ones(num_instances),
+                latlons=np.random.rand(num_instances, 2),
+                yearly_aggs=None,
+                static=None,
+                prev_y_var=np.random.rand(num_instances, 1),
+            )
+            return ModelArrays(
+                x=train_data,
+                y=np.random.rand(num_instances, 1),
+                x_vars=["a", "b"],
+                y_var="a",
+                latlons=train_data.latlons,
+                target_time=pd.Timestamp("2000-01-31"),
+            )
+
+        arrays = {f"2000_{i}": _make_arrays(10) for i in range(1, 4)}
+        cache = ModelArraysCache(
+            max_bytes=arrays["2000_1"].nbytes * 2, cache_dir=tmp_path
+        )
+        for key, val in arrays.items():
+            cache.put(key, val)
+
+        # the least recently used key should have been spilled to disk
+        assert (tmp_path / "2000_1/x_historical.npy").exists()
+        assert not (tmp_path / "2000_3").exists()
+
+        reloaded = cache.get("2000_1")
+        assert reloaded is not arrays["2000_1"]
+        assert (reloaded.x.historical == arrays["2000_1"].x.historical).all()
+        assert (reloaded.y == arrays["2000_1"].y).all()
+        assert reloaded.x.current is None
+        assert reloaded.x_vars == ["a", "b"]
+        assert reloaded.target_time == arrays["2000_1"].target_time
+
+        # in memory arrays are returned as is
+        assert cache.get("2000_1") is reloaded
+        assert "2000_2" in cache
+        assert cache.get("2001_1") is None
@@ -1,7 +1,10 @@
+import numpy as np
 import pytest
+import xarray as xr
 
 from ..utils import _make_dataset
 
+from src.preprocess import base
 from src.preprocess.base import BasePreProcessor
 
 
@@ -61,6 +64,84 @@ class TestBase:
             processor.preprocessed_folder / weight_filename
         ).exists() is False, f"Regridder weight file not deleted!"
 
+    def test_regridder_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(base, "_regridders", {})
+
+        reference_ds, _, _ = _make_dataset((10, 10))
+        target_ds, _, _ = _make_dataset((20, 20))
+        other_target_ds, _, _ = _make_dataset((20, 20), lonmin=-170.0)
+
+        # xesmf is imported when the processor is initialized
+        processor = BasePreProcessor(tmp_path)
+
+        num_regridders = {"count": 0}
+        regridder_class = base.xesmf.Regridder
+
+        def counting_regridder(*args, **kwargs):
+            num_regridders["count"] += 1
+            return regridder_class(*args, **kwargs)
+
+        monkeypatch.setattr(base.xesmf, "Regridder", counting_regridder)
+
+        first = processor.regrid(target_ds, reference_ds)
+        second = processor.regrid(target_ds, reference_ds)
+        assert num_regridders["count"] == 1, "Regridder should have been reused"
+        assert (first.VHI.values == second.VHI.values).all()
+
+        # the weights are saved, so that other processes can load them
+        weight_files = list((tmp_path / "interim/regrid_weights").glob("*.nc"))
+        assert len(weight_files) == 1
+        assert weight_files[0].name.startswith("nearest_s2d_")
+
+        # a different input grid (with the same shape) needs new weights
+        processor.regrid(other_target_ds, reference_ds)
+        assert num_regridders["count"] == 2
+        assert len(list((tmp_path / "interim/regrid_weights").glob("*.nc"))) == 2
+
+        # a new process would load the weights from file
+        monkeypatch.setattr(base, "_regridders", {})
+        processor.regrid(target_ds, reference_ds, clean=True)
+        assert num_regridders["count"] == 3
+        assert len(list((tmp_path / "interim/regrid_weights").glob("*.nc"))) == 1
+
+    def test_regrid_batched(self):
+        from scipy import sparse
+
+        ds, _, _ = _make_dataset((4, 4))
+        ds["precip"] = ds.VHI * 2
+        ds["VHI"] = ds.VHI.astype(np.float32)
+        ds_out = xr.Dataset(
+            {"lat": (["lat"], ds.lat.values[::2]), "lon": (["lon"], ds.lon.values[::2])}
+        )
+
+        # each output pixel is the mean of a 2x2 block of input pixels
+        rows, cols = [], []
+        for lat in range(4):
+            for lon in range(4):
+                rows.append((lat // 2) * 2 + lon // 2)
+                cols.append(lat * 4 + lon)
+        weights = sparse.coo_matrix((np.full(16, 0.25), (rows, cols)), shape=(4, 16))
+
+        ds.VHI[{"time": 0, "lat": 0, "lon": 0}] = np.nan
+        ds.VHI[{"time": 1, "lat": slice(0, 2), "lon": slice(0, 2)}] = np.nan
+
+        regridded = BasePreProcessor._regrid_batched(weights.tocsr(), ds, ds_out)
+        assert regridded.VHI.dims == ("time", "lat", "lon")
+        assert regridded.VHI.dtype == np.float32
+        assert (regridded.time.values == ds.time.values).all()
+        assert (regridded.lat.values == ds_out.lat.values).all()
+
+        expected = ds.precip.coarsen(lat=2, lon=2).mean()
+        assert np.allclose(regridded.precip.values, expected.values)
+
+        # NaN inputs are ignored, and the remaining weights renormalised
+        assert np.isclose(
+            regridded.VHI[0, 0, 0].values,
+            np.nanmean(ds.VHI[0, :2, :2].values),
+        )
+        assert np.isnan(regridded.VHI[1, 0, 0].values)
+        assert not np.isnan(regridded.VHI[1, 1, 1].values)
+
     def test_load_regridder(self, tmp_path):
 
         test_dataset, _, _ = _make_dataset(size=(10, 10))
@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 import cfgrib
 
+from src.preprocess.seas5.ensemble import EnsembleStatistics
 from src.preprocess.seas5.ouce_s5 import OuceS5Data
 from src.preprocess import S5Preprocessor
 from src.utils import get_kenya
@@ -267,3 +268,136 @@ class TestS5Preprocessor:
         assert (
             not processor.interim.exists()
         ), f"Interim S5 folder should have been deleted"
+
+    def test_stream_to_netcdf(self, tmp_path):
+        # a lazily read dataset, as read from a CDS grib file
+        ds = make_dummy_seas5_data("2018-01-31")
+        ds = xr.concat(
+            [ds, ds.assign_coords(initialisation_date=[pd.Timestamp("2018-02-28")])],
+            dim="initialisation_date",
+        )
+        ds["precip"] = ds.precip * xr.DataArray(ds.number, dims="number")
+        ds = ds.rename({"lat": "latitude", "lon": "longitude"}).drop("valid_time")
+        ds.to_netcdf(tmp_path / "raw.nc")
+        ds = xr.open_dataset(tmp_path / "raw.nc").rename(
+            {"latitude": "lat", "longitude": "lon"}
+        )
+
+        processor = S5Preprocessor(tmp_path / "data")
+        output_paths = [tmp_path / "all.nc", tmp_path / "batched.nc"]
+        processor._stream_to_netcdf(
+            ds, ["precip"], output_paths[0], subset_str="kenya", batch_size=2
+        )
+        processor._stream_to_netcdf(
+            ds,
+            ["precip"],
+            output_paths[1],
+            subset_str="kenya",
+            batch_size=1,
+            member_batch_size=10,
+        )
+        assert not (tmp_path / "batched.nc.part").exists()
+
+        # the latitudes of the dummy data are inverted
+        expected = processor.chop_roi(ds, "kenya", inverse_lat=True).load()
+        for path in output_paths:
+            out_data = xr.open_dataset(path)
+            assert out_data.precip.dims == ds.precip.dims
+            assert (out_data.precip.values == expected.precip.values).all()
+            assert (out_data.initialisation_date == ds.initialisation_date).all()
+            assert (out_data.forecast_horizon == ds.forecast_horizon).all()
+
+        # one chunk per initialisation date and batch of ensemble members
+        out_data = xr.open_dataset(output_paths[1])
+        chunksizes = (10, 1, 24) + expected.precip.shape[-2:]
+        assert out_data.precip.encoding["chunksizes"] == chunksizes
+
+    def test_create_lead_month_variables(self, tmp_path):
+        ds = make_dummy_seas5_data("2018-01-31").isel(forecast_horizon=[0, 3, 6])
+        ds = ds.drop("valid_time")
+        ds["precip"] = ds.precip * xr.DataArray(ds.number, dims="number")
+        times = pd.to_datetime(
+            (ds.initialisation_date + ds.forecast_horizon).values.ravel()
+        )
+        # the second initialisation date has no forecast for the last horizon
+        second = ds.assign_coords(initialisation_date=[pd.Timestamp("2018-02-28")])
+        second["precip"] = second.precip.where(
+            second.forecast_horizon < ds.forecast_horizon[-1]
+        )
+        ds = xr.concat([ds, second], dim="initialisation_date")
+
+        processor = S5Preprocessor(tmp_path / "data")
+        out_data = processor.create_lead_month_variables(
+            ds,
+            n_members=10,
+            quantiles=[0.5],
+            thresholds=[4.5],
+            batch_size=2,
+            member_batch_size=3,
+        )
+
+        expected_vars = [
+            f"precip_{stat}_{n}"
+            for stat in ["mean", "std", "q50", "exceed_4.5"]
+            for n in [1, 2, 3]
+        ]
+        assert sorted(out_data.data_vars) == sorted(expected_vars)
+        assert out_data.precip_mean_1.dims == ("lat", "lon", "time")
+
+        # the forecasts of both initialisation dates, without the missing forecast
+        assert out_data.time.size == ds.initialisation_date.size * times.size - 1
+
+        # the mean and std of the first 10 members (0, 1, ..., 9)
+        members = np.arange(10)
+        for time, n in zip(times, [1, 2, 3]):
+            assert (out_data[f"precip_mean_{n}"].sel(time=time) == members.mean()).all()
+            assert np.allclose(
+                out_data[f"precip_std_{n}"].sel(time=time), members.std()
+            )
+            assert (out_data[f"precip_q50_{n}"].sel(time=time) == 4.5).all()
+            assert (out_data[f"precip_exceed_4.5_{n}"].sel(time=time) == 0.5).all()
+        assert out_data.precip_q50_1.dtype == np.float32
+        # the forecasts of the other lead months are NaN at these times
+        assert np.isnan(out_data.precip_mean_2.sel(time=times[0])).all()
+
+
+class TestEnsembleStatistics:
+    def test_statistics(self):
+        values = np.random.default_rng(0).normal(size=(20, 3, 4, 5))
+        values[np.random.default_rng(1).random(values.shape) < 0.2] = np.nan
+        # an element without any members
+        values[:, 0, 0, 0] = np.nan
+
+        ensemble = EnsembleStatistics(
+            (3, 4, 5), n_members=20, quantiles=[0.1, 0.9], thresholds=[0.5]
+        )
+        for i in range(0, 20, 6):
+            ensemble.update(values[i : i + 6])
+        stats = ensemble.statistics("var")
+
+        assert sorted(stats) == [
+            "var_exceed_0.5",
+            "var_mean",
+            "var_q10",
+            "var_q90",
+            "var_std",
+        ]
+        assert np.allclose(
+            stats["var_mean"], np.nanmean(values, axis=0), equal_nan=True
+        )
+        assert np.allclose(stats["var_std"], np.nanstd(values, axis=0), equal_nan=True)
+        for quantile in [0.1, 0.9]:
+            assert np.allclose(
+                stats[f"var_q{100 * quantile:g}"],
+                np.nanquantile(values, quantile, axis=0),
+                equal_nan=True,
+            )
+        exceedance = (values > 0.5).sum(axis=0) / (~np.isnan(values)).sum(axis=0)
+        assert np.allclose(stats["var_exceed_0.5"], exceedance, equal_nan=True)
+        assert np.isnan(stats["var_q10"][0, 0, 0])
+
+        # only the statistics of the masked elements
+        mask = np.array([True, False, True])
+        masked = ensemble.statistics("var", mask)
+        assert masked["var_q90"].shape == (2, 4, 5)
+        assert np.allclose(masked["var_mean"], stats["var_mean"][mask], equal_nan=True)
@@ -1,5 +1,11 @@
+import numpy as np
 import xarray as xr
-from src.utils import get_modal_value_across_time
+import pytest
+from src.utils import (
+    get_modal_value_across_time,
+    create_shape_aligned_climatology,
+    grouped_nanquantile,
+)
 from .utils import _make_dataset
 
 
@@ -21,3 +27,37 @@ class TestUtils:
             "Expect that one timestep of 1s"
             "and 36 timesteps of 5s would create a modal_da of 5 for each pixel"
         )
+
+    def test_create_shape_aligned_climatology(self):
+        ds, _, _ = _make_dataset((5, 6), start_date="1999-01-01", end_date="2004-12-31")
+        clim = ds.groupby("time.month").mean(dim="time")
+
+        clim_ext = create_shape_aligned_climatology(ds, clim, "VHI", "month")
+        assert clim_ext.VHI.shape == ds.VHI.shape
+        assert (clim_ext.time.values == ds.time.values).all()
+        assert "month" not in ds, "The input dataset should not be modified"
+
+        # every timestep has the climatology of its month
+        for month in range(1, 13):
+            expected = clim.VHI.sel(month=month).values
+            got = clim_ext.VHI.sel(time=ds["time.month"] == month).values
+            assert (got == expected[np.newaxis]).all()
+
+    @pytest.mark.parametrize("chunk_size", [None, 2])
+    def test_grouped_nanquantile(self, chunk_size):
+        values = np.random.normal(size=(50, 5, 4))
+        values[np.random.uniform(size=values.shape) < 0.2] = np.nan
+        values[:, 0, 0] = np.nan
+        groups = np.arange(50) % 12
+
+        quantiles = grouped_nanquantile(
+            values, groups, [0.1, 0.5, 0.9], chunk_size=chunk_size
+        )
+        assert quantiles.shape == (3, 12, 5, 4)
+
+        for i, q in enumerate([10, 50, 90]):
+            for group in range(12):
+                expected = np.nanpercentile(values[groups == group][:, 1:], q, axis=0)
+                assert np.allclose(quantiles[i, group, 1:], expected, equal_nan=True)
+        # all NaN pixels have NaN quantiles
+        assert np.isnan(quantiles[:, :, 0, 0]).all()